@@ -0,0 +1,94 @@
+import games_model
+import test_with_lines
+import argparse
+import glob
+import json
+import os
+import re
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from concurrent.futures import ProcessPoolExecutor
+from sklearn.metrics import log_loss, roc_auc_score
+
+# walk-forward backtest of the games model: each season is predicted by a model trained in-process on the seasons before it,
+# and scored on log loss, AUC and the net win from Kelly bets against the closing lines (see test_with_lines.py)
+# the gameTrain_<season>.csv files are read once into a parquet cache, and seasons are run in parallel
+
+def _game_train_files(data_dir='data'):
+    # gameTrain csv for each season, by season
+    files = {}
+    for f in glob.glob(os.path.join(data_dir, 'gameTrain_*.csv')):
+        match = re.search(r'gameTrain_(\d{4})\.csv$', f)
+        if match:
+            files[int(match.group(1))] = f
+    return files
+
+def _files_key(files):
+    # season -> [mtime, size] of each gameTrain csv, stored in the cache's metadata to tell when it is stale
+    return {str(season): [os.path.getmtime(f), os.path.getsize(f)] for season, f in sorted(files.items())}
+
+def _cached_files_key(cache_file):
+    # the files key the cache was built from, None if there is no cache or it has no key
+    if not os.path.isfile(cache_file):
+        return None
+    metadata = pq.read_schema(cache_file).metadata or {}
+    key = metadata.get(b'gameTrain_files')
+    return json.loads(key) if key is not None else None
+
+def load_game_train(columns=None, data_dir='data', cache_file=None):
+    # every season's gameTrain data as one dataframe, read from a parquet cache (data_dir/gameTrain.parquet by default)
+    # the cache is rebuilt from the csv files whenever the season -> (mtime, size) of the files it was built from changes,
+    # so added, deleted or rewritten csvs are all picked up. columns limits which columns are read
+    if cache_file is None:
+        cache_file = os.path.join(data_dir, 'gameTrain.parquet')
+    files = _game_train_files(data_dir)
+    key = _files_key(files)
+    if _cached_files_key(cache_file) != key:
+        df = pd.concat([pd.read_csv(files[season]).assign(Season=season) for season in sorted(files)], ignore_index=True)
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        table = table.replace_schema_metadata({**(table.schema.metadata or {}), b'gameTrain_files': json.dumps(key).encode()})
+        pq.write_table(table, cache_file)
+        del df, table
+    return pd.read_parquet(cache_file, columns=columns)
+
+def backtest_season(season, train, test, lines, features=None):
+    # train on the train games, predict the test games (one season) and score the predictions
+    scaler, model = games_model.fit(*games_model.train_arrays(train, features))
+    df = games_model.predict_games(test, scaler, model, features)
+    return {
+        'Season' : season,
+        'Games' : len(df.index),
+        'LogLoss' : log_loss(df['Win'], df['winProba']),
+        'AUC' : roc_auc_score(df['Win'], df['winProba']),
+        'NetWin' : test_with_lines.net_win(df, lines),
+    }
+
+def run(seasons, min_season=2015, features=None, lines_file='data/lines.csv', data_dir='data', workers=None):
+    # walk-forward backtest for the given seasons, where season N is predicted by a model trained on min_season to N-1
+    # returns a dataframe with one row per season
+    features = features or games_model.games_config['features']
+    columns = list(dict.fromkeys(['Season','Date','Team','Opp','Win','Home','Playoffs'] + features))
+    df = load_game_train(columns, data_dir)
+    lines = pd.read_csv(lines_file)
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        jobs = [executor.submit(backtest_season, season, df.loc[(df['Season']>=min_season)&(df['Season']<season)],
+            df.loc[df['Season']==season], lines, features) for season in seasons]
+        results = [job.result() for job in jobs]
+
+    return pd.DataFrame(results)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-seasons', nargs=2, required=True, type=int, help='First and last season to backtest')
+    parser.add_argument('-min_season', required=False, type=int, default=2015, help='First season of training data')
+    parser.add_argument('-lines_file', required=False, default='data/lines.csv', help='File with the betting lines')
+    parser.add_argument('-workers', required=False, type=int, help='Number of seasons to run at once (number of cores by default)')
+    parser.add_argument('-output', required=False, help='csv file to write the results to')
+    args = parser.parse_args()
+
+    results = run(range(args.seasons[0], args.seasons[1]+1), min_season=args.min_season, lines_file=args.lines_file, workers=args.workers)
+    print (results.to_string(index=False))
+    if args.output is not None:
+        results.to_csv(args.output, index=False)
@@ -0,0 +1,398 @@
+import data_processing
+import data_storage
+import inseason_ratings
+import schema
+import xG_model
+import games_model
+import betting
+import test_with_lines
+import argparse
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+import pandas as pd
+import numpy as np
+
+def toi_overlap(season=2022, n_games=5, data_dir='data'):
+    # time the interval sweep in get_toi_overlap on real games (equivalence with the original loop is checked in tests/test_data_processing.py)
+    pbp = data_storage.read_data('pbp', season, data_dir=data_dir)
+    shifts = data_storage.read_data('shifts', season, data_dir=data_dir)
+    pbp['Game_Id'] = pbp['Game_Id'].astype(np.int64)
+    shifts['Game_Id'] = shifts['Game_Id'].astype(np.int64)
+    gameids = shifts['Game_Id'].unique()[:n_games]
+    pbp = pbp.loc[pbp['Game_Id'].isin(gameids)]
+    shifts = shifts.loc[shifts['Game_Id'].isin(gameids)]
+
+    start = time.time()
+    toi_overlap, toi = data_processing.get_toi_overlap(pbp, shifts)
+    sweep_time = time.time() - start
+    print('toi_overlap: {} games, {} overlap rows, {} toi rows'.format(len(gameids), len(toi_overlap), len(toi)))
+    print('sweep: {:.2f}s'.format(sweep_time))
+
+def onice(season=2022, n_games=5, data_dir='data'):
+    # time aggregate_player_data with the long-format on-ice stats on a few real games
+    # (equivalence with the original per-slot version is checked in tests/test_data_processing.py)
+    pbp = data_storage.read_data('pbp', season, data_dir=data_dir)
+    shifts = data_storage.read_data('shifts', season, data_dir=data_dir)
+    gameids = shifts['Game_Id'].unique()[:n_games]
+    pbp = pbp.loc[pbp['Game_Id'].isin(gameids)]
+    shifts = shifts.loc[shifts['Game_Id'].isin(gameids)]
+
+    teamGame = data_processing.aggregate_team_data(pbp.copy(), None)
+    start = time.time()
+    playerGame = data_processing.aggregate_player_data(pbp.copy(), shifts.copy(), teamGame)[0]
+    long_time = time.time() - start
+    print('onice: {} games, {} player-game rows'.format(len(gameids), len(playerGame.index)))
+    print('long: {:.2f}s (whole aggregate_player_data)'.format(long_time))
+
+def player_inseason_ratings(season=2022, start_date=None, end_date=None, data_dir='data'):
+    # time player in-season ratings over a date range (equivalence with recomputing every date is checked in tests/test_inseason_ratings.py)
+    playerGame = data_storage.read_data('playerGame', season, data_dir=data_dir)
+    toiOverlap = data_storage.read_data('toiOverlap', season, data_dir=data_dir)
+    if start_date is None:
+        start_date = playerGame['Date'].min()
+    if end_date is None:
+        end_date = playerGame['Date'].max()
+
+    start = time.time()
+    ratings = inseason_ratings.add_player_inseason_ratings(playerGame.copy(), toiOverlap, start_date, end_date)
+    incremental_time = time.time() - start
+    print('player_inseason_ratings: {} to {}, {} rows'.format(start_date, end_date, len(ratings.index)))
+    print('incremental: {:.2f}s'.format(incremental_time))
+
+def team_inseason_ratings(start_date=None, end_date=None, data_dir='data'):
+    # time team in-season ratings from cumulative sums (equivalence with the per-date loop is checked in tests/test_inseason_ratings.py)
+    teamGame = data_storage.read_data('teamGame', data_dir=data_dir)
+    if start_date is None:
+        start_date = teamGame['Date'].min()
+    if end_date is None:
+        end_date = teamGame['Date'].max()
+
+    start = time.time()
+    cumulative = inseason_ratings.add_team_inseason_ratings(teamGame.copy(), start_date, end_date)
+    cumulative_time = time.time() - start
+    print('team_inseason_ratings: {} to {}, {} seasons, {} rows'.format(start_date, end_date, teamGame['Season'].nunique(), len(cumulative.index)))
+    print('cumulative: {:.2f}s'.format(cumulative_time))
+
+def inseason_snapshots(season=2022, data_dir='data'):
+    # check player and team in-season ratings read from the snapshot store against computing them, and time a cold store,
+    # a warm store, and a store that's missing only the last day (as when predicting the day after update_data.py runs)
+    playerGame = data_storage.read_data('playerGame', season, data_dir=data_dir)
+    playerGame = playerGame.loc[playerGame['Playoffs']==0]
+    toiOverlap = data_storage.read_data('toiOverlap', season, data_dir=data_dir)
+    teamGame = data_storage.read_data('teamGame', data_dir=data_dir)
+    teamGame = teamGame.loc[teamGame['Playoffs']==0]
+    start_date = playerGame['Date'].min()
+    end_date = playerGame['Date'].max()
+    snapshot_dir = tempfile.mkdtemp()
+
+    def run(snapshot_dir):
+        start = time.time()
+        players = inseason_ratings.add_player_inseason_ratings(playerGame.copy(), toiOverlap, start_date, end_date, data_dir=snapshot_dir)
+        teams = inseason_ratings.add_team_inseason_ratings(teamGame.copy(), start_date, end_date, data_dir=snapshot_dir)
+        return players, teams, time.time() - start
+
+    players, teams, computed_time = run(None)
+    players_cold, teams_cold, cold_time = run(snapshot_dir)
+    players_warm, teams_warm, warm_time = run(snapshot_dir)
+    inseason_ratings.clear_snapshots(season, end_date, snapshot_dir)
+    players_day, teams_day, day_time = run(snapshot_dir)
+    shutil.rmtree(snapshot_dir)
+
+    for p, t in [(players_cold, teams_cold), (players_warm, teams_warm), (players_day, teams_day)]:
+        pd.testing.assert_frame_equal(players, p, check_dtype=False)
+        pd.testing.assert_frame_equal(teams, t, check_dtype=False)
+    print('inseason_snapshots: {} to {}, {} player rows and {} team rows match'.format(start_date, end_date, len(players.index), len(teams.index)))
+    print('computed: {:.2f}s, cold store: {:.2f}s, warm store: {:.2f}s, last day missing: {:.2f}s'.format(computed_time, cold_time, warm_time, day_time))
+
+def lag_features(season=2022, data_dir='data'):
+    # time the cumulative sum lag features, and check adding the last month of games to the earlier games' lag_history against
+    # computing them all at once (equivalence with the groupby-transform version is checked in tests/test_data_processing.py)
+    teamGame = data_storage.read_data('teamGame', data_dir=data_dir)
+    teamGame = teamGame.loc[(teamGame['Season']>=season-2)&(teamGame['Season']<=season)&(teamGame['Playoffs']==0)]
+    teamGame = teamGame.sort_values(by=['DateInt','Game_Id'], kind='stable').reset_index(drop=True)
+    metrics = [m+s for s in ['','_5v5','Adjusted','Adjusted_5v5'] for m in ['Goals','Shots','ShotAttempts','UnblockedShotAttempts','xG','xG_flurry']]
+    lags = [8,16,32,64]
+
+    start = time.time()
+    cumulative = data_processing._add_lags(teamGame.copy(), metrics, lags, 'Team')
+    cumulative_time = time.time() - start
+
+    split_date = (pd.Timestamp(teamGame['Date'].max()) - pd.Timedelta(days=30)).strftime('%Y-%m-%d')
+    earlier = teamGame.loc[teamGame['Date']<split_date]
+    start = time.time()
+    appended = data_processing._add_lags(teamGame.loc[teamGame['Date']>=split_date].copy(), metrics, lags, 'Team',
+        history=data_processing.lag_history(earlier, metrics, lags, 'Team'))
+    appended_time = time.time() - start
+
+    pd.testing.assert_frame_equal(cumulative.loc[teamGame['Date']>=split_date], appended)
+    print('lag_features: {} rows, {} columns, {} rows appended from {} match'.format(len(teamGame.index), len(metrics)*len(lags), len(appended.index), split_date))
+    print('cumulative sums: {:.3f}s, appended: {:.3f}s'.format(cumulative_time, appended_time))
+
+def opponent_columns(season=2022, data_dir='data'):
+    # time the gathered opponent columns on the teamGame rows add_game_features joins
+    # (equivalence with the self-join version is checked in tests/test_data_processing.py)
+    teamGame = data_storage.read_data('teamGame', data_dir=data_dir)
+    teamGame = teamGame.loc[(teamGame['Season']>=season-2)&(teamGame['Season']<=season)]
+    opp = teamGame[['Game_Id','Date','Season','Team']].rename(columns={'Team':'Opp'})
+    teamGame = teamGame.merge(opp, on=['Game_Id','Date','Season'])
+    teamGame = teamGame.loc[teamGame['Team']!=teamGame['Opp']].reset_index(drop=True)
+    cols = [c for c in teamGame.columns if c not in ['Game_Id','Date','Team','Season','Opp']]
+
+    start = time.time()
+    gathered = data_processing._add_opponent_columns(teamGame, cols)
+    gather_time = time.time() - start
+    print('opponent_columns: {} rows, {} opponent columns'.format(len(gathered.index), len(cols)))
+    print('gather: {:.3f}s'.format(gather_time))
+
+def scheduled_games(data_dir='data'):
+    # time adding the last day of stored games as scheduled games from the team state (computed once, as update_data saves it)
+    # (equivalence with reranking and running add_elo through all of teamGame is checked in tests/test_data_processing.py)
+    teamGame = data_storage.read_data('teamGame', data_dir=data_dir)
+    last_date = teamGame['Date'].max()
+    games = teamGame.loc[(teamGame['Date']==last_date)&(teamGame['Home']==1)]
+    opps = teamGame.loc[(teamGame['Date']==last_date)&(teamGame['Home']==0), ['Game_Id','Team']].rename(columns={'Team':'away_team'})
+    schedule = games[['Game_Id','Date','Team']].merge(opps, on='Game_Id').set_axis(['game_id','date','home_team','away_team'], axis=1)
+    season = int(teamGame['Season'].max())
+    team_state = data_processing.get_team_state(teamGame.loc[teamGame['Date']<last_date])
+
+    start = time.time()
+    state = data_processing.add_scheduled_games(teamGame.copy(), schedule, season, team_state)
+    state_time = time.time() - start
+    print('scheduled_games: {} scheduled games on {}'.format(len(schedule.index), last_date))
+    print('team state: {:.3f}s'.format(state_time))
+
+def overlap_sums(season=2022, data_dir='data'):
+    # time the teammate and competition sums from the sparse overlap matrices for each position and strength over a season
+    # (any stat works as the metric being summed; equivalence with merging the pairs with the player totals is checked in
+    # tests/test_inseason_ratings.py)
+    playerGame = data_storage.read_data('playerGame', season, data_dir=data_dir)
+    toiOverlap = data_storage.read_data('toiOverlap', season, data_dir=data_dir)
+    players = inseason_ratings._sum_player_games(playerGame.loc[(playerGame['Playoffs']==0)&(playerGame['TOI_5v5']>0)])
+    pairs = inseason_ratings._sum_overlap(toiOverlap.rename(columns={'Player_x':'Player', 'Player_Id_x':'PlayerID'}))
+    strengths = [
+        ('TOI_5v5', None, {'team':('xG_5v5_onice', True, 4), 'comp':('Goals_5v5_onice', False, 5)}),
+        ('TOI_PP', ('TOI_PP','TOI_PK'), {'team':('GoalsAdjusted_PP_onice', True, 4), 'comp':('GoalsAgainst_PK_onice', False, 4)}),
+        ('TOI_PK', ('TOI_PK','TOI_PP'), {'team':('GoalsAgainst_PK_onice', True, 3), 'comp':('GoalsAdjusted_PP_onice', False, 5)}),
+    ]
+    sparse_time = 0
+    for ratings, (toi, special_teams, sums) in zip(pairs, strengths):
+        start = time.time()
+        overlaps = inseason_ratings.overlap_matrices(ratings, players)
+        sparse_time += time.time() - start
+        for position in ['F','D']:
+            args = (position, toi, sums, ['Player','PlayerID','Position_x'], {toi+'_x':'max', 'team':'sum', 'comp':'sum'}, special_teams)
+            start = time.time()
+            summed = inseason_ratings.pair_metric_sums(ratings, overlaps, players, *args)
+            sparse_time += time.time() - start
+            print('overlap_sums: {} {} players at {}'.format(len(summed.index), position, toi))
+    print('sparse matrices: {:.3f}s'.format(sparse_time))
+
+def team_update(split_date=None, data_dir='data'):
+    # check aggregate_team_data's team state mode against reranking and running add_elo through all of teamGame, adding the
+    # games from split_date on (the last day by default) to the ones before it as update_data does, and time both
+    teamGame = data_storage.read_data('teamGame', data_dir=data_dir)
+    if split_date is None:
+        split_date = teamGame['Date'].max()
+    teamGame = teamGame.drop(columns=['teamGameRank','teamGameRankOverall','Playoffs','DateInt','Elo'])
+    prev_teamGame = teamGame.loc[teamGame['Date']<split_date]
+    new = teamGame.loc[teamGame['Date']>=split_date]
+
+    start = time.time()
+    full = data_processing._add_ranks_and_elo(new.copy(), prev_teamGame.copy())
+    full_time = time.time() - start
+    team_state = data_processing.get_team_state(full.loc[full['Date']<split_date])
+    start = time.time()
+    delta = data_processing._add_ranks_and_elo(new.copy(), team_state=team_state)
+    delta_time = time.time() - start
+
+    full = schema.apply(full.loc[full['Date']>=split_date], 'teamGame').reset_index(drop=True)
+    delta = schema.apply(delta, 'teamGame')[full.columns].reset_index(drop=True)
+    pd.testing.assert_frame_equal(full, delta, check_dtype=False)
+    print('team_update: {} teamGame rows from {} match'.format(len(delta.index), split_date))
+    print('rerank and add_elo: {:.3f}s, team state: {:.3f}s'.format(full_time, delta_time))
+
+def schema_dtypes(season=2022, data_dir='data'):
+    # memory use of each dataset with the int64 columns and plain strings the scraper returns against the schema's compact dtypes
+    # and categoricals, and the time of the sort and groupby add_xG_to_pbp does on pbp with each
+    for name in ['pbp','shifts','playerGame','teamGame']:
+        df = data_storage.read_data(name, season if name!='teamGame' else None, data_dir=data_dir)
+        wide = df.astype({c:np.int64 for c in schema.SCHEMAS[name] if c in df.columns})
+        wide = wide.astype({c:object for c in schema.CATEGORY_COLUMNS.get(name, []) if c in df.columns})
+        schema.memory_report(wide, name)
+        if name=='pbp':
+            times = []
+            for frame in [wide, df]:
+                start = time.time()
+                frame = frame.sort_values(by=['Date','Game_Id','Period','Seconds_Elapsed'])
+                counts = frame.groupby(['Game_Id','Date','Season','Period'])['Seconds_Elapsed'].agg(['count','max'])
+                times.append(time.time() - start)
+                if len(times)==1:
+                    wide_counts = counts
+            pd.testing.assert_frame_equal(wide_counts.reset_index(), counts.reset_index(), check_dtype=False)
+            print('pbp sort and groupby: int64 {:.3f}s, compact {:.3f}s'.format(times[0], times[1]))
+
+def roster_features(season=2022, data_dir='data'):
+    # time the single-sort roster features, using each player's in-season ratings as their projections
+    # (equivalence with the one-groupby-and-merge-per-set version is checked in tests/test_data_processing.py)
+    playerGame = data_storage.read_data('playerGame', season, data_dir=data_dir)
+    teamGame = data_storage.read_data('teamGame', season, data_dir=data_dir)
+    playerGame = inseason_ratings.add_player_inseason_ratings(playerGame, data_storage.read_data('toiOverlap', season, data_dir=data_dir),
+        '{}-10-01'.format(season), '{}-09-30'.format(season+1), data_dir=data_dir)
+    playerGame = playerGame.rename(columns={'prevGames_GC60_5v5':'xGC60_5v5', 'prevGames_GP60_5v5':'xGP60_5v5', 'prevGames_GI60_Pens':'xGI60_Pens',
+        'prevGames_GC60_PP':'xGC60_PP', 'prevGames_GP60_PK':'xGP60_PK'})
+
+    start = time.time()
+    kernel = teamGame.merge(data_processing._roster_features(playerGame), on=['Date','Team'], how='left')
+    kernel_time = time.time() - start
+    print('roster_features: {} team-games, {} player-games'.format(len(kernel.index), len(playerGame.index)))
+    print('single sort: {:.2f}s'.format(kernel_time))
+
+def elo(resume_date=None, data_dir='data'):
+    # time the array elo engine, and check that resuming from earlier ratings gives the same result
+    # (equivalence with the original per-game loop is checked in tests/test_data_processing.py)
+    teamGame = data_storage.read_data('teamGame', data_dir=data_dir).drop(columns=['Elo','teamGameRankOverall'], errors='ignore')
+    if resume_date is None:
+        resume_date = teamGame.loc[teamGame['Season']==teamGame['Season'].max(), 'Date'].min()
+
+    start = time.time()
+    array = data_processing.add_elo(teamGame.copy())
+    array_time = time.time() - start
+
+    prefix = array.loc[array['Date']<resume_date].drop(columns=['teamGameRankOverall'])
+    start = time.time()
+    resumed = data_processing.add_elo(pd.concat([prefix, teamGame.loc[teamGame['Date']>=resume_date]], ignore_index=True), data_processing.get_elo_ratings(prefix))
+    resume_time = time.time() - start
+    pd.testing.assert_frame_equal(array.reset_index(drop=True), resumed.reset_index(drop=True)[array.columns], check_dtype=False, rtol=1e-9)
+    print('elo: {} games, resumed from {} matches'.format(teamGame['Game_Id'].nunique(), resume_date))
+    print('array: {:.2f}s, resumed: {:.2f}s'.format(array_time, resume_time))
+
+def shot_features(season=2022, data_dir='data'):
+    # check get_shots_data with the per-game shot feature cache against computing every feature, and time a cold and a warm cache
+    pbp = data_storage.read_data('pbp', season, data_dir=data_dir)
+    cache_dir = tempfile.mkdtemp()
+
+    start = time.time()
+    shots = data_processing.get_shots_data(pbp, season)[1]
+    uncached_time = time.time() - start
+    start = time.time()
+    shots_cold = data_processing.get_shots_data(pbp, season, cache_dir)[1]
+    cold_time = time.time() - start
+    start = time.time()
+    shots_warm = data_processing.get_shots_data(pbp, season, cache_dir)[1]
+    warm_time = time.time() - start
+    shutil.rmtree(cache_dir)
+
+    pd.testing.assert_frame_equal(shots, shots_cold)
+    pd.testing.assert_frame_equal(shots, shots_warm)
+    print('shot_features: {} games, {} shots match'.format(shots['Game_Id'].nunique(), len(shots.index)))
+    print('uncached: {:.2f}s, cold cache: {:.2f}s, warm cache: {:.2f}s'.format(uncached_time, cold_time, warm_time))
+
+def xG(season=2022, data_dir='data'):
+    # time compiled xG predictions on a season of shots, in shots/sec
+    # (equivalence with the sklearn scaler and LGBMClassifier is checked in tests/test_xG_model.py)
+    shots = data_processing.get_shots_data(data_storage.read_data('pbp', season, data_dir=data_dir), season)[1]
+    model = xG_model.xG_model()
+    model.predict(shots.head(10))
+
+    start = time.time()
+    preds = model.predict(shots)
+    compiled_time = time.time() - start
+    print('xG: {} shots, mean xG {:.4f}'.format(len(shots.index), preds.mean()))
+    print('compiled: {:.0f} shots/sec'.format(len(shots.index)/compiled_time))
+
+def xG_train_data(season=2022, data_dir='data'):
+    # check the season-at-a-time xG training data builder against concatenating the shots in memory for the given season and
+    # the one before it, and compare peak memory (the memory-mapped feature matrix isn't counted, since it lives in the file)
+    seasons = [season-1, season]
+    tracemalloc.start()
+    df = pd.concat([data_processing.get_shots_data(data_storage.read_data('pbp', s, data_dir=data_dir), s)[1] for s in seasons], ignore_index=True)
+    mean_codes = {i: df.groupby(colname, observed=True)['goal'].mean().to_dict() for i, colname in xG_model.MEAN_ENCODING_COLUMNS.items()}
+    for i, colname in xG_model.xG_config['mean_encodings'].items():
+        df[colname+'_meanEnc'] = df[colname].map(mean_codes[i])
+    X_memory = df[xG_model.xG_config['features']].values
+    y_memory = df['goal'].values
+    del df
+    memory_peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    work_dir = tempfile.mkdtemp()
+    tracemalloc.start()
+    mean_codes_built, X, y = xG_model.build_train_data(seasons[0], seasons[-1], work_dir, cache_dir=os.path.join(data_dir, 'shotFeatures'), data_dir=data_dir)
+    built_peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    assert mean_codes_built==mean_codes, 'mean encodings differ'
+    np.testing.assert_allclose(np.asarray(X, dtype=np.float64), X_memory, rtol=1e-6, equal_nan=True)
+    assert (y==y_memory).all(), 'targets differ'
+    del X
+    shutil.rmtree(work_dir)
+    print('xG_train_data: seasons {} to {}, {} shots match'.format(seasons[0], seasons[-1], len(y)))
+    print('in memory: {:.0f}MB peak, built: {:.0f}MB peak'.format(memory_peak/1e6, built_peak/1e6))
+
+def betting_grid(season=2022, lines_file='data/lines.csv', data_dir='data'):
+    # check the vectorized betting evaluator against test_with_lines.net_win, and time a grid of rules against running net_win for each
+    df = games_model.games_model().predict(pd.read_csv(os.path.join(data_dir, 'gameTrain_{}.csv'.format(str(season)))))
+    lines = pd.read_csv(lines_file)
+    bets = betting.get_bets(df, lines)
+    thresholds = np.linspace(0, 0.7, 15)
+    edge_cutoffs = np.linspace(0, 0.2, 21)
+
+    # net_win only evaluates the default rule, so it's run once per grid point to time evaluating one rule at a time
+    start = time.time()
+    net_wins = [test_with_lines.net_win(df.copy(), lines) for i in range(len(thresholds)*len(edge_cutoffs))]
+    loop_time = time.time() - start
+    start = time.time()
+    grid = betting.evaluate(bets, thresholds, [0.25, 0.5, 1.], edge_cutoffs)
+    grid_time = time.time() - start
+
+    assert abs(grid.loc[(grid['Threshold']==0)&(grid['KellyFraction']==1)&(grid['EdgeCutoff']==0), 'NetWin'].iloc[0] - net_wins[0])<1e-9, 'net win differs'
+    print('betting_grid: {} bets, net win matches, {} rules evaluated'.format(len(bets.index), len(grid.index)))
+    print('net_win for {} rules: {:.2f}s, grid: {:.3f}s'.format(len(net_wins), loop_time, grid_time))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('check', help='Which check/benchmark to run', choices=['toi_overlap','onice','player_inseason_ratings','team_inseason_ratings','inseason_snapshots','lag_features','roster_features','opponent_columns','scheduled_games','team_update','overlap_sums','schema','elo','shot_features','xG','xG_train_data','betting_grid'])
+    parser.add_argument('-season', required=False, type=int, default=2022, help='NHL season to run for')
+    parser.add_argument('-dates', nargs=2, required=False, help='First date is start date, second date is end date')
+    parser.add_argument('-games', required=False, type=int, default=5, help='Number of games to compare')
+    args = parser.parse_args()
+
+    if args.check=='toi_overlap':
+        toi_overlap(season=args.season, n_games=args.games)
+    elif args.check=='onice':
+        onice(season=args.season, n_games=args.games)
+    elif args.check=='player_inseason_ratings':
+        dates = args.dates if args.dates is not None else [None, None]
+        player_inseason_ratings(season=args.season, start_date=dates[0], end_date=dates[1])
+    elif args.check=='team_inseason_ratings':
+        dates = args.dates if args.dates is not None else [None, None]
+        team_inseason_ratings(start_date=dates[0], end_date=dates[1])
+    elif args.check=='inseason_snapshots':
+        inseason_snapshots(season=args.season)
+    elif args.check=='lag_features':
+        lag_features(season=args.season)
+    elif args.check=='roster_features':
+        roster_features(season=args.season)
+    elif args.check=='opponent_columns':
+        opponent_columns(season=args.season)
+    elif args.check=='scheduled_games':
+        scheduled_games()
+    elif args.check=='overlap_sums':
+        overlap_sums(args.season)
+    elif args.check=='team_update':
+        team_update(None if args.dates is None else args.dates[0])
+    elif args.check=='schema':
+        schema_dtypes(season=args.season)
+    elif args.check=='elo':
+        elo(resume_date=args.dates[0] if args.dates is not None else None)
+    elif args.check=='shot_features':
+        shot_features(season=args.season)
+    elif args.check=='xG':
+        xG(season=args.season)
+    elif args.check=='xG_train_data':
+        xG_train_data(season=args.season)
+    elif args.check=='betting_grid':
+        betting_grid(season=args.season)
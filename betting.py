@@ -0,0 +1,80 @@
+import games_model
+import argparse
+import numpy as np
+import pandas as pd
+
+# betting results for game predictions against the closing lines, for a whole grid of betting rules at once
+# each bet is on a team whose predicted win probability beats the line's implied probability by more than an edge cutoff, and whose
+# win probability is above a threshold, sized as a fraction of the Kelly bet. a bet's result is linear in the Kelly fraction, so the
+# grid is worked out for full Kelly bets over thresholds x edge cutoffs with numpy broadcasting, then scaled for each fraction
+
+def get_bets(df, lines):
+    # one row per team and game with a line, in date order: predicted win probability (df, from games_model), implied win probability,
+    # gain ratio (amount won per amount bet on a win) and result. the same bets test_with_lines.net_win makes
+    lines = lines.merge(df[['Date','Team','Win']], how='left', on=['Date','Team'])
+    df = df.assign(Opp_winProba=1-df['winProba'])
+    home = df[['Date','Team','winProba']]
+    away = df[['Date','Opp','Opp_winProba']]
+    away.columns = ['Date','Team','winProba']
+    bets = lines.merge(pd.concat([home, away], ignore_index=True), how='inner', on=['Date','Team'])
+    bets = bets.sort_values(by='Date', kind='stable', ignore_index=True)
+
+    close = bets['Close'].values
+    bets['ImpliedPct'] = np.where(close<0, close/(close-100), np.where(close>0, 100/(100+close), 0.))
+    bets['GainRatio'] = np.where(close<0, -100/close, np.where(close>0, close/100., 0.))
+    return bets[['Date','Team','Close','Win','winProba','ImpliedPct','GainRatio']]
+
+def evaluate(bets, thresholds=[0.], kelly_fractions=[1.], edge_cutoffs=[0.]):
+    # NetWin, amount staked, ROI and max drawdown (of the running NetWin, in date order) for every combination of win probability
+    # threshold, Kelly fraction and edge cutoff. the defaults are the rule test_with_lines.net_win uses
+    thresholds = np.asarray(thresholds, dtype=np.float64)
+    kelly_fractions = np.asarray(kelly_fractions, dtype=np.float64)
+    edge_cutoffs = np.asarray(edge_cutoffs, dtype=np.float64)
+    proba = bets['winProba'].values
+    gain = bets['GainRatio'].values
+    win = bets['Win'].values
+    edge = proba - bets['ImpliedPct'].values
+
+    # full Kelly bet and its result for each bet. bets without a result count as 0
+    kelly = proba - (1-proba)/gain
+    result = np.where(win==1, kelly*gain, np.where(win==0, -kelly, 0.))
+
+    # (threshold, edge cutoff, bet) mask of the bets each rule makes
+    placed = (proba[None,None,:]>thresholds[:,None,None]) & (edge[None,None,:]>edge_cutoffs[None,:,None])
+    staked = np.where(placed, kelly, 0.).sum(-1)
+    running = np.cumsum(np.where(placed, result, 0.), axis=-1)
+    net_win = running[...,-1] if running.shape[-1]>0 else np.zeros(placed.shape[:2])
+    drawdown = (np.maximum.accumulate(np.maximum(running, 0.), axis=-1) - running).max(-1, initial=0.)
+
+    # scale by Kelly fraction, giving (threshold, Kelly fraction, edge cutoff) grids
+    grid = pd.MultiIndex.from_product([thresholds, kelly_fractions, edge_cutoffs], names=['Threshold','KellyFraction','EdgeCutoff']).to_frame(index=False)
+    grid['Bets'] = np.broadcast_to(placed.sum(-1)[:,None,:], (len(thresholds), len(kelly_fractions), len(edge_cutoffs))).ravel()
+    grid['Staked'] = (staked[:,None,:]*kelly_fractions[None,:,None]).ravel()
+    grid['NetWin'] = (net_win[:,None,:]*kelly_fractions[None,:,None]).ravel()
+    grid['ROI'] = np.broadcast_to((net_win/np.where(staked==0, np.nan, staked))[:,None,:], (len(thresholds), len(kelly_fractions), len(edge_cutoffs))).ravel()
+    grid['MaxDrawdown'] = (drawdown[:,None,:]*kelly_fractions[None,:,None]).ravel()
+
+    return grid
+
+def main(season=2021, lines_file='data/lines.csv', scaler_file=None, model_file=None, thresholds=[0.], kelly_fractions=[1.], edge_cutoffs=[0.]):
+    # betting results over the grid for a season of games, predicted by the current games model (or the given scaler and model files)
+    model = games_model.games_model(scaler_file=scaler_file, model_file=model_file)
+    df = model.predict(pd.read_csv('data/gameTrain_{}.csv'.format(str(season))))
+    return evaluate(get_bets(df, pd.read_csv(lines_file)), thresholds, kelly_fractions, edge_cutoffs)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-season', required=False, type=int, default=2021, help='NHL season to run for')
+    parser.add_argument('-scaler_file', required=False, help='File location of scaler to use for data')
+    parser.add_argument('-model_file', required=False, help='File location of model to use for prediction')
+    parser.add_argument('-thresholds', nargs='+', required=False, type=float, default=[0.], help='Minimum predicted win probabilities to bet at')
+    parser.add_argument('-kelly_fractions', nargs='+', required=False, type=float, default=[1.], help='Fractions of the Kelly bet to bet')
+    parser.add_argument('-edge_cutoffs', nargs='+', required=False, type=float, default=[0.], help='Minimum edges (predicted minus implied win probability) to bet at')
+    parser.add_argument('-output', required=False, help='csv file to write the results to')
+    args = parser.parse_args()
+
+    grid = main(args.season, scaler_file=args.scaler_file, model_file=args.model_file, thresholds=args.thresholds,
+        kelly_fractions=args.kelly_fractions, edge_cutoffs=args.edge_cutoffs)
+    print (grid.to_string(index=False))
+    if args.output is not None:
+        grid.to_csv(args.output, index=False)
@@ -1,12 +1,33 @@
 import pandas as pd
 import numpy as np
 import xG_model
+import data_storage
+import schema
 import os
+import glob
+import shutil
+import uuid
+import hashlib
+import inspect
+import pyarrow.dataset as ds
 import gc
 import json
 import math
+from scipy import sparse
+
+def _reverse_strength(df, rows):
+    # reverse Strength on the given rows (4x5 to 5x4), in place. Strength is a categorical (see schema.py), so any reversed
+    # strengths that aren't categories yet are added first
+    reversed_strength = df.loc[rows, 'Strength'].astype(object).str[::-1]
+    if df['Strength'].dtype.name=='category':
+        new = pd.Index(reversed_strength.dropna().unique()).difference(df['Strength'].cat.categories)
+        df['Strength'] = df['Strength'].cat.add_categories(new)
+    df.loc[rows, 'Strength'] = reversed_strength
+
+def get_shots_data(df, season=2022, cache_dir=None):
+    # pbp with a Play_Id field, and the shots from it with the features for the xG model
+    # if cache_dir is given, the shot features for each game are cached there (see _cached_shot_features) and only computed for new games
 
-def get_shots_data(df, season=2022):
     # create Play_Id field for joining later
     df = df.reset_index()
     df.rename({'index':'Play_Id'}, axis=1, inplace=True)
@@ -20,23 +41,34 @@ def get_shots_data(df, season=2022):
     df['Home_Team'] = df['Home_Team'].replace({'PHX':'ARI', 'S.J':'SJS', 'L.A':'LAK', 'T.B':'TBL', 'N.J':'NJD'})
     df['Away_Team'] = df['Away_Team'].replace({'PHX':'ARI', 'S.J':'SJS', 'L.A':'LAK', 'T.B':'TBL', 'N.J':'NJD'})
 
+    if cache_dir is None:
+        return df, _shot_features(df)
+    return df, _cached_shot_features(df, season, cache_dir)
+
+def _shot_features(df):
+    # shots from the pbp (with Play_Id, Season and fixed teams), with the features for the xG model
+    # every feature only depends on events from the same game, so features can be computed and cached a game at a time
+
     # to add xG values, filter for only specific events that are relevant for xG
     shots = df.loc[df['Event'].isin(['MISS','SHOT','GOAL','FAC','HIT','BLOCK','GIVE','TAKE'])]
 
+    # the teams are compared to each other below, so they're plain strings here instead of categoricals (see schema.py)
+    shots = shots.astype({'Ev_Team':object, 'Home_Team':object, 'Away_Team':object})
+
     # remove null location data (this is a key part of xG)
     shots = shots.loc[~shots['xC'].isnull()]
     shots = shots.loc[~shots['yC'].isnull()]
 
-    # get previous event time and location
+    # get previous event time and location (shifted within each game, so nothing carries over from the game before it)
     shots = shots.sort_values(by=['Game_Id','Period','Seconds_Elapsed'])
-    shots['prev_Game_Id'] = shots['Game_Id'].shift(1)
-    shots['prev_Period'] = shots['Period'].shift(1)
+    shots['prev_Game_Id'] = shots.groupby('Game_Id')['Game_Id'].shift(1)
+    shots['prev_Period'] = shots.groupby('Game_Id')['Period'].shift(1)
     shots['keepPrev'] = ((shots['prev_Game_Id']==shots['Game_Id']) & (shots['prev_Period']==shots['Period'])).astype(int)
-    shots['prev_Event'] = shots['Event'].shift(1)
-    shots['prev_Seconds_Elapsed'] = shots['Seconds_Elapsed'].shift(1)
-    shots['prev_xC'] = shots['xC'].shift(1)
-    shots['prev_yC'] = shots['yC'].shift(1)
-    shots['prev_Ev_Team'] = shots['Ev_Team'].shift(1)
+    shots['prev_Event'] = shots.groupby('Game_Id')['Event'].shift(1)
+    shots['prev_Seconds_Elapsed'] = shots.groupby('Game_Id')['Seconds_Elapsed'].shift(1)
+    shots['prev_xC'] = shots.groupby('Game_Id')['xC'].shift(1)
+    shots['prev_yC'] = shots.groupby('Game_Id')['yC'].shift(1)
+    shots['prev_Ev_Team'] = shots.groupby('Game_Id')['Ev_Team'].shift(1)
     shots['prev_sameTeam'] = (shots['prev_Ev_Team']==shots['Ev_Team']).astype(int)
     shots.loc[shots['keepPrev']==0, 'prev_Event'] = np.NaN
     shots.loc[shots['keepPrev']==0, ['prev_Seconds_Elapsed','prev_xC','prev_yC']] = 0.
@@ -66,13 +98,13 @@ def get_shots_data(df, season=2022):
     shots.loc[(shots['timeSincePrev']<=4)&(shots['xDistanceSincePrev']>=50), 'ShotCategory'] = 'Rush'
 
     # get previous shot time and location, and then calculate derived metrics
-    shots['prevShot_Game_Id'] = shots['Game_Id'].shift(1)
-    shots['prevShot_Period'] = shots['Period'].shift(1)
+    shots['prevShot_Game_Id'] = shots.groupby('Game_Id')['Game_Id'].shift(1)
+    shots['prevShot_Period'] = shots.groupby('Game_Id')['Period'].shift(1)
     shots['keepPrevShot'] = ((shots['prevShot_Game_Id']==shots['Game_Id']) & (shots['prevShot_Period']==shots['Period'])).astype(int)
-    shots['prevShot_Seconds_Elapsed'] = shots['Seconds_Elapsed'].shift(1)
-    shots['prevShot_xC'] = shots['xC'].shift(1)
-    shots['prevShot_yC'] = shots['yC'].shift(1)
-    shots['prevShot_Ev_Team'] = shots['Ev_Team'].shift(1)
+    shots['prevShot_Seconds_Elapsed'] = shots.groupby('Game_Id')['Seconds_Elapsed'].shift(1)
+    shots['prevShot_xC'] = shots.groupby('Game_Id')['xC'].shift(1)
+    shots['prevShot_yC'] = shots.groupby('Game_Id')['yC'].shift(1)
+    shots['prevShot_Ev_Team'] = shots.groupby('Game_Id')['Ev_Team'].shift(1)
     shots['prevShot_sameTeam'] = (shots['prevShot_Ev_Team']==shots['Ev_Team']).astype(int)
     shots.loc[shots['keepPrevShot']==0, ['prevShot_Seconds_Elapsed','prevShot_xC','prevShot_yC','prevShot_Ev_Team']] = np.NaN
     shots['timeSincePrevShot'] = shots['Seconds_Elapsed'] - shots['prevShot_Seconds_Elapsed']
@@ -108,12 +140,61 @@ def get_shots_data(df, season=2022):
     shots['scoreDiff'] = shots['scoreFor'] - shots['scoreAgainst']
 
     # reverse strength for away team, so that 5x4 always means PP and 4x5 always means PK
-    shots.loc[shots['Ev_Team']==shots['Away_Team'], 'Strength'] = shots.loc[shots['Ev_Team']==shots['Away_Team'], 'Strength'].str[::-1]
+    _reverse_strength(shots, shots['Ev_Team']==shots['Away_Team'])
 
     # add target variable
     shots['goal'] = (shots['Event']=='GOAL').astype(int)
 
-    return df, shots
+    return shots
+
+def shot_features_version():
+    # hash of the code that computes the shot features, so cached features are recomputed whenever it changes
+    # that's _shot_features and every function in this module it calls, and the ones they call (like _reverse_strength)
+    funcs = [_shot_features]
+    for f in funcs:
+        for name in f.__code__.co_names:
+            g = globals().get(name)
+            if inspect.isfunction(g) and g.__module__==__name__ and g not in funcs:
+                funcs.append(g)
+    return hashlib.sha1(''.join(inspect.getsource(f) for f in funcs).encode()).hexdigest()[:12]
+
+def _cached_shot_features(df, season, cache_dir):
+    # same as _shot_features(df), but the shots are cached in cache_dir/season=<season>/<shot_features_version()>/ as parquet
+    # files with a chunk of games in each. only games that aren't in the cache are computed, and they're written as a new chunk
+    # events are matched back to this df by their row number within the game, since Play_Id depends on what else is in df
+    if len(df.index)==0:
+        return _shot_features(df)
+    path = os.path.join(cache_dir, 'season={}'.format(int(season)), shot_features_version())
+    game_row = df.groupby('Game_Id').cumcount()
+    game_ids = df['Game_Id'].unique()
+
+    files = sorted(glob.glob(os.path.join(path, '*.parquet')))
+    if len(files)>0:
+        shots = data_storage.read_files(files, filter=ds.field('Game_Id').isin(game_ids.tolist()))
+    else:
+        shots = pd.DataFrame(columns=['Game_Id'])
+    new_games = game_ids[~pd.Series(game_ids).isin(shots['Game_Id']).values]
+    if len(new_games)>0:
+        new_shots = _shot_features(df.loc[df['Game_Id'].isin(new_games)])
+        new_shots['Game_Row'] = game_row.loc[new_shots.index].values
+        # written to a temp file first, so a half-written chunk is never read
+        os.makedirs(path, exist_ok=True)
+        f = os.path.join(path, 'chunk-{}.parquet'.format(uuid.uuid4().hex))
+        new_shots.to_parquet(f+'.tmp', index=False)
+        os.replace(f+'.tmp', f)
+        shots = pd.concat([shots, new_shots.reset_index(drop=True)], ignore_index=True) if len(shots.index)>0 else new_shots
+
+    # back in the same order as _shot_features: by game, and each game's shots in the order they were computed
+    shots = shots.sort_values(by='Game_Id', kind='stable')
+    rows = pd.MultiIndex.from_arrays([df['Game_Id'].values, game_row.values]).get_indexer(
+        pd.MultiIndex.from_arrays([shots['Game_Id'].values, shots['Game_Row'].values]))
+    shots['Play_Id'] = df['Play_Id'].values[rows]
+    shots.index = df.index[rows]
+    return shots.drop(columns=['Game_Row'])
+
+def clear_shot_features(season, cache_dir='data/shotFeatures'):
+    # delete the cached shot features for a season (for all versions of the features), e.g. after its pbp is scraped again
+    shutil.rmtree(os.path.join(cache_dir, 'season={}'.format(int(season))), ignore_errors=True)
 
 def add_xG_to_pbp(df, shots):
     # make xG predictions
@@ -126,31 +207,8 @@ def add_xG_to_pbp(df, shots):
     df = df.merge(shots, on='Play_Id', how='left')
     del shots
 
-    # downcast some fields
-    df['Period'] = df['Period'].astype(np.int8)
-    df['Seconds_Elapsed'] = df['Seconds_Elapsed'].astype(np.int16)
-    df['p1_ID'] = df['p1_ID'].fillna(-1).astype(np.int32)
-    df['p2_ID'] = df['p2_ID'].fillna(-1).astype(np.int32)
-    df['p3_ID'] = df['p3_ID'].fillna(-1).astype(np.int32)
-    df['awayPlayer1_id'] = df['awayPlayer1_id'].fillna(-1).astype(np.int32)
-    df['awayPlayer2_id'] = df['awayPlayer2_id'].fillna(-1).astype(np.int32)
-    df['awayPlayer3_id'] = df['awayPlayer3_id'].fillna(-1).astype(np.int32)
-    df['awayPlayer4_id'] = df['awayPlayer4_id'].fillna(-1).astype(np.int32)
-    df['awayPlayer5_id'] = df['awayPlayer5_id'].fillna(-1).astype(np.int32)
-    df['awayPlayer6_id'] = df['awayPlayer6_id'].fillna(-1).astype(np.int32)
-    df['homePlayer1_id'] = df['homePlayer1_id'].fillna(-1).astype(np.int32)
-    df['homePlayer2_id'] = df['homePlayer2_id'].fillna(-1).astype(np.int32)
-    df['homePlayer3_id'] = df['homePlayer3_id'].fillna(-1).astype(np.int32)
-    df['homePlayer4_id'] = df['homePlayer4_id'].fillna(-1).astype(np.int32)
-    df['homePlayer5_id'] = df['homePlayer5_id'].fillna(-1).astype(np.int32)
-    df['homePlayer6_id'] = df['homePlayer6_id'].fillna(-1).astype(np.int32)
-    df['Away_Players'] = df['Away_Players'].astype(np.int8)
-    df['Home_Players'] = df['Home_Players'].astype(np.int8)
-    df['Away_Score'] = df['Away_Score'].astype(np.int8)
-    df['Home_Score'] = df['Home_Score'].astype(np.int8)
-    df['Away_Goalie_Id'] = df['Away_Goalie_Id'].fillna(-1).astype(np.int32)
-    df['Home_Goalie_Id'] = df['Home_Goalie_Id'].fillna(-1).astype(np.int32)
-    df['Season'] = df['Season'].astype(np.int32)
+    # downcast some fields (pbp read from data_storage already has the schema's dtypes, this covers pbp from anywhere else)
+    df = schema.apply(df, 'pbp')
 
     # remove Play_Id field, it's now useless
     df = df.drop(columns=['Play_Id'])
@@ -164,108 +222,329 @@ def add_xG_to_pbp(df, shots):
 
     return df
 
-def aggregate_player_data(plays, shifts, homeaway_adjustments='data/score_homeaway_adjustments.csv'):
+def _get_strength_changes(plays, gameids=None, chunk_size=10):
+    # one row for each change in game strength, with the time it starts and ends (seconds elapsed in the period)
+    # previous/next values run across every game in a chunk of chunk_size games, as in the original chunked loop, so the
+    # first and last change of a game see the neighbouring game in its chunk (e.g. a PENL that ends a game takes the next game's strength)
+    pbp_merge = plays.loc[~plays['Home_Zone'].isna(), ['Game_Id','Period','Strength','Seconds_Elapsed','Home_Team','Away_Team','Event','Home_Zone']]
+    pbp_merge = pbp_merge.sort_values(by=['Game_Id','Period','Seconds_Elapsed'])
+    # Event is a categorical (see schema.py), which groupby can't rank, so the events are ranked as plain strings
+    pbp_merge['eventRank'] = pbp_merge.assign(Event=pbp_merge['Event'].astype(object)).groupby(['Game_Id','Period','Seconds_Elapsed'])['Event'].rank('first')
+    pbp_merge = pbp_merge.loc[pbp_merge['eventRank']==1]
+    pbp_merge = pbp_merge.drop(columns=['eventRank'])
+    if gameids is None:
+        chunk = pd.Series(0, index=pbp_merge.index)
+    else:
+        chunk = pbp_merge['Game_Id'].map(pd.Series(np.arange(len(gameids))//chunk_size, index=gameids))
+    pbp_merge['Prev_Strength'] = pbp_merge['Strength'].groupby(chunk).shift(1)
+    pbp_merge['Next_Strength'] = pbp_merge['Strength'].groupby(chunk).shift(-1)
+    pbp_merge.loc[pbp_merge['Event']=='PENL', 'Strength'] = pbp_merge.loc[pbp_merge['Event']=='PENL', 'Next_Strength']
+    keep = (pbp_merge['Strength']!=pbp_merge['Prev_Strength'])|((pbp_merge['Period']==1)&(pbp_merge['Seconds_Elapsed']==0))
+    pbp_merge, chunk = pbp_merge.loc[keep], chunk.loc[keep]
+    pbp_merge['End_Seconds_Elapsed'] = pbp_merge['Seconds_Elapsed'].groupby(chunk).shift(-1)
+    pbp_merge['Next_Period'] = pbp_merge['Period'].groupby(chunk).shift(-1)
+    pbp_merge.loc[pbp_merge['End_Seconds_Elapsed'].isna(), 'End_Seconds_Elapsed'] = 1200.
+    pbp_merge.loc[(pbp_merge['End_Seconds_Elapsed']==1200)&(pbp_merge['Period']==4)&(pbp_merge['Strength']=='3x3'), 'End_Seconds_Elapsed'] = 300.
+    pbp_merge.loc[(pbp_merge['Period']==4)&(pbp_merge['Strength']=='3x3')&(pbp_merge['Next_Period']!=pbp_merge['Period']), 'End_Seconds_Elapsed'] = 300.
+
+    return pbp_merge
+
+def _overlaps(a_start, a_end, b_start, b_end):
+    # whether interval b overlaps interval a (same edge rules as the original merge filters)
+    return ((b_start>=a_start)&(b_start<a_end))|((b_end>a_start)&(b_end<=a_end))|((b_end>=a_end)&(b_start<=a_start))
+
+def _expand_ranges(first, last):
+    # expand [first, last) index ranges into (range number, index) pairs
+    counts = np.maximum(last - first, 0)
+    idx = np.repeat(np.arange(len(first)), counts)
+    pos = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts) + first[idx]
+    return idx, pos
+
+def _interval_pairs(a_block, a_lo, a_hi, b_block, b_lo, b_hi):
+    # sweep over sorted start points to find every (a, b) pair in the same block where the closed intervals intersect
+    # each intersecting pair has either b starting inside a, or a starting strictly inside b, so it is found exactly once
+    if len(a_lo)==0 or len(b_lo)==0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    offset = min(a_lo.min(), b_lo.min())
+    width = max(a_hi.max(), b_hi.max()) - offset + 1
+    a_lo_key = a_block*width + (a_lo - offset)
+    a_hi_key = a_block*width + (a_hi - offset)
+    b_lo_key = b_block*width + (b_lo - offset)
+    b_hi_key = b_block*width + (b_hi - offset)
+
+    # b starting inside a
+    b_order = np.argsort(b_lo_key, kind='stable')
+    first = np.searchsorted(b_lo_key[b_order], a_lo_key, 'left')
+    last = np.searchsorted(b_lo_key[b_order], a_hi_key, 'right')
+    a_idx1, pos = _expand_ranges(first, last)
+    b_idx1 = b_order[pos]
+
+    # a starting strictly inside b
+    a_order = np.argsort(a_lo_key, kind='stable')
+    first = np.searchsorted(a_lo_key[a_order], b_lo_key, 'right')
+    last = np.searchsorted(a_lo_key[a_order], b_hi_key, 'right')
+    b_idx2, pos = _expand_ranges(first, last)
+    a_idx2 = a_order[pos]
+
+    return np.concatenate([a_idx1, a_idx2]), np.concatenate([b_idx1, b_idx2])
+
+def _sum_toi(toi_chunk):
+    # sum time on ice by strength from unique (shift, strength segment) rows
+    toi_chunk['TOI_5v5'] = toi_chunk.loc[toi_chunk['Strength']=='5x5', ['End','End_Seconds_Elapsed']].min(axis=1) -\
+        toi_chunk.loc[toi_chunk['Strength']=='5x5', ['Start','Seconds_Elapsed']].max(axis=1)
+    toi_chunk['TOI_PP'] = toi_chunk.loc[toi_chunk['Strength'].isin(['5x4','4x3','5x3']), ['End','End_Seconds_Elapsed']].min(axis=1) -\
+        toi_chunk.loc[toi_chunk['Strength'].isin(['5x4','4x3','5x3']), ['Start','Seconds_Elapsed']].max(axis=1)
+    toi_chunk['TOI_PK'] = toi_chunk.loc[toi_chunk['Strength'].isin(['4x5','3x4','3x5']), ['End','End_Seconds_Elapsed']].min(axis=1) -\
+        toi_chunk.loc[toi_chunk['Strength'].isin(['4x5','3x4','3x5']), ['Start','Seconds_Elapsed']].max(axis=1)
+    toi_chunk['TOI'] = toi_chunk[['End','End_Seconds_Elapsed']].min(axis=1) - toi_chunk[['Start','Seconds_Elapsed']].max(axis=1)
+    toi_chunk = toi_chunk[['Game_Id','Player','Player_Id','Date','TOI','TOI_5v5','TOI_PP','TOI_PK']]\
+        .groupby(['Game_Id','Player','Player_Id','Date'], as_index=False).sum()
+
+    return toi_chunk
+
+def _get_toi_overlap_chunk(pbp_merge, shifts_chunk):
+    # toi and toi_overlap for a chunk of games, using an interval sweep instead of merging all pairs of shifts with all strength segments
+    shifts_chunk = shifts_chunk.reset_index(drop=True)
+    game = shifts_chunk['Game_Id'].values
+    period = shifts_chunk['Period'].values.astype(np.int32)
+    team = shifts_chunk['Team'].astype(object).values
+    player_id = shifts_chunk['Player_Id'].values
+    start = shifts_chunk['Start'].values.astype(np.float64)
+    end = shifts_chunk['End'].values.astype(np.float64)
+
+    # strength segments as seen from each period of the game: segments that run past the end of their period
+    # are cut at 1200 in their own period, and run from 0 in every later period
+    seg = pbp_merge[['Game_Id','Period','Strength','Seconds_Elapsed','End_Seconds_Elapsed','Home_Team']].copy()
+    seg['Home_Team'] = seg['Home_Team'].astype(object)
+    seg['Period'] = seg['Period'].astype(np.int32)
+    wrapped = seg['Seconds_Elapsed']>seg['End_Seconds_Elapsed']
+    later = seg.loc[wrapped].merge(pd.DataFrame({'Game_Id':game, 'Period':period}).drop_duplicates(), on='Game_Id', suffixes=('_seg',''))
+    later = later.loc[later['Period']>later['Period_seg']].drop(columns=['Period_seg'])
+    later['Seconds_Elapsed'] = 0.
+    seg.loc[wrapped, 'End_Seconds_Elapsed'] = 1200.
+    seg = pd.concat([seg, later], ignore_index=True)
+    seg_start = seg['Seconds_Elapsed'].values.astype(np.float64)
+    seg_end = seg['End_Seconds_Elapsed'].values.astype(np.float64)
+
+    # strength codes for each segment, from the home team and the away team perspective
+    strength_codes, strengths = pd.factorize(pd.concat([seg['Strength'], seg['Strength'].str[::-1]], ignore_index=True))
+    strengths = np.append(np.asarray(strengths, dtype=object), np.nan) # code -1 (missing strength) maps to NaN
+    seg_home_code = strength_codes[:len(seg)]
+    seg_away_code = strength_codes[len(seg):]
+
+    # each interval is searched by its [min, max] hull, then filtered with the exact overlap rules
+    lo = np.fmin(start, end)
+    hi = np.fmax(start, end)
+    valid = np.flatnonzero(~np.isnan(lo))
+    seg_lo = np.fmin(seg_start, seg_end)
+    seg_hi = np.fmax(seg_start, seg_end)
+    seg_valid = np.flatnonzero(~np.isnan(seg_lo))
+
+    # pairs of shifts that overlap in the same game and period
+    pair_block = shifts_chunk.groupby(['Game_Id','Period','Date'], dropna=False, sort=False).ngroup().values.astype(np.float64)
+    x, y = _interval_pairs(pair_block[valid], lo[valid], hi[valid], pair_block[valid], lo[valid], hi[valid])
+    x, y = valid[x], valid[y]
+    keep = _overlaps(start[x], end[x], start[y], end[y]) & (player_id[x]!=player_id[y])
+    x, y = x[keep], y[keep]
+
+    # strength segments that overlap each shift, sorted by shift
+    period_key = np.unique(np.concatenate([game.astype(np.int64)*100 + period, seg['Game_Id'].values.astype(np.int64)*100 + seg['Period'].values]),
+        return_inverse=True)[1].astype(np.float64)
+    inc_x, inc_s = _interval_pairs(period_key[:len(game)][valid], lo[valid], hi[valid], period_key[len(game):][seg_valid], seg_lo[seg_valid], seg_hi[seg_valid])
+    inc_x, inc_s = valid[inc_x], seg_valid[inc_s]
+    keep = _overlaps(start[inc_x], end[inc_x], seg_start[inc_s], seg_end[inc_s])
+    inc_x, inc_s = inc_x[keep], inc_s[keep]
+    order = np.lexsort((inc_s, inc_x))
+    inc_x, inc_s = inc_x[order], inc_s[order]
+    inc_code = np.where(team[inc_x]!=seg['Home_Team'].values[inc_s], seg_away_code[inc_s], seg_home_code[inc_s])
+
+    # (shift, shift, segment) triples where the segment overlaps both shifts
+    p, pos = _expand_ranges(np.searchsorted(inc_x, x, 'left'), np.searchsorted(inc_x, x, 'right'))
+    inc_key = inc_x*len(seg) + inc_s
+    triple_key = y[p]*len(seg) + inc_s[pos]
+    found = np.minimum(np.searchsorted(inc_key, triple_key), max(len(inc_key)-1, 0))
+    keep = inc_key[found]==triple_key if len(inc_key) else np.zeros(0, dtype=bool)
+    p, pos = p[keep], pos[keep]
+    tx, ty, ts = x[p], y[p], inc_s[pos]
+
+    # overlap by strength and teammate/opponent, grouped on integer codes and mapped back to player names after
+    player_code = shifts_chunk.groupby(['Player','Player_Id'], sort=False).ngroup().fillna(-1).values.astype(np.int64)
+    team_code = pd.factorize(shifts_chunk['Team'])[0]
+    toi_overlap = pd.DataFrame({'Game_Id':game[tx], 'x':player_code[tx], 'y':player_code[ty], 'Strength':inc_code[pos],
+        'SameTeam':(team_code[tx]==team_code[ty])&(team_code[tx]>=0),
+        'Overlap':np.fmin(np.fmin(end[tx], end[ty]), seg_end[ts]) - np.fmax(np.fmax(start[tx], start[ty]), seg_start[ts])})
+    toi_overlap = toi_overlap.loc[(toi_overlap['x']>=0)&(toi_overlap['y']>=0)&(toi_overlap['Strength']>=0)]
+    toi_overlap = toi_overlap.groupby(['Game_Id','x','y','Strength','SameTeam'], as_index=False)['Overlap'].sum()
+    players = shifts_chunk[['Player','Player_Id']].assign(code=player_code)
+    players = players.loc[players['code']>=0].drop_duplicates('code').sort_values(by='code')
+    toi_overlap['Player_x'] = players['Player'].values[toi_overlap['x'].values]
+    toi_overlap['Player_Id_x'] = players['Player_Id'].values[toi_overlap['x'].values]
+    toi_overlap['Player_y'] = players['Player'].values[toi_overlap['y'].values]
+    toi_overlap['Player_Id_y'] = players['Player_Id'].values[toi_overlap['y'].values]
+    toi_overlap['Strength'] = strengths[toi_overlap['Strength'].values]
+    toi_overlap = toi_overlap[['Game_Id','Player_x','Player_Id_x','Player_y','Player_Id_y','Strength','SameTeam','Overlap']]
+    toi_overlap = toi_overlap.sort_values(by=['Game_Id','Player_x','Player_Id_x','Player_y','Player_Id_y','Strength','SameTeam'], ignore_index=True)
+
+    # time on ice from each (shift, segment) pair that is part of at least one overlap
+    used = np.unique(pos)
+    ux, us, ucode = inc_x[used], inc_s[used], inc_code[used]
+    toi_chunk = pd.DataFrame({'Game_Id':game[ux], 'Period':period[ux], 'Team':team[ux], 'Player':shifts_chunk['Player'].values[ux],
+        'Player_Id':player_id[ux], 'Start':start[ux], 'End':end[ux], 'Date':shifts_chunk['Date'].values[ux],
+        'Strength':strengths[ucode], 'Seconds_Elapsed':seg_start[us], 'End_Seconds_Elapsed':seg_end[us]}).drop_duplicates()
+    toi_chunk = _sum_toi(toi_chunk)
+
+    return toi_overlap, toi_chunk
+
+def get_toi_overlap(plays, shifts, chunk_size=100):
+    # time on ice by strength for each player, and time on ice overlapping each teammate/opponent by strength
+    gameids = shifts['Game_Id'].unique()
+    pbp_merge = _get_strength_changes(plays.loc[plays['Game_Id'].isin(gameids)], gameids)
+
+    # process one chunk of games at a time
+    toi_overlap = []
+    toi = []
+    for i in range(math.ceil(len(gameids)/chunk_size)):
+        gameids_chunk = gameids[i*chunk_size:(i+1)*chunk_size]
+        toi_overlap_chunk, toi_chunk = _get_toi_overlap_chunk(pbp_merge.loc[pbp_merge['Game_Id'].isin(gameids_chunk)],
+            shifts.loc[shifts['Game_Id'].isin(gameids_chunk)])
+        toi_overlap.append(toi_overlap_chunk)
+        toi.append(toi_chunk)
+
+    return pd.concat(toi_overlap, ignore_index=True), pd.concat(toi, ignore_index=True)
+
+ONICE_COLUMNS = ['Goals_onice','Shots_onice','ShotAttempts_onice','UnblockedShotAttempts_onice','xG_onice',
+                'xG_flurry_onice','Goals_5v5_onice','Shots_5v5_onice',
+                'ShotAttempts_5v5_onice','UnblockedShotAttempts_5v5_onice','xG_5v5_onice',
+                'xG_flurry_5v5_onice','Goals_PP_onice','Shots_PP_onice',
+                'ShotAttempts_PP_onice','UnblockedShotAttempts_PP_onice','xG_PP_onice',
+                'xG_flurry_PP_onice','Goals_PK_onice','Shots_PK_onice',
+                'ShotAttempts_PK_onice','UnblockedShotAttempts_PK_onice','xG_PK_onice',
+                'xG_flurry_PK_onice','GoalsAgainst_onice','ShotsAgainst_onice',
+                'ShotAttemptsAgainst_onice','UnblockedShotAttemptsAgainst_onice',
+                'xGAgainst_onice','xG_flurryAgainst_onice','GoalsAgainst_5v5_onice',
+                'ShotsAgainst_5v5_onice','ShotAttemptsAgainst_5v5_onice','UnblockedShotAttemptsAgainst_5v5_onice',
+                'xGAgainst_5v5_onice','xG_flurryAgainst_5v5_onice','GoalsAgainst_PP_onice',
+                'ShotsAgainst_PP_onice','ShotAttemptsAgainst_PP_onice','UnblockedShotAttemptsAgainst_PP_onice',
+                'xGAgainst_PP_onice','xG_flurryAgainst_PP_onice','GoalsAgainst_PK_onice',
+                'ShotsAgainst_PK_onice','ShotAttemptsAgainst_PK_onice','UnblockedShotAttemptsAgainst_PK_onice',
+                'xGAgainst_PK_onice','xG_flurryAgainst_PK_onice','GoalsAdjusted_onice',
+                'ShotsAdjusted_onice','ShotAttemptsAdjusted_onice','UnblockedShotAttemptsAdjusted_onice',
+                'xGAdjusted_onice','xG_flurryAdjusted_onice','GoalsAdjusted_5v5_onice',
+                'ShotsAdjusted_5v5_onice','ShotAttemptsAdjusted_5v5_onice','UnblockedShotAttemptsAdjusted_5v5_onice',
+                'xGAdjusted_5v5_onice','xG_flurryAdjusted_5v5_onice','GoalsAdjusted_PP_onice','ShotsAdjusted_PP_onice',
+                'ShotAttemptsAdjusted_PP_onice','UnblockedShotAttemptsAdjusted_PP_onice',
+                'xGAdjusted_PP_onice','xG_flurryAdjusted_PP_onice','GoalsAdjustedAgainst_onice','ShotsAdjustedAgainst_onice',
+                'ShotAttemptsAdjustedAgainst_onice','UnblockedShotAttemptsAdjustedAgainst_onice',
+                'xGAdjustedAgainst_onice','xG_flurryAdjustedAgainst_onice','GoalsAdjustedAgainst_5v5_onice','ShotsAdjustedAgainst_5v5_onice',
+                'ShotAttemptsAdjustedAgainst_5v5_onice','UnblockedShotAttemptsAdjustedAgainst_5v5_onice',
+                'xGAdjustedAgainst_5v5_onice','xG_flurryAdjustedAgainst_5v5_onice','GoalsAdjustedAgainst_PK_onice','ShotsAdjustedAgainst_PK_onice',
+                'ShotAttemptsAdjustedAgainst_PK_onice','UnblockedShotAttemptsAdjustedAgainst_PK_onice',
+                'xGAdjustedAgainst_PK_onice','xG_flurryAdjustedAgainst_PK_onice','ReboundShotsAgainst_onice']
+
+def _onice_source(col):
+    # column in shots that an on-ice stat sums, and whether it counts events by the player's team (For) or the other team (Against)
+    # against stats on the PP come from the other team's PK columns, and vice versa
+    stat = col[:-len('_onice')]
+    if stat=='ReboundShotsAgainst':
+        return 'ReboundShots', False
+    if 'Against' not in stat:
+        return stat, True
+    stat = stat.replace('Against', '')
+    if stat.endswith('_PP'):
+        return stat[:-len('_PP')]+'_PK', False
+    if stat.endswith('_PK'):
+        return stat[:-len('_PK')]+'_PP', False
+    return stat, False
+
+def _add_onice_stats(playerGame, shots):
+    # add on-ice stats (ONICE_COLUMNS), player positions and team to playerGame for every player in the home and away slots
+    # shots is melted to one row per event and player slot, and every stat is summed in one go as a sparse
+    # (player-game x event) matrix times the (event x stat) matrix, so nothing is copied per slot or per stat
+    keys = ['Game_Id','Date','Player','PlayerID','Season']
+    n_events = len(shots.index)
+    shots = shots.reset_index(drop=True)
+
+    # long form, home slots then away slots. slots without a player are dropped, like groupby does with null keys
+    onice = pd.DataFrame({
+        'event':np.tile(np.arange(n_events, dtype=np.int32), 12),
+        'home':np.repeat(np.array([True]*6 + [False]*6), n_events),
+        'slot':np.repeat(np.tile(np.arange(6, dtype=np.int8), 2), n_events),
+        'Player':pd.Categorical(np.concatenate([shots['{}Player{}'.format(side, str(i))].values for side in ['home','away'] for i in range(1,7)])),
+        'PlayerID':np.concatenate([shots['{}Player{}_id'.format(side, str(i))].values for side in ['home','away'] for i in range(1,7)]),
+    })
+    onice = onice.loc[onice['Player'].notnull().values & onice['PlayerID'].notnull().values]
+    events = onice['event'].values
+    for k in ['Game_Id','Date','Season']:
+        onice[k] = shots[k].values[events]
+    grouped = onice.groupby(keys, observed=True)
+    player_game = grouped.ngroup().values
+    players = grouped.size().reset_index()[keys]
+    players['Player'] = players['Player'].astype(object)
+    n_players = len(players.index)
+
+    # weights for each (event, slot): whether the event was by the player's team, or by the other team
+    home = onice['home'].values
+    home_event = shots['HomeTeamEvent'].values[events].astype(np.float64)
+    away_event = shots['AwayTeamEvent'].values[events].astype(np.float64)
+    onice_for = sparse.csr_matrix((np.where(home, home_event, away_event), (player_game, events)), shape=(n_players, n_events))
+    onice_against = sparse.csr_matrix((np.where(home, away_event, home_event), (player_game, events)), shape=(n_players, n_events))
+
+    # number of events in each slot, for working out positions
+    positions = np.zeros((n_players, 6))
+    np.add.at(positions, (player_game, onice['slot'].values), 1)
+    for i in range(1,7):
+        players['position_{}'.format(str(i))] = positions[:,i-1]
+
+    # sum every stat at once
+    shots['ReboundShots'] = (shots['ShotCategory']=='Rebound').astype(np.int16)
+    sources = [_onice_source(col) for col in ONICE_COLUMNS]
+    stats_for = [col for col, (source, is_for) in zip(ONICE_COLUMNS, sources) if is_for]
+    stats_against = [col for col, (source, is_for) in zip(ONICE_COLUMNS, sources) if not is_for]
+    players[stats_for] = onice_for @ shots[[source for source, is_for in sources if is_for]].fillna(0).values.astype(np.float64)
+    players[stats_against] = onice_against @ shots[[source for source, is_for in sources if not is_for]].fillna(0).values.astype(np.float64)
+    players = players[keys+['position_{}'.format(str(i)) for i in range(1,7)]+ONICE_COLUMNS]
+
+    # team the player was on: the home team if they were in a home slot, the away team if an away slot
+    players['team_home'] = ''
+    players.loc[player_game[home], 'team_home'] = shots['Home_Team'].values[events[home]]
+    players['team_away'] = ''
+    players.loc[player_game[~home], 'team_away'] = shots['Away_Team'].values[events[~home]]
+
+    playerGame = playerGame.merge(players, how='outer', on=keys)
+    playerGame = playerGame.fillna(0)
+    playerGame['Team'] = playerGame[['team_away','team_home']].replace(0,'').max(1)
+    playerGame = playerGame.drop(columns=['team_away','team_home'])
+
+    return playerGame
+
+def aggregate_player_data(plays, shifts, teamGame, homeaway_adjustments='data/score_homeaway_adjustments.csv'):
+    # inputs should come from data_storage or add_xG_to_pbp, with the schema's dtypes
+    # teamGame has the rows from aggregate_team_data for the same games, which the playoffs flag is taken from
+    schema.check(plays, 'pbp')
+    schema.check(shifts, 'shifts')
 
     # ensure gameid is an int
     shifts['Game_Id'] = shifts['Game_Id'].astype(np.int64)
     plays['Game_Id'] = plays['Game_Id'].astype(np.int64)
 
-    # process one chunk of games at a time
+    # time on ice and overlap with each teammate/opponent, by strength
+    toi_overlap, toi = get_toi_overlap(plays, shifts)
+
+    # zone starts, one chunk of games at a time
     chunk_size = 10
     gameids = shifts['Game_Id'].unique()
     for i in range(math.ceil(len(gameids)/chunk_size)):
         gameids_chunk = gameids[i*chunk_size:(i+1)*chunk_size]
 
-        pbp_merge = plays.loc[plays['Game_Id'].isin(gameids_chunk)]
-        pbp_merge = pbp_merge.loc[~pbp_merge['Home_Zone'].isna(), ['Game_Id','Period','Strength','Seconds_Elapsed','Home_Team','Away_Team','Event','Home_Zone']]
-        pbp_merge = pbp_merge.sort_values(by=['Game_Id','Period','Seconds_Elapsed'])
-        pbp_merge['eventRank'] = pbp_merge.groupby(['Game_Id','Period','Seconds_Elapsed'])['Event'].rank('first')
-        pbp_merge = pbp_merge.loc[pbp_merge['eventRank']==1]
-        pbp_merge = pbp_merge.drop(columns=['eventRank'])
-        pbp_merge['Prev_Strength'] = pbp_merge['Strength'].shift(1)
-        pbp_merge['Next_Strength'] = pbp_merge['Strength'].shift(-1)
-        pbp_merge.loc[pbp_merge['Event']=='PENL', 'Strength'] = pbp_merge.loc[pbp_merge['Event']=='PENL', 'Next_Strength']
-        pbp_merge = pbp_merge.loc[(pbp_merge['Strength']!=pbp_merge['Prev_Strength'])|((pbp_merge['Period']==1)&(pbp_merge['Seconds_Elapsed']==0))]
-        pbp_merge['End_Seconds_Elapsed'] = pbp_merge['Seconds_Elapsed'].shift(-1)
-        pbp_merge['Next_Period'] = pbp_merge['Period'].shift(-1)
-        pbp_merge.loc[pbp_merge['End_Seconds_Elapsed'].isna(), 'End_Seconds_Elapsed'] = 1200.
-        pbp_merge.loc[(pbp_merge['End_Seconds_Elapsed']==1200)&(pbp_merge['Period']==4)&(pbp_merge['Strength']=='3x3'), 'End_Seconds_Elapsed'] = 300.
-        pbp_merge.loc[(pbp_merge['Period']==4)&(pbp_merge['Strength']=='3x3')&(pbp_merge['Next_Period']!=pbp_merge['Period']), 'End_Seconds_Elapsed'] = 300.
-
         shifts_chunk = shifts.loc[shifts['Game_Id'].isin(gameids_chunk)]
-        shifts_chunk = shifts_chunk.merge(shifts_chunk, on=['Game_Id','Period','Date'])
-        shifts_chunk = shifts_chunk.loc[((shifts_chunk['Start_y']>=shifts_chunk['Start_x'])&(shifts_chunk['Start_y']<shifts_chunk['End_x']))|\
-            ((shifts_chunk['End_y']>shifts_chunk['Start_x'])&(shifts_chunk['End_y']<=shifts_chunk['End_x']))|\
-            ((shifts_chunk['End_y']>=shifts_chunk['End_x'])&(shifts_chunk['Start_y']<=shifts_chunk['Start_x']))]
-        shifts_chunk = shifts_chunk.loc[shifts_chunk['Player_Id_x']!=shifts_chunk['Player_Id_y']]
-        shifts_chunk = shifts_chunk.merge(pbp_merge, on=['Game_Id'])
-        shifts_chunk['Period_x'] = shifts_chunk['Period_x'].astype(np.int32)
-        shifts_chunk['Period_y'] = shifts_chunk['Period_y'].astype(np.int32)
-        shifts_chunk.loc[(shifts_chunk['Seconds_Elapsed']>shifts_chunk['End_Seconds_Elapsed'])&(shifts_chunk['Period_x']==shifts_chunk['Period_y']),
-            'End_Seconds_Elapsed'] = 1200.
-        shifts_chunk.loc[(shifts_chunk['Seconds_Elapsed']>shifts_chunk['End_Seconds_Elapsed'])&(shifts_chunk['Period_x']>shifts_chunk['Period_y']),
-            ['Seconds_Elapsed','Period_y']] = 0.
-        shifts_chunk.loc[shifts_chunk['Period_y']==0, 'Period_y'] = shifts_chunk.loc[shifts_chunk['Period_y']==0, 'Period_x']
-        shifts_chunk = shifts_chunk.loc[shifts_chunk['Period_x']==shifts_chunk['Period_y']]
-        shifts_chunk = shifts_chunk.loc[((shifts_chunk['Seconds_Elapsed']>=shifts_chunk['Start_x'])&(shifts_chunk['Seconds_Elapsed']<shifts_chunk['End_x']))|\
-            ((shifts_chunk['End_Seconds_Elapsed']>shifts_chunk['Start_x'])&(shifts_chunk['End_Seconds_Elapsed']<=shifts_chunk['End_x']))|\
-            ((shifts_chunk['End_Seconds_Elapsed']>=shifts_chunk['End_x'])&(shifts_chunk['Seconds_Elapsed']<=shifts_chunk['Start_x']))]
-        shifts_chunk = shifts_chunk.loc[((shifts_chunk['Seconds_Elapsed']>=shifts_chunk['Start_y'])&(shifts_chunk['Seconds_Elapsed']<shifts_chunk['End_y']))|\
-            ((shifts_chunk['End_Seconds_Elapsed']>shifts_chunk['Start_y'])&(shifts_chunk['End_Seconds_Elapsed']<=shifts_chunk['End_y']))|\
-            ((shifts_chunk['End_Seconds_Elapsed']>=shifts_chunk['End_y'])&(shifts_chunk['Seconds_Elapsed']<=shifts_chunk['Start_y']))]
-        shifts_chunk.loc[shifts_chunk['Team_x']!=shifts_chunk['Home_Team'], 'Strength'] = \
-            shifts_chunk.loc[shifts_chunk['Team_x']!=shifts_chunk['Home_Team'], 'Strength'].str[::-1]
-        shifts_chunk['Overlap'] = shifts_chunk[['End_x','End_y','End_Seconds_Elapsed']].min(axis=1) - shifts_chunk[['Start_x','Start_y','Seconds_Elapsed']].max(axis=1)
-        shifts_chunk['SameTeam'] = shifts_chunk['Team_x']==shifts_chunk['Team_y']
-
-        toi_chunk = shifts_chunk[['Game_Id','Period_x','Team_x','Player_x','Player_Id_x','Start_x','End_x','Date','Strength',
-            'Seconds_Elapsed','End_Seconds_Elapsed']].drop_duplicates()
-        toi_chunk.columns = ['Game_Id','Period','Team','Player','Player_Id','Start','End','Date','Strength','Seconds_Elapsed','End_Seconds_Elapsed']
-        toi_chunk['TOI_5v5'] = toi_chunk.loc[toi_chunk['Strength']=='5x5', ['End','End_Seconds_Elapsed']].min(axis=1) -\
-            toi_chunk.loc[toi_chunk['Strength']=='5x5', ['Start','Seconds_Elapsed']].max(axis=1)
-        toi_chunk['TOI_PP'] = toi_chunk.loc[toi_chunk['Strength'].isin(['5x4','4x3','5x3']), ['End','End_Seconds_Elapsed']].min(axis=1) -\
-            toi_chunk.loc[toi_chunk['Strength'].isin(['5x4','4x3','5x3']), ['Start','Seconds_Elapsed']].max(axis=1)
-        toi_chunk['TOI_PK'] = toi_chunk.loc[toi_chunk['Strength'].isin(['4x5','3x4','3x5']), ['End','End_Seconds_Elapsed']].min(axis=1) -\
-            toi_chunk.loc[toi_chunk['Strength'].isin(['4x5','3x4','3x5']), ['Start','Seconds_Elapsed']].max(axis=1)
-        toi_chunk['TOI'] = toi_chunk[['End','End_Seconds_Elapsed']].min(axis=1) - toi_chunk[['Start','Seconds_Elapsed']].max(axis=1)
-        toi_chunk = toi_chunk[['Game_Id','Player','Player_Id','Date','TOI','TOI_5v5','TOI_PP','TOI_PK']]\
-            .groupby(['Game_Id','Player','Player_Id','Date'], as_index=False).sum()
-
-        shifts_chunk = shifts_chunk[['Game_Id','Player_x','Player_Id_x','Player_y','Player_Id_y','Strength','SameTeam','Overlap']]
-        shifts_chunk = shifts_chunk.groupby(['Game_Id','Player_x','Player_Id_x','Player_y','Player_Id_y','Strength','SameTeam'], as_index=False).sum()
-        if i==0:
-            toi_overlap = shifts_chunk.copy(deep=True)
-            toi = toi_chunk.copy(deep=True)
-        else:
-            toi_overlap = pd.concat([toi_overlap, shifts_chunk], ignore_index=True)
-            toi = pd.concat([toi, toi_chunk], ignore_index=True)
-
-        gc.collect()
-
-        #TODO: consolidate with above? some of this code is the same
-        shifts_chunk = shifts.loc[shifts['Game_Id'].isin(gameids_chunk)]
-        pbp_merge = plays.loc[plays['Game_Id'].isin(gameids_chunk)]
-        pbp_merge = pbp_merge.loc[~pbp_merge['Home_Zone'].isna(), ['Game_Id','Period','Strength','Seconds_Elapsed','Home_Team','Away_Team','Event','Home_Zone']]
-        pbp_merge = pbp_merge.sort_values(by=['Game_Id','Period','Seconds_Elapsed'])
-        pbp_merge['eventRank'] = pbp_merge.groupby(['Game_Id','Period','Seconds_Elapsed'])['Event'].rank('first')
-        pbp_merge = pbp_merge.loc[pbp_merge['eventRank']==1]
-        pbp_merge = pbp_merge.drop(columns=['eventRank'])
-        pbp_merge['Prev_Strength'] = pbp_merge['Strength'].shift(1)
-        pbp_merge['Next_Strength'] = pbp_merge['Strength'].shift(-1)
-        pbp_merge.loc[pbp_merge['Event']=='PENL', 'Strength'] = pbp_merge.loc[pbp_merge['Event']=='PENL', 'Next_Strength']
-        pbp_merge = pbp_merge.loc[(pbp_merge['Strength']!=pbp_merge['Prev_Strength'])|((pbp_merge['Period']==1)&(pbp_merge['Seconds_Elapsed']==0))]
-        pbp_merge['End_Seconds_Elapsed'] = pbp_merge['Seconds_Elapsed'].shift(-1)
-        pbp_merge['Next_Period'] = pbp_merge['Period'].shift(-1)
-        pbp_merge.loc[pbp_merge['End_Seconds_Elapsed'].isna(), 'End_Seconds_Elapsed'] = 1200.
-        pbp_merge.loc[(pbp_merge['End_Seconds_Elapsed']==1200)&(pbp_merge['Period']==4)&(pbp_merge['Strength']=='3x3'), 'End_Seconds_Elapsed'] = 300.
-        pbp_merge.loc[(pbp_merge['Period']==4)&(pbp_merge['Strength']=='3x3')&(pbp_merge['Next_Period']!=pbp_merge['Period']), 'End_Seconds_Elapsed'] = 300.
+        pbp_merge = _get_strength_changes(plays.loc[plays['Game_Id'].isin(gameids_chunk)])
         shifts_chunk = shifts_chunk.merge(pbp_merge, on=['Game_Id'], how='left')
         shifts_chunk = shifts_chunk.loc[((shifts_chunk['Start']<=shifts_chunk['Seconds_Elapsed'])&\
             (shifts_chunk['End']>=shifts_chunk['Seconds_Elapsed']))|(shifts_chunk['Seconds_Elapsed'].isnull())]
 
-        #reverse Strength value for away team players
-        shifts_chunk.loc[shifts_chunk['Team']==shifts_chunk['Away_Team'], 'Strength'] = \
-            shifts_chunk.loc[shifts_chunk['Team']==shifts_chunk['Away_Team'], 'Strength'].str[::-1]
+        #reverse Strength value for away team players (the teams are compared as plain strings, see schema.py)
+        shifts_chunk = shifts_chunk.astype({'Team':object, 'Home_Team':object, 'Away_Team':object})
+        _reverse_strength(shifts_chunk, shifts_chunk['Team']==shifts_chunk['Away_Team'])
 
         #add zone for 5v5 faceoffs
         shifts_chunk['Zone'] = np.nan
@@ -329,8 +608,9 @@ def aggregate_player_data(plays, shifts, homeaway_adjustments='data/score_homeaw
     plays.loc[plays['Strength'].isin(['5x5']), 'xG_flurry_5v5'] = plays.loc[(plays['Strength'].isin(['5x5'])) & (~plays['Empty_Net'])]['xG_flurry']
     plays['Penalties'] = ((plays['Event']=='PENL')&(~(plays['Type'].str.contains('Fight')).fillna(False))).astype(np.int16)
 
-    #reverse strength for away team
-    plays.loc[plays['Ev_Team']==plays['Away_Team'], 'Strength'] = plays.loc[plays['Ev_Team']==plays['Away_Team'], 'Strength'].str[::-1]
+    #reverse strength for away team (the teams are categoricals, so they're compared as plain strings, see schema.py)
+    away_event = plays['Ev_Team'].astype(object)==plays['Away_Team'].astype(object)
+    _reverse_strength(plays, away_event)
 
     plays['Goals_PP'] = ((plays['Event'] == 'GOAL') & (plays['Strength'].isin(['5x4','5x3','4x3']))).astype(np.int16)
     plays['Shots_PP'] = ((plays['Event'].isin(['SHOT','GOAL'])) & (plays['Strength'].isin(['5x4','5x3','4x3']))).astype(np.int16)
@@ -351,7 +631,7 @@ def aggregate_player_data(plays, shifts, homeaway_adjustments='data/score_homeaw
     plays.loc[plays['Strength'].isin(['4x5','3x5','3x4']), 'xG_flurry_PK'] = plays.loc[plays['Strength'].isin(['4x5','3x5','3x4'])]['xG_flurry']
 
     # adjust for score and homeaway
-    plays['strength'] = plays['Strength']
+    plays['strength'] = plays['Strength'].astype(object)
     plays.loc[plays['strength'].isin(['5x4','5x3','4x3']), 'strength'] = 'PP'
     plays.loc[plays['Empty_Net'], 'strength'] = 'EN'
     plays['period'] = plays['Period']
@@ -365,7 +645,7 @@ def aggregate_player_data(plays, shifts, homeaway_adjustments='data/score_homeaw
     plays.loc[(plays['scoreDiff']<-1)&(plays['Strength']!='5x5'), 'scoreDiff'] = -1
     plays.loc[(plays['strength'].isin(['4x4','3x3']))&(plays['scoreDiff']==0), 'period'] = 1
     plays['homeAway'] = 'home'
-    plays.loc[plays['Ev_Team']==plays['Away_Team'], 'homeAway'] = 'away'
+    plays.loc[away_event, 'homeAway'] = 'away'
     plays = plays.merge(adjustments, how='left', on=['strength', 'homeAway', 'scoreDiff', 'period'])
     plays['GoalsAdjusted'] = plays['Goals'] * plays['goalsAdjustment'].fillna(1.0)
     plays.loc[(plays['Away_Goalie'].isnull())&(plays['homeAway']=='home'), 'GoalsAdjusted'] = 0
@@ -527,445 +807,14 @@ def aggregate_player_data(plays, shifts, homeaway_adjustments='data/score_homeaw
         'SecondaryAssistsAdjusted' : 'GoalsAdjusted', 'SecondaryAssistsAdjusted_5v5' : 'GoalsAdjusted_5v5',
         'SecondaryAssistsAdjusted_PP' : 'GoalsAdjusted_PP', 'PenaltiesDrawn' : 'Penalties'})
     del plays # to save some memory
+    # the teams are compared to each other, so as plain strings (see schema.py)
+    shots = shots.astype({'Ev_Team':object, 'Home_Team':object, 'Away_Team':object})
     shots['HomeTeamEvent'] = ((shots['Ev_Team']==shots['Home_Team'])|((shots['Ev_Team']==shots['Away_Team'])&(shots['Event']=='BLOCK'))).astype(int)
     shots['AwayTeamEvent'] = ((shots['Ev_Team']==shots['Away_Team'])|((shots['Ev_Team']==shots['Home_Team'])&(shots['Event']=='BLOCK'))).astype(int)
 
-    # on-ice stats home players
-    for i in range(1,7):
-        shots['Player'] = shots['homePlayer{}'.format(str(i))].copy()
-        shots['PlayerID'] = shots['homePlayer{}_id'.format(str(i))].copy()
-
-        shots['Goals_onice_home{}'.format(str(i))] = shots['Goals'] * shots['HomeTeamEvent']
-        shots['Shots_onice_home{}'.format(str(i))] = shots['Shots'] * shots['HomeTeamEvent']
-        shots['ShotAttempts_onice_home{}'.format(str(i))] = shots['ShotAttempts'] * shots['HomeTeamEvent']
-        shots['UnblockedShotAttempts_onice_home{}'.format(str(i))] = shots['UnblockedShotAttempts'] * shots['HomeTeamEvent']
-        shots['xG_onice_home{}'.format(str(i))] = shots['xG'] * shots['HomeTeamEvent']
-        shots['xG_flurry_onice_home{}'.format(str(i))] = shots['xG_flurry'] * shots['HomeTeamEvent']
-        shots['Goals_5v5_onice_home{}'.format(str(i))] = shots['Goals_5v5'] * shots['HomeTeamEvent']
-        shots['Shots_5v5_onice_home{}'.format(str(i))] = shots['Shots_5v5'] * shots['HomeTeamEvent']
-        shots['ShotAttempts_5v5_onice_home{}'.format(str(i))] = shots['ShotAttempts_5v5'] * shots['HomeTeamEvent']
-        shots['UnblockedShotAttempts_5v5_onice_home{}'.format(str(i))] = shots['UnblockedShotAttempts_5v5'] * shots['HomeTeamEvent']
-        shots['xG_5v5_onice_home{}'.format(str(i))] = shots['xG_5v5'] * shots['HomeTeamEvent']
-        shots['xG_flurry_5v5_onice_home{}'.format(str(i))] = shots['xG_flurry_5v5'] * shots['HomeTeamEvent']
-        shots['Goals_PP_onice_home{}'.format(str(i))] = shots['Goals_PP'] * shots['HomeTeamEvent']
-        shots['Shots_PP_onice_home{}'.format(str(i))] = shots['Shots_PP'] * shots['HomeTeamEvent']
-        shots['ShotAttempts_PP_onice_home{}'.format(str(i))] = shots['ShotAttempts_PP'] * shots['HomeTeamEvent']
-        shots['UnblockedShotAttempts_PP_onice_home{}'.format(str(i))] = shots['UnblockedShotAttempts_PP'] * shots['HomeTeamEvent']
-        shots['xG_PP_onice_home{}'.format(str(i))] = shots['xG_PP'] * shots['HomeTeamEvent']
-        shots['xG_flurry_PP_onice_home{}'.format(str(i))] = shots['xG_flurry_PP'] * shots['HomeTeamEvent']
-        shots['Goals_PK_onice_home{}'.format(str(i))] = shots['Goals_PK'] * shots['HomeTeamEvent']
-        shots['Shots_PK_onice_home{}'.format(str(i))] = shots['Shots_PK'] * shots['HomeTeamEvent']
-        shots['ShotAttempts_PK_onice_home{}'.format(str(i))] = shots['ShotAttempts_PK'] * shots['HomeTeamEvent']
-        shots['UnblockedShotAttempts_PK_onice_home{}'.format(str(i))] = shots['UnblockedShotAttempts_PK'] * shots['HomeTeamEvent']
-        shots['xG_PK_onice_home{}'.format(str(i))] = shots['xG_PK'] * shots['HomeTeamEvent']
-        shots['xG_flurry_PK_onice_home{}'.format(str(i))] = shots['xG_flurry_PK'] * shots['HomeTeamEvent']
-
-        shots['GoalsAdjusted_onice_home{}'.format(str(i))] = shots['GoalsAdjusted'] * shots['HomeTeamEvent']
-        shots['ShotsAdjusted_onice_home{}'.format(str(i))] = shots['ShotsAdjusted'] * shots['HomeTeamEvent']
-        shots['ShotAttemptsAdjusted_onice_home{}'.format(str(i))] = shots['ShotAttemptsAdjusted'] * shots['HomeTeamEvent']
-        shots['UnblockedShotAttemptsAdjusted_onice_home{}'.format(str(i))] = shots['UnblockedShotAttemptsAdjusted'] * shots['HomeTeamEvent']
-        shots['xGAdjusted_onice_home{}'.format(str(i))] = shots['xGAdjusted'] * shots['HomeTeamEvent']
-        shots['xG_flurryAdjusted_onice_home{}'.format(str(i))] = shots['xG_flurryAdjusted'] * shots['HomeTeamEvent']
-        shots['GoalsAdjusted_5v5_onice_home{}'.format(str(i))] = shots['GoalsAdjusted_5v5'] * shots['HomeTeamEvent']
-        shots['ShotsAdjusted_5v5_onice_home{}'.format(str(i))] = shots['ShotsAdjusted_5v5'] * shots['HomeTeamEvent']
-        shots['ShotAttemptsAdjusted_5v5_onice_home{}'.format(str(i))] = shots['ShotAttemptsAdjusted_5v5'] * shots['HomeTeamEvent']
-        shots['UnblockedShotAttemptsAdjusted_5v5_onice_home{}'.format(str(i))] = shots['UnblockedShotAttemptsAdjusted_5v5'] * shots['HomeTeamEvent']
-        shots['xGAdjusted_5v5_onice_home{}'.format(str(i))] = shots['xGAdjusted_5v5'] * shots['HomeTeamEvent']
-        shots['xG_flurryAdjusted_5v5_onice_home{}'.format(str(i))] = shots['xG_flurryAdjusted_5v5'] * shots['HomeTeamEvent']
-        shots['GoalsAdjusted_PP_onice_home{}'.format(str(i))] = shots['GoalsAdjusted_PP'] * shots['HomeTeamEvent']
-        shots['ShotsAdjusted_PP_onice_home{}'.format(str(i))] = shots['ShotsAdjusted_PP'] * shots['HomeTeamEvent']
-        shots['ShotAttemptsAdjusted_PP_onice_home{}'.format(str(i))] = shots['ShotAttemptsAdjusted_PP'] * shots['HomeTeamEvent']
-        shots['UnblockedShotAttemptsAdjusted_PP_onice_home{}'.format(str(i))] = shots['UnblockedShotAttemptsAdjusted_PP'] * shots['HomeTeamEvent']
-        shots['xGAdjusted_PP_onice_home{}'.format(str(i))] = shots['xGAdjusted_PP'] * shots['HomeTeamEvent']
-        shots['xG_flurryAdjusted_PP_onice_home{}'.format(str(i))] = shots['xG_flurryAdjusted_PP'] * shots['HomeTeamEvent']
-
-        shots['GoalsAgainst_onice_home{}'.format(str(i))] = shots['Goals'] * shots['AwayTeamEvent']
-        shots['ShotsAgainst_onice_home{}'.format(str(i))] = shots['Shots'] * shots['AwayTeamEvent']
-        shots['ShotAttemptsAgainst_onice_home{}'.format(str(i))] = shots['ShotAttempts'] * shots['AwayTeamEvent']
-        shots['UnblockedShotAttemptsAgainst_onice_home{}'.format(str(i))] = shots['UnblockedShotAttempts'] * shots['AwayTeamEvent']
-        shots['xGAgainst_onice_home{}'.format(str(i))] = shots['xG'] * shots['AwayTeamEvent']
-        shots['xG_flurryAgainst_onice_home{}'.format(str(i))] = shots['xG_flurry'] * shots['AwayTeamEvent']
-        shots['GoalsAgainst_5v5_onice_home{}'.format(str(i))] = shots['Goals_5v5'] * shots['AwayTeamEvent']
-        shots['ShotsAgainst_5v5_onice_home{}'.format(str(i))] = shots['Shots_5v5'] * shots['AwayTeamEvent']
-        shots['ShotAttemptsAgainst_5v5_onice_home{}'.format(str(i))] = shots['ShotAttempts_5v5'] * shots['AwayTeamEvent']
-        shots['UnblockedShotAttemptsAgainst_5v5_onice_home{}'.format(str(i))] = shots['UnblockedShotAttempts_5v5'] * shots['AwayTeamEvent']
-        shots['xGAgainst_5v5_onice_home{}'.format(str(i))] = shots['xG_5v5'] * shots['AwayTeamEvent']
-        shots['xG_flurryAgainst_5v5_onice_home{}'.format(str(i))] = shots['xG_flurry_5v5'] * shots['AwayTeamEvent']
-        shots['GoalsAgainst_PP_onice_home{}'.format(str(i))] = shots['Goals_PK'] * shots['AwayTeamEvent']
-        shots['ShotsAgainst_PP_onice_home{}'.format(str(i))] = shots['Shots_PK'] * shots['AwayTeamEvent']
-        shots['ShotAttemptsAgainst_PP_onice_home{}'.format(str(i))] = shots['ShotAttempts_PK'] * shots['AwayTeamEvent']
-        shots['UnblockedShotAttemptsAgainst_PP_onice_home{}'.format(str(i))] = shots['UnblockedShotAttempts_PK'] * shots['AwayTeamEvent']
-        shots['xGAgainst_PP_onice_home{}'.format(str(i))] = shots['xG_PK'] * shots['AwayTeamEvent']
-        shots['xG_flurryAgainst_PP_onice_home{}'.format(str(i))] = shots['xG_flurry_PK'] * shots['AwayTeamEvent']
-        shots['GoalsAgainst_PK_onice_home{}'.format(str(i))] = shots['Goals_PP'] * shots['AwayTeamEvent']
-        shots['ShotsAgainst_PK_onice_home{}'.format(str(i))] = shots['Shots_PP'] * shots['AwayTeamEvent']
-        shots['ShotAttemptsAgainst_PK_onice_home{}'.format(str(i))] = shots['ShotAttempts_PP'] * shots['AwayTeamEvent']
-        shots['UnblockedShotAttemptsAgainst_PK_onice_home{}'.format(str(i))] = shots['UnblockedShotAttempts_PP'] * shots['AwayTeamEvent']
-        shots['xGAgainst_PK_onice_home{}'.format(str(i))] = shots['xG_PP'] * shots['AwayTeamEvent']
-        shots['xG_flurryAgainst_PK_onice_home{}'.format(str(i))] = shots['xG_flurry_PP'] * shots['AwayTeamEvent']
-        shots['ReboundShotsAgainst_onice_home{}'.format(str(i))] = (shots['ShotCategory']=='Rebound').astype(np.int16) * shots['AwayTeamEvent']
-
-        shots['GoalsAdjustedAgainst_onice_home{}'.format(str(i))] = shots['GoalsAdjusted'] * shots['AwayTeamEvent']
-        shots['ShotsAdjustedAgainst_onice_home{}'.format(str(i))] = shots['ShotsAdjusted'] * shots['AwayTeamEvent']
-        shots['ShotAttemptsAdjustedAgainst_onice_home{}'.format(str(i))] = shots['ShotAttemptsAdjusted'] * shots['AwayTeamEvent']
-        shots['UnblockedShotAttemptsAdjustedAgainst_onice_home{}'.format(str(i))] = shots['UnblockedShotAttemptsAdjusted'] * shots['AwayTeamEvent']
-        shots['xGAdjustedAgainst_onice_home{}'.format(str(i))] = shots['xGAdjusted'] * shots['AwayTeamEvent']
-        shots['xG_flurryAdjustedAgainst_onice_home{}'.format(str(i))] = shots['xG_flurryAdjusted'] * shots['AwayTeamEvent']
-        shots['GoalsAdjustedAgainst_5v5_onice_home{}'.format(str(i))] = shots['GoalsAdjusted_5v5'] * shots['AwayTeamEvent']
-        shots['ShotsAdjustedAgainst_5v5_onice_home{}'.format(str(i))] = shots['ShotsAdjusted_5v5'] * shots['AwayTeamEvent']
-        shots['ShotAttemptsAdjustedAgainst_5v5_onice_home{}'.format(str(i))] = shots['ShotAttemptsAdjusted_5v5'] * shots['AwayTeamEvent']
-        shots['UnblockedShotAttemptsAdjustedAgainst_5v5_onice_home{}'.format(str(i))] = shots['UnblockedShotAttemptsAdjusted_5v5'] * shots['AwayTeamEvent']
-        shots['xGAdjustedAgainst_5v5_onice_home{}'.format(str(i))] = shots['xGAdjusted_5v5'] * shots['AwayTeamEvent']
-        shots['xG_flurryAdjustedAgainst_5v5_onice_home{}'.format(str(i))] = shots['xG_flurryAdjusted_5v5'] * shots['AwayTeamEvent']
-        shots['GoalsAdjustedAgainst_PK_onice_home{}'.format(str(i))] = shots['GoalsAdjusted_PP'] * shots['AwayTeamEvent']
-        shots['ShotsAdjustedAgainst_PK_onice_home{}'.format(str(i))] = shots['ShotsAdjusted_PP'] * shots['AwayTeamEvent']
-        shots['ShotAttemptsAdjustedAgainst_PK_onice_home{}'.format(str(i))] = shots['ShotAttemptsAdjusted_PP'] * shots['AwayTeamEvent']
-        shots['UnblockedShotAttemptsAdjustedAgainst_PK_onice_home{}'.format(str(i))] = shots['UnblockedShotAttemptsAdjusted_PP'] * shots['AwayTeamEvent']
-        shots['xGAdjustedAgainst_PK_onice_home{}'.format(str(i))] = shots['xGAdjusted_PP'] * shots['AwayTeamEvent']
-        shots['xG_flurryAdjustedAgainst_PK_onice_home{}'.format(str(i))] = shots['xG_flurryAdjusted_PP'] * shots['AwayTeamEvent']
-
-        shots['team_home{}'.format(str(i))] = shots['Home_Team'].copy()
-
-        # add column for tracking player positions
-        shots['position_home{}'.format(str(i))] = 1
-
-        playerGame_home = shots.groupby([
-                'Game_Id','Date','Player','PlayerID','Season'
-            ]).agg({
-                'Goals_onice_home{}'.format(str(i)) : sum,
-                'Shots_onice_home{}'.format(str(i)) : sum,
-                'ShotAttempts_onice_home{}'.format(str(i)) : sum,
-                'UnblockedShotAttempts_onice_home{}'.format(str(i)) : sum,
-                'xG_onice_home{}'.format(str(i)) : sum,
-                'xG_flurry_onice_home{}'.format(str(i)) : sum,
-                'Goals_5v5_onice_home{}'.format(str(i)) : sum,
-                'Shots_5v5_onice_home{}'.format(str(i)) : sum,
-                'ShotAttempts_5v5_onice_home{}'.format(str(i)) : sum,
-                'UnblockedShotAttempts_5v5_onice_home{}'.format(str(i)) : sum,
-                'xG_5v5_onice_home{}'.format(str(i)) : sum,
-                'xG_flurry_5v5_onice_home{}'.format(str(i)) : sum,
-                'Goals_PP_onice_home{}'.format(str(i)) : sum,
-                'Shots_PP_onice_home{}'.format(str(i)) : sum,
-                'ShotAttempts_PP_onice_home{}'.format(str(i)) : sum,
-                'UnblockedShotAttempts_PP_onice_home{}'.format(str(i)) : sum,
-                'xG_PP_onice_home{}'.format(str(i)) : sum,
-                'xG_flurry_PP_onice_home{}'.format(str(i)) : sum,
-                'Goals_PK_onice_home{}'.format(str(i)) : sum,
-                'Shots_PK_onice_home{}'.format(str(i)) : sum,
-                'ShotAttempts_PK_onice_home{}'.format(str(i)) : sum,
-                'UnblockedShotAttempts_PK_onice_home{}'.format(str(i)) : sum,
-                'xG_PK_onice_home{}'.format(str(i)) : sum,
-                'xG_flurry_PK_onice_home{}'.format(str(i)) : sum,
-                'GoalsAgainst_onice_home{}'.format(str(i)) : sum,
-                'ShotsAgainst_onice_home{}'.format(str(i)) : sum,
-                'ShotAttemptsAgainst_onice_home{}'.format(str(i)) : sum,
-                'UnblockedShotAttemptsAgainst_onice_home{}'.format(str(i)) : sum,
-                'xGAgainst_onice_home{}'.format(str(i)) : sum,
-                'xG_flurryAgainst_onice_home{}'.format(str(i)) : sum,
-                'GoalsAgainst_5v5_onice_home{}'.format(str(i)) : sum,
-                'ShotsAgainst_5v5_onice_home{}'.format(str(i)) : sum,
-                'ShotAttemptsAgainst_5v5_onice_home{}'.format(str(i)) : sum,
-                'UnblockedShotAttemptsAgainst_5v5_onice_home{}'.format(str(i)) : sum,
-                'xGAgainst_5v5_onice_home{}'.format(str(i)) : sum,
-                'xG_flurryAgainst_5v5_onice_home{}'.format(str(i)) : sum,
-                'GoalsAgainst_PP_onice_home{}'.format(str(i)) : sum,
-                'ShotsAgainst_PP_onice_home{}'.format(str(i)) : sum,
-                'ShotAttemptsAgainst_PP_onice_home{}'.format(str(i)) : sum,
-                'UnblockedShotAttemptsAgainst_PP_onice_home{}'.format(str(i)) : sum,
-                'xGAgainst_PP_onice_home{}'.format(str(i)) : sum,
-                'xG_flurryAgainst_PP_onice_home{}'.format(str(i)) : sum,
-                'GoalsAgainst_PK_onice_home{}'.format(str(i)) : sum,
-                'ShotsAgainst_PK_onice_home{}'.format(str(i)) : sum,
-                'ShotAttemptsAgainst_PK_onice_home{}'.format(str(i)) : sum,
-                'UnblockedShotAttemptsAgainst_PK_onice_home{}'.format(str(i)) : sum,
-                'xGAgainst_PK_onice_home{}'.format(str(i)) : sum,
-                'xG_flurryAgainst_PK_onice_home{}'.format(str(i)) : sum,
-                'GoalsAdjusted_onice_home{}'.format(str(i)) : sum,
-                'ShotsAdjusted_onice_home{}'.format(str(i)) : sum,
-                'ShotAttemptsAdjusted_onice_home{}'.format(str(i)) : sum,
-                'UnblockedShotAttemptsAdjusted_onice_home{}'.format(str(i)) : sum,
-                'xGAdjusted_onice_home{}'.format(str(i)) : sum,
-                'xG_flurryAdjusted_onice_home{}'.format(str(i)) : sum,
-                'GoalsAdjusted_5v5_onice_home{}'.format(str(i)) : sum,
-                'ShotsAdjusted_5v5_onice_home{}'.format(str(i)) : sum,
-                'ShotAttemptsAdjusted_5v5_onice_home{}'.format(str(i)) : sum,
-                'UnblockedShotAttemptsAdjusted_5v5_onice_home{}'.format(str(i)) : sum,
-                'xGAdjusted_5v5_onice_home{}'.format(str(i)) : sum,
-                'xG_flurryAdjusted_5v5_onice_home{}'.format(str(i)) : sum,
-                'GoalsAdjusted_PP_onice_home{}'.format(str(i)) : sum,
-                'ShotsAdjusted_PP_onice_home{}'.format(str(i)) : sum,
-                'ShotAttemptsAdjusted_PP_onice_home{}'.format(str(i)) : sum,
-                'UnblockedShotAttemptsAdjusted_PP_onice_home{}'.format(str(i)) : sum,
-                'xGAdjusted_PP_onice_home{}'.format(str(i)) : sum,
-                'xG_flurryAdjusted_PP_onice_home{}'.format(str(i)) : sum,
-                'GoalsAdjustedAgainst_onice_home{}'.format(str(i)) : sum,
-                'ShotsAdjustedAgainst_onice_home{}'.format(str(i)) : sum,
-                'ShotAttemptsAdjustedAgainst_onice_home{}'.format(str(i)) : sum,
-                'UnblockedShotAttemptsAdjustedAgainst_onice_home{}'.format(str(i)) : sum,
-                'xGAdjustedAgainst_onice_home{}'.format(str(i)) : sum,
-                'xG_flurryAdjustedAgainst_onice_home{}'.format(str(i)) : sum,
-                'GoalsAdjustedAgainst_5v5_onice_home{}'.format(str(i)) : sum,
-                'ShotsAdjustedAgainst_5v5_onice_home{}'.format(str(i)) : sum,
-                'ShotAttemptsAdjustedAgainst_5v5_onice_home{}'.format(str(i)) : sum,
-                'UnblockedShotAttemptsAdjustedAgainst_5v5_onice_home{}'.format(str(i)) : sum,
-                'xGAdjustedAgainst_5v5_onice_home{}'.format(str(i)) : sum,
-                'xG_flurryAdjustedAgainst_5v5_onice_home{}'.format(str(i)) : sum,
-                'GoalsAdjustedAgainst_PK_onice_home{}'.format(str(i)) : sum,
-                'ShotsAdjustedAgainst_PK_onice_home{}'.format(str(i)) : sum,
-                'ShotAttemptsAdjustedAgainst_PK_onice_home{}'.format(str(i)) : sum,
-                'UnblockedShotAttemptsAdjustedAgainst_PK_onice_home{}'.format(str(i)) : sum,
-                'xGAdjustedAgainst_PK_onice_home{}'.format(str(i)) : sum,
-                'xG_flurryAdjustedAgainst_PK_onice_home{}'.format(str(i)) : sum,
-                'ReboundShotsAgainst_onice_home{}'.format(str(i)) : sum,
-                'position_home{}'.format(str(i)) : sum,
-                'team_home{}'.format(str(i)) : lambda x: x.value_counts().index[0]
-        }).reset_index().fillna(0)
-        playerGame_home['team_home{}'.format(str(i))] = playerGame_home['team_home{}'.format(str(i))].replace(0, '')
-
-        playerGame = playerGame.merge(playerGame_home, how='outer', on=['Game_Id','Date','Player','PlayerID','Season'])
-        del playerGame_home
-
-    # on-ice stats away players
-    for i in range(1,7):
-        shots['Player'] = shots['awayPlayer{}'.format(str(i))].copy()
-        shots['PlayerID'] = shots['awayPlayer{}_id'.format(str(i))].copy()
-
-        shots['Goals_onice_away{}'.format(str(i))] = shots['Goals'] * shots['AwayTeamEvent']
-        shots['Shots_onice_away{}'.format(str(i))] = shots['Shots'] * shots['AwayTeamEvent']
-        shots['ShotAttempts_onice_away{}'.format(str(i))] = shots['ShotAttempts'] * shots['AwayTeamEvent']
-        shots['UnblockedShotAttempts_onice_away{}'.format(str(i))] = shots['UnblockedShotAttempts'] * shots['AwayTeamEvent']
-        shots['xG_onice_away{}'.format(str(i))] = shots['xG'] * shots['AwayTeamEvent']
-        shots['xG_flurry_onice_away{}'.format(str(i))] = shots['xG_flurry'] * shots['AwayTeamEvent']
-        shots['Goals_5v5_onice_away{}'.format(str(i))] = shots['Goals_5v5'] * shots['AwayTeamEvent']
-        shots['Shots_5v5_onice_away{}'.format(str(i))] = shots['Shots_5v5'] * shots['AwayTeamEvent']
-        shots['ShotAttempts_5v5_onice_away{}'.format(str(i))] = shots['ShotAttempts_5v5'] * shots['AwayTeamEvent']
-        shots['UnblockedShotAttempts_5v5_onice_away{}'.format(str(i))] = shots['UnblockedShotAttempts_5v5'] * shots['AwayTeamEvent']
-        shots['xG_5v5_onice_away{}'.format(str(i))] = shots['xG_5v5'] * shots['AwayTeamEvent']
-        shots['xG_flurry_5v5_onice_away{}'.format(str(i))] = shots['xG_flurry_5v5'] * shots['AwayTeamEvent']
-        shots['Goals_PP_onice_away{}'.format(str(i))] = shots['Goals_PP'] * shots['AwayTeamEvent']
-        shots['Shots_PP_onice_away{}'.format(str(i))] = shots['Shots_PP'] * shots['AwayTeamEvent']
-        shots['ShotAttempts_PP_onice_away{}'.format(str(i))] = shots['ShotAttempts_PP'] * shots['AwayTeamEvent']
-        shots['UnblockedShotAttempts_PP_onice_away{}'.format(str(i))] = shots['UnblockedShotAttempts_PP'] * shots['AwayTeamEvent']
-        shots['xG_PP_onice_away{}'.format(str(i))] = shots['xG_PP'] * shots['AwayTeamEvent']
-        shots['xG_flurry_PP_onice_away{}'.format(str(i))] = shots['xG_flurry_PP'] * shots['AwayTeamEvent']
-        shots['Goals_PK_onice_away{}'.format(str(i))] = shots['Goals_PK'] * shots['AwayTeamEvent']
-        shots['Shots_PK_onice_away{}'.format(str(i))] = shots['Shots_PK'] * shots['AwayTeamEvent']
-        shots['ShotAttempts_PK_onice_away{}'.format(str(i))] = shots['ShotAttempts_PK'] * shots['AwayTeamEvent']
-        shots['UnblockedShotAttempts_PK_onice_away{}'.format(str(i))] = shots['UnblockedShotAttempts_PK'] * shots['AwayTeamEvent']
-        shots['xG_PK_onice_away{}'.format(str(i))] = shots['xG_PK'] * shots['AwayTeamEvent']
-        shots['xG_flurry_PK_onice_away{}'.format(str(i))] = shots['xG_flurry_PK'] * shots['AwayTeamEvent']
-
-        shots['GoalsAdjusted_onice_away{}'.format(str(i))] = shots['GoalsAdjusted'] * shots['AwayTeamEvent']
-        shots['ShotsAdjusted_onice_away{}'.format(str(i))] = shots['ShotsAdjusted'] * shots['AwayTeamEvent']
-        shots['ShotAttemptsAdjusted_onice_away{}'.format(str(i))] = shots['ShotAttemptsAdjusted'] * shots['AwayTeamEvent']
-        shots['UnblockedShotAttemptsAdjusted_onice_away{}'.format(str(i))] = shots['UnblockedShotAttemptsAdjusted'] * shots['AwayTeamEvent']
-        shots['xGAdjusted_onice_away{}'.format(str(i))] = shots['xGAdjusted'] * shots['AwayTeamEvent']
-        shots['xG_flurryAdjusted_onice_away{}'.format(str(i))] = shots['xG_flurryAdjusted'] * shots['AwayTeamEvent']
-        shots['GoalsAdjusted_5v5_onice_away{}'.format(str(i))] = shots['GoalsAdjusted_5v5'] * shots['AwayTeamEvent']
-        shots['ShotsAdjusted_5v5_onice_away{}'.format(str(i))] = shots['ShotsAdjusted_5v5'] * shots['AwayTeamEvent']
-        shots['ShotAttemptsAdjusted_5v5_onice_away{}'.format(str(i))] = shots['ShotAttemptsAdjusted_5v5'] * shots['AwayTeamEvent']
-        shots['UnblockedShotAttemptsAdjusted_5v5_onice_away{}'.format(str(i))] = shots['UnblockedShotAttemptsAdjusted_5v5'] * shots['AwayTeamEvent']
-        shots['xGAdjusted_5v5_onice_away{}'.format(str(i))] = shots['xGAdjusted_5v5'] * shots['AwayTeamEvent']
-        shots['xG_flurryAdjusted_5v5_onice_away{}'.format(str(i))] = shots['xG_flurryAdjusted_5v5'] * shots['AwayTeamEvent']
-        shots['GoalsAdjusted_PP_onice_away{}'.format(str(i))] = shots['GoalsAdjusted_PP'] * shots['AwayTeamEvent']
-        shots['ShotsAdjusted_PP_onice_away{}'.format(str(i))] = shots['ShotsAdjusted_PP'] * shots['AwayTeamEvent']
-        shots['ShotAttemptsAdjusted_PP_onice_away{}'.format(str(i))] = shots['ShotAttemptsAdjusted_PP'] * shots['AwayTeamEvent']
-        shots['UnblockedShotAttemptsAdjusted_PP_onice_away{}'.format(str(i))] = shots['UnblockedShotAttemptsAdjusted_PP'] * shots['AwayTeamEvent']
-        shots['xGAdjusted_PP_onice_away{}'.format(str(i))] = shots['xGAdjusted_PP'] * shots['AwayTeamEvent']
-        shots['xG_flurryAdjusted_PP_onice_away{}'.format(str(i))] = shots['xG_flurryAdjusted_PP'] * shots['AwayTeamEvent']
-
-        shots['GoalsAgainst_onice_away{}'.format(str(i))] = shots['Goals'] * shots['HomeTeamEvent']
-        shots['ShotsAgainst_onice_away{}'.format(str(i))] = shots['Shots'] * shots['HomeTeamEvent']
-        shots['ShotAttemptsAgainst_onice_away{}'.format(str(i))] = shots['ShotAttempts'] * shots['HomeTeamEvent']
-        shots['UnblockedShotAttemptsAgainst_onice_away{}'.format(str(i))] = shots['UnblockedShotAttempts'] * shots['HomeTeamEvent']
-        shots['xGAgainst_onice_away{}'.format(str(i))] = shots['xG'] * shots['HomeTeamEvent']
-        shots['xG_flurryAgainst_onice_away{}'.format(str(i))] = shots['xG_flurry'] * shots['HomeTeamEvent']
-        shots['GoalsAgainst_5v5_onice_away{}'.format(str(i))] = shots['Goals_5v5'] * shots['HomeTeamEvent']
-        shots['ShotsAgainst_5v5_onice_away{}'.format(str(i))] = shots['Shots_5v5'] * shots['HomeTeamEvent']
-        shots['ShotAttemptsAgainst_5v5_onice_away{}'.format(str(i))] = shots['ShotAttempts_5v5'] * shots['HomeTeamEvent']
-        shots['UnblockedShotAttemptsAgainst_5v5_onice_away{}'.format(str(i))] = shots['UnblockedShotAttempts_5v5'] * shots['HomeTeamEvent']
-        shots['xGAgainst_5v5_onice_away{}'.format(str(i))] = shots['xG_5v5'] * shots['HomeTeamEvent']
-        shots['xG_flurryAgainst_5v5_onice_away{}'.format(str(i))] = shots['xG_flurry_5v5'] * shots['HomeTeamEvent']
-        shots['GoalsAgainst_PP_onice_away{}'.format(str(i))] = shots['Goals_PK'] * shots['HomeTeamEvent']
-        shots['ShotsAgainst_PP_onice_away{}'.format(str(i))] = shots['Shots_PK'] * shots['HomeTeamEvent']
-        shots['ShotAttemptsAgainst_PP_onice_away{}'.format(str(i))] = shots['ShotAttempts_PK'] * shots['HomeTeamEvent']
-        shots['UnblockedShotAttemptsAgainst_PP_onice_away{}'.format(str(i))] = shots['UnblockedShotAttempts_PK'] * shots['HomeTeamEvent']
-        shots['xGAgainst_PP_onice_away{}'.format(str(i))] = shots['xG_PK'] * shots['HomeTeamEvent']
-        shots['xG_flurryAgainst_PP_onice_away{}'.format(str(i))] = shots['xG_flurry_PK'] * shots['HomeTeamEvent']
-        shots['GoalsAgainst_PK_onice_away{}'.format(str(i))] = shots['Goals_PP'] * shots['HomeTeamEvent']
-        shots['ShotsAgainst_PK_onice_away{}'.format(str(i))] = shots['Shots_PP'] * shots['HomeTeamEvent']
-        shots['ShotAttemptsAgainst_PK_onice_away{}'.format(str(i))] = shots['ShotAttempts_PP'] * shots['HomeTeamEvent']
-        shots['UnblockedShotAttemptsAgainst_PK_onice_away{}'.format(str(i))] = shots['UnblockedShotAttempts_PP'] * shots['HomeTeamEvent']
-        shots['xGAgainst_PK_onice_away{}'.format(str(i))] = shots['xG_PP'] * shots['HomeTeamEvent']
-        shots['xG_flurryAgainst_PK_onice_away{}'.format(str(i))] = shots['xG_flurry_PP'] * shots['HomeTeamEvent']
-        shots['ReboundShotsAgainst_onice_away{}'.format(str(i))] = (shots['ShotCategory']=='Rebound').astype(np.int16) * shots['HomeTeamEvent']
-
-        shots['GoalsAdjustedAgainst_onice_away{}'.format(str(i))] = shots['GoalsAdjusted'] * shots['HomeTeamEvent']
-        shots['ShotsAdjustedAgainst_onice_away{}'.format(str(i))] = shots['ShotsAdjusted'] * shots['HomeTeamEvent']
-        shots['ShotAttemptsAdjustedAgainst_onice_away{}'.format(str(i))] = shots['ShotAttemptsAdjusted'] * shots['HomeTeamEvent']
-        shots['UnblockedShotAttemptsAdjustedAgainst_onice_away{}'.format(str(i))] = shots['UnblockedShotAttemptsAdjusted'] * shots['HomeTeamEvent']
-        shots['xGAdjustedAgainst_onice_away{}'.format(str(i))] = shots['xGAdjusted'] * shots['HomeTeamEvent']
-        shots['xG_flurryAdjustedAgainst_onice_away{}'.format(str(i))] = shots['xG_flurryAdjusted'] * shots['HomeTeamEvent']
-        shots['GoalsAdjustedAgainst_5v5_onice_away{}'.format(str(i))] = shots['GoalsAdjusted_5v5'] * shots['HomeTeamEvent']
-        shots['ShotsAdjustedAgainst_5v5_onice_away{}'.format(str(i))] = shots['ShotsAdjusted_5v5'] * shots['HomeTeamEvent']
-        shots['ShotAttemptsAdjustedAgainst_5v5_onice_away{}'.format(str(i))] = shots['ShotAttemptsAdjusted_5v5'] * shots['HomeTeamEvent']
-        shots['UnblockedShotAttemptsAdjustedAgainst_5v5_onice_away{}'.format(str(i))] = shots['UnblockedShotAttemptsAdjusted_5v5'] * shots['HomeTeamEvent']
-        shots['xGAdjustedAgainst_5v5_onice_away{}'.format(str(i))] = shots['xGAdjusted_5v5'] * shots['HomeTeamEvent']
-        shots['xG_flurryAdjustedAgainst_5v5_onice_away{}'.format(str(i))] = shots['xG_flurryAdjusted_5v5'] * shots['HomeTeamEvent']
-        shots['GoalsAdjustedAgainst_PK_onice_away{}'.format(str(i))] = shots['GoalsAdjusted_PP'] * shots['HomeTeamEvent']
-        shots['ShotsAdjustedAgainst_PK_onice_away{}'.format(str(i))] = shots['ShotsAdjusted_PP'] * shots['HomeTeamEvent']
-        shots['ShotAttemptsAdjustedAgainst_PK_onice_away{}'.format(str(i))] = shots['ShotAttemptsAdjusted_PP'] * shots['HomeTeamEvent']
-        shots['UnblockedShotAttemptsAdjustedAgainst_PK_onice_away{}'.format(str(i))] = shots['UnblockedShotAttemptsAdjusted_PP'] * shots['HomeTeamEvent']
-        shots['xGAdjustedAgainst_PK_onice_away{}'.format(str(i))] = shots['xGAdjusted_PP'] * shots['HomeTeamEvent']
-        shots['xG_flurryAdjustedAgainst_PK_onice_away{}'.format(str(i))] = shots['xG_flurryAdjusted_PP'] * shots['HomeTeamEvent']
-
-        shots['team_away{}'.format(str(i))] = shots['Away_Team'].copy()
-
-        # add column for tracking player positions
-        shots['position_away{}'.format(str(i))] = 1
-
-        playerGame_away = shots.groupby([
-                'Game_Id','Date','Player','PlayerID','Season'
-            ]).agg({
-                'Goals_onice_away{}'.format(str(i)) : sum,
-                'Shots_onice_away{}'.format(str(i)) : sum,
-                'ShotAttempts_onice_away{}'.format(str(i)) : sum,
-                'UnblockedShotAttempts_onice_away{}'.format(str(i)) : sum,
-                'xG_onice_away{}'.format(str(i)) : sum,
-                'xG_flurry_onice_away{}'.format(str(i)) : sum,
-                'Goals_5v5_onice_away{}'.format(str(i)) : sum,
-                'Shots_5v5_onice_away{}'.format(str(i)) : sum,
-                'ShotAttempts_5v5_onice_away{}'.format(str(i)) : sum,
-                'UnblockedShotAttempts_5v5_onice_away{}'.format(str(i)) : sum,
-                'xG_5v5_onice_away{}'.format(str(i)) : sum,
-                'xG_flurry_5v5_onice_away{}'.format(str(i)) : sum,
-                'Goals_PP_onice_away{}'.format(str(i)) : sum,
-                'Shots_PP_onice_away{}'.format(str(i)) : sum,
-                'ShotAttempts_PP_onice_away{}'.format(str(i)) : sum,
-                'UnblockedShotAttempts_PP_onice_away{}'.format(str(i)) : sum,
-                'xG_PP_onice_away{}'.format(str(i)) : sum,
-                'xG_flurry_PP_onice_away{}'.format(str(i)) : sum,
-                'Goals_PK_onice_away{}'.format(str(i)) : sum,
-                'Shots_PK_onice_away{}'.format(str(i)) : sum,
-                'ShotAttempts_PK_onice_away{}'.format(str(i)) : sum,
-                'UnblockedShotAttempts_PK_onice_away{}'.format(str(i)) : sum,
-                'xG_PK_onice_away{}'.format(str(i)) : sum,
-                'xG_flurry_PK_onice_away{}'.format(str(i)) : sum,
-                'GoalsAgainst_onice_away{}'.format(str(i)) : sum,
-                'ShotsAgainst_onice_away{}'.format(str(i)) : sum,
-                'ShotAttemptsAgainst_onice_away{}'.format(str(i)) : sum,
-                'UnblockedShotAttemptsAgainst_onice_away{}'.format(str(i)) : sum,
-                'xGAgainst_onice_away{}'.format(str(i)) : sum,
-                'xG_flurryAgainst_onice_away{}'.format(str(i)) : sum,
-                'GoalsAgainst_5v5_onice_away{}'.format(str(i)) : sum,
-                'ShotsAgainst_5v5_onice_away{}'.format(str(i)) : sum,
-                'ShotAttemptsAgainst_5v5_onice_away{}'.format(str(i)) : sum,
-                'UnblockedShotAttemptsAgainst_5v5_onice_away{}'.format(str(i)) : sum,
-                'xGAgainst_5v5_onice_away{}'.format(str(i)) : sum,
-                'xG_flurryAgainst_5v5_onice_away{}'.format(str(i)) : sum,
-                'GoalsAgainst_PP_onice_away{}'.format(str(i)) : sum,
-                'ShotsAgainst_PP_onice_away{}'.format(str(i)) : sum,
-                'ShotAttemptsAgainst_PP_onice_away{}'.format(str(i)) : sum,
-                'UnblockedShotAttemptsAgainst_PP_onice_away{}'.format(str(i)) : sum,
-                'xGAgainst_PP_onice_away{}'.format(str(i)) : sum,
-                'xG_flurryAgainst_PP_onice_away{}'.format(str(i)) : sum,
-                'GoalsAgainst_PK_onice_away{}'.format(str(i)) : sum,
-                'ShotsAgainst_PK_onice_away{}'.format(str(i)) : sum,
-                'ShotAttemptsAgainst_PK_onice_away{}'.format(str(i)) : sum,
-                'UnblockedShotAttemptsAgainst_PK_onice_away{}'.format(str(i)) : sum,
-                'xGAgainst_PK_onice_away{}'.format(str(i)) : sum,
-                'xG_flurryAgainst_PK_onice_away{}'.format(str(i)) : sum,
-                'GoalsAdjusted_onice_away{}'.format(str(i)) : sum,
-                'ShotsAdjusted_onice_away{}'.format(str(i)) : sum,
-                'ShotAttemptsAdjusted_onice_away{}'.format(str(i)) : sum,
-                'UnblockedShotAttemptsAdjusted_onice_away{}'.format(str(i)) : sum,
-                'xGAdjusted_onice_away{}'.format(str(i)) : sum,
-                'xG_flurryAdjusted_onice_away{}'.format(str(i)) : sum,
-                'GoalsAdjusted_5v5_onice_away{}'.format(str(i)) : sum,
-                'ShotsAdjusted_5v5_onice_away{}'.format(str(i)) : sum,
-                'ShotAttemptsAdjusted_5v5_onice_away{}'.format(str(i)) : sum,
-                'UnblockedShotAttemptsAdjusted_5v5_onice_away{}'.format(str(i)) : sum,
-                'xGAdjusted_5v5_onice_away{}'.format(str(i)) : sum,
-                'xG_flurryAdjusted_5v5_onice_away{}'.format(str(i)) : sum,
-                'GoalsAdjusted_PP_onice_away{}'.format(str(i)) : sum,
-                'ShotsAdjusted_PP_onice_away{}'.format(str(i)) : sum,
-                'ShotAttemptsAdjusted_PP_onice_away{}'.format(str(i)) : sum,
-                'UnblockedShotAttemptsAdjusted_PP_onice_away{}'.format(str(i)) : sum,
-                'xGAdjusted_PP_onice_away{}'.format(str(i)) : sum,
-                'xG_flurryAdjusted_PP_onice_away{}'.format(str(i)) : sum,
-                'GoalsAdjustedAgainst_onice_away{}'.format(str(i)) : sum,
-                'ShotsAdjustedAgainst_onice_away{}'.format(str(i)) : sum,
-                'ShotAttemptsAdjustedAgainst_onice_away{}'.format(str(i)) : sum,
-                'UnblockedShotAttemptsAdjustedAgainst_onice_away{}'.format(str(i)) : sum,
-                'xGAdjustedAgainst_onice_away{}'.format(str(i)) : sum,
-                'xG_flurryAdjustedAgainst_onice_away{}'.format(str(i)) : sum,
-                'GoalsAdjustedAgainst_5v5_onice_away{}'.format(str(i)) : sum,
-                'ShotsAdjustedAgainst_5v5_onice_away{}'.format(str(i)) : sum,
-                'ShotAttemptsAdjustedAgainst_5v5_onice_away{}'.format(str(i)) : sum,
-                'UnblockedShotAttemptsAdjustedAgainst_5v5_onice_away{}'.format(str(i)) : sum,
-                'xGAdjustedAgainst_5v5_onice_away{}'.format(str(i)) : sum,
-                'xG_flurryAdjustedAgainst_5v5_onice_away{}'.format(str(i)) : sum,
-                'GoalsAdjustedAgainst_PK_onice_away{}'.format(str(i)) : sum,
-                'ShotsAdjustedAgainst_PK_onice_away{}'.format(str(i)) : sum,
-                'ShotAttemptsAdjustedAgainst_PK_onice_away{}'.format(str(i)) : sum,
-                'UnblockedShotAttemptsAdjustedAgainst_PK_onice_away{}'.format(str(i)) : sum,
-                'xGAdjustedAgainst_PK_onice_away{}'.format(str(i)) : sum,
-                'xG_flurryAdjustedAgainst_PK_onice_away{}'.format(str(i)) : sum,
-                'ReboundShotsAgainst_onice_away{}'.format(str(i)) : sum,
-                'position_away{}'.format(str(i)) : sum,
-                'team_away{}'.format(str(i)) : lambda x: x.value_counts().index[0]
-        }).reset_index()
-        playerGame_away['team_away{}'.format(str(i))] = playerGame_away['team_away{}'.format(str(i))].replace(0, '')
-
-        playerGame = playerGame.merge(playerGame_away, how='outer', on=['Game_Id','Date','Player','PlayerID','Season'])
-        del playerGame_away
-
-        # add up home and away player position numbers
-        playerGame['position_{}'.format(str(i))] = playerGame['position_home{}'.format(str(i))].fillna(0) + playerGame['position_away{}'.format(str(i))].fillna(0)
-        playerGame = playerGame.drop(columns=['position_home{}'.format(str(i)),'position_away{}'.format(str(i))])
-
-    # fill nulls, and add up on-ice columns so there is only one per stat
-    playerGame = playerGame.fillna(0)
-    for col in ['Goals_onice','Shots_onice','ShotAttempts_onice','UnblockedShotAttempts_onice','xG_onice',
-                'xG_flurry_onice','Goals_5v5_onice','Shots_5v5_onice',
-                'ShotAttempts_5v5_onice','UnblockedShotAttempts_5v5_onice','xG_5v5_onice',
-                'xG_flurry_5v5_onice','Goals_PP_onice','Shots_PP_onice',
-                'ShotAttempts_PP_onice','UnblockedShotAttempts_PP_onice','xG_PP_onice',
-                'xG_flurry_PP_onice','Goals_PK_onice','Shots_PK_onice',
-                'ShotAttempts_PK_onice','UnblockedShotAttempts_PK_onice','xG_PK_onice',
-                'xG_flurry_PK_onice','GoalsAgainst_onice','ShotsAgainst_onice',
-                'ShotAttemptsAgainst_onice','UnblockedShotAttemptsAgainst_onice',
-                'xGAgainst_onice','xG_flurryAgainst_onice','GoalsAgainst_5v5_onice',
-                'ShotsAgainst_5v5_onice','ShotAttemptsAgainst_5v5_onice','UnblockedShotAttemptsAgainst_5v5_onice',
-                'xGAgainst_5v5_onice','xG_flurryAgainst_5v5_onice','GoalsAgainst_PP_onice',
-                'ShotsAgainst_PP_onice','ShotAttemptsAgainst_PP_onice','UnblockedShotAttemptsAgainst_PP_onice',
-                'xGAgainst_PP_onice','xG_flurryAgainst_PP_onice','GoalsAgainst_PK_onice',
-                'ShotsAgainst_PK_onice','ShotAttemptsAgainst_PK_onice','UnblockedShotAttemptsAgainst_PK_onice',
-                'xGAgainst_PK_onice','xG_flurryAgainst_PK_onice','GoalsAdjusted_onice',
-                'ShotsAdjusted_onice','ShotAttemptsAdjusted_onice','UnblockedShotAttemptsAdjusted_onice',
-                'xGAdjusted_onice','xG_flurryAdjusted_onice','GoalsAdjusted_5v5_onice',
-                'ShotsAdjusted_5v5_onice','ShotAttemptsAdjusted_5v5_onice','UnblockedShotAttemptsAdjusted_5v5_onice',
-                'xGAdjusted_5v5_onice','xG_flurryAdjusted_5v5_onice','GoalsAdjusted_PP_onice','ShotsAdjusted_PP_onice',
-                'ShotAttemptsAdjusted_PP_onice','UnblockedShotAttemptsAdjusted_PP_onice',
-                'xGAdjusted_PP_onice','xG_flurryAdjusted_PP_onice','GoalsAdjustedAgainst_onice','ShotsAdjustedAgainst_onice',
-                'ShotAttemptsAdjustedAgainst_onice','UnblockedShotAttemptsAdjustedAgainst_onice',
-                'xGAdjustedAgainst_onice','xG_flurryAdjustedAgainst_onice','GoalsAdjustedAgainst_5v5_onice','ShotsAdjustedAgainst_5v5_onice',
-                'ShotAttemptsAdjustedAgainst_5v5_onice','UnblockedShotAttemptsAdjustedAgainst_5v5_onice',
-                'xGAdjustedAgainst_5v5_onice','xG_flurryAdjustedAgainst_5v5_onice','GoalsAdjustedAgainst_PK_onice','ShotsAdjustedAgainst_PK_onice',
-                'ShotAttemptsAdjustedAgainst_PK_onice','UnblockedShotAttemptsAdjustedAgainst_PK_onice',
-                'xGAdjustedAgainst_PK_onice','xG_flurryAdjustedAgainst_PK_onice','ReboundShotsAgainst_onice']:
-        playerGame[col] = playerGame['{}_home1'.format(col)] + playerGame['{}_home2'.format(col)] + playerGame['{}_home3'.format(col)] + playerGame['{}_home4'.format(col)] \
-            + playerGame['{}_home5'.format(col)] + playerGame['{}_home6'.format(col)] + playerGame['{}_away1'.format(col)] + playerGame['{}_away2'.format(col)] \
-            + playerGame['{}_away3'.format(col)] + playerGame['{}_away4'.format(col)] + playerGame['{}_away5'.format(col)] + playerGame['{}_away6'.format(col)]
-        playerGame = playerGame.drop(columns=['{}_home1'.format(col),'{}_home2'.format(col),'{}_home3'.format(col),'{}_home4'.format(col),'{}_home5'.format(col),
-                                      '{}_home6'.format(col),'{}_away1'.format(col),'{}_away2'.format(col),'{}_away3'.format(col),'{}_away4'.format(col),
-                                      '{}_away5'.format(col),'{}_away6'.format(col)])
-
-    # combine the team columns into one
-    playerGame['Team'] = playerGame[['team_away1','team_away2','team_away3','team_away4','team_away5','team_away6',
-                                     'team_home1','team_home2','team_home3','team_home4','team_home5','team_home6']].replace(0,'').max(1)
-    playerGame = playerGame.drop(columns=['team_away1','team_away2','team_away3','team_away4','team_away5','team_away6',
-                                  'team_home1','team_home2','team_home3','team_home4','team_home5','team_home6'])
+    # on-ice stats for the home and away players
+    playerGame = _add_onice_stats(playerGame, shots)
+    del shots
 
     # downcast some fields
     playerGame['Game_Id'] = playerGame['Game_Id'].astype(np.int32)
@@ -1029,59 +878,167 @@ def aggregate_player_data(plays, shifts, homeaway_adjustments='data/score_homeaw
     # add an ID field
     playerGame['PlayerGameID'] = playerGame['Date'] + '_' + playerGame['PlayerID'].astype(str)
 
-    # add field for whether this is a playoff game or not
-    playerGame['DateInt'] = playerGame['Date'].str.replace('-','').astype(np.int64)
-    playerGame['teamGameRank'] = playerGame.groupby(['Team','Season'])['DateInt'].rank("dense")
-    playerGame['Playoffs'] = (playerGame['teamGameRank']>82).astype(np.int8)
-    playerGame.loc[(playerGame['Season']==2012)&(playerGame['teamGameRank']>48),'Playoffs'] = 1 #fix for the lockout-shortened season
-    playerGame.loc[(playerGame['Season']==2019)&(playerGame['Date']>'2020-03-12'),'Playoffs'] = 1 #fix for the first covid-shortened season
-    playerGame.loc[(playerGame['Season']==2020)&(playerGame['teamGameRank']>56),'Playoffs'] = 1 #fix for the second covid-shortened season
-    playerGame = playerGame.drop(columns=['teamGameRank'])
+    # add field for whether this is a playoff game or not, from teamGame, since the games here may only be part of the season
+    # while teamGame's ranks carry on from each team's earlier games (see aggregate_team_data)
+    playerGame['DateInt'] = playerGame['Date'].str.replace('-','').astype(np.int32)
+    playerGame = playerGame.merge(teamGame[['Game_Id','Team','Playoffs']].astype({'Game_Id':np.int64, 'Team':object}), on=['Game_Id','Team'], how='left')
     playerGame = playerGame.loc[playerGame['PlayerID']>=1]
 
-    return playerGame, toi_overlap
-
-def add_elo(teamGame):
-    teamGame['Game_Id_Unique'] = (teamGame['Season'].astype(str) + teamGame['Game_Id'].astype(str)).astype(int)
-    teamGame = teamGame.sort_values(by=['DateInt','Game_Id'])
-    teamGame['teamGameRankOverall'] = teamGame.groupby('Team')['DateInt'].rank("dense")
-    gids = teamGame['Game_Id_Unique'].unique().tolist() #gids = teamGame.loc[teamGame['Elo'].isnull(), 'Game_Id'].unique().tolist()
-    teamGame['Elo'] = 1500 #teamGame.loc[teamGame['Elo'].isnull(), 'Elo'] = 1500
-    for gid in gids:
-        game_df = teamGame.loc[teamGame['Game_Id_Unique']==gid].copy()
-        elo_1 = game_df['Elo'].iloc[0]
-        elo_2 = game_df['Elo'].iloc[1]
-        if game_df['teamGameRank'].iloc[0]==1 and game_df['teamGameRankOverall'].iloc[0]>1:
+    return schema.apply(playerGame, 'playerGame'), toi_overlap
+
+TEAM_STATE_COLUMNS = ['Team','Date','Season','teamGameRank','teamGameRankOverall','Elo']
+
+def _elo_update(elo_1, elo_2, victoryMarginMultiplier_1, victoryMarginMultiplier_2, win_1, win_2):
+    # new elo ratings for both teams in a game, from their ratings before it
+    p_1 = 1/(10**((elo_2-elo_1)/400)+1)
+    p_2 = 1/(10**((elo_1-elo_2)/400)+1)
+    if elo_1>elo_2 and win_1==1:
+        autoAdjust_1 = 2.05/((elo_1-elo_2) * 0.001 + 2.05)
+        autoAdjust_2 = 1
+    elif elo_2>elo_1 and win_2==1:
+        autoAdjust_2 = 2.05/((elo_1-elo_2) * 0.001 + 2.05)
+        autoAdjust_1 = 1
+    else:
+        autoAdjust_1 = 1
+        autoAdjust_2 = 1
+    favMultiplier_1 = win_1 - p_1
+    favMultiplier_2 = win_2 - p_2
+    new_elo_1 = elo_1 + (6*victoryMarginMultiplier_1*autoAdjust_1*favMultiplier_1)
+    new_elo_2 = elo_2 + (6*victoryMarginMultiplier_2*autoAdjust_2*favMultiplier_2)
+    return new_elo_1, new_elo_2
+
+def _run_elo(teams, ranks, newSeason, victoryMarginMultipliers, wins, elo_by_rank):
+    # run elo through the games in order, where rows 2k and 2k+1 are the two teams in game k
+    # elo_by_rank[team][rank] is the team's rating going into its game with that overall rank
+    for k in range(0, len(teams), 2):
+        elo_1 = elo_by_rank[teams[k]][ranks[k]]
+        elo_2 = elo_by_rank[teams[k+1]][ranks[k+1]]
+        if newSeason[k]:
             elo_1 = (elo_1*0.7) + (1505*0.3)
-            teamGame.loc[(teamGame['Team']==game_df['Team'].iloc[0]) & (teamGame['teamGameRankOverall']==game_df['teamGameRankOverall'].iloc[0]), 'Elo'] = elo_1
-        if game_df['teamGameRank'].iloc[1]==1 and game_df['teamGameRankOverall'].iloc[1]>1:
+            elo_by_rank[teams[k]][ranks[k]] = elo_1
+        if newSeason[k+1]:
             elo_2 = (elo_2*0.7) + (1505*0.3)
-            teamGame.loc[(teamGame['Team']==game_df['Team'].iloc[1]) & (teamGame['teamGameRankOverall']==game_df['teamGameRankOverall'].iloc[1]), 'Elo'] = elo_2
-        p_1 = 1/(10**((elo_2-elo_1)/400)+1)
-        p_2 = 1/(10**((elo_1-elo_2)/400)+1)
-        win_1 = game_df['Win'].iloc[0]
-        win_2 = game_df['Win'].iloc[1]
-        victoryMarginMultiplier_1 = 0.6686 * np.log(np.max([np.abs(game_df['Goals'].iloc[0]-game_df['Goals'].iloc[1]),1])) + 0.8048
-        victoryMarginMultiplier_2 = 0.6686 * np.log(np.max([np.abs(game_df['Goals'].iloc[1]-game_df['Goals'].iloc[0]),1])) + 0.8048
-        if elo_1>elo_2 and win_1==1:
-            autoAdjust_1 = 2.05/((elo_1-elo_2) * 0.001 + 2.05)
-            autoAdjust_2 = 1
-        elif elo_2>elo_1 and win_2==1:
-            autoAdjust_2 = 2.05/((elo_1-elo_2) * 0.001 + 2.05)
-            autoAdjust_1 = 1
-        else:
-            autoAdjust_1 = 1
-            autoAdjust_2 = 1
-        favMultiplier_1 = win_1 - p_1
-        favMultiplier_2 = win_2 - p_2
-        new_elo_1 = elo_1 + (6*victoryMarginMultiplier_1*autoAdjust_1*favMultiplier_1)
-        new_elo_2 = elo_2 + (6*victoryMarginMultiplier_2*autoAdjust_2*favMultiplier_2)
-        teamGame.loc[(teamGame['Team']==game_df['Team'].iloc[0]) & (teamGame['teamGameRankOverall']==game_df['teamGameRankOverall'].iloc[0]+1), 'Elo'] = new_elo_1
-        teamGame.loc[(teamGame['Team']==game_df['Team'].iloc[1]) & (teamGame['teamGameRankOverall']==game_df['teamGameRankOverall'].iloc[1]+1), 'Elo'] = new_elo_2
+            elo_by_rank[teams[k+1]][ranks[k+1]] = elo_2
+        new_elo_1, new_elo_2 = _elo_update(elo_1, elo_2, victoryMarginMultipliers[k], victoryMarginMultipliers[k+1], wins[k], wins[k+1])
+        elo_by_rank[teams[k]][ranks[k]+1] = new_elo_1
+        elo_by_rank[teams[k+1]][ranks[k+1]+1] = new_elo_2
+
+    return elo_by_rank
+
+def add_elo(teamGame, elo_ratings=None, ranked=False):
+    # add the elo rating going into each game, running through the games in order with a vector of ratings per team
+    # if elo_ratings is given (see get_elo_ratings), start from those and only run the games after them
+    # if ranked, teamGame only holds games after elo_ratings and already has their overall ranks, carried on from the
+    # teams' earlier games (see _continue_ranks)
+    teamGame['Game_Id_Unique'] = (teamGame['Season'].astype(str) + teamGame['Game_Id'].astype(str)).astype(int)
+    teamGame = teamGame.sort_values(by=['DateInt','Game_Id'])
+    if not ranked:
+        teamGame['teamGameRankOverall'] = teamGame.groupby('Team')['DateInt'].rank("dense")
+    teams, team_names = pd.factorize(teamGame['Team'])
+    ranks = teamGame['teamGameRankOverall'].values.astype(np.int64)
+    elo_by_rank = np.full((len(team_names), ranks.max()+2), 1500.)
+
+    # rows that already have a rating when resuming
+    new_rows = np.ones(len(teamGame.index), dtype=bool)
+    if elo_ratings is not None:
+        elo_ratings = pd.DataFrame({'Team':team_names}).merge(elo_ratings, on='Team', how='left')
+        resumed = elo_ratings['Elo'].notnull().values
+        resume_ranks = elo_ratings['teamGameRankOverall'].fillna(0).values.astype(np.int64)
+        elo_by_rank[np.flatnonzero(resumed), resume_ranks[resumed]] = elo_ratings.loc[resumed, 'Elo'].values
+        new_rows = ranks >= resume_ranks[teams]
+
+    # first two rows of each game that has a new row, in game order
+    games = pd.factorize(teamGame['Game_Id_Unique'])[0]
+    order = np.argsort(games, kind='stable')
+    game_start = np.searchsorted(games[order], games[order], 'left')
+    game_size = np.bincount(games)[games[order]]
+    run = np.zeros(games.max()+1 if len(games) else 0, dtype=bool)
+    run[games[new_rows]] = True
+    order = order[(np.arange(len(order))-game_start<2) & (game_size>=2) & run[games[order]]]
+
+    goals = teamGame['Goals'].values.astype(np.float64)[order]
+    victoryMarginMultipliers = 0.6686 * np.log(np.maximum(np.abs(goals - goals[np.arange(len(order))^1]),1)) + 0.8048
+    newSeason = (teamGame['teamGameRank'].values[order]==1) & (ranks[order]>1)
+    elo_by_rank = _run_elo(teams[order].tolist(), ranks[order].tolist(), newSeason.tolist(), victoryMarginMultipliers.tolist(),
+        teamGame['Win'].values.astype(np.float64)[order].tolist(), elo_by_rank.tolist())
+
+    elo = np.array(elo_by_rank)[teams, ranks]
+    if elo_ratings is None or 'Elo' not in teamGame.columns:
+        teamGame['Elo'] = elo
+    else:
+        teamGame['Elo'] = np.where(new_rows, elo, teamGame['Elo'].values)
 
     return teamGame.drop(columns='Game_Id_Unique')
 
-def aggregate_team_data(pbp, prev_teamGame, homeaway_adjustments='data/score_homeaway_adjustments.csv'):
+def get_elo_ratings(teamGame):
+    # each team's elo rating after its last game in teamGame, and the overall rank of the game it goes into, for resuming add_elo
+    teamGame = teamGame.sort_values(by=['DateInt','Game_Id'])
+    teamGame['teamGameRankOverall'] = teamGame.groupby('Team')['DateInt'].rank("dense")
+    teamGame['lastGame'] = teamGame['teamGameRankOverall']==teamGame.groupby('Team')['teamGameRankOverall'].transform('max')
+    teamGame['gameRow'] = teamGame.groupby(['Season','Game_Id']).cumcount()
+
+    # pair up the two teams in each game, in the same order add_elo runs them
+    games = teamGame.loc[teamGame['gameRow']==0, ['Season','Game_Id','Team','Goals','Win','Elo','teamGameRankOverall','lastGame']].merge(
+        teamGame.loc[teamGame['gameRow']==1, ['Season','Game_Id','Team','Goals','Win','Elo','teamGameRankOverall','lastGame']],
+        on=['Season','Game_Id'], suffixes=('_1','_2'))
+    games = games.loc[games['lastGame_1']|games['lastGame_2']]
+    victoryMarginMultiplier = 0.6686 * np.log(np.maximum(np.abs(games['Goals_1']-games['Goals_2']),1)) + 0.8048
+    new_elos = [_elo_update(elo_1, elo_2, m, m, win_1, win_2) for elo_1, elo_2, m, win_1, win_2 in \
+        zip(games['Elo_1'], games['Elo_2'], victoryMarginMultiplier, games['Win_1'].astype(np.float64), games['Win_2'].astype(np.float64))]
+    games['newElo_1'] = [e[0] for e in new_elos]
+    games['newElo_2'] = [e[1] for e in new_elos]
+
+    elo_ratings = pd.concat([
+        games.loc[games['lastGame_1'], ['Team_1','newElo_1','teamGameRankOverall_1']].set_axis(['Team','Elo','teamGameRankOverall'], axis=1),
+        games.loc[games['lastGame_2'], ['Team_2','newElo_2','teamGameRankOverall_2']].set_axis(['Team','Elo','teamGameRankOverall'], axis=1)
+    ], ignore_index=True)
+    elo_ratings['teamGameRankOverall'] = elo_ratings['teamGameRankOverall'] + 1
+    elo_ratings = elo_ratings.drop_duplicates(subset=['Team'], keep='last')
+
+    return elo_ratings.reset_index(drop=True)
+
+def _add_ranks_and_elo(teamGame, prev_teamGame=None, team_state=None):
+    # season and overall game ranks, the playoffs flag and elo ratings for new teamGame rows, either by reranking and
+    # rerunning add_elo over prev_teamGame and the new rows together, or by carrying on from team_state (see aggregate_team_data)
+    # only the new games, carrying on from the team state
+    if team_state is not None:
+        teamGame = teamGame.sort_values(by=['Date','Game_Id'])
+        teamGame['DateInt'] = teamGame['Date'].str.replace('-','').astype(np.int32)
+        teamGame = _continue_ranks(teamGame, team_state)
+        elo_ratings = team_state[['Team','Elo','teamGameRankOverall']].copy()
+        elo_ratings['teamGameRankOverall'] = elo_ratings['teamGameRankOverall'] + 1
+        teamGame = add_elo(teamGame, elo_ratings, ranked=True)
+        return teamGame
+
+    # add previous teamGame data, if it exists
+    if prev_teamGame is not None:
+        teamGame = pd.concat([prev_teamGame, teamGame], ignore_index=True)
+
+    # sort
+    teamGame = teamGame.sort_values(by=['Date','Game_Id'])
+
+    # add field for whether this is a playoff game or not
+    teamGame['DateInt'] = teamGame['Date'].str.replace('-','').astype(np.int32)
+    teamGame['teamGameRank'] = teamGame.groupby(['Team','Season'])['DateInt'].rank("dense")
+    teamGame['Playoffs'] = (teamGame['teamGameRank']>82).astype(np.int8)
+    teamGame.loc[(teamGame['Season']==2012)&(teamGame['teamGameRank']>48),'Playoffs'] = 1 #fix for the lockout-shortened season
+    teamGame.loc[(teamGame['Season']==2019)&(teamGame['Date']>'2020-03-12'),'Playoffs'] = 1 #fix for the first covid-shortened season
+    teamGame.loc[(teamGame['Season']==2020)&(teamGame['teamGameRank']>56),'Playoffs'] = 1 #fix for the second covid-shortened season
+
+    # add elo ratings
+    teamGame = add_elo(teamGame)
+
+    return teamGame
+
+def aggregate_team_data(pbp, prev_teamGame, homeaway_adjustments='data/score_homeaway_adjustments.csv', team_state=None):
+    # teamGame rows for the games in pbp, with prev_teamGame (all earlier games) reranked and rerun through add_elo along with them
+    # if team_state is given (see get_team_state), only the new rows are returned, with their ranks and elo ratings carried on
+    # from each team's state after its last game, and prev_teamGame isn't needed
+    # inputs should come from data_storage or add_xG_to_pbp, with the schema's dtypes
+    schema.check(pbp, 'pbp')
+    if prev_teamGame is not None:
+        schema.check(prev_teamGame, 'teamGame')
+
     # read adjustments data
     adjustments = pd.read_csv(homeaway_adjustments)
 
@@ -1102,8 +1059,10 @@ def aggregate_team_data(pbp, prev_teamGame, homeaway_adjustments='data/score_hom
     pbp['Penalties'] = ((pbp['Event']=='PENL')&(~(pbp['Type'].str.contains('Fight')).fillna(False))).astype(np.int16)
 
     # add adjusted metric
-    pbp['strength'] = pbp['Strength']
-    pbp.loc[pbp['Ev_Team']==pbp['Away_Team'], 'strength'] = pbp.loc[pbp['Ev_Team']==pbp['Away_Team'], 'strength'].str[::-1]
+    # the teams are categoricals, so they're compared as plain strings (see schema.py)
+    away_event = pbp['Ev_Team'].astype(object)==pbp['Away_Team'].astype(object)
+    pbp['strength'] = pbp['Strength'].astype(object)
+    pbp.loc[away_event, 'strength'] = pbp.loc[away_event, 'strength'].str[::-1]
     pbp.loc[pbp['strength'].isin(['5x4','5x3','4x3']), 'strength'] = 'PP'
     pbp.loc[pbp['Empty_Net'], 'strength'] = 'EN'
     pbp['period'] = pbp['Period']
@@ -1117,7 +1076,7 @@ def aggregate_team_data(pbp, prev_teamGame, homeaway_adjustments='data/score_hom
     pbp.loc[(pbp['scoreDiff']<-1)&(pbp['Strength']!='5x5'), 'scoreDiff'] = -1
     pbp.loc[(pbp['strength'].isin(['4x4','3x3']))&(pbp['scoreDiff']==0), 'period'] = 1
     pbp['homeAway'] = 'home'
-    pbp.loc[pbp['Ev_Team']==pbp['Away_Team'], 'homeAway'] = 'away'
+    pbp.loc[away_event, 'homeAway'] = 'away'
     pbp['Home'] = (pbp['homeAway']=='home').astype(np.int16)
     pbp = pbp.merge(adjustments, how='left', on=['strength', 'homeAway', 'scoreDiff', 'period'])
     pbp['GoalsAdjusted'] = pbp['Goals'] * pbp['goalsAdjustment'].fillna(1.0)
@@ -1140,7 +1099,7 @@ def aggregate_team_data(pbp, prev_teamGame, homeaway_adjustments='data/score_hom
     # create aggregate
     teamGame = pbp.groupby([
             'Game_Id','Date','Ev_Team','Season'
-        ]).agg({
+        ], observed=True).agg({
             'Goals' : 'sum',
             'Shootout_Goals' : 'sum',
             'Shots' : 'sum',
@@ -1169,7 +1128,11 @@ def aggregate_team_data(pbp, prev_teamGame, homeaway_adjustments='data/score_hom
             'Penalties' : 'sum',
             'Home' : 'max'
         }).reset_index()
+    # teamGame keeps its teams as plain strings. with observed=True, pandas doesn't sort a categorical key that's grouped on
+    # along with others, so the rows are sorted as they would be by plain strings
     teamGame = teamGame.rename(columns={'Ev_Team':'Team'})
+    teamGame['Team'] = teamGame['Team'].astype(object)
+    teamGame = teamGame.sort_values(by=['Game_Id','Date','Team','Season'], ignore_index=True)
     teamGame = teamGame.fillna(0)
 
     # add starting goalies
@@ -1195,28 +1158,49 @@ def aggregate_team_data(pbp, prev_teamGame, homeaway_adjustments='data/score_hom
     # fix a bug
     teamGame = teamGame.loc[teamGame['Team'].str.len()==3]
 
-    # add previous teamGame data, if it exists
-    if prev_teamGame is not None:
-        teamGame = pd.concat([prev_teamGame, teamGame], ignore_index=True)
-
-    # sort
-    teamGame = teamGame.sort_values(by=['Date','Game_Id'])
-
-    # add field for whether this is a playoff game or not
-    teamGame['DateInt'] = teamGame['Date'].str.replace('-','').astype(np.int64)
-    teamGame['teamGameRank'] = teamGame.groupby(['Team','Season'])['DateInt'].rank("dense")
-    teamGame['Playoffs'] = (teamGame['teamGameRank']>82).astype(np.int8)
-    teamGame.loc[(teamGame['Season']==2012)&(teamGame['teamGameRank']>48),'Playoffs'] = 1 #fix for the lockout-shortened season
-    teamGame.loc[(teamGame['Season']==2019)&(teamGame['Date']>'2020-03-12'),'Playoffs'] = 1 #fix for the first covid-shortened season
-    teamGame.loc[(teamGame['Season']==2020)&(teamGame['teamGameRank']>56),'Playoffs'] = 1 #fix for the second covid-shortened season
-
-    # add elo ratings
-    teamGame = add_elo(teamGame)
-
-    return teamGame
+    # add ranks, playoffs field and elo ratings
+    teamGame = _add_ranks_and_elo(teamGame, prev_teamGame, team_state)
+
+    return schema.apply(teamGame, 'teamGame')
+
+def get_team_state(teamGame):
+    # each team's state after its last game in teamGame: the game's date, season, and season and overall ranks, and the
+    # team's elo rating after it (as get_elo_ratings). add_scheduled_games starts the next games from this instead of
+    # running through all of teamGame, and update_data keeps it saved with teamGame (see data_storage.read_team_state)
+    if len(teamGame.index)==0:
+        return pd.DataFrame(columns=TEAM_STATE_COLUMNS)
+    last = teamGame.sort_values(by=['DateInt','Game_Id']).drop_duplicates(subset=['Team'], keep='last')
+    state = last[['Team','Date','Season','teamGameRank','teamGameRankOverall']].merge(get_elo_ratings(teamGame)[['Team','Elo']], on='Team', how='left')
+    return state[TEAM_STATE_COLUMNS].sort_values(by='Team', ignore_index=True)
+
+def update_team_state(team_state, teamGame):
+    # team_state with the teams that played in teamGame moved on to their last game in it
+    # teamGame has to have both teams' rows for each game, with the ranks and elo ratings from aggregate_team_data
+    new_state = get_team_state(teamGame)
+    if team_state is None or len(team_state.index)==0:
+        return new_state
+    return pd.concat([team_state.loc[~team_state['Team'].isin(new_state['Team'])], new_state], ignore_index=True).sort_values(by='Team', ignore_index=True)
+
+def _continue_ranks(df, team_state):
+    # season and overall game ranks, and the playoffs flag, for games after each team's state (see get_team_state): the
+    # ranks carry on from the team's last game, and the season rank starts over in a new season
+    last = df[['Team']].merge(team_state[['Team','Season','teamGameRank','teamGameRankOverall']], on='Team', how='left')
+    sameSeason = (last['Season']==df['Season'].values).values
+    df['teamGameRank'] = np.where(sameSeason, last['teamGameRank'].values, 0) + df.groupby(['Team','Season'])['DateInt'].rank("dense").values
+    df['teamGameRankOverall'] = last['teamGameRankOverall'].fillna(0).values + df.groupby('Team')['DateInt'].rank("dense").values
+
+    df['Playoffs'] = (df['teamGameRank']>82).astype(np.int8)
+    df.loc[(df['Season']==2012)&(df['teamGameRank']>48),'Playoffs'] = 1 #fix for the lockout-shortened season
+    df.loc[(df['Season']==2019)&(df['Date']>'2020-03-12'),'Playoffs'] = 1 #fix for the first covid-shortened season
+    df.loc[(df['Season']==2020)&(df['teamGameRank']>56),'Playoffs'] = 1 #fix for the second covid-shortened season
+    return df
 
-def add_scheduled_games(teamGame, schedule, season=2022):
+def add_scheduled_games(teamGame, schedule, season=2022, team_state=None):
     # adds scheduled games to end of teamGame, to create features for game predictions based on past games
+    # the scheduled games' ranks, playoffs flags and elo ratings come from each team's state after its last game before
+    # them (see get_team_state), so only the scheduled rows are computed. team_state is computed from teamGame if it isn't
+    # given, or if it includes games on or after the first scheduled date
+    # a team's elo rating isn't updated between its scheduled games, so every scheduled game gets the rating after its last game played
 
     # do some processing in schedule dataframe first
     home = schedule[['game_id','date','home_team']].copy()
@@ -1228,42 +1212,191 @@ def add_scheduled_games(teamGame, schedule, season=2022):
     schedule = pd.concat([home, away], ignore_index=True)
     schedule['Team'] = schedule['Team'].replace({'PHX':'ARI', 'S.J':'SJS', 'L.A':'LAK', 'T.B':'TBL', 'N.J':'NJD'})
     schedule['Season'] = int(season)
-    schedule['DateInt'] = schedule['Date'].str.replace('-','').astype(np.int64)
+    schedule['DateInt'] = schedule['Date'].str.replace('-','').astype(np.int32)
 
     # combine dataframes
     starting_goalies = teamGame[['Date','Team','StartingGoalie_Id']]
     schedule = schedule.merge(starting_goalies, how='left', on=['Date','Team'])
     teamGame = teamGame.loc[teamGame['Date']<(schedule['Date'].min())]
-    teamGame = pd.concat([teamGame, schedule], ignore_index=True)
-
-    # add playoffs column
-    teamGame['teamGameRank'] = teamGame.groupby(['Team','Season'])['DateInt'].rank("dense")
-    teamGame['Playoffs'] = (teamGame['teamGameRank']>82).astype(np.int8)
-    teamGame.loc[(teamGame['Season']==2012)&(teamGame['teamGameRank']>48),'Playoffs'] = 1 #fix for the lockout-shortened season
-    teamGame.loc[(teamGame['Season']==2019)&(teamGame['Date']>'2020-03-12'),'Playoffs'] = 1 #fix for the first covid-shortened season
-    teamGame.loc[(teamGame['Season']==2020)&(teamGame['teamGameRank']>56),'Playoffs'] = 1 #fix for the second covid-shortened season
+    if team_state is None or (len(team_state.index)>0 and team_state['Date'].max()>=schedule['Date'].min()):
+        team_state = get_team_state(teamGame)
 
-    # add elo ratings
-    teamGame = add_elo(teamGame)
+    # add ranks and playoffs column
+    schedule = _continue_ranks(schedule, team_state)
 
-    return teamGame
+    # add elo ratings, regressed to the mean for a team's first games of a new season
+    last = schedule[['Team']].merge(team_state[['Team','Season','Elo']], on='Team', how='left')
+    schedule['Elo'] = last['Elo'].fillna(1500.).values
+    newSeason = (last['Season'].notnull() & (last['Season']!=schedule['Season'].values)).values
+    schedule.loc[newSeason, 'Elo'] = (schedule.loc[newSeason, 'Elo']*0.7) + (1505*0.3)
 
-def _add_lag(df, cols, lag, groupCol):
-    new_cols = [col+'_last'+str(lag) for col in cols]
-    df[new_cols] = df.groupby(groupCol)[cols].transform(lambda x: x.rolling(window=lag).mean())
-    df[new_cols] = df.groupby(groupCol)[new_cols].shift(1)
+    teamGame = pd.concat([teamGame, schedule], ignore_index=True)
+    return teamGame.sort_values(by=['DateInt','Game_Id'])
+
+def _add_lags(df, cols, lags, groupCol, history=None):
+    # rolling averages of the last lag games before each game for every lag in lags, from cumulative sums over each group's
+    # games (played games only, so when several days of games are predicted, every scheduled game gets the averages as of the
+    # last game played)
+    # history is earlier rows for the same groups (see lag_history), so new games can be added without the rest of the data
+    data = df[[groupCol]+cols] if history is None else pd.concat([history[[groupCol]+cols], df[[groupCol]+cols]], ignore_index=True)
+    values = data[cols].values.astype(np.float64)
+    groups = pd.factorize(data[groupCol])[0]
+    played = ~np.isnan(values).all(axis=1)
+
+    # each group's rows as a contiguous block, in their original order, and the played rows of each block
+    order = np.argsort(groups, kind='stable')
+    groups_sorted = groups[order]
+    played_sorted = played[order]
+    played_rows = order[played_sorted]
+    played_groups = groups[played_rows]
+    played_pos = np.arange(len(played_rows)) - np.searchsorted(played_groups, played_groups, 'left')
+
+    # cumulative sums restart at each group, to keep them small, and a row of zeros at the end for windows that start a group
+    nans = np.isnan(values[played_rows])
+    sums = pd.DataFrame(np.where(nans, 0., values[played_rows])).groupby(played_groups).cumsum().values
+    sums = np.vstack([sums, np.zeros((1, len(cols)))])
+    nan_counts = np.vstack([np.zeros((1, len(cols)), dtype=np.int64), np.cumsum(nans, axis=0)])
+
+    # each row gets the averages as of the last game played before it in its group
+    last_played = np.concatenate([[-1], np.cumsum(played_sorted)[:-1]-1])
+    prev_group = np.concatenate([[-1], groups_sorted[:-1]])
+    valid = (prev_group==groups_sorted) & (groups_sorted>=0) & (last_played>=0)
+    valid[valid] = played_groups[last_played[valid]]==groups_sorted[valid]
+    last = np.where(valid, last_played, -1)
+    last_pos = np.append(played_pos, -1)[last]
+
+    for lag in lags:
+        full = last_pos>=lag-1
+        window_sums = sums[last] - sums[np.where(last_pos>=lag, last-lag, -1)]
+        window_nans = nan_counts[last+1] - nan_counts[np.maximum(last+1-lag, 0)]
+        means = np.where(full[:,None] & (window_nans==0), window_sums/lag, np.nan)
+        lagged = np.empty_like(means)
+        lagged[order] = means
+        df[[col+'_last'+str(lag) for col in cols]] = lagged[len(data.index)-len(df.index):]
 
     return df
 
-def add_game_features(teamGame, playerGame, preseason_config_team_file='configs/preseason_config_team.json',
-        tanh_inseason_coefs_team_file='configs/tanh_inseason_coefs_team.json'):
-    # adds features needed for game predictions
-
-    # read configs
-    with open(preseason_config_team_file) as f:
-        preseason_config_team = json.load(f)
-    with open(tanh_inseason_coefs_team_file) as f:
-        tanh_inseason_coefs_team = json.load(f)
+def lag_history(df, cols, lags, groupCol):
+    # the rows of df that _add_lags needs to carry on each group's rolling averages: from the max(lags)-th last game played on
+    played = df[cols].notnull().any(axis=1)
+    remaining = played[::-1].groupby(df[groupCol][::-1]).cumsum()[::-1]
+    return df.loc[remaining<=max(lags), [groupCol]+cols]
+
+ROSTER_STATS = ['sum','median','max','std']
+
+def _segment_stats(group, values, n_groups):
+    # sum, median, max and standard deviation of values in each group (0..n_groups-1), skipping NaNs like a pandas groupby:
+    # the sum of a group with no values is 0, the rest are NaN, and groups with no rows at all are NaN for everything
+    # rows must be sorted by group and then value (NaNs last, as np.lexsort leaves them), so each group is a contiguous
+    # segment and its max and median are read off by position
+    valid = ~np.isnan(values)
+    rows = np.bincount(group, minlength=n_groups)
+    count = np.bincount(group, weights=valid, minlength=n_groups).astype(np.int64)
+    start = np.cumsum(rows) - rows
+    values0 = np.where(valid, values, 0)
+    total = np.bincount(group, weights=values0, minlength=n_groups)
+
+    stats = np.full((n_groups, 4), np.nan)
+    has_rows = rows>0
+    has_values = count>0
+    stats[has_rows,0] = total[has_rows]
+    last = np.where(has_values, start+count-1, 0)
+    stats[has_values,2] = values[last[has_values]]
+    lo = np.where(has_values, start+(count-1)//2, 0)
+    hi = np.where(has_values, start+count//2, 0)
+    stats[has_values,1] = (values[lo[has_values]] + values[hi[has_values]])/2
+    mean = total/np.maximum(count, 1)
+    squares = np.bincount(group, weights=np.where(valid, values-mean[group], 0)**2, minlength=n_groups)
+    has_std = count>1
+    stats[has_std,3] = np.sqrt(squares[has_std]/(count[has_std]-1))
+    return stats
+
+def _dense_rank_desc(segment, values):
+    # dense rank of values within each segment, highest first (like groupby().rank("dense", ascending=False)), NaN for NaNs
+    order = np.lexsort((-values, segment))
+    segment = segment[order]
+    sorted_values = values[order]
+    new_segment = np.r_[True, segment[1:]!=segment[:-1]]
+    new_value = new_segment | np.r_[True, sorted_values[1:]!=sorted_values[:-1]]
+    steps = np.cumsum(new_value)
+    rank = steps - steps[np.flatnonzero(new_segment)[np.cumsum(new_segment)-1]] + 1
+    ranks = np.empty(len(values))
+    ranks[order] = np.where(np.isnan(sorted_values), np.nan, rank)
+    return ranks
+
+def _roster_features(playerGame):
+    # team sums, medians, maxes and standard deviations of the player projections for each Date and Team: skaters (F and D),
+    # the top power play unit (top 6 F and top 2 D by xGC60_PP), the top penalty kill unit (top 4 F by xGP60_PK, and top 4 D
+    # by xGC60_PP as the games model was trained with), forwards and defencemen
+    # every set of players is a mask over the same skater rows, so each value is sorted once by (Date, Team, value) and
+    # the sets are taken from the sorted rows
+    skaters = playerGame.loc[playerGame['Position'].isin(['F','D']), ['Date','Team','Position','xGC60_5v5','xGP60_5v5','xGI60_Pens','xGC60_PP','xGP60_PK']]
+    keys = skaters.groupby(['Date','Team'], sort=True).ngroup().values.astype(np.int64)
+    features = skaters[['Date','Team']].drop_duplicates().sort_values(by=['Date','Team'], ignore_index=True)
+    n_groups = len(features.index)
+
+    forward = (skaters['Position']=='F').values
+    segment = keys*2 + forward
+    pp_rank = _dense_rank_desc(segment, skaters['xGC60_PP'].values.astype(np.float64))
+    pk_rank = _dense_rank_desc(segment, skaters['xGP60_PK'].values.astype(np.float64))
+    top_pp = (forward & (pp_rank<=6)) | (~forward & (pp_rank<=2))
+    top_pk = (forward & (pk_rank<=4)) | (~forward & (pp_rank<=4))
+
+    subsets = [
+        ('', np.ones(len(keys), dtype=bool), ['xGC60_5v5','xGP60_5v5','xGI60_Pens']),
+        ('', top_pp, ['xGC60_PP']),
+        ('', top_pk, ['xGP60_PK']),
+        ('_F', forward, ['xGC60_5v5','xGP60_5v5','xGI60_Pens']),
+        ('_D', ~forward, ['xGC60_5v5','xGP60_5v5','xGI60_Pens']),
+    ]
+    stats = {}
+    for c in ['xGC60_5v5','xGP60_5v5','xGI60_Pens','xGC60_PP','xGP60_PK']:
+        values = skaters[c].values.astype(np.float64)
+        order = np.lexsort((values, keys))
+        for suffix, mask, cols in subsets:
+            if c in cols:
+                in_subset = mask[order]
+                stats[c+suffix] = _segment_stats(keys[order][in_subset], values[order][in_subset], n_groups)
+
+    # columns in the order the games model was trained with
+    columns = {}
+    for suffix, mask, cols in subsets:
+        for c in cols:
+            for i, stat in enumerate(ROSTER_STATS):
+                columns[c+suffix+'_'+stat] = stats[c+suffix][:,i]
+    return pd.concat([features, pd.DataFrame(columns)], axis=1)
+
+def _opponent_rows(games_df):
+    # positions of the rows that have an opponent row in the same game (the row whose Team is this row's Opp), and of
+    # those opponent rows, in the order an inner self-join on the game would give them
+    # each team has one row per game, so this is a single lookup of integer (game, team) keys; if a team has more than
+    # one, the pairs come from merging the keys alone, which repeats rows the same way the self-join would
+    game = games_df.groupby(['Game_Id','Date','Season'], sort=False).ngroup().values.astype(np.int64)
+    codes, uniques = pd.factorize(np.concatenate([games_df['Team'].values, games_df['Opp'].values]), use_na_sentinel=False)
+    team_key = game*len(uniques) + codes[:len(game)]
+    opp_key = game*len(uniques) + codes[len(game):]
+    teams = pd.Index(team_key)
+    if teams.is_unique:
+        opp_rows = teams.get_indexer(opp_key)
+        rows = np.flatnonzero(opp_rows>=0)
+        return rows, opp_rows[rows]
+    pairs = pd.DataFrame({'key':opp_key, 'row':np.arange(len(game))}).merge(pd.DataFrame({'key':team_key, 'opp_row':np.arange(len(game))}), on='key')
+    return pairs['row'].values, pairs['opp_row'].values
+
+def _add_opponent_columns(games_df, cols):
+    # add the opposing team's cols in the same game as Opp_ columns, dropping rows with no opponent row
+    # the opponent rows are gathered by position with one take over the block of cols, instead of a self-join
+    rows, opp_rows = _opponent_rows(games_df)
+    opp = games_df[cols].take(opp_rows)
+    opp.columns = ['Opp_'+c for c in cols]
+    if not np.array_equal(rows, np.arange(len(games_df.index))):
+        games_df = games_df.take(rows)
+    return pd.concat([games_df.reset_index(drop=True), opp.reset_index(drop=True)], axis=1)
+
+def project_players(playerGame):
+    # each player's projected impacts going into their game: their preseason ratings (rookies get the average rookie's) for
+    # their team's first game of the season, and from then on their in-season ratings weighted against their preseason
+    # ratings by how many games the team has played. PlayerGameNum has to be set to the team's game number in the season
 
     # add rookie preseason ratings
     playerGame.loc[(playerGame['Position']=='F')&(playerGame['preseason_xGC60_5v5'].isnull()), 'preseason_xGC60_5v5'] = 0.0179
@@ -1279,7 +1412,6 @@ def add_game_features(teamGame, playerGame, preseason_config_team_file='configs/
     playerGame.loc[(playerGame['Position']=='G')&(playerGame['preseason_xGI60'].isnull()), 'preseason_xGI60'] = -0.0147
 
     # fill first games of season with preseason expectations
-    playerGame['PlayerGameNum'] = playerGame.groupby(['Team','Season'])['DateInt'].rank("dense")
     playerGame.loc[playerGame['PlayerGameNum']==1, 'xGC60_5v5'] = playerGame.loc[playerGame['PlayerGameNum']==1, 'preseason_xGC60_5v5']
     playerGame.loc[playerGame['PlayerGameNum']==1, 'xGP60_5v5'] = playerGame.loc[playerGame['PlayerGameNum']==1, 'preseason_xGP60_5v5']
     playerGame.loc[playerGame['PlayerGameNum']==1, 'xGC60_PP'] = playerGame.loc[playerGame['PlayerGameNum']==1, 'preseason_xGC60_PP']
@@ -1347,56 +1479,12 @@ def add_game_features(teamGame, playerGame, preseason_config_team_file='configs/
         + ((1 - np.tanh((playerGame.loc[(playerGame['Position']=='G')&(playerGame['PlayerGameNum']>1)&(~playerGame['prevGames_GI60'].isnull()), 'PlayerGameNum']-1)/39)) \
         * playerGame.loc[(playerGame['Position']=='G')&(playerGame['PlayerGameNum']>1)&(~playerGame['prevGames_GI60'].isnull()), 'preseason_xGI60'])
 
-    # aggregate individual player projections into team features
-    playerTeamGame = playerGame.loc[playerGame['Position'].isin(['F','D'])].groupby(['Date','Team']).agg({
-        'xGC60_5v5' : ['sum','median','max','std'],
-        'xGP60_5v5' : ['sum','median','max','std'],
-        'xGI60_Pens' : ['sum','median','max','std']
-    }).reset_index()
-    playerTeamGame.columns = ['Date','Team','xGC60_5v5_sum','xGC60_5v5_median','xGC60_5v5_max','xGC60_5v5_std',
-                              'xGP60_5v5_sum','xGP60_5v5_median','xGP60_5v5_max','xGP60_5v5_std',
-                              'xGI60_Pens_sum','xGI60_Pens_median','xGI60_Pens_max','xGI60_Pens_std'
-                              ]
-    games_df = teamGame.merge(playerTeamGame, on=['Date','Team'], how='left')
-
-    playerGame['PP_Rank'] = playerGame.groupby(['Date','Team','Position'])['xGC60_PP'].rank("dense", ascending=False)
-    playerGame['PK_Rank'] = playerGame.groupby(['Date','Team','Position'])['xGP60_PK'].rank("dense", ascending=False)
-
-    playerTeamGame = playerGame.loc[((playerGame['Position']=='F')&(playerGame['PP_Rank']<=6))|\
-        ((playerGame['Position']=='D')&(playerGame['PP_Rank']<=2))].groupby(['Date','Team']).agg({
-        'xGC60_PP' : ['sum','median','max','std']
-    }).reset_index()
-    playerTeamGame.columns = ['Date','Team','xGC60_PP_sum','xGC60_PP_median','xGC60_PP_max','xGC60_PP_std']
-    games_df = games_df.merge(playerTeamGame, on=['Date','Team'], how='left')
-
-    playerTeamGame = playerGame.loc[((playerGame['Position']=='F')&(playerGame['PK_Rank']<=4))|\
-        ((playerGame['Position']=='D')&(playerGame['PP_Rank']<=4))].groupby(['Date','Team']).agg({
-        'xGP60_PK' : ['sum','median','max','std']
-    }).reset_index()
-    playerTeamGame.columns = ['Date','Team','xGP60_PK_sum','xGP60_PK_median','xGP60_PK_max','xGP60_PK_std']
-    games_df = games_df.merge(playerTeamGame, on=['Date','Team'], how='left')
+    return playerGame
 
-    playerTeamGame = playerGame.loc[playerGame['Position']=='F'].groupby(['Date','Team']).agg({
-        'xGC60_5v5' : ['sum','median','max','std'],
-        'xGP60_5v5' : ['sum','median','max','std'],
-        'xGI60_Pens' : ['sum','median','max','std']
-    }).reset_index()
-    playerTeamGame.columns = ['Date','Team','xGC60_5v5_F_sum','xGC60_5v5_F_median','xGC60_5v5_F_max','xGC60_5v5_F_std',
-                              'xGP60_5v5_F_sum','xGP60_5v5_F_median','xGP60_5v5_F_max','xGP60_5v5_F_std',
-                              'xGI60_Pens_F_sum','xGI60_Pens_F_median','xGI60_Pens_F_max','xGI60_Pens_F_std'
-                              ]
-    games_df = games_df.merge(playerTeamGame, on=['Date','Team'], how='left')
-
-    playerTeamGame = playerGame.loc[playerGame['Position']=='D'].groupby(['Date','Team']).agg({
-        'xGC60_5v5' : ['sum','median','max','std'],
-        'xGP60_5v5' : ['sum','median','max','std'],
-        'xGI60_Pens' : ['sum','median','max','std']
-    }).reset_index()
-    playerTeamGame.columns = ['Date','Team','xGC60_5v5_D_sum','xGC60_5v5_D_median','xGC60_5v5_D_max','xGC60_5v5_D_std',
-                              'xGP60_5v5_D_sum','xGP60_5v5_D_median','xGP60_5v5_D_max','xGP60_5v5_D_std',
-                              'xGI60_Pens_D_sum','xGI60_Pens_D_median','xGI60_Pens_D_max','xGI60_Pens_D_std'
-                              ]
-    games_df = games_df.merge(playerTeamGame, on=['Date','Team'], how='left')
+def add_roster_features(teamGame, playerGame):
+    # teamGame with its players' projections (see project_players) aggregated into team features for each Date and Team:
+    # the roster features (see _roster_features) and the starting goalie's projection
+    games_df = teamGame.merge(_roster_features(playerGame), on=['Date','Team'], how='left')
 
     playerTeamGame = playerGame.loc[playerGame['Position']=='G'].groupby(['Date','Team','PlayerID']).agg({
         'xGI60' : ['mean']
@@ -1404,6 +1492,33 @@ def add_game_features(teamGame, playerGame, preseason_config_team_file='configs/
     playerTeamGame.columns = ['Date','Team','StartingGoalie_Id','Goalie_xGI60']
     games_df['StartingGoalie_Id'] = games_df['StartingGoalie_Id'].astype(int)
     games_df = games_df.merge(playerTeamGame, on=['Date','Team','StartingGoalie_Id'], how='left')
+    return games_df
+
+def add_roster_diffs(games_df):
+    # differences between the team's and the opponent's summed player projections
+    games_df['GI_5v5_Off_Diff'] = games_df['xGC60_5v5_sum'] - games_df['Opp_xGP60_5v5_sum']
+    games_df['GI_5v5_Def_Diff'] = games_df['xGP60_5v5_sum'] - games_df['Opp_xGC60_5v5_sum']
+    games_df['GI_5v5_Diff'] = games_df['GI_5v5_Off_Diff'] + games_df['GI_5v5_Def_Diff']
+    games_df['GI_PP_Diff'] = games_df['xGC60_PP_sum'] - games_df['Opp_xGP60_PK_sum']
+    games_df['GI_PK_Diff'] = games_df['xGP60_PK_sum'] - games_df['Opp_xGC60_PP_sum']
+    return games_df
+
+def add_game_features(teamGame, playerGame, preseason_config_team_file='configs/preseason_config_team.json',
+        tanh_inseason_coefs_team_file='configs/tanh_inseason_coefs_team.json'):
+    # adds features needed for game predictions
+
+    # read configs
+    with open(preseason_config_team_file) as f:
+        preseason_config_team = json.load(f)
+    with open(tanh_inseason_coefs_team_file) as f:
+        tanh_inseason_coefs_team = json.load(f)
+
+    # project player impacts, with the first games of season filled with preseason expectations
+    playerGame['PlayerGameNum'] = playerGame.groupby(['Team','Season'])['DateInt'].rank("dense")
+    playerGame = project_players(playerGame)
+
+    # aggregate individual player projections into team features
+    games_df = add_roster_features(teamGame, playerGame)
 
     # add some lag features (rolling averages of past games)
     metrics = ['Goals','Shots','ShotAttempts','UnblockedShotAttempts','xG','xG_flurry',
@@ -1411,22 +1526,14 @@ def add_game_features(teamGame, playerGame, preseason_config_team_file='configs/
                'GoalsAdjusted','ShotsAdjusted','ShotAttemptsAdjusted','UnblockedShotAttemptsAdjusted','xGAdjusted','xG_flurryAdjusted',
                'GoalsAdjusted_5v5','ShotsAdjusted_5v5','ShotAttemptsAdjusted_5v5','UnblockedShotAttemptsAdjusted_5v5','xGAdjusted_5v5','xG_flurryAdjusted_5v5']
     games_df = games_df.loc[games_df['Season']>=playerGame['Season'].max()-2]
-    games_df = _add_lag(games_df, metrics, 8, 'Team')
-    games_df = _add_lag(games_df, metrics, 16, 'Team')
-    games_df = _add_lag(games_df, metrics, 32, 'Team')
-    games_df = _add_lag(games_df, metrics, 64, 'Team')
+    games_df = _add_lags(games_df, metrics, [8,16,32,64], 'Team')
 
     # do a self-join to get features for the opposing team
     games_df['LastGame'] = games_df.groupby('Team')['Date'].shift(1)
     games_df['RestDays'] = (pd.to_datetime(games_df['Date']) - pd.to_datetime(games_df['LastGame']))/np.timedelta64(1,'D')
     games_df['BackToBack'] = (games_df['RestDays']==1).astype(np.int16)
-    games_df_opp = games_df.copy()
-    games_df_opp = games_df_opp.drop(columns=['Win','DateInt','Playoffs','Home','teamGameRankOverall','teamGameRank','StartingGoalie','StartingGoalie_Id','Opp'])
-    for c in games_df_opp.columns.tolist():
-        if c not in ['Game_Id','Date','Team','Season','Opp']:
-            games_df_opp = games_df_opp.rename(columns = {c : 'Opp_'+c})
-    games_df_opp = games_df_opp.rename(columns = {'Team' : 'Opp'})
-    games_df = games_df.merge(games_df_opp, on=['Game_Id','Date','Season','Opp'])
+    games_df = _add_opponent_columns(games_df, [c for c in games_df.columns.tolist() if c not in ['Game_Id','Date','Team','Season','Opp',
+        'Win','DateInt','Playoffs','Home','teamGameRankOverall','teamGameRank','StartingGoalie','StartingGoalie_Id']])
     games_df['EloDiff'] = games_df['Elo'] - games_df['Opp_Elo']
     games_df['EloDiff_538adj'] = (games_df['Elo'] - games_df['Opp_Elo'] + (games_df['Home']*50) + ((games_df['Home']-1)*50))*(games_df['Playoffs']*0.25+1)
 
@@ -1453,41 +1560,26 @@ def add_game_features(teamGame, playerGame, preseason_config_team_file='configs/
             'Opp_UnblockedShotAttemptsAdjusted','Opp_xGAdjusted','Opp_xG_flurryAdjusted',
         'Opp_GoalsAdjusted_5v5','Opp_ShotsAdjusted_5v5','Opp_ShotAttemptsAdjusted_5v5',
             'Opp_UnblockedShotAttemptsAdjusted_5v5','Opp_xGAdjusted_5v5','Opp_xG_flurryAdjusted_5v5']
-    games_df = _add_lag(games_df, metrics, 8, 'Team')
-    games_df = _add_lag(games_df, metrics, 16, 'Team')
-    games_df = _add_lag(games_df, metrics, 32, 'Team')
-    games_df = _add_lag(games_df, metrics, 64, 'Team')
+    games_df = _add_lags(games_df, metrics, [8,16,32,64], 'Team')
     # rename columns for clarity
-    for m in metrics:
-        games_df = games_df.rename(columns = {m+'_last8' : m[4:]+'Against_last8',
-            m+'_last16' : m[4:]+'Against_last16', m+'_last32' : m[4:]+'Against_last32', m+'_last64' : m[4:]+'Against_last64'})
+    games_df = games_df.rename(columns = {m+'_last'+str(lag) : m[4:]+'Against_last'+str(lag) for m in metrics for lag in [8,16,32,64]})
 
     # filter for only this season
     games_df = games_df.loc[games_df['Season']==playerGame['Season'].max()]
 
     # do a second self-join to get final features for the opposing team
-    games_df_opp = games_df.copy()
-    keep_cols = ['Game_Id','Date','Team','Season','xGoals','xShots','xShotAttempts','xUnblockedShotAttempts','xxG','xxG_flurry',
+    keep_cols = ['xGoals','xShots','xShotAttempts','xUnblockedShotAttempts','xxG','xxG_flurry',
         'xGoalsAgainst','xShotsAgainst','xShotAttemptsAgainst','xUnblockedShotAttemptsAgainst','xxGAgainst','xxG_flurryAgainst']
     last8_cols = [c[4:]+'Against_last8' for c in metrics]
     last16_cols = [c[4:]+'Against_last16' for c in metrics]
     last32_cols = [c[4:]+'Against_last32' for c in metrics]
     last64_cols = [c[4:]+'Against_last64' for c in metrics]
     keep_cols = keep_cols + last8_cols + last16_cols + last32_cols + last64_cols
-    games_df_opp = games_df_opp[keep_cols]
-    for c in games_df_opp.columns.tolist():
-        if c not in ['Game_Id','Date','Team','Season']:
-            games_df_opp = games_df_opp.rename(columns = {c : 'Opp_'+c})
-    games_df_opp = games_df_opp.rename(columns = {'Team' : 'Opp'})
-    games_df = games_df.merge(games_df_opp, on=['Game_Id','Date','Season','Opp'])
+    games_df = _add_opponent_columns(games_df, keep_cols)
 
     # home games only, and some final feature calculation
     games_df = games_df.loc[(games_df['Home']==1)&(games_df['Playoffs']==0)]
     games_df = games_df.loc[games_df['Season']>=2015]
-    games_df['GI_5v5_Off_Diff'] = games_df['xGC60_5v5_sum'] - games_df['Opp_xGP60_5v5_sum']
-    games_df['GI_5v5_Def_Diff'] = games_df['xGP60_5v5_sum'] - games_df['Opp_xGC60_5v5_sum']
-    games_df['GI_5v5_Diff'] = games_df['GI_5v5_Off_Diff'] + games_df['GI_5v5_Def_Diff']
-    games_df['GI_PP_Diff'] = games_df['xGC60_PP_sum'] - games_df['Opp_xGP60_PK_sum']
-    games_df['GI_PK_Diff'] = games_df['xGP60_PK_sum'] - games_df['Opp_xGC60_PP_sum']
+    games_df = add_roster_diffs(games_df)
 
     return games_df
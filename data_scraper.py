@@ -1,56 +1,170 @@
 import hockey_scraper
+import data_storage
+import data_processing
 import pandas as pd
 import os
+import pickle
 import datetime
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date, timedelta
 
-def scrape_dates(start_date=None, end_date=None, pbp_data_file='data/pbp_2022.pkl', shifts_data_file='data/shifts_2022.pkl', season_start='2022-10-07', replace=False):
+class ReplayScraper(object):
+    # stand-in for hockey_scraper that replays saved schedules and games instead of making requests, for running offline
+    # fixtures_dir has the same layout as the scrape_dates cache, so a cache from a real run can be replayed
+    def __init__(self, fixtures_dir):
+        self.fixtures_dir = fixtures_dir
+
+    def scrape_schedule(self, date_from, date_to):
+        days = pd.date_range(date_from, date_to).strftime('%Y-%m-%d')
+        return pd.concat([pd.read_pickle(os.path.join(self.fixtures_dir, 'schedule_{}.pkl'.format(d))) for d in days], ignore_index=True)
+
+    def scrape_games(self, games, if_scrape_shifts, data_format='Pandas'):
+        scraped = [pd.read_pickle(os.path.join(self.fixtures_dir, 'game_{}.pkl'.format(g))) for g in games]
+        return {'pbp':pd.concat([s['pbp'] for s in scraped], ignore_index=True), 'shifts':pd.concat([s['shifts'] for s in scraped], ignore_index=True)}
+
+def _cacheable(day):
+    # a day's schedule and games can still change until the day is over, so only days before today are cached
+    return day < date.today().strftime('%Y-%m-%d')
+
+def _scrape_day_schedule(day, scraper, cache_dir):
+    # schedule for one day, from the cache if it has been scraped before
+    cache_file = os.path.join(cache_dir, 'schedule_{}.pkl'.format(day))
+    if _cacheable(day) and os.path.isfile(cache_file):
+        return pd.read_pickle(cache_file)
+    schedule = scraper.scrape_schedule(day, day)
+    if _cacheable(day):
+        schedule.to_pickle(cache_file)
+    return schedule
+
+def _scrape_game(game_id, day, scraper, cache_dir):
+    # pbp and shifts for one game on day, from the cache if it has been scraped before. failed scrapes aren't cached
+    cache_file = os.path.join(cache_dir, 'game_{}.pkl'.format(game_id))
+    if _cacheable(day) and os.path.isfile(cache_file):
+        return pd.read_pickle(cache_file)
+    scrape_dict = scraper.scrape_games([game_id], True, data_format='Pandas')
+    if scrape_dict is None or scrape_dict['pbp'] is None or scrape_dict['pbp'].empty:
+        raise ValueError('no data scraped for game {}'.format(game_id))
+    game = {'pbp':scrape_dict['pbp'], 'shifts':scrape_dict['shifts']}
+    if _cacheable(day):
+        pickle.dump(game, open(cache_file, 'wb'))
+    return game
+
+def _finished_games(schedule):
+    # full game ids of the finished regular season and playoff games in a schedule. hockey_scraper.scrape_schedule also lists
+    # preseason games and ones that are postponed or not over yet, which scrape_date_range leaves out
+    games = schedule.dropna(subset=['game_id'])
+    game_ids = games['game_id'].astype('int64')
+    short_ids = game_ids.astype(str).str[5:].astype('int64')
+    return game_ids.loc[(short_ids>=20000)&(short_ids<40000)&(games['status']=='OFF')].tolist()
+
+def _try_day_schedule(day, scraper, cache_dir):
+    # _scrape_day_schedule and None, or None and the exception it raised, so one failed day doesn't stop the others
+    try:
+        return _scrape_day_schedule(day, scraper, cache_dir), None
+    except Exception as e:
+        return None, e
+
+def scrape_games_parallel(start_date, end_date, skip_games=[], scraper=hockey_scraper, cache_dir='data/cache', workers=8):
+    # scrape pbp and shifts for all games between start_date and end_date (inclusive), one game per job on a pool of workers
+    # each past day's schedule and game is cached in cache_dir by date and game id, so retries and re-runs don't refetch them
+    # skip_games are the (short) Game_Ids that are already stored, matching the Game_Id column in pbp
+    # days whose schedule fails and games that fail are printed and left out, and the days they're on are returned in 'failed'
+    # only finished regular season and playoff games are scraped (see _finished_games)
+    os.makedirs(cache_dir, exist_ok=True)
+    days = pd.date_range(start_date, end_date).strftime('%Y-%m-%d').tolist()
+    skip_games = set(skip_games)
+    failed = set()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        game_days = {}
+        for day, (schedule, e) in zip(days, executor.map(lambda d: _try_day_schedule(d, scraper, cache_dir), days)):
+            if e is not None:
+                print ('failed to scrape schedule for {}: {}'.format(day, e))
+                failed.add(day)
+                continue
+            for g in _finished_games(schedule):
+                if g not in game_days and int(str(g)[5:]) not in skip_games:
+                    game_days[g] = day
+        jobs = [(g, day, executor.submit(_scrape_game, g, day, scraper, cache_dir)) for g, day in game_days.items()]
+
+    # combine in schedule order
+    pbp = []
+    shifts = []
+    for g, day, job in jobs:
+        try:
+            game = job.result()
+        except Exception as e:
+            print ('failed to scrape game {}: {}'.format(g, e))
+            failed.add(day)
+            continue
+        pbp.append(game['pbp'])
+        shifts.append(game['shifts'])
+    if len(pbp)==0:
+        return {'pbp':pd.DataFrame(), 'shifts':pd.DataFrame(), 'failed':sorted(failed)}
+
+    return {'pbp':pd.concat(pbp, ignore_index=True), 'shifts':pd.concat(shifts, ignore_index=True), 'failed':sorted(failed)}
+
+def _stored_games(season, data_dir='data'):
+    # Season, Game_Id and Date of the games in the season that have both pbp and shifts stored
+    manifest = data_storage.read_manifest('pbp', data_dir)
+    manifest = manifest.loc[manifest['Season']==int(season)]
+    return manifest.merge(data_storage.read_manifest('shifts', data_dir)[['Season','Game_Id']].drop_duplicates(), on=['Season','Game_Id'])
+
+def scrape_dates(start_date=None, end_date=None, season=2022, data_dir='data', season_start='2022-10-07', replace=False,
+    scraper=hockey_scraper, cache_dir=None, workers=8):
     # start_date and end_date specify the date range to scrape data for
     # if start_date and end_date are None, data will be scraped that is after any existing data (or the beginning of the season if there is none), up to yesterday
-    # pbp_data_file and shifts_data_file specify where data should be saved (assumed to be .pkl files)
+    # data is saved to the pbp and shifts datasets in data_dir (see data_storage.py), partitioned by season and date
     # season_start is a string (YYYY-MM-DD format) with the first date of games for the current NHL season
-    # replace will replace any data in the data files with the newly scraped data, if the files exist. if replace=False, new data will be appended
-    # if the files do not exist yet, or are empty, then the replace parameter is meaningless
-
-    # read existing pbp data for this season, if it exists
-    if os.path.isfile(pbp_data_file):
-        df_pbp = pd.read_pickle(pbp_data_file)
-    else:
-        replace = True
+    # replace will replace any data for this season with the newly scraped data. if replace=False, the scraped games are appended
+    # as a new chunk, skipping any games that are already stored, so scraping the same dates again is harmless
+    # if there is no data for this season yet, then the replace parameter is meaningless
+    # scraper, cache_dir (data_dir/cache by default) and workers are passed to scrape_games_parallel. use ReplayScraper as the scraper to run offline
+    if cache_dir is None:
+        cache_dir = os.path.join(data_dir, 'cache')
 
     # set start date to be one day after any existing data, or the beginning of the season if there is no existing data
+    # a game only counts as stored once both its pbp and its shifts are, so a game missing either is scraped again
+    manifest = _stored_games(season, data_dir)
     if start_date is None:
-        if df_pbp.empty or replace:
+        if replace or manifest.empty:
             start_date = season_start
             replace = True
         else:
-            start_date = (datetime.datetime.srtptime(df_pbp['Date'].max(), '%Y-%m-%d') + timedelta(days=1)).strftime('%Y-%m-%d')
+            start_date = (datetime.datetime.strptime(manifest['Date'].max(), '%Y-%m-%d') + timedelta(days=1)).strftime('%Y-%m-%d')
 
     # if end_date is not given, set it to yesterday
     if end_date is None:
         end_date = (date.today() - timedelta(days=1)).strftime('%Y-%m-%d')
 
-    # scrape data
-    scrape_dict = hockey_scraper.scrape_date_range(start_date, end_date, True, data_format='Pandas')
+    # scrape data, skipping games that are already stored unless replacing the season
+    skip_games = [] if replace else manifest['Game_Id'].tolist()
+    scrape_dict = scrape_games_parallel(start_date, end_date, skip_games, scraper, cache_dir, workers)
 
     # get dataframes
     df_pbp_new = scrape_dict['pbp']
     df_shifts_new = scrape_dict['shifts']
+    failed = scrape_dict['failed']
     del scrape_dict #save some memory
 
-    # append to existing data, if it exists. then output data to files
+    # games from the first day with a failure on aren't stored, so the next run starts from that day again
+    # (the games scraped after it are cached, so they aren't fetched twice)
+    if len(failed)>0 and not df_pbp_new.empty:
+        print ('not storing games from {} on, run again to retry'.format(failed[0]))
+        kept = df_pbp_new.loc[df_pbp_new['Date'].astype(str)<failed[0], 'Game_Id'].astype('int64').unique()
+        df_pbp_new = df_pbp_new.loc[df_pbp_new['Game_Id'].astype('int64').isin(kept)]
+        df_shifts_new = df_shifts_new.loc[df_shifts_new['Game_Id'].astype('int64').isin(kept)]
+    if df_pbp_new.empty:
+        return
+
+    # output data. appends only write files for the new games, so the cost doesn't grow over the season
     if replace:
-        df_pbp_new.to_pickle(pbp_data_file)
-        df_shifts_new.to_pickle(shifts_data_file)
+        # shot features cached from the old pbp would be stale
+        data_processing.clear_shot_features(season, os.path.join(data_dir, 'shotFeatures'))
+        data_storage.write_data(df_pbp_new, 'pbp', season, replace=True, data_dir=data_dir)
+        data_storage.write_data(df_shifts_new, 'shifts', season, replace=True, data_dir=data_dir)
     else:
-        df_pbp = pd.concat([df_pbp, df_pbp_new], ignore_index=True)
-        del df_pbp_new
-        df_pbp.to_pickle(pbp_data_file)
-        del df_pbp
-
-        df_shifts = pd.read_pickle(shifts_data_file)
-        df_shifts = pd.concat([df_shifts, df_shifts_new], ignore_index=True)
-        df_shifts.to_pickle(shifts_data_file)
+        data_storage.append_data(df_pbp_new, 'pbp', season, data_dir=data_dir)
+        data_storage.append_data(df_shifts_new, 'shifts', season, data_dir=data_dir)
 
 def scrape_schedule(start_date=date.today().strftime('%Y-%m-%d'), end_date=date.today().strftime('%Y-%m-%d')):
     # get today's games by default, can get schedule for other dates between start_date and end_date, inclusive
@@ -0,0 +1,228 @@
+import argparse
+import glob
+import os
+import re
+import shutil
+import time
+import uuid
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+import schema
+
+# datasets are stored as parquet under data_dir/<name>/season=<season>/date=<YYYY-MM-DD>/, so readers only open the
+# partitions for the seasons and dates they ask for, and a new day of data is written as new partitions instead of
+# rewriting the whole season. the partition keys are kept separate from the data's own Season and Date columns
+# (toiOverlap has neither) and aren't returned by read_data
+# each dataset also keeps a manifest (_manifest.csv) of the Season, Game_Id and Date of every game it has, so appends
+# can skip games that are already stored without reading the data
+# data is cast to the dataset's compact dtypes (schema.py) when it's written and again when it's read, so files written
+# before the schema existed (with int64/float64 columns) read back the same as new ones
+
+DATASETS = ['pbp','shifts','playerGame','toiOverlap','teamGame']
+PARTITIONING = ds.partitioning(pa.schema([('season', pa.int64()), ('date', pa.string())]), flavor='hive')
+
+def _date_str(d):
+    # dates can be given as 'YYYY-MM-DD' strings, or as date/datetime objects
+    return pd.Timestamp(d).strftime('%Y-%m-%d')
+
+def _filter(season=None, start_date=None, end_date=None):
+    # partition filter for the given season(s) and date range (inclusive)
+    conditions = []
+    if season is not None:
+        seasons = [int(s) for s in season] if isinstance(season, (list, tuple)) else [int(season)]
+        conditions.append(ds.field('season').isin(seasons))
+    if start_date is not None:
+        conditions.append(ds.field('date')>=_date_str(start_date))
+    if end_date is not None:
+        conditions.append(ds.field('date')<=_date_str(end_date))
+    expr = None
+    for c in conditions:
+        expr = c if expr is None else expr & c
+    return expr
+
+def has_data(name, season=None, data_dir='data'):
+    # whether there is any data stored for the dataset (and season, if given)
+    path = os.path.join(data_dir, name)
+    if not os.path.isdir(path):
+        return False
+    if season is None:
+        return len(glob.glob(os.path.join(path, 'season=*', 'date=*', '*.parquet')))>0
+    return len(glob.glob(os.path.join(path, 'season={}'.format(int(season)), 'date=*', '*.parquet')))>0
+
+def read_data(name, season=None, columns=None, start_date=None, end_date=None, data_dir='data'):
+    # read a dataset into a dataframe, only opening the partitions for the given season(s) and dates (inclusive)
+    # columns limits which columns are read from the files; an empty dataframe is returned if there is no matching data
+    if not has_data(name, None, data_dir):
+        return pd.DataFrame(columns=columns)
+    dataset = ds.dataset(os.path.join(data_dir, name), format='parquet', partitioning=PARTITIONING)
+    expr = _filter(season, start_date, end_date)
+    fragments = list(dataset.get_fragments(filter=expr))
+    if len(fragments)==0:
+        return pd.DataFrame(columns=columns)
+
+    # a column that's all null in one day's partition is written with a null type, and files written before the schema
+    # existed have wider types than newer ones, so unify the file schemas
+    file_schema = pa.unify_schemas([f.physical_schema for f in fragments], promote_options='permissive')
+    if columns is None:
+        columns = [c for c in file_schema.names if c not in ['season','date']]
+    file_schema = pa.unify_schemas([file_schema, PARTITIONING.schema])
+    dataset = ds.dataset([f.path for f in fragments], schema=file_schema, format='parquet', partitioning=PARTITIONING,
+        partition_base_dir=os.path.join(data_dir, name))
+
+    return schema.apply(dataset.to_table(columns=columns).to_pandas(), name)
+
+def read_files(paths, columns=None, filter=None):
+    # read a list of parquet files into one dataframe, in the order given. filter is a pyarrow.dataset expression for the rows to read
+    file_schema = pa.unify_schemas([pq.read_schema(p) for p in paths], promote_options='permissive')
+    return ds.dataset(paths, schema=file_schema, format='parquet').to_table(columns=columns, filter=filter).to_pandas()
+
+def _manifest_file(name, data_dir='data'):
+    return os.path.join(data_dir, name, '_manifest.csv')
+
+def read_manifest(name, data_dir='data'):
+    # Season, Game_Id and Date of the games stored in a dataset
+    if not os.path.isfile(_manifest_file(name, data_dir)):
+        return pd.DataFrame({'Season':pd.Series(dtype='int64'), 'Game_Id':pd.Series(dtype='int64'), 'Date':pd.Series(dtype='object')})
+    return pd.read_csv(_manifest_file(name, data_dir), dtype={'Season':'int64', 'Game_Id':'int64', 'Date':'object'})
+
+def _team_state_file(data_dir='data'):
+    return os.path.join(data_dir, 'teamGame', '_team_state.csv')
+
+def read_team_state(data_dir='data'):
+    # each team's state after its last stored game (see data_processing.get_team_state), or None if it hasn't been saved
+    if not os.path.isfile(_team_state_file(data_dir)):
+        return None
+    return pd.read_csv(_team_state_file(data_dir), dtype={'Team':'object', 'Date':'object'})
+
+def write_team_state(team_state, data_dir='data'):
+    # the team state is kept alongside the teamGame manifest, so it's removed along with the dataset
+    os.makedirs(os.path.join(data_dir, 'teamGame'), exist_ok=True)
+    team_state.to_csv(_team_state_file(data_dir), index=False)
+
+def _games(partitions, df):
+    # manifest rows for the games in df
+    if 'Game_Id' not in df.columns:
+        return None
+    games = pd.DataFrame({'Season':partitions['season'].values, 'Game_Id':df['Game_Id'].astype('int64').values, 'Date':partitions['date'].values})
+    return games.drop_duplicates(subset=['Season','Game_Id'])
+
+def _partitions(df, season=None, game_dates=None):
+    # season and date partition keys for each row in df, and df with any Date column from game_dates removed
+    if game_dates is not None and 'Date' not in df.columns:
+        df = df.merge(game_dates[['Game_Id','Date']].drop_duplicates(subset=['Game_Id']), on='Game_Id', how='left')
+        date = df.pop('Date')
+    else:
+        date = df['Date']
+    partitions = pd.DataFrame({
+        'season':df['Season'].astype('int64').values if 'Season' in df.columns else int(season),
+        'date':date.map(_date_str).values,
+    })
+    return df, partitions
+
+def _to_table(df, partitions):
+    # categoricals are written as plain strings, so new files unify with the ones written before they were categoricals
+    # (parquet dictionary-encodes them anyway), and read_data makes them categoricals again
+    df = df.copy(deep=False)
+    for c in [c for c in df.columns if df[c].dtype.name=='category']:
+        df[c] = df[c].astype(object)
+    table = pa.Table.from_pandas(df.reset_index(drop=True), preserve_index=False)
+    table = table.append_column('season', pa.array(partitions['season'].values, pa.int64()))
+    return table.append_column('date', pa.array(partitions['date'].values, pa.string()))
+
+def delete_data(name, season, data_dir='data', start_date=None):
+    # delete all data for a season from a dataset, or only the dates from start_date on if it's given
+    path = os.path.join(data_dir, name)
+    if start_date is None:
+        shutil.rmtree(os.path.join(path, 'season={}'.format(int(season))), ignore_errors=True)
+    else:
+        for p in glob.glob(os.path.join(path, 'season={}'.format(int(season)), 'date=*')):
+            if os.path.basename(p)[len('date='):]>=_date_str(start_date):
+                shutil.rmtree(p, ignore_errors=True)
+    if os.path.isfile(_manifest_file(name, data_dir)):
+        manifest = read_manifest(name, data_dir)
+        deleted = manifest['Season']==int(season)
+        if start_date is not None:
+            deleted = deleted & (manifest['Date']>=_date_str(start_date))
+        manifest.loc[~deleted].to_csv(_manifest_file(name, data_dir), index=False)
+
+def write_data(df, name, season=None, game_dates=None, replace=False, data_dir='data'):
+    # write a dataframe to a dataset, partitioned by season and date. any existing partitions for the dates in df are
+    # replaced and all other partitions are left alone, so writing a new day only writes files for that day
+    # season is used if df has no Season column, and game_dates (Game_Id and Date) if df has no Date column
+    # replace=True deletes all existing data for the seasons in df first
+    path = os.path.join(data_dir, name)
+    df, partitions = _partitions(schema.apply(df.copy(deep=False), name), season, game_dates)
+    if replace:
+        for s in partitions['season'].unique():
+            delete_data(name, s, data_dir)
+    if len(df.index)==0:
+        return
+
+    ds.write_dataset(_to_table(df, partitions), path, format='parquet', partitioning=PARTITIONING, existing_data_behavior='delete_matching',
+        basename_template='part-{i}.parquet', max_partitions=10000)
+
+    # the date partitions written over are replaced in the manifest too
+    games = _games(partitions, df)
+    if games is not None:
+        manifest = read_manifest(name, data_dir)
+        written = manifest[['Season','Date']].merge(partitions.drop_duplicates().rename(columns={'season':'Season','date':'Date'}), how='left', indicator=True)
+        manifest = pd.concat([manifest.loc[(written['_merge']=='left_only').values], games], ignore_index=True)
+        manifest.to_csv(_manifest_file(name, data_dir), index=False)
+
+def append_data(df, name, season=None, game_dates=None, data_dir='data'):
+    # append a dataframe to a dataset as a new chunk of files, without touching any existing files
+    # games already in the dataset's manifest are skipped, so appending the same games again does nothing
+    # returns the rows that were appended
+    path = os.path.join(data_dir, name)
+    df, partitions = _partitions(schema.apply(df.copy(deep=False), name), season, game_dates)
+    if 'Game_Id' in df.columns:
+        manifest = read_manifest(name, data_dir)
+        new_rows = ~pd.MultiIndex.from_arrays([partitions['season'].values, df['Game_Id'].astype('int64').values]).isin(
+            pd.MultiIndex.from_frame(manifest[['Season','Game_Id']]))
+        df = df.loc[new_rows]
+        partitions = partitions.loc[new_rows]
+    games = _games(partitions, df)
+    if len(df.index)==0:
+        return df
+
+    # chunk files are named uniquely so they sit alongside earlier chunks in the same date partition
+    chunk = 'chunk-{}-{}'.format(time.strftime('%Y%m%d'), uuid.uuid4().hex)
+    ds.write_dataset(_to_table(df, partitions), path, format='parquet', partitioning=PARTITIONING, existing_data_behavior='overwrite_or_ignore',
+        basename_template=chunk+'-{i}.parquet', max_partitions=10000)
+
+    # the manifest is only appended to
+    if games is not None:
+        games.to_csv(_manifest_file(name, data_dir), mode='a', index=False, header=not os.path.isfile(_manifest_file(name, data_dir)))
+
+    return df
+
+def migrate(data_dir='data', remove=False):
+    # one-off conversion of the season pickles (pbp_2022.pkl, etc.) and teamGame.pkl to parquet datasets
+    # toiOverlap has no Date column, so its partitions come from the same season's playerGame
+    for name in DATASETS:
+        if name=='teamGame':
+            files = [(os.path.join(data_dir, 'teamGame.pkl'), None)]
+        else:
+            files = [(f, int(re.search(r'_(\d{4})\.pkl$', f).group(1))) for f in sorted(glob.glob(os.path.join(data_dir, '{}_*.pkl'.format(name))))
+                if re.search(r'_(\d{4})\.pkl$', f)]
+        for f, season in files:
+            if not os.path.isfile(f):
+                continue
+            df = pd.read_pickle(f)
+            game_dates = None
+            if name=='toiOverlap':
+                game_dates = read_data('playerGame', season, ['Game_Id','Date'], data_dir=data_dir)
+            write_data(df, name, season, game_dates, replace=True, data_dir=data_dir)
+            print ('migrated {} ({} rows)'.format(f, len(df.index)))
+            if remove:
+                os.remove(f)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-data_dir', required=False, default='data', help='Directory with the pickle files, where the parquet datasets will be written')
+    parser.add_argument('--remove', help='Deletes each pickle file after it is migrated if flag is included', action='store_true')
+    args = parser.parse_args()
+
+    migrate(data_dir=args.data_dir, remove=args.remove)
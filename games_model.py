@@ -3,6 +3,7 @@
 import pickle
 import os
 import json
+import model_registry
 import pandas as pd
 from sklearn.linear_model import LogisticRegression
 from sklearn.preprocessing import StandardScaler
@@ -18,29 +19,14 @@ class games_model(object):
         self.scaler_file = scaler_file or os.path.join(scriptdir, 'models/', games_config['scaler_file'])
         self.model_file = model_file or os.path.join(scriptdir, 'models/', games_config['model_file'])
 
+    def load(self):
+        # scaler and model, each only unpickled once per process (see model_registry.py)
+        return model_registry.load(self.scaler_file), model_registry.load(self.model_file)
+
     def predict(self, df):
         # makes game predictions for games in the provided dataframe
-
-        # filter for only home regular season games
-        if 'Home' in df.columns:
-            df = df.loc[df['Home']==1]
-        if 'Playoffs' in df.columns:
-            df = df.loc[df['Playoffs']==0]
-
-        # create input feature array
-        df = df.dropna(subset=games_config['features'])
-        X = df[games_config['features']].values
-        scaler = pickle.load(open(self.scaler_file, 'rb'))
-        X = scaler.transform(X)
-
-        # make predictions
-        model = pickle.load(open(self.model_file, 'rb'))
-        preds = model.predict_proba(X)[:,1]
-
-        df = df[['Date','Team','Opp','Win']]
-        df['winProba'] = preds
-
-        return df
+        scaler, model = self.load()
+        return predict_games(df, scaler, model)
 
     def train(self, min_season=2015, max_season=2020, df=None):
         # retrains games model
@@ -51,21 +37,51 @@ class games_model(object):
             for season in range(min_season+1, max_season+1):
                 df = pd.concat([df, pd.read_csv('data/gameTrain_{}.csv'.format(str(season)))], ignore_index=True)
 
-        df = df.dropna(subset=games_config['features'])
-        X = df[games_config['features']].values
-        y = df['Win'].values
+        X, y = train_arrays(df)
         del df
 
-        # apply scaler
-        scaler = StandardScaler()
-        X = scaler.fit_transform(X)
+        scaler, model = fit(X, y)
         pickle.dump(scaler, open(self.scaler_file, 'wb'))
-
-        model = LogisticRegression(max_iter=10000)
-        model.fit(X, y)
         pickle.dump(model, open(self.model_file, 'wb'))
 
-        preds = model.predict_proba(X)[:,1]
+        preds = model.predict_proba(scaler.transform(X))[:,1]
         print ('Number of games: {}'.format(str(X.shape[0])))
         print ('LogLoss score on train set: {}'.format(str(log_loss(y, preds))))
         print ('AUC score on train set: {}'.format(str(roc_auc_score(y, preds))))
+
+def train_arrays(df, features=None):
+    # input features and target for training on the games in df (games missing any feature are skipped)
+    features = features or games_config['features']
+    df = df.dropna(subset=features)
+    return df[features].values, df['Win'].values
+
+def fit(X, y):
+    # fits the scaler and model, without saving them, so they can be trained in-process (see backtest.py)
+    scaler = StandardScaler()
+    X = scaler.fit_transform(X)
+    model = LogisticRegression(max_iter=10000)
+    model.fit(X, y)
+    return scaler, model
+
+def predict_games(df, scaler, model, features=None):
+    # game predictions for the home regular season games in df, from the given scaler and model
+    features = features or games_config['features']
+
+    # filter for only home regular season games
+    if 'Home' in df.columns:
+        df = df.loc[df['Home']==1]
+    if 'Playoffs' in df.columns:
+        df = df.loc[df['Playoffs']==0]
+
+    # create input feature array
+    df = df.dropna(subset=features)
+    X = df[features].values
+    X = scaler.transform(X)
+
+    # make predictions
+    preds = model.predict_proba(X)[:,1]
+
+    df = df[['Date','Team','Opp','Win']]
+    df['winProba'] = preds
+
+    return df
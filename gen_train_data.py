@@ -1,4 +1,5 @@
 import data_processing
+import data_storage
 import inseason_ratings
 import games_model
 import argparse
@@ -12,19 +13,13 @@ from update_preseason_ratings import PreseasonRatingsUpdater
 # compare to lines
 
 def main(season=2021,
-        teamGame_file='data/teamGame.pkl', playerGame_file=None, toiOverlap_file=None,
+        data_dir='data',
         preseason_teams_file='data/ratings_preseason_teams.csv',
         preseason_players_file='data/ratings_preseason_players.csv',
         lines_file = 'data/lines.csv'):
-    # determine data filenames if not given
-    if playerGame_file is None:
-        playerGame_file = 'data/playerGame_{}.pkl'.format(str(season))
-    if toiOverlap_file is None:
-        toiOverlap_file = 'data/toiOverlap_{}.pkl'.format(str(season))
-
     # read teamGame and playerGame data
-    teamGame = pd.read_pickle(teamGame_file)
-    playerGame = pd.read_pickle(playerGame_file)
+    teamGame = data_storage.read_data('teamGame', data_dir=data_dir)
+    playerGame = data_storage.read_data('playerGame', season, data_dir=data_dir)
 
     # only include regular season games
     teamGame = teamGame.loc[teamGame['Playoffs']==0]
@@ -49,8 +44,9 @@ def main(season=2021,
     # add inseason ratings
     start_date = date(season, 10, 1)
     end_date = date(season+1, 9, 30)
-    playerGame = inseason_ratings.add_player_inseason_ratings(playerGame, pd.read_pickle(toiOverlap_file), start_date, end_date)
-    teamGame = inseason_ratings.add_team_inseason_ratings(teamGame, start_date, end_date)
+    playerGame = inseason_ratings.add_player_inseason_ratings(playerGame, data_storage.read_data('toiOverlap', season, data_dir=data_dir), start_date, end_date,
+        data_dir=data_dir)
+    teamGame = inseason_ratings.add_team_inseason_ratings(teamGame, start_date, end_date, data_dir=data_dir)
     print ('preseason ratings added!')
 
     # calculate features for games model
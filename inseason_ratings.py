@@ -1,11 +1,575 @@
+import data_storage
 import pandas as pd
 import numpy as np
 import os
 import gc
+import shutil
+from scipy import sparse
 from sklearn.linear_model import LinearRegression
 
-def add_player_inseason_ratings(playerGame, toiOverlap, start_date, end_date):
-    # add impact from previous games so far in the season to playerGame
+# ratings going into a date only depend on the games before it, so once a date's ratings are computed they can be kept in a
+# snapshot store instead of being recomputed from the season start every run. the stores are data_storage datasets
+# (playerRatings and teamRatings, partitioned by season and date), and _snapshots.csv in each lists the dates that are saved
+
+PLAYER_RATINGS_COLUMNS = ['Player','PlayerID','Position','prevGames_TOI_5v5','prevGames_GC60_5v5','prevGames_GP60_5v5',
+    'prevGames_TOI_PP','prevGames_GC60_PP','prevGames_TOI_PK','prevGames_GP60_PK','prevGames_TOI','prevGames_GI60_Pens','prevGames_GI60',
+    'Date','Season']
+SNAPSHOT_DATASETS = ['playerRatings','teamRatings']
+
+def _snapshot_file(name, data_dir='data'):
+    return os.path.join(data_dir, name, '_snapshots.csv')
+
+def read_snapshot_dates(name, season, data_dir='data'):
+    # dates with ratings saved in a snapshot store for the season
+    if not os.path.isfile(_snapshot_file(name, data_dir)):
+        return []
+    snapshots = pd.read_csv(_snapshot_file(name, data_dir), dtype={'Season':'int64', 'Date':'object'})
+    return sorted(snapshots.loc[snapshots['Season']==int(season), 'Date'].unique().tolist())
+
+def clear_snapshots(season=None, start_date=None, data_dir='data'):
+    # delete saved ratings for the season (all seasons if None) from start_date on (the whole season if None),
+    # for when the games they were computed from are rewritten
+    for name in SNAPSHOT_DATASETS:
+        if season is None:
+            shutil.rmtree(os.path.join(data_dir, name), ignore_errors=True)
+            continue
+        data_storage.delete_data(name, season, data_dir, start_date)
+        if os.path.isfile(_snapshot_file(name, data_dir)):
+            snapshots = pd.read_csv(_snapshot_file(name, data_dir), dtype={'Season':'int64', 'Date':'object'})
+            deleted = snapshots['Season']==int(season)
+            if start_date is not None:
+                deleted = deleted & (snapshots['Date']>=pd.Timestamp(start_date).strftime('%Y-%m-%d'))
+            snapshots.loc[~deleted].to_csv(_snapshot_file(name, data_dir), index=False)
+
+def _snapshot_ratings(name, compute, columns, season, start_date, end_date, final_date, data_dir='data'):
+    # ratings from start_date to end_date, read from the snapshot store up to the first date that isn't saved, and computed
+    # with compute(first_date, last_date) from there. computed dates are only saved up to final_date (the last date with
+    # games played), since the ratings for later dates can still change as more games are added
+    dates = pd.date_range(start_date, end_date).strftime('%Y-%m-%d').tolist()
+    saved = set(read_snapshot_dates(name, season, data_dir))
+    missing = [d for d in dates if d not in saved]
+
+    ratings = []
+    if len(missing)==0 or missing[0]>dates[0]:
+        read_end = dates[-1] if len(missing)==0 else (pd.Timestamp(missing[0]) - pd.Timedelta(days=1)).strftime('%Y-%m-%d')
+        ratings.append(data_storage.read_data(name, season, columns, dates[0], read_end, data_dir))
+    if len(missing)>0:
+        computed = compute(missing[0], dates[-1])[columns]
+        computed['Date'] = computed['Date'].astype(str)
+        ratings.append(computed)
+
+        # save the dates that are final
+        new_dates = [d for d in dates if d>=missing[0] and isinstance(final_date, str) and d<=final_date]
+        if len(new_dates)>0:
+            data_storage.write_data(computed.loc[computed['Date'].isin(new_dates)&(computed['Season']==int(season))], name, season, data_dir=data_dir)
+            snapshots = pd.DataFrame({'Season':int(season), 'Date':new_dates})
+            snapshots.to_csv(_snapshot_file(name, data_dir), mode='a', index=False, header=not os.path.isfile(_snapshot_file(name, data_dir)))
+
+    return pd.concat(ratings, ignore_index=True)
+
+def _sum_player_games(xGs_temp):
+    # sum stats from each player's games
+    xGs_temp = xGs_temp.drop(columns=['Playoffs','DateInt','Season','Playoffs','PlayerGameID','Team','Date','Game_Id'])
+    return xGs_temp.fillna(0).groupby(['Player','PlayerID','Position'], as_index=False).sum()
+
+def _sum_overlap(ratings_temp):
+    # sum time on ice together for each pair of players, at 5v5, PP and PK
+    ratings_PP = ratings_temp.loc[ratings_temp['Strength'].isin(['5x4','5x3','4x3'])]
+    ratings_PP = ratings_PP[['Player','PlayerID','Player_y','Player_Id_y','SameTeam','Overlap']]
+    ratings_PP = ratings_PP.groupby(['Player','PlayerID','Player_y','Player_Id_y','SameTeam'], as_index=False).sum()
+
+    ratings_PK = ratings_temp.loc[ratings_temp['Strength'].isin(['4x5','3x5','3x4'])]
+    ratings_PK = ratings_PK[['Player','PlayerID','Player_y','Player_Id_y','SameTeam','Overlap']]
+    ratings_PK = ratings_PK.groupby(['Player','PlayerID','Player_y','Player_Id_y','SameTeam'], as_index=False).sum()
+
+    ratings_temp = ratings_temp.loc[ratings_temp['Strength']=='5x5']
+    ratings_temp = ratings_temp[['Player','PlayerID','Player_y','Player_Id_y','SameTeam','Overlap']]
+    ratings_temp = ratings_temp.groupby(['Player','PlayerID','Player_y','Player_Id_y','SameTeam'], as_index=False).sum()
+
+    return ratings_temp, ratings_PP, ratings_PK
+
+def overlap_matrices(ratings, players):
+    # one strength's summed time on ice together (Player, PlayerID, Player_y, Player_Id_y, SameTeam, Overlap) as two sparse
+    # players x players CSR matrices of overlap seconds, teammates and opponents, with rows and columns in the order of players.
+    # pairs with a player who isn't in players are dropped, as the inner merges with the player totals did. pairs that were on
+    # the ice together for 0 seconds are kept as explicit zeros, since they still count as a pair (see pair_metric_sums)
+    # a player with more than one row in players (listed at two positions) has each pair repeated for every one of their rows
+    codes, keys = pd.MultiIndex.from_frame(players[['Player','PlayerID']]).factorize()
+    counts = np.bincount(codes, minlength=len(keys))
+    order = np.argsort(codes, kind='stable')
+    starts = np.cumsum(counts) - counts
+    key_x = keys.get_indexer(pd.MultiIndex.from_arrays([ratings['Player'], ratings['PlayerID']]))
+    key_y = keys.get_indexer(pd.MultiIndex.from_arrays([ratings['Player_y'], ratings['Player_Id_y']]))
+    found = (key_x>=0)&(key_y>=0)
+    key_x, key_y = key_x[found], key_y[found]
+    same_team = ratings['SameTeam'].values.astype(bool)[found]
+    overlap = ratings['Overlap'].values.astype(np.float64)[found]
+
+    # every pair of rows of the two players, in order of the players' rows (one pair per pair of players without duplicates)
+    repeats = counts[key_x]*counts[key_y]
+    pair = np.repeat(np.arange(len(key_x)), repeats)
+    j = np.arange(len(pair)) - np.repeat(np.cumsum(repeats)-repeats, repeats)
+    rows = order[starts[key_x[pair]] + j//counts[key_y[pair]]]
+    cols = order[starts[key_y[pair]] + j%counts[key_y[pair]]]
+    same_team, overlap = same_team[pair], overlap[pair]
+    shape = (len(players.index), len(players.index))
+    return tuple(sparse.csr_matrix((overlap[side], (rows[side], cols[side])), shape=shape) for side in [same_team, ~same_team])
+
+def pair_metric_sums(ratings, overlaps, players, position, toi, sums, by, agg, special_teams=None):
+    # one row per player at position with their own columns and the teammate and competition sums of each other player's
+    # metric weighted by time on ice together, as agg (an aggregation of the pairs merged with the players' columns) names them
+    # sums maps each summed column to (metric, whether it's over teammates, number of skaters); every other column in agg is
+    # the player's own (with an _x suffix). goalies are left out of the sums, and players with no pairs left are dropped
+    # special_teams is (team toi, competition toi) for PP and PK, where only pairs with overlap, the player with time at that
+    # strength, teammates with time at the team toi and opponents with time at the competition toi count
+    # overlaps come from overlap_matrices(ratings, players); each sum is one sparse product with the metric
+    skater = (players['Position']!='G').values
+    player = (players['Position']==position).values
+    counted = [skater, skater]
+    pairs = [m.copy() for m in overlaps]
+    if special_teams is None:
+        # every pair counts, including ones with no time together
+        for m in pairs:
+            m.data = np.ones_like(m.data)
+    else:
+        player = player&(players[toi].values>0)
+        counted = [skater&(players[special_teams[0]].values>0), skater&(players[special_teams[1]].values>0)]
+        for m in pairs:
+            m.data = (m.data>0).astype(np.float64)
+    player = player&((pairs[0]@counted[0] + pairs[1]@counted[1])>0)
+
+    # keys typed as the merge on the pairs would leave them
+    player_sums = players.loc[player, ['Player','PlayerID','Position']].rename(columns={'Position':'Position_x'})
+    player_sums['PlayerID'] = player_sums['PlayerID'].astype(ratings['PlayerID'].dtype)
+    for c in agg:
+        if c in sums:
+            metric, same_team, n = sums[c]
+            side = 0 if same_team else 1
+            weighted = overlaps[side]@(players[metric].fillna(0).values*counted[side])
+            player_sums[c] = weighted[player]/(players.loc[player, toi].values*n)
+        else:
+            player_sums[c] = players.loc[player, c[:-2]].values
+    player_sums = player_sums.dropna(subset=by).sort_values(by=by)
+    return player_sums[by+list(agg)].reset_index(drop=True)
+
+def _player_ratings_on_date(xGs_temp, ratings_temp, ratings_PP, ratings_PK, i, season):
+    # ratings for each player on date i, from their season totals (xGs_temp) and time on ice with each other player (ratings_*) before that date
+
+    #compute mean metrics
+    metric_mean_F_O = 3600*(
+        .163*xGs_temp.loc[xGs_temp['Position']=='F', 'Goals_5v5_onice'].sum()
+        + .185*.091286*xGs_temp.loc[xGs_temp['Position']=='F', 'ShotsAdjusted_5v5_onice'].sum()
+        + .262*xGs_temp.loc[xGs_temp['Position']=='F', 'xG_flurry_5v5_onice'].sum()
+        )/(xGs_temp.loc[xGs_temp['Position']=='F', 'TOI_5v5'].sum() * (.163+.185+.262))
+    metric_mean_D_O = 3600*(
+        .064*xGs_temp.loc[xGs_temp['Position']=='D', 'GoalsAdjusted_5v5_onice'].sum()
+        + .132*.049399*xGs_temp.loc[xGs_temp['Position']=='D', 'ShotAttemptsAdjusted_5v5_onice'].sum()
+        + .160*xGs_temp.loc[xGs_temp['Position']=='D', 'xG_5v5_onice'].sum()
+        )/(xGs_temp.loc[xGs_temp['Position']=='D', 'TOI_5v5'].sum() * (.064+.132+.160))
+    metric_mean_F_D = 3600*(
+        .031*xGs_temp.loc[xGs_temp['Position']=='F', 'GoalsAgainst_5v5_onice'].sum()
+        + .140*.065956*xGs_temp.loc[xGs_temp['Position']=='F', 'UnblockedShotAttemptsAdjustedAgainst_5v5_onice'].sum()
+        + .175*xGs_temp.loc[xGs_temp['Position']=='F', 'xG_flurryAdjustedAgainst_5v5_onice'].sum()
+        )/(xGs_temp.loc[xGs_temp['Position']=='F', 'TOI_5v5'].sum() * (.031+.140+.175))
+    metric_mean_D_D = 3600*(
+        .041*xGs_temp.loc[xGs_temp['Position']=='D', 'GoalsAgainst_5v5_onice'].sum()
+        + .172*.065956*xGs_temp.loc[xGs_temp['Position']=='D', 'UnblockedShotAttemptsAdjustedAgainst_5v5_onice'].sum()
+        + .216*xGs_temp.loc[xGs_temp['Position']=='D', 'xGAdjustedAgainst_5v5_onice'].sum()
+        )/(xGs_temp.loc[xGs_temp['Position']=='D', 'TOI_5v5'].sum() * (.041+.172+.216))
+    metric_mean_F_PP = 3600*(
+        .154*xGs_temp.loc[xGs_temp['Position']=='F', 'GoalsAdjusted_PP_onice'].sum()
+        + .268*.065956*xGs_temp.loc[xGs_temp['Position']=='F', 'UnblockedShotAttempts_PP_onice'].sum()
+        + .293*xGs_temp.loc[xGs_temp['Position']=='F', 'xG_flurry_PP_onice'].sum()
+        )/(xGs_temp.loc[xGs_temp['Position']=='F', 'TOI_PP'].sum() * (.154+.268+.293))
+    metric_mean_D_PP = 3600*(
+        .104*xGs_temp.loc[xGs_temp['Position']=='D', 'GoalsAdjusted_PP_onice'].sum()
+        + .249*.065956*xGs_temp.loc[xGs_temp['Position']=='D', 'UnblockedShotAttempts_PP_onice'].sum()
+        + .215*xGs_temp.loc[xGs_temp['Position']=='D', 'xG_flurry_PP_onice'].sum()
+        )/(xGs_temp.loc[xGs_temp['Position']=='D', 'TOI_PP'].sum() * (.104+.249+.215))
+    metric_mean_F_PK = 3600*(
+        .019*xGs_temp.loc[xGs_temp['Position']=='F', 'GoalsAdjustedAgainst_PK_onice'].sum()
+        + .155*.049399*xGs_temp.loc[xGs_temp['Position']=='F', 'ShotAttemptsAgainst_PK_onice'].sum()
+        + .097*xGs_temp.loc[xGs_temp['Position']=='F', 'xG_flurryAdjustedAgainst_PK_onice'].sum()
+        )/(xGs_temp.loc[xGs_temp['Position']=='F', 'TOI_PK'].sum() * (.019+.155+.097))
+    metric_mean_D_PK = 3600*(
+        .017*xGs_temp.loc[xGs_temp['Position']=='D', 'GoalsAgainst_PK_onice'].sum()
+        + .166*.049399*xGs_temp.loc[xGs_temp['Position']=='D', 'ShotAttemptsAgainst_PK_onice'].sum()
+        + .065*xGs_temp.loc[xGs_temp['Position']=='D', 'xG_flurryAgainst_PK_onice'].sum()
+        )/(xGs_temp.loc[xGs_temp['Position']=='D', 'TOI_PK'].sum() * (.017+.166+.065))
+
+    xGs_temp['OZoneStartRate_5v5'] = xGs_temp['OZoneStartCount_5v5']/(xGs_temp['OZoneStartCount_5v5']+xGs_temp['NZoneStartCount_5v5']+xGs_temp['DZoneStartCount_5v5'])
+    xGs_temp['DZoneStartRate_5v5'] = xGs_temp['DZoneStartCount_5v5']/(xGs_temp['OZoneStartCount_5v5']+xGs_temp['NZoneStartCount_5v5']+xGs_temp['DZoneStartCount_5v5'])
+
+    xGs_temp['metric_O'] = 0.
+    xGs_temp.loc[xGs_temp['Position']=='F', 'metric_O'] = 3600*(
+        .163*xGs_temp.loc[xGs_temp['Position']=='F', 'Goals_5v5_onice']
+        + .185*.091286*xGs_temp.loc[xGs_temp['Position']=='F', 'ShotsAdjusted_5v5_onice']
+        + .262*xGs_temp.loc[xGs_temp['Position']=='F', 'xG_flurry_5v5_onice']
+        )/(xGs_temp.loc[xGs_temp['Position']=='F', 'TOI_5v5'] * (.163+.185+.262))
+    xGs_temp.loc[xGs_temp['Position']=='D', 'metric_O'] = 3600*(
+        .064*xGs_temp.loc[xGs_temp['Position']=='D', 'GoalsAdjusted_5v5_onice']
+        + .132*.049399*xGs_temp.loc[xGs_temp['Position']=='D', 'ShotAttemptsAdjusted_5v5_onice']
+        + .160*xGs_temp.loc[xGs_temp['Position']=='D', 'xG_5v5_onice']
+        )/(xGs_temp.loc[xGs_temp['Position']=='D', 'TOI_5v5'] * (.064+.132+.160))
+
+    xGs_temp['metric_D'] = 0.
+    xGs_temp.loc[xGs_temp['Position']=='F', 'metric_D'] = 3600*(
+        .031*xGs_temp.loc[xGs_temp['Position']=='F', 'GoalsAgainst_5v5_onice']
+        + .140*.065956*xGs_temp.loc[xGs_temp['Position']=='F', 'UnblockedShotAttemptsAdjustedAgainst_5v5_onice']
+        + .175*xGs_temp.loc[xGs_temp['Position']=='F', 'xG_flurryAdjustedAgainst_5v5_onice']
+        )/(xGs_temp.loc[xGs_temp['Position']=='F', 'TOI_5v5'] * (.031+.140+.175))
+    xGs_temp.loc[xGs_temp['Position']=='D', 'metric_D'] = 3600*(
+        .041*xGs_temp.loc[xGs_temp['Position']=='D', 'GoalsAgainst_5v5_onice']
+        + .172*.065956*xGs_temp.loc[xGs_temp['Position']=='D', 'UnblockedShotAttemptsAdjustedAgainst_5v5_onice']
+        + .216*xGs_temp.loc[xGs_temp['Position']=='D', 'xGAdjustedAgainst_5v5_onice']
+        )/(xGs_temp.loc[xGs_temp['Position']=='D', 'TOI_5v5'] * (.041+.172+.216))
+
+    xGs_temp['metric_PP'] = 0.
+    xGs_temp.loc[xGs_temp['Position']=='F', 'metric_PP'] = 3600*(
+        .154*xGs_temp.loc[xGs_temp['Position']=='F', 'GoalsAdjusted_PP_onice']
+        + .268*.065956*xGs_temp.loc[xGs_temp['Position']=='F', 'UnblockedShotAttempts_PP_onice']
+        + .293*xGs_temp.loc[xGs_temp['Position']=='F', 'xG_flurry_PP_onice']
+        )/(xGs_temp.loc[xGs_temp['Position']=='F', 'TOI_PP'] * (.154+.268+.293))
+    xGs_temp.loc[xGs_temp['Position']=='D', 'metric_PP'] = 3600*(
+        .104*xGs_temp.loc[xGs_temp['Position']=='D', 'GoalsAdjusted_PP_onice']
+        + .249*.065956*xGs_temp.loc[xGs_temp['Position']=='D', 'UnblockedShotAttempts_PP_onice']
+        + .215*xGs_temp.loc[xGs_temp['Position']=='D', 'xG_flurry_PP_onice']
+        )/(xGs_temp.loc[xGs_temp['Position']=='D', 'TOI_PP'] * (.104+.249+.215))
+
+    xGs_temp['metric_PK'] = 0.
+    xGs_temp.loc[xGs_temp['Position']=='F', 'metric_PK'] = 3600*(
+        .019*xGs_temp.loc[xGs_temp['Position']=='F', 'GoalsAdjustedAgainst_PK_onice']
+        + .155*.049399*xGs_temp.loc[xGs_temp['Position']=='F', 'ShotAttemptsAgainst_PK_onice']
+        + .097*xGs_temp.loc[xGs_temp['Position']=='F', 'xG_flurryAdjustedAgainst_PK_onice']
+        )/(xGs_temp.loc[xGs_temp['Position']=='F', 'TOI_PK'] * (.019+.155+.097))
+    xGs_temp.loc[xGs_temp['Position']=='D', 'metric_PK'] = 3600*(
+        .017*xGs_temp.loc[xGs_temp['Position']=='D', 'GoalsAgainst_PK_onice']
+        + .166*.049399*xGs_temp.loc[xGs_temp['Position']=='D', 'ShotAttemptsAgainst_PK_onice']
+        + .065*xGs_temp.loc[xGs_temp['Position']=='D', 'xG_flurryAgainst_PK_onice']
+        )/(xGs_temp.loc[xGs_temp['Position']=='D', 'TOI_PK'] * (.017+.166+.065))
+
+    xGs_temp['metric_G'] = 3600*(xGs_temp['xGAgainst_onice']-xGs_temp['GoalsAgainst_onice'])/xGs_temp['TOI']
+
+    # time on ice together at each strength as sparse matrices between the players in xGs_temp
+    overlaps_5v5 = overlap_matrices(ratings_temp, xGs_temp)
+    overlaps_PP = overlap_matrices(ratings_PP, xGs_temp)
+    overlaps_PK = overlap_matrices(ratings_PK, xGs_temp)
+
+    # F, 5v5
+    ratings_F = pair_metric_sums(ratings_temp, overlaps_5v5, xGs_temp, 'F', 'TOI_5v5', {
+        'metricSum_O_team' : ('metric_O', True, 4),
+        'metricSum_O_comp' : ('metric_D', False, 5),
+        'metricSum_D_team' : ('metric_D', True, 4),
+        'metricSum_D_comp' : ('metric_O', False, 5)
+    }, ['Player','PlayerID','Position_x'], {
+        'TOI_5v5_x' : 'max',
+        'OZoneStartRate_5v5_x' : 'max',
+        'DZoneStartRate_5v5_x' : 'max',
+        'metric_O_x' : 'max',
+        'metricSum_O_team' : 'sum',
+        'metricSum_O_comp' : 'sum',
+        'metric_D_x' : 'max',
+        'metricSum_D_team' : 'sum',
+        'metricSum_D_comp' : 'sum',
+        'xG_5v5_onice_x' : 'max',
+        'Goals_5v5_x' : 'max',
+        'Shots_5v5_x' : 'max',
+        'ShotAttempts_5v5_x' : 'max',
+        'UnblockedShotAttempts_5v5_x' : 'max',
+        'xG_5v5_x' : 'max',
+        'xG_flurry_5v5_x' : 'max',
+        'PrimaryAssists_5v5_x' : 'max',
+        'SecondaryAssists_5v5_x' : 'max',
+        'TOI_x' : 'max'
+    })
+
+    features = ['OZoneStartRate_5v5_x','metricSum_O_team','metricSum_O_comp']
+    X = ratings_F.dropna(subset=features)[features].values
+    Y = ratings_F.dropna(subset=features)['metric_O_x'].values
+    model = LinearRegression()
+    model.fit(X, Y)
+    ratings_F['pred_metric_O_x'] = model.predict(ratings_F[features].fillna(0.4).values)
+    ratings_F['metric_O_aboveExp'] = ratings_F['metric_O_x']-ratings_F['pred_metric_O_x']
+    ratings_F['metric_O_aboveAvg'] = ratings_F['metric_O_x']-metric_mean_F_O
+    ratings_F['indiv_contrib_5v5'] = (.142*ratings_F['Goals_5v5_x']+.114*ratings_F['PrimaryAssists_5v5_x']+.036*ratings_F['SecondaryAssists_5v5_x']+\
+        .559*.049399*ratings_F['ShotAttempts_5v5_x']+\
+        .374*ratings_F['xG_flurry_5v5_x'])*3600/(ratings_F['TOI_5v5_x']*(.142+.114+.036+.559+.374))
+    indiv_contrib_mean = (ratings_F['indiv_contrib_5v5']*ratings_F['TOI_5v5_x']).sum()/ratings_F['TOI_5v5_x'].sum()
+    ratings_F['indiv_contrib_5v5_aboveAvg'] = ratings_F['indiv_contrib_5v5']-indiv_contrib_mean
+    ratings_F['GC60_5v5'] = (ratings_F['metric_O_aboveExp']+ratings_F['metric_O_aboveAvg']+ratings_F['indiv_contrib_5v5_aboveAvg'])/3
+    ratings_F = ratings_F.rename(columns = {'Position_x':'Position', 'TOI_5v5_x':'TOI_5v5'})
+    inseason_ratings_season = ratings_F[['Player','PlayerID','Position','TOI_5v5','GC60_5v5']]
+
+    features = ['DZoneStartRate_5v5_x','metricSum_D_team','metricSum_D_comp']
+    X = ratings_F.dropna(subset=features)[features].values
+    Y = ratings_F.dropna(subset=features)['metric_D_x'].values
+    model = LinearRegression()
+    model.fit(X, Y)
+    ratings_F['pred_metric_D_x'] = model.predict(ratings_F[features].fillna(0.4).values)
+    ratings_F['metric_D_aboveExp'] = ratings_F['metric_D_x']-ratings_F['pred_metric_D_x']
+    ratings_F['metric_D_aboveAvg'] = ratings_F['metric_D_x']-metric_mean_F_D
+    ratings_F['GP60_5v5'] = (ratings_F['metric_D_aboveExp']+ratings_F['metric_D_aboveAvg'])/-2
+    inseason_ratings_season = inseason_ratings_season.merge(ratings_F[['Player','PlayerID','Position','GP60_5v5']], \
+        on=['Player','PlayerID','Position'])
+
+    # F, PP
+    ratings_PP_F = pair_metric_sums(ratings_PP, overlaps_PP, xGs_temp, 'F', 'TOI_PP', {
+        'metricSum_PP_team' : ('metric_PP', True, 4),
+        'metricSum_PP_comp' : ('metric_PK', False, 4)
+    }, ['Player','PlayerID'], {
+        'TOI_PP_x' : 'max',
+        'metric_PP_x' : 'max',
+        'metricSum_PP_team' : 'sum',
+        'metricSum_PP_comp' : 'sum'
+    }, special_teams=('TOI_PP','TOI_PK'))
+    ratings_PP_F.columns = ['Player','PlayerID','TOI_PP','metric_O_PP','metricSum_team_PP','metricSum_comp_PP']
+
+    features = ['metricSum_team_PP','metricSum_comp_PP']
+    X = ratings_PP_F[features].values
+    Y = ratings_PP_F['metric_O_PP'].values
+    model = LinearRegression()
+    model.fit(X, Y)
+    intercept_F_GC_PP = model.intercept_
+    weights_F_GC_PP = model.coef_
+
+    # F, PP
+    ratings_PP_F = pair_metric_sums(ratings_PP, overlaps_PP, xGs_temp, 'F', 'TOI_PP', {
+        'metricSum_PP_team' : ('metric_PP', True, 4),
+        'metricSum_PP_comp' : ('metric_PK', False, 4)
+    }, ['Player','PlayerID','Position_x'], {
+        'TOI_PP_x' : 'max',
+        'metric_PP_x' : 'max',
+        'metricSum_PP_team' : 'sum',
+        'metricSum_PP_comp' : 'sum',
+        'xG_PP_onice_x' : 'max',
+        'Goals_PP_x' : 'max',
+        'Shots_PP_x' : 'max',
+        'ShotAttempts_PP_x' : 'max',
+        'UnblockedShotAttempts_PP_x' : 'max',
+        'xG_PP_x' : 'max',
+        'xG_flurry_PP_x' : 'max',
+        'PrimaryAssists_PP_x' : 'max',
+        'SecondaryAssists_PP_x' : 'max'
+    }, special_teams=('TOI_PP','TOI_PK'))
+    ratings_PP_F.columns = ['Player','PlayerID','Position_x','TOI_PP','metric_O_PP','metricSum_team_PP','metricSum_comp_PP','xG_PP_onice','Goals_PP',
+        'Shots_PP','ShotAttempts_PP','UnblockedShotAttempts_PP','xG_PP','xG_flurry_PP','PrimaryAssists_PP','SecondaryAssists_PP']
+
+    features = ['metricSum_team_PP','metricSum_comp_PP']
+    X = ratings_PP_F[features].values
+    Y = ratings_PP_F['metric_O_PP'].values
+    model = LinearRegression()
+    model.fit(X, Y)
+    ratings_PP_F['pred_metric_O_PP'] = model.predict(X)
+    ratings_PP_F['metric_PP_aboveExp'] = ratings_PP_F['metric_O_PP']-ratings_PP_F['pred_metric_O_PP']
+    ratings_PP_F['metric_PP_aboveAvg'] = ratings_PP_F['metric_O_PP']-metric_mean_F_PP
+    ratings_PP_F['indiv_contrib_PP'] = (.072*ratings_PP_F['Goals_PP']+.160*ratings_PP_F['PrimaryAssists_PP']+.091*ratings_PP_F['SecondaryAssists_PP']+\
+        .549*.049399*ratings_PP_F['ShotAttempts_PP']+\
+        .315*ratings_PP_F['xG_flurry_PP'])*3600/(ratings_PP_F['TOI_PP']*(.072+.160+.091+.549+.315))
+    indiv_contrib_mean = (ratings_PP_F['indiv_contrib_PP']*ratings_PP_F['TOI_PP']).sum()/ratings_PP_F['TOI_PP'].sum()
+    ratings_PP_F['indiv_contrib_PP_aboveAvg'] = ratings_PP_F['indiv_contrib_PP']-indiv_contrib_mean
+    ratings_PP_F['GC60_PP'] = (ratings_PP_F['metric_PP_aboveExp']+ratings_PP_F['metric_PP_aboveAvg']+ratings_PP_F['indiv_contrib_PP_aboveAvg'])/3
+    ratings_PP_F = ratings_PP_F.rename(columns = {'Position_x':'Position', 'TOI_PP_x':'TOI_PP'})
+    inseason_ratings_season = inseason_ratings_season.merge(ratings_PP_F[['Player','PlayerID','Position','TOI_PP','GC60_PP']], \
+        on=['Player','PlayerID','Position'], how='left')
+
+    # F, PK
+    ratings_PK_F = pair_metric_sums(ratings_PK, overlaps_PK, xGs_temp, 'F', 'TOI_PK', {
+        'metricSum_PK_team' : ('metric_PK', True, 3),
+        'metricSum_PK_comp' : ('metric_PP', False, 5)
+    }, ['Player','PlayerID','Position_x'], {
+        'TOI_PK_x' : 'max',
+        'metric_PK_x' : 'max',
+        'metricSum_PK_team' : 'sum',
+        'metricSum_PK_comp' : 'sum'
+    }, special_teams=('TOI_PK','TOI_PP'))
+    ratings_PK_F.columns = ['Player','PlayerID','Position_x','TOI_PK','metric_D_PK','metricSum_team_PK','metricSum_comp_PK']
+
+    features = ['metricSum_team_PK','metricSum_comp_PK']
+    X = ratings_PK_F[features].values
+    Y = ratings_PK_F['metric_D_PK'].values
+    model = LinearRegression()
+    model.fit(X, Y)
+    intercept_F_GP_PK = model.intercept_
+    weights_F_GP_PK = model.coef_
+    ratings_PK_F['pred_metric_D_PK'] = model.predict(X)
+    ratings_PK_F['metric_D_aboveExp'] = ratings_PK_F['metric_D_PK']-ratings_PK_F['pred_metric_D_PK']
+    ratings_PK_F['metric_D_aboveAvg'] = ratings_PK_F['metric_D_PK']-metric_mean_F_PK
+    ratings_PK_F['GP60_PK'] = (ratings_PK_F['metric_D_aboveExp']+ratings_PK_F['metric_D_aboveAvg'])/-2
+    ratings_PK_F = ratings_PK_F.rename(columns = {'Position_x':'Position', 'TOI_PK_x':'TOI_PK'})
+    inseason_ratings_season = inseason_ratings_season.merge(ratings_PK_F[['Player','PlayerID','Position','TOI_PK','GP60_PK']], \
+        on=['Player','PlayerID','Position'], how='left')
+
+    # F, Pens
+    ratings_pen_F = xGs_temp.loc[xGs_temp['Position']=='F', ['Player','PlayerID','Position','Penalties','PenaltiesDrawn','TOI']]
+    ratings_pen_F = ratings_pen_F.groupby(['Player','PlayerID','Position'], as_index=False).sum()
+    pen_val = ((3600*xGs_temp['Goals_PP_onice'].sum()/xGs_temp['TOI_PP'].sum()) - (3600*xGs_temp['Goals_PK_onice'].sum()/xGs_temp['TOI_PK'].sum()))*(2/60)
+    ratings_pen_F['GI60_Pens'] = pen_val*3600*(.837*ratings_pen_F['PenaltiesDrawn'].fillna(0) - 1.163*ratings_pen_F['Penalties'].fillna(0))/ratings_pen_F['TOI']
+    inseason_ratings_season = inseason_ratings_season.merge(ratings_pen_F[['Player','PlayerID','Position','TOI','GI60_Pens']], \
+        on=['Player','PlayerID','Position'], how='left')
+
+    # D, 5v5
+    ratings_D = pair_metric_sums(ratings_temp, overlaps_5v5, xGs_temp, 'D', 'TOI_5v5', {
+        'metricSum_O_team' : ('metric_O', True, 4),
+        'metricSum_O_comp' : ('metric_D', False, 5),
+        'metricSum_D_team' : ('metric_D', True, 4),
+        'metricSum_D_comp' : ('metric_O', False, 5)
+    }, ['Player','PlayerID','Position_x'], {
+        'TOI_5v5_x' : 'max',
+        'OZoneStartRate_5v5_x' : 'max',
+        'DZoneStartRate_5v5_x' : 'max',
+        'metric_O_x' : 'max',
+        'metricSum_O_team' : 'sum',
+        'metricSum_O_comp' : 'sum',
+        'metric_D_x' : 'max',
+        'metricSum_D_team' : 'sum',
+        'metricSum_D_comp' : 'sum',
+        'xG_5v5_onice_x' : 'max',
+        'Goals_5v5_x' : 'max',
+        'Shots_5v5_x' : 'max',
+        'ShotAttempts_5v5_x' : 'max',
+        'UnblockedShotAttempts_5v5_x' : 'max',
+        'xG_5v5_x' : 'max',
+        'xG_flurry_5v5_x' : 'max',
+        'PrimaryAssists_5v5_x' : 'max',
+        'SecondaryAssists_5v5_x' : 'max',
+        'TOI_x' : 'max'
+    })
+
+    features = ['OZoneStartRate_5v5_x','metricSum_O_team','metricSum_O_comp']
+    X = ratings_D.dropna(subset=features)[features].values
+    Y = ratings_D.dropna(subset=features)['metric_O_x'].values
+    model = LinearRegression()
+    model.fit(X, Y)
+    ratings_D['pred_metric_O_x'] = model.predict(ratings_D[features].fillna(0.4).values)
+    ratings_D['metric_O_aboveExp'] = ratings_D['metric_O_x']-ratings_D['pred_metric_O_x']
+    ratings_D['metric_O_aboveAvg'] = ratings_D['metric_O_x']-metric_mean_D_O
+    ratings_D['indiv_contrib_5v5'] = (.070*ratings_D['Goals_5v5_x']+.050*ratings_D['PrimaryAssists_5v5_x']+.021*ratings_D['SecondaryAssists_5v5_x']+\
+        .502*.049399*ratings_D['ShotAttempts_5v5_x']+\
+        .386*ratings_D['xG_flurry_5v5_x'])*3600/(ratings_D['TOI_5v5_x']*(.070+.050+.021+.502+.386))
+    indiv_contrib_mean = (ratings_D['indiv_contrib_5v5']*ratings_D['TOI_5v5_x']).sum()/ratings_D['TOI_5v5_x'].sum()
+    ratings_D['indiv_contrib_5v5_aboveAvg'] = ratings_D['indiv_contrib_5v5']-indiv_contrib_mean
+    ratings_D['GC60_5v5'] = (ratings_D['metric_O_aboveExp']+ratings_D['metric_O_aboveAvg']+ratings_D['indiv_contrib_5v5_aboveAvg'])/3
+    ratings_D = ratings_D.rename(columns = {'Position_x':'Position', 'TOI_5v5_x':'TOI_5v5'})
+    inseason_ratings_season_D = ratings_D[['Player','PlayerID','Position','TOI_5v5','GC60_5v5']]
+
+    features = ['DZoneStartRate_5v5_x','metricSum_D_team','metricSum_D_comp']
+    X = ratings_D.dropna(subset=features)[features].values
+    Y = ratings_D.dropna(subset=features)['metric_D_x'].values
+    model = LinearRegression()
+    model.fit(X, Y)
+    ratings_D['pred_metric_D_x'] = model.predict(ratings_D[features].fillna(0.4).values)
+    ratings_D['metric_D_aboveExp'] = ratings_D['metric_D_x']-ratings_D['pred_metric_D_x']
+    ratings_D['metric_D_aboveAvg'] = ratings_D['metric_D_x']-metric_mean_D_D
+    ratings_D['GP60_5v5'] = (ratings_D['metric_D_aboveExp']+ratings_D['metric_D_aboveAvg'])/-2
+    ratings_D = ratings_D.rename(columns = {'Position_x':'Position', 'TOI_5v5_x':'TOI_5v5'})
+    inseason_ratings_season_D = inseason_ratings_season_D.merge(ratings_D[['Player','PlayerID','Position','GP60_5v5']], \
+        on=['Player','PlayerID','Position'])
+
+    # D, PP
+    ratings_PP_D = pair_metric_sums(ratings_PP, overlaps_PP, xGs_temp, 'D', 'TOI_PP', {
+        'metricSum_PP_team' : ('metric_PP', True, 4),
+        'metricSum_PP_comp' : ('metric_PK', False, 4)
+    }, ['Player','PlayerID','Position_x'], {
+        'TOI_PP_x' : 'max',
+        'metric_PP_x' : 'max',
+        'metricSum_PP_team' : 'sum',
+        'metricSum_PP_comp' : 'sum',
+        'xG_PP_onice_x' : 'max',
+        'Goals_PP_x' : 'max',
+        'Shots_PP_x' : 'max',
+        'ShotAttempts_PP_x' : 'max',
+        'UnblockedShotAttempts_PP_x' : 'max',
+        'xG_PP_x' : 'max',
+        'xG_flurry_PP_x' : 'max',
+        'PrimaryAssists_PP_x' : 'max',
+        'SecondaryAssists_PP_x' : 'max',
+        'GoalsAdjusted_PP_x' : 'max',
+        'PrimaryAssistsAdjusted_PP_x' : 'max',
+        'ShotAttemptsAdjusted_PP_x' : 'max'
+    }, special_teams=('TOI_PP','TOI_PK'))
+    ratings_PP_D.columns = ['Player','PlayerID','Position_x','TOI_PP','metric_O_PP','metricSum_team_PP','metricSum_comp_PP','xG_PP_onice','Goals_PP',
+        'Shots_PP','ShotAttempts_PP','UnblockedShotAttempts_PP','xG_PP','xG_flurry_PP','PrimaryAssists_PP','SecondaryAssists_PP',
+        'GoalsAdjusted_PP','PrimaryAssistsAdjusted_PP','ShotAttemptsAdjusted_PP']
+
+    features = ['metricSum_team_PP','metricSum_comp_PP']
+    X = ratings_PP_D[features].values
+    Y = ratings_PP_D['metric_O_PP'].values
+    model = LinearRegression()
+    model.fit(X, Y)
+    ratings_PP_D['pred_metric_O_PP'] = model.predict(X)
+    ratings_PP_D['metric_PP_aboveExp'] = ratings_PP_D['metric_O_PP']-ratings_PP_D['pred_metric_O_PP']
+    ratings_PP_D['metric_PP_aboveAvg'] = ratings_PP_D['metric_O_PP']-metric_mean_D_PP
+    ratings_PP_D['indiv_contrib_PP'] = (.021*ratings_PP_D['GoalsAdjusted_PP']+.091*ratings_PP_D['PrimaryAssistsAdjusted_PP']+.033*ratings_PP_D['SecondaryAssists_PP']+\
+        .354*.049399*ratings_PP_D['ShotAttempts_PP']+\
+        .289*ratings_PP_D['xG_PP'])*3600/(ratings_PP_D['TOI_PP']*(.021+.091+.033+.354+.289))
+    indiv_contrib_mean = (ratings_PP_D['indiv_contrib_PP']*ratings_PP_D['TOI_PP']).sum()/ratings_PP_D['TOI_PP'].sum()
+    ratings_PP_D['indiv_contrib_PP_aboveAvg'] = ratings_PP_D['indiv_contrib_PP']-indiv_contrib_mean
+    ratings_PP_D['GC60_PP'] = (ratings_PP_D['metric_PP_aboveExp']+ratings_PP_D['metric_PP_aboveAvg']+ratings_PP_D['indiv_contrib_PP_aboveAvg'])/3
+    ratings_PP_D = ratings_PP_D.rename(columns = {'Position_x':'Position', 'TOI_PP_x':'TOI_PP'})
+    inseason_ratings_season_D = inseason_ratings_season_D.merge(ratings_PP_D[['Player','PlayerID','Position','TOI_PP','GC60_PP']], \
+        on=['Player','PlayerID','Position'], how='left')
+
+    # D, PK
+    ratings_PK_D = pair_metric_sums(ratings_PK, overlaps_PK, xGs_temp, 'D', 'TOI_PK', {
+        'metricSum_PK_team' : ('metric_PK', True, 3),
+        'metricSum_PK_comp' : ('metric_PP', False, 5)
+    }, ['Player','PlayerID','Position_x'], {
+        'TOI_PK_x' : 'max',
+        'metric_PK_x' : 'max',
+        'metricSum_PK_team' : 'sum',
+        'metricSum_PK_comp' : 'sum'
+    }, special_teams=('TOI_PK','TOI_PP'))
+    ratings_PK_D.columns = ['Player','PlayerID','Position_x','TOI_PK','metric_D_PK','metricSum_team_PK','metricSum_comp_PK']
+
+    features = ['metricSum_team_PK','metricSum_comp_PK']
+    X = ratings_PK_D[features].values
+    Y = ratings_PK_D['metric_D_PK'].values
+    model = LinearRegression()
+    model.fit(X, Y)
+    ratings_PK_D['pred_metric_D_PK'] = model.predict(X)
+    ratings_PK_D['metric_D_aboveExp'] = ratings_PK_D['metric_D_PK']-ratings_PK_D['pred_metric_D_PK']
+    ratings_PK_D['metric_D_aboveAvg'] = ratings_PK_D['metric_D_PK']-metric_mean_D_PK
+    ratings_PK_D['GP60_PK'] = (ratings_PK_D['metric_D_aboveExp']+ratings_PK_D['metric_D_aboveAvg'])/-2
+    ratings_PK_D = ratings_PK_D.rename(columns = {'Position_x':'Position', 'TOI_PP_x':'TOI_PP'})
+    inseason_ratings_season_D = inseason_ratings_season_D.merge(ratings_PK_D[['Player','PlayerID','Position','TOI_PK','GP60_PK']], \
+        on=['Player','PlayerID','Position'], how='left')
+
+    # D, Pens
+    ratings_pen_D = xGs_temp.loc[xGs_temp['Position']=='D', ['Player','PlayerID','Position','Penalties','PenaltiesDrawn','TOI']]
+    ratings_pen_D = ratings_pen_D.groupby(['Player','PlayerID','Position'], as_index=False).sum()
+    pen_val = ((3600*xGs_temp['Goals_PP_onice'].sum()/xGs_temp['TOI_PP'].sum()) - (3600*xGs_temp['Goals_PK_onice'].sum()/xGs_temp['TOI_PK'].sum()))*(2/60)
+    ratings_pen_D['GI60_Pens'] = pen_val*3600*(.733*ratings_pen_D['PenaltiesDrawn'].fillna(0) - 1.267*ratings_pen_D['Penalties'].fillna(0))/ratings_pen_D['TOI']
+    inseason_ratings_season_D = inseason_ratings_season_D.merge(ratings_pen_D[['Player','PlayerID','Position','TOI','GI60_Pens']], \
+        on=['Player','PlayerID','Position'], how='left')
+    inseason_ratings_season = pd.concat([inseason_ratings_season, inseason_ratings_season_D], ignore_index=True)
+
+    # G
+    inseason_ratings_season_G = xGs_temp.loc[xGs_temp['Position']=='G', ['Player','PlayerID','Position','TOI','xGAdjustedAgainst_onice',
+        'GoalsAdjustedAgainst_onice','GoalsAgainst_onice','ShotsAgainst_onice']]
+    inseason_ratings_season_G = inseason_ratings_season_G.groupby(['Player','PlayerID','Position'], as_index=False).sum()
+    inseason_ratings_season_G['GSAXAdjusted'] = inseason_ratings_season_G['xGAdjustedAgainst_onice'] - inseason_ratings_season_G['GoalsAdjustedAgainst_onice']
+    inseason_ratings_season_G['SvPct'] = 1 - (inseason_ratings_season_G['GoalsAgainst_onice']/inseason_ratings_season_G['ShotsAgainst_onice'])
+    inseason_ratings_season_G['SvPctAboveAvg'] = inseason_ratings_season_G['SvPct'] - \
+        ((inseason_ratings_season_G['SvPct']*inseason_ratings_season_G['TOI']).sum()/inseason_ratings_season_G['TOI'].sum())
+    inseason_ratings_season_G['GoalsSavedAboveAvg'] = inseason_ratings_season_G['SvPctAboveAvg']*inseason_ratings_season_G['ShotsAgainst_onice']
+    inseason_ratings_season_G['GI60'] = (.020*inseason_ratings_season_G['GoalsSavedAboveAvg']+.018*inseason_ratings_season_G['GSAXAdjusted'])*3600/\
+        (inseason_ratings_season_G['TOI']*(.020+.018))
+    inseason_ratings_season_G = inseason_ratings_season_G[['Player','PlayerID','Position','TOI','GI60']]
+    inseason_ratings_season = inseason_ratings_season.merge(inseason_ratings_season_G, on=['Player','PlayerID','Position','TOI'], how='outer')
+
+    # combine
+    inseason_ratings_season['Date'] = i
+    inseason_ratings_season['Season'] = season
+    inseason_ratings_season.columns = ['Player','PlayerID','Position','prevGames_TOI_5v5','prevGames_GC60_5v5','prevGames_GP60_5v5',
+        'prevGames_TOI_PP','prevGames_GC60_PP','prevGames_TOI_PK','prevGames_GP60_PK','prevGames_TOI','prevGames_GI60_Pens','prevGames_GI60',
+        'Date','Season']
+
+    return inseason_ratings_season
+def _player_inseason_ratings(playerGame, toiOverlap, start_date, end_date):
+    # ratings going into each date from start_date to end_date, for every player who has played so far in the season
+    # running totals by player and by pair of players are kept as arrays and each day's games are added to them in place,
+    # instead of filtering and re-summing the whole season so far for every date. the ratings are regressions over every
+    # player, so one player's games move everyone's ratings; they're only recomputed on dates where the totals changed
     season = playerGame['Season'].unique()[0]
 
     xGs = playerGame.loc[playerGame['Playoffs']==0]
@@ -13,514 +577,90 @@ def add_player_inseason_ratings(playerGame, toiOverlap, start_date, end_date):
 
     toiOverlap = toiOverlap.rename(columns={'Player_x':'Player', 'Player_Id_x':'PlayerID'})
     #toiOverlap['PlayerGameNum'] = toiOverlap.groupby(['Player','PlayerID'])['Game_Id'].rank('dense')
-    toiOverlap_5v5 = toiOverlap.loc[toiOverlap['Strength']=='5x5']
-    toiOverlap_PP = toiOverlap.loc[toiOverlap['Strength'].isin(['5x4','5x3','4x3'])]
-    toiOverlap_PK = toiOverlap.loc[toiOverlap['Strength'].isin(['4x5','3x5','3x4'])]
 
     ratings = toiOverlap.copy(deep=True)
     ratings = ratings.loc[ratings['Game_Id'].isin(xGs['Game_Id'].unique())]
     xGs = xGs.loc[xGs['TOI_5v5']>0]
 
-    # loop through one date at a time
-    inseason_ratings = pd.DataFrame(columns=['Player','PlayerID','Position','prevGames_TOI_5v5','prevGames_GC60_5v5','prevGames_GP60_5v5',
-        'prevGames_TOI_PP','prevGames_GC60_PP','prevGames_TOI_PK','prevGames_GP60_PK','prevGames_TOI','prevGames_GI60_Pens','prevGames_GI60',
-        'Date','Season'])
+    # player totals: one row per player, one column per stat, with games sorted by date so each day is a contiguous block
+    xGs = xGs.sort_values(by='Date', kind='stable')
+    xGs['PlayerCode'] = xGs.groupby(['Player','PlayerID','Position']).ngroup()
+    xGs = xGs.loc[~xGs['PlayerCode'].isnull()]
+    stats = [c for c in xGs.columns if c not in ['Player','PlayerID','Position','Playoffs','DateInt','Season','PlayerGameID','Team','Date','Game_Id','PlayerCode']]
+    players = xGs[['Player','PlayerID','Position','PlayerCode']].drop_duplicates(subset=['PlayerCode']).sort_values(by='PlayerCode')
+    players = players[['Player','PlayerID','Position']].reset_index(drop=True)
+    player_dates = xGs['Date'].values
+    player_codes = xGs['PlayerCode'].values.astype(np.int64)
+    player_stats = xGs[stats].fillna(0).values.astype(np.float64)
+    player_totals = np.zeros((len(players.index), len(stats)))
+    player_seen = np.zeros(len(players.index), dtype=bool)
+
+    # pair totals: one row per pair of players, for 5v5, PP and PK
+    ratings = ratings.merge(xGs[['Game_Id','Date']].drop_duplicates(), on='Game_Id')
+    ratings['StrengthCode'] = -1
+    ratings.loc[ratings['Strength']=='5x5', 'StrengthCode'] = 0
+    ratings.loc[ratings['Strength'].isin(['5x4','5x3','4x3']), 'StrengthCode'] = 1
+    ratings.loc[ratings['Strength'].isin(['4x5','3x5','3x4']), 'StrengthCode'] = 2
+    ratings = ratings.loc[ratings['StrengthCode']>=0].sort_values(by='Date', kind='stable')
+    ratings['PairCode'] = ratings.groupby(['Player','PlayerID','Player_y','Player_Id_y','SameTeam']).ngroup()
+    ratings = ratings.loc[~ratings['PairCode'].isnull()]
+    pairs = ratings[['Player','PlayerID','Player_y','Player_Id_y','SameTeam','PairCode']].drop_duplicates(subset=['PairCode']).sort_values(by='PairCode')
+    pairs = pairs[['Player','PlayerID','Player_y','Player_Id_y','SameTeam']].reset_index(drop=True)
+    pair_dates = ratings['Date'].values
+    pair_codes = ratings['PairCode'].values.astype(np.int64)
+    pair_strengths = ratings['StrengthCode'].values.astype(np.int64)
+    pair_overlaps = ratings['Overlap'].values.astype(np.float64)
+    pair_totals = np.zeros((3, len(pairs.index)))
+    pair_seen = np.zeros((3, len(pairs.index)), dtype=bool)
+    prev_date = ''
+
+    # loop through one date at a time, collecting each date's ratings and concatenating them once at the end
+    inseason_ratings = []
+    inseason_ratings_season = None
     for i in pd.date_range(start_date, end_date):
-        xGs_temp = xGs.loc[xGs['Date']<i.strftime('%Y-%m-%d')]
-        if len(xGs_temp.index>0):
-            ratings_temp = ratings.loc[ratings['Game_Id'].isin(xGs_temp['Game_Id'].unique())]
-
-            #compute mean metrics
-            metric_mean_F_O = 3600*(
-                .163*xGs_temp.loc[xGs_temp['Position']=='F', 'Goals_5v5_onice'].sum()
-                + .185*.091286*xGs_temp.loc[xGs_temp['Position']=='F', 'ShotsAdjusted_5v5_onice'].sum()
-                + .262*xGs_temp.loc[xGs_temp['Position']=='F', 'xG_flurry_5v5_onice'].sum()
-                )/(xGs_temp.loc[xGs_temp['Position']=='F', 'TOI_5v5'].sum() * (.163+.185+.262))
-            metric_mean_D_O = 3600*(
-                .064*xGs_temp.loc[xGs_temp['Position']=='D', 'GoalsAdjusted_5v5_onice'].sum()
-                + .132*.049399*xGs_temp.loc[xGs_temp['Position']=='D', 'ShotAttemptsAdjusted_5v5_onice'].sum()
-                + .160*xGs_temp.loc[xGs_temp['Position']=='D', 'xG_5v5_onice'].sum()
-                )/(xGs_temp.loc[xGs_temp['Position']=='D', 'TOI_5v5'].sum() * (.064+.132+.160))
-            metric_mean_F_D = 3600*(
-                .031*xGs_temp.loc[xGs_temp['Position']=='F', 'GoalsAgainst_5v5_onice'].sum()
-                + .140*.065956*xGs_temp.loc[xGs_temp['Position']=='F', 'UnblockedShotAttemptsAdjustedAgainst_5v5_onice'].sum()
-                + .175*xGs_temp.loc[xGs_temp['Position']=='F', 'xG_flurryAdjustedAgainst_5v5_onice'].sum()
-                )/(xGs_temp.loc[xGs_temp['Position']=='F', 'TOI_5v5'].sum() * (.031+.140+.175))
-            metric_mean_D_D = 3600*(
-                .041*xGs_temp.loc[xGs_temp['Position']=='D', 'GoalsAgainst_5v5_onice'].sum()
-                + .172*.065956*xGs_temp.loc[xGs_temp['Position']=='D', 'UnblockedShotAttemptsAdjustedAgainst_5v5_onice'].sum()
-                + .216*xGs_temp.loc[xGs_temp['Position']=='D', 'xGAdjustedAgainst_5v5_onice'].sum()
-                )/(xGs_temp.loc[xGs_temp['Position']=='D', 'TOI_5v5'].sum() * (.041+.172+.216))
-            metric_mean_F_PP = 3600*(
-                .154*xGs_temp.loc[xGs_temp['Position']=='F', 'GoalsAdjusted_PP_onice'].sum()
-                + .268*.065956*xGs_temp.loc[xGs_temp['Position']=='F', 'UnblockedShotAttempts_PP_onice'].sum()
-                + .293*xGs_temp.loc[xGs_temp['Position']=='F', 'xG_flurry_PP_onice'].sum()
-                )/(xGs_temp.loc[xGs_temp['Position']=='F', 'TOI_PP'].sum() * (.154+.268+.293))
-            metric_mean_D_PP = 3600*(
-                .104*xGs_temp.loc[xGs_temp['Position']=='D', 'GoalsAdjusted_PP_onice'].sum()
-                + .249*.065956*xGs_temp.loc[xGs_temp['Position']=='D', 'UnblockedShotAttempts_PP_onice'].sum()
-                + .215*xGs_temp.loc[xGs_temp['Position']=='D', 'xG_flurry_PP_onice'].sum()
-                )/(xGs_temp.loc[xGs_temp['Position']=='D', 'TOI_PP'].sum() * (.104+.249+.215))
-            metric_mean_F_PK = 3600*(
-                .019*xGs_temp.loc[xGs_temp['Position']=='F', 'GoalsAdjustedAgainst_PK_onice'].sum()
-                + .155*.049399*xGs_temp.loc[xGs_temp['Position']=='F', 'ShotAttemptsAgainst_PK_onice'].sum()
-                + .097*xGs_temp.loc[xGs_temp['Position']=='F', 'xG_flurryAdjustedAgainst_PK_onice'].sum()
-                )/(xGs_temp.loc[xGs_temp['Position']=='F', 'TOI_PK'].sum() * (.019+.155+.097))
-            metric_mean_D_PK = 3600*(
-                .017*xGs_temp.loc[xGs_temp['Position']=='D', 'GoalsAgainst_PK_onice'].sum()
-                + .166*.049399*xGs_temp.loc[xGs_temp['Position']=='D', 'ShotAttemptsAgainst_PK_onice'].sum()
-                + .065*xGs_temp.loc[xGs_temp['Position']=='D', 'xG_flurryAgainst_PK_onice'].sum()
-                )/(xGs_temp.loc[xGs_temp['Position']=='D', 'TOI_PK'].sum() * (.017+.166+.065))
-
-            xGs_temp = xGs_temp.drop(columns=['Playoffs','DateInt','Season','Playoffs','PlayerGameID','Team','Date','Game_Id'])
-            xGs_temp = xGs_temp.fillna(0).groupby(['Player','PlayerID','Position'], as_index=False).sum()
-            xGs_temp['OZoneStartRate_5v5'] = xGs_temp['OZoneStartCount_5v5']/(xGs_temp['OZoneStartCount_5v5']+xGs_temp['NZoneStartCount_5v5']+xGs_temp['DZoneStartCount_5v5'])
-            xGs_temp['DZoneStartRate_5v5'] = xGs_temp['DZoneStartCount_5v5']/(xGs_temp['OZoneStartCount_5v5']+xGs_temp['NZoneStartCount_5v5']+xGs_temp['DZoneStartCount_5v5'])
-
-            xGs_temp['metric_O'] = 0.
-            xGs_temp.loc[xGs_temp['Position']=='F', 'metric_O'] = 3600*(
-                .163*xGs_temp.loc[xGs_temp['Position']=='F', 'Goals_5v5_onice']
-                + .185*.091286*xGs_temp.loc[xGs_temp['Position']=='F', 'ShotsAdjusted_5v5_onice']
-                + .262*xGs_temp.loc[xGs_temp['Position']=='F', 'xG_flurry_5v5_onice']
-                )/(xGs_temp.loc[xGs_temp['Position']=='F', 'TOI_5v5'] * (.163+.185+.262))
-            xGs_temp.loc[xGs_temp['Position']=='D', 'metric_O'] = 3600*(
-                .064*xGs_temp.loc[xGs_temp['Position']=='D', 'GoalsAdjusted_5v5_onice']
-                + .132*.049399*xGs_temp.loc[xGs_temp['Position']=='D', 'ShotAttemptsAdjusted_5v5_onice']
-                + .160*xGs_temp.loc[xGs_temp['Position']=='D', 'xG_5v5_onice']
-                )/(xGs_temp.loc[xGs_temp['Position']=='D', 'TOI_5v5'] * (.064+.132+.160))
-
-            xGs_temp['metric_D'] = 0.
-            xGs_temp.loc[xGs_temp['Position']=='F', 'metric_D'] = 3600*(
-                .031*xGs_temp.loc[xGs_temp['Position']=='F', 'GoalsAgainst_5v5_onice']
-                + .140*.065956*xGs_temp.loc[xGs_temp['Position']=='F', 'UnblockedShotAttemptsAdjustedAgainst_5v5_onice']
-                + .175*xGs_temp.loc[xGs_temp['Position']=='F', 'xG_flurryAdjustedAgainst_5v5_onice']
-                )/(xGs_temp.loc[xGs_temp['Position']=='F', 'TOI_5v5'] * (.031+.140+.175))
-            xGs_temp.loc[xGs_temp['Position']=='D', 'metric_D'] = 3600*(
-                .041*xGs_temp.loc[xGs_temp['Position']=='D', 'GoalsAgainst_5v5_onice']
-                + .172*.065956*xGs_temp.loc[xGs_temp['Position']=='D', 'UnblockedShotAttemptsAdjustedAgainst_5v5_onice']
-                + .216*xGs_temp.loc[xGs_temp['Position']=='D', 'xGAdjustedAgainst_5v5_onice']
-                )/(xGs_temp.loc[xGs_temp['Position']=='D', 'TOI_5v5'] * (.041+.172+.216))
-
-            xGs_temp['metric_PP'] = 0.
-            xGs_temp.loc[xGs_temp['Position']=='F', 'metric_PP'] = 3600*(
-                .154*xGs_temp.loc[xGs_temp['Position']=='F', 'GoalsAdjusted_PP_onice']
-                + .268*.065956*xGs_temp.loc[xGs_temp['Position']=='F', 'UnblockedShotAttempts_PP_onice']
-                + .293*xGs_temp.loc[xGs_temp['Position']=='F', 'xG_flurry_PP_onice']
-                )/(xGs_temp.loc[xGs_temp['Position']=='F', 'TOI_PP'] * (.154+.268+.293))
-            xGs_temp.loc[xGs_temp['Position']=='D', 'metric_PP'] = 3600*(
-                .104*xGs_temp.loc[xGs_temp['Position']=='D', 'GoalsAdjusted_PP_onice']
-                + .249*.065956*xGs_temp.loc[xGs_temp['Position']=='D', 'UnblockedShotAttempts_PP_onice']
-                + .215*xGs_temp.loc[xGs_temp['Position']=='D', 'xG_flurry_PP_onice']
-                )/(xGs_temp.loc[xGs_temp['Position']=='D', 'TOI_PP'] * (.104+.249+.215))
-
-            xGs_temp['metric_PK'] = 0.
-            xGs_temp.loc[xGs_temp['Position']=='F', 'metric_PK'] = 3600*(
-                .019*xGs_temp.loc[xGs_temp['Position']=='F', 'GoalsAdjustedAgainst_PK_onice']
-                + .155*.049399*xGs_temp.loc[xGs_temp['Position']=='F', 'ShotAttemptsAgainst_PK_onice']
-                + .097*xGs_temp.loc[xGs_temp['Position']=='F', 'xG_flurryAdjustedAgainst_PK_onice']
-                )/(xGs_temp.loc[xGs_temp['Position']=='F', 'TOI_PK'] * (.019+.155+.097))
-            xGs_temp.loc[xGs_temp['Position']=='D', 'metric_PK'] = 3600*(
-                .017*xGs_temp.loc[xGs_temp['Position']=='D', 'GoalsAgainst_PK_onice']
-                + .166*.049399*xGs_temp.loc[xGs_temp['Position']=='D', 'ShotAttemptsAgainst_PK_onice']
-                + .065*xGs_temp.loc[xGs_temp['Position']=='D', 'xG_flurryAgainst_PK_onice']
-                )/(xGs_temp.loc[xGs_temp['Position']=='D', 'TOI_PK'] * (.017+.166+.065))
-
-            xGs_temp['metric_G'] = 3600*(xGs_temp['xGAgainst_onice']-xGs_temp['GoalsAgainst_onice'])/xGs_temp['TOI']
-
-            ratings_PP = ratings_temp.loc[ratings_temp['Strength'].isin(['5x4','5x3','4x3'])]
-            ratings_PP = ratings_PP[['Player','PlayerID','Player_y','Player_Id_y','SameTeam','Overlap']]
-            ratings_PP = ratings_PP.groupby(['Player','PlayerID','Player_y','Player_Id_y','SameTeam'], as_index=False).sum()
-            ratings_PP = ratings_PP.merge(xGs_temp, on=['Player','PlayerID'])
-            xG_others = xGs_temp.rename(columns={'Player':'Player_y', 'PlayerID':'Player_Id_y'})
-            ratings_PP = ratings_PP.merge(xG_others, on=['Player_y','Player_Id_y'])
-            del xG_others
-
-            ratings_PK = ratings_temp.loc[ratings_temp['Strength'].isin(['4x5','3x5','3x4'])]
-            ratings_PK = ratings_PK[['Player','PlayerID','Player_y','Player_Id_y','SameTeam','Overlap']]
-            ratings_PK = ratings_PK.groupby(['Player','PlayerID','Player_y','Player_Id_y','SameTeam'], as_index=False).sum()
-            ratings_PK = ratings_PK.merge(xGs_temp, on=['Player','PlayerID'])
-            xG_others = xGs_temp.rename(columns={'Player':'Player_y', 'PlayerID':'Player_Id_y'})
-            ratings_PK = ratings_PK.merge(xG_others, on=['Player_y','Player_Id_y'])
-            del xG_others
-
-            ratings_temp = ratings_temp.loc[ratings_temp['Strength']=='5x5']
-            ratings_temp = ratings_temp[['Player','PlayerID','Player_y','Player_Id_y','SameTeam','Overlap']]
-            ratings_temp = ratings_temp.groupby(['Player','PlayerID','Player_y','Player_Id_y','SameTeam'], as_index=False).sum()
-            ratings_temp = ratings_temp.merge(xGs_temp, on=['Player','PlayerID'])
-            xG_others = xGs_temp.rename(columns={'Player':'Player_y', 'PlayerID':'Player_Id_y'})
-            ratings_temp = ratings_temp.merge(xG_others, on=['Player_y','Player_Id_y'])
-            del xG_others
-
-            # F, 5v5
-            ratings_F = ratings_temp.loc[ratings_temp['Position_x']=='F']
-            ratings_F = ratings_F.loc[ratings_F['Position_y']!='G']
-            ratings_F['metricSum_O_team'] = 0.
-            ratings_F.loc[ratings_F['SameTeam'], 'metricSum_O_team'] = ratings_F.loc[ratings_F['SameTeam'], 'metric_O_y']*ratings_F.loc[ratings_F['SameTeam'], 'Overlap']/\
-                (ratings_F.loc[ratings_F['SameTeam'], 'TOI_5v5_x']*4)
-            ratings_F['metricSum_O_comp'] = 0.
-            ratings_F.loc[~ratings_F['SameTeam'], 'metricSum_O_comp'] = ratings_F.loc[~ratings_F['SameTeam'], 'metric_D_y']*ratings_F.loc[~ratings_F['SameTeam'], 'Overlap']/\
-                (ratings_F.loc[~ratings_F['SameTeam'], 'TOI_5v5_x']*5)
-            ratings_F['metricSum_D_team'] = 0.
-            ratings_F.loc[ratings_F['SameTeam'], 'metricSum_D_team'] = ratings_F.loc[ratings_F['SameTeam'], 'metric_D_y']*ratings_F.loc[ratings_F['SameTeam'], 'Overlap']/\
-                (ratings_F.loc[ratings_F['SameTeam'], 'TOI_5v5_x']*4)
-            ratings_F['metricSum_D_comp'] = 0.
-            ratings_F.loc[~ratings_F['SameTeam'], 'metricSum_D_comp'] = ratings_F.loc[~ratings_F['SameTeam'], 'metric_O_y']*ratings_F.loc[~ratings_F['SameTeam'], 'Overlap']/\
-                (ratings_F.loc[~ratings_F['SameTeam'], 'TOI_5v5_x']*5)
-            ratings_F = ratings_F.groupby(['Player','PlayerID','Position_x'], as_index=False).agg({
-                'TOI_5v5_x' : 'max',
-                'OZoneStartRate_5v5_x' : 'max',
-                'DZoneStartRate_5v5_x' : 'max',
-                'metric_O_x' : 'max',
-                'metricSum_O_team' : 'sum',
-                'metricSum_O_comp' : 'sum',
-                'metric_D_x' : 'max',
-                'metricSum_D_team' : 'sum',
-                'metricSum_D_comp' : 'sum',
-                'xG_5v5_onice_x' : 'max',
-                'Goals_5v5_x' : 'max',
-                'Shots_5v5_x' : 'max',
-                'ShotAttempts_5v5_x' : 'max',
-                'UnblockedShotAttempts_5v5_x' : 'max',
-                'xG_5v5_x' : 'max',
-                'xG_flurry_5v5_x' : 'max',
-                'PrimaryAssists_5v5_x' : 'max',
-                'SecondaryAssists_5v5_x' : 'max',
-                'TOI_x' : 'max'
-            })
-
-            features = ['OZoneStartRate_5v5_x','metricSum_O_team','metricSum_O_comp']
-            X = ratings_F.dropna(subset=features)[features].values
-            Y = ratings_F.dropna(subset=features)['metric_O_x'].values
-            model = LinearRegression()
-            model.fit(X, Y)
-            ratings_F['pred_metric_O_x'] = model.predict(ratings_F[features].fillna(0.4).values)
-            ratings_F['metric_O_aboveExp'] = ratings_F['metric_O_x']-ratings_F['pred_metric_O_x']
-            ratings_F['metric_O_aboveAvg'] = ratings_F['metric_O_x']-metric_mean_F_O
-            ratings_F['indiv_contrib_5v5'] = (.142*ratings_F['Goals_5v5_x']+.114*ratings_F['PrimaryAssists_5v5_x']+.036*ratings_F['SecondaryAssists_5v5_x']+\
-                .559*.049399*ratings_F['ShotAttempts_5v5_x']+\
-                .374*ratings_F['xG_flurry_5v5_x'])*3600/(ratings_F['TOI_5v5_x']*(.142+.114+.036+.559+.374))
-            indiv_contrib_mean = (ratings_F['indiv_contrib_5v5']*ratings_F['TOI_5v5_x']).sum()/ratings_F['TOI_5v5_x'].sum()
-            ratings_F['indiv_contrib_5v5_aboveAvg'] = ratings_F['indiv_contrib_5v5']-indiv_contrib_mean
-            ratings_F['GC60_5v5'] = (ratings_F['metric_O_aboveExp']+ratings_F['metric_O_aboveAvg']+ratings_F['indiv_contrib_5v5_aboveAvg'])/3
-            ratings_F = ratings_F.rename(columns = {'Position_x':'Position', 'TOI_5v5_x':'TOI_5v5'})
-            inseason_ratings_season = ratings_F[['Player','PlayerID','Position','TOI_5v5','GC60_5v5']]
-
-            features = ['DZoneStartRate_5v5_x','metricSum_D_team','metricSum_D_comp']
-            X = ratings_F.dropna(subset=features)[features].values
-            Y = ratings_F.dropna(subset=features)['metric_D_x'].values
-            model = LinearRegression()
-            model.fit(X, Y)
-            ratings_F['pred_metric_D_x'] = model.predict(ratings_F[features].fillna(0.4).values)
-            ratings_F['metric_D_aboveExp'] = ratings_F['metric_D_x']-ratings_F['pred_metric_D_x']
-            ratings_F['metric_D_aboveAvg'] = ratings_F['metric_D_x']-metric_mean_F_D
-            ratings_F['GP60_5v5'] = (ratings_F['metric_D_aboveExp']+ratings_F['metric_D_aboveAvg'])/-2
-            inseason_ratings_season = inseason_ratings_season.merge(ratings_F[['Player','PlayerID','Position','GP60_5v5']], \
-                on=['Player','PlayerID','Position'])
-
-            # F, PP
-            ratings_PP_F = ratings_PP.loc[ratings_PP['Position_x']=='F']
-            ratings_PP_F = ratings_PP_F.loc[ratings_PP_F['Position_y']!='G']
-            ratings_PP_F = ratings_PP_F.loc[ratings_PP_F['Overlap']>0]
-            ratings_PP_F = ratings_PP_F.loc[ratings_PP_F['TOI_PP_x']>0]
-            ratings_PP_F = ratings_PP_F.loc[((ratings_PP_F['TOI_PK_y']>0)&(~ratings_PP_F['SameTeam']))|((ratings_PP_F['TOI_PP_y']>0)&(ratings_PP_F['SameTeam']))]
-            ratings_PP_F['metricSum_PP_team'] = 0.
-            ratings_PP_F.loc[ratings_PP_F['SameTeam'], 'metricSum_PP_team'] = ratings_PP_F.loc[ratings_PP_F['SameTeam'], 'metric_PP_y']*ratings_PP_F.loc[ratings_PP_F['SameTeam'], \
-                'Overlap']/(ratings_PP_F.loc[ratings_PP_F['SameTeam'], 'TOI_PP_x']*4)
-            ratings_PP_F['metricSum_PP_comp'] = 0.
-            ratings_PP_F.loc[~ratings_PP_F['SameTeam'], 'metricSum_PP_comp'] = ratings_PP_F.loc[~ratings_PP_F['SameTeam'], 'metric_PK_y'].fillna(0)\
-                *ratings_PP_F.loc[~ratings_PP_F['SameTeam'], 'Overlap']/(ratings_PP_F.loc[~ratings_PP_F['SameTeam'], 'TOI_PP_x']*4)
-            ratings_PP_F = ratings_PP_F.groupby(['Player','PlayerID'], as_index=False).agg({
-                'TOI_PP_x' : 'max',
-                'metric_PP_x' : 'max',
-                'metricSum_PP_team' : 'sum',
-                'metricSum_PP_comp' : 'sum'
-            })
-            ratings_PP_F.columns = ['Player','PlayerID','TOI_PP','metric_O_PP','metricSum_team_PP','metricSum_comp_PP']
-
-            features = ['metricSum_team_PP','metricSum_comp_PP']
-            X = ratings_PP_F[features].values
-            Y = ratings_PP_F['metric_O_PP'].values
-            model = LinearRegression()
-            model.fit(X, Y)
-            intercept_F_GC_PP = model.intercept_
-            weights_F_GC_PP = model.coef_
-
-            # F, PP
-            ratings_PP_F = ratings_PP.loc[ratings_PP['Position_x']=='F']
-            ratings_PP_F = ratings_PP_F.loc[ratings_PP_F['Position_y']!='G']
-            ratings_PP_F = ratings_PP_F.loc[ratings_PP_F['Overlap']>0]
-            ratings_PP_F = ratings_PP_F.loc[ratings_PP_F['TOI_PP_x']>0]
-            ratings_PP_F = ratings_PP_F.loc[((ratings_PP_F['TOI_PK_y']>0)&(~ratings_PP_F['SameTeam']))|((ratings_PP_F['TOI_PP_y']>0)&(ratings_PP_F['SameTeam']))]
-            ratings_PP_F['metricSum_PP_team'] = 0.
-            ratings_PP_F.loc[ratings_PP_F['SameTeam'], 'metricSum_PP_team'] = ratings_PP_F.loc[ratings_PP_F['SameTeam'], 'metric_PP_y']*ratings_PP_F.loc[ratings_PP_F['SameTeam'], \
-                'Overlap']/(ratings_PP_F.loc[ratings_PP_F['SameTeam'], 'TOI_PP_x']*4)
-            ratings_PP_F['metricSum_PP_comp'] = 0.
-            ratings_PP_F.loc[~ratings_PP_F['SameTeam'], 'metricSum_PP_comp'] = ratings_PP_F.loc[~ratings_PP_F['SameTeam'], 'metric_PK_y'].fillna(0)\
-                *ratings_PP_F.loc[~ratings_PP_F['SameTeam'], 'Overlap']/(ratings_PP_F.loc[~ratings_PP_F['SameTeam'], 'TOI_PP_x']*4)
-            ratings_PP_F = ratings_PP_F.groupby(['Player','PlayerID','Position_x'], as_index=False).agg({
-                'TOI_PP_x' : 'max',
-                'metric_PP_x' : 'max',
-                'metricSum_PP_team' : 'sum',
-                'metricSum_PP_comp' : 'sum',
-                'xG_PP_onice_x' : 'max',
-                'Goals_PP_x' : 'max',
-                'Shots_PP_x' : 'max',
-                'ShotAttempts_PP_x' : 'max',
-                'UnblockedShotAttempts_PP_x' : 'max',
-                'xG_PP_x' : 'max',
-                'xG_flurry_PP_x' : 'max',
-                'PrimaryAssists_PP_x' : 'max',
-                'SecondaryAssists_PP_x' : 'max'
-            })
-            ratings_PP_F.columns = ['Player','PlayerID','Position_x','TOI_PP','metric_O_PP','metricSum_team_PP','metricSum_comp_PP','xG_PP_onice','Goals_PP',
-                'Shots_PP','ShotAttempts_PP','UnblockedShotAttempts_PP','xG_PP','xG_flurry_PP','PrimaryAssists_PP','SecondaryAssists_PP']
-
-            features = ['metricSum_team_PP','metricSum_comp_PP']
-            X = ratings_PP_F[features].values
-            Y = ratings_PP_F['metric_O_PP'].values
-            model = LinearRegression()
-            model.fit(X, Y)
-            ratings_PP_F['pred_metric_O_PP'] = model.predict(X)
-            ratings_PP_F['metric_PP_aboveExp'] = ratings_PP_F['metric_O_PP']-ratings_PP_F['pred_metric_O_PP']
-            ratings_PP_F['metric_PP_aboveAvg'] = ratings_PP_F['metric_O_PP']-metric_mean_F_PP
-            ratings_PP_F['indiv_contrib_PP'] = (.072*ratings_PP_F['Goals_PP']+.160*ratings_PP_F['PrimaryAssists_PP']+.091*ratings_PP_F['SecondaryAssists_PP']+\
-                .549*.049399*ratings_PP_F['ShotAttempts_PP']+\
-                .315*ratings_PP_F['xG_flurry_PP'])*3600/(ratings_PP_F['TOI_PP']*(.072+.160+.091+.549+.315))
-            indiv_contrib_mean = (ratings_PP_F['indiv_contrib_PP']*ratings_PP_F['TOI_PP']).sum()/ratings_PP_F['TOI_PP'].sum()
-            ratings_PP_F['indiv_contrib_PP_aboveAvg'] = ratings_PP_F['indiv_contrib_PP']-indiv_contrib_mean
-            ratings_PP_F['GC60_PP'] = (ratings_PP_F['metric_PP_aboveExp']+ratings_PP_F['metric_PP_aboveAvg']+ratings_PP_F['indiv_contrib_PP_aboveAvg'])/3
-            ratings_PP_F = ratings_PP_F.rename(columns = {'Position_x':'Position', 'TOI_PP_x':'TOI_PP'})
-            inseason_ratings_season = inseason_ratings_season.merge(ratings_PP_F[['Player','PlayerID','Position','TOI_PP','GC60_PP']], \
-                on=['Player','PlayerID','Position'], how='left')
-
-            # F, PK
-            ratings_PK_F = ratings_PK.loc[ratings_PK['Position_x']=='F']
-            ratings_PK_F = ratings_PK_F.loc[ratings_PK_F['Position_y']!='G']
-            ratings_PK_F = ratings_PK_F.loc[ratings_PK_F['Overlap']>0]
-            ratings_PK_F = ratings_PK_F.loc[ratings_PK_F['TOI_PK_x']>0]
-            ratings_PK_F = ratings_PK_F.loc[((ratings_PK_F['TOI_PP_y']>0)&(~ratings_PK_F['SameTeam']))|((ratings_PK_F['TOI_PK_y']>0)&(ratings_PK_F['SameTeam']))]
-            ratings_PK_F['metricSum_PK_team'] = 0.
-            ratings_PK_F.loc[ratings_PK_F['SameTeam'], 'metricSum_PK_team'] = ratings_PK_F.loc[ratings_PK_F['SameTeam'], 'metric_PK_y'].fillna(0)\
-                *ratings_PK_F.loc[ratings_PK_F['SameTeam'], 'Overlap']/(ratings_PK_F.loc[ratings_PK_F['SameTeam'], 'TOI_PK_x']*3)
-            ratings_PK_F['metricSum_PK_comp'] = 0.
-            ratings_PK_F.loc[~ratings_PK_F['SameTeam'], 'metricSum_PK_comp'] = ratings_PK_F.loc[~ratings_PK_F['SameTeam'], 'metric_PP_y'].fillna(0)\
-                *ratings_PK_F.loc[~ratings_PK_F['SameTeam'], 'Overlap']/(ratings_PK_F.loc[~ratings_PK_F['SameTeam'], 'TOI_PK_x']*5)
-            ratings_PK_F = ratings_PK_F.groupby(['Player','PlayerID','Position_x'], as_index=False).agg({
-                'TOI_PK_x' : 'max',
-                'metric_PK_x' : 'max',
-                'metricSum_PK_team' : 'sum',
-                'metricSum_PK_comp' : 'sum'
-            })
-            ratings_PK_F.columns = ['Player','PlayerID','Position_x','TOI_PK','metric_D_PK','metricSum_team_PK','metricSum_comp_PK']
-
-            features = ['metricSum_team_PK','metricSum_comp_PK']
-            X = ratings_PK_F[features].values
-            Y = ratings_PK_F['metric_D_PK'].values
-            model = LinearRegression()
-            model.fit(X, Y)
-            intercept_F_GP_PK = model.intercept_
-            weights_F_GP_PK = model.coef_
-            ratings_PK_F['pred_metric_D_PK'] = model.predict(X)
-            ratings_PK_F['metric_D_aboveExp'] = ratings_PK_F['metric_D_PK']-ratings_PK_F['pred_metric_D_PK']
-            ratings_PK_F['metric_D_aboveAvg'] = ratings_PK_F['metric_D_PK']-metric_mean_F_PK
-            ratings_PK_F['GP60_PK'] = (ratings_PK_F['metric_D_aboveExp']+ratings_PK_F['metric_D_aboveAvg'])/-2
-            ratings_PK_F = ratings_PK_F.rename(columns = {'Position_x':'Position', 'TOI_PK_x':'TOI_PK'})
-            inseason_ratings_season = inseason_ratings_season.merge(ratings_PK_F[['Player','PlayerID','Position','TOI_PK','GP60_PK']], \
-                on=['Player','PlayerID','Position'], how='left')
-
-            # F, Pens
-            ratings_pen_F = xGs_temp.loc[xGs_temp['Position']=='F', ['Player','PlayerID','Position','Penalties','PenaltiesDrawn','TOI']]
-            ratings_pen_F = ratings_pen_F.groupby(['Player','PlayerID','Position'], as_index=False).sum()
-            pen_val = ((3600*xGs_temp['Goals_PP_onice'].sum()/xGs_temp['TOI_PP'].sum()) - (3600*xGs_temp['Goals_PK_onice'].sum()/xGs_temp['TOI_PK'].sum()))*(2/60)
-            ratings_pen_F['GI60_Pens'] = pen_val*3600*(.837*ratings_pen_F['PenaltiesDrawn'].fillna(0) - 1.163*ratings_pen_F['Penalties'].fillna(0))/ratings_pen_F['TOI']
-            inseason_ratings_season = inseason_ratings_season.merge(ratings_pen_F[['Player','PlayerID','Position','TOI','GI60_Pens']], \
-                on=['Player','PlayerID','Position'], how='left')
-
-            # D, 5v5
-            ratings_D = ratings_temp.loc[ratings_temp['Position_x']=='D']
-            ratings_D = ratings_D.loc[ratings_D['Position_y']!='G']
-            ratings_D['metricSum_O_team'] = 0.
-            ratings_D.loc[ratings_D['SameTeam'], 'metricSum_O_team'] = ratings_D.loc[ratings_D['SameTeam'], 'metric_O_y']*ratings_D.loc[ratings_D['SameTeam'], 'Overlap']/\
-                (ratings_D.loc[ratings_D['SameTeam'], 'TOI_5v5_x']*4)
-            ratings_D['metricSum_O_comp'] = 0.
-            ratings_D.loc[~ratings_D['SameTeam'], 'metricSum_O_comp'] = ratings_D.loc[~ratings_D['SameTeam'], 'metric_D_y']*ratings_D.loc[~ratings_D['SameTeam'], 'Overlap']/\
-                (ratings_D.loc[~ratings_D['SameTeam'], 'TOI_5v5_x']*5)
-            ratings_D['metricSum_D_team'] = 0.
-            ratings_D.loc[ratings_D['SameTeam'], 'metricSum_D_team'] = ratings_D.loc[ratings_D['SameTeam'], 'metric_D_y']*ratings_D.loc[ratings_D['SameTeam'], 'Overlap']/\
-                (ratings_D.loc[ratings_D['SameTeam'], 'TOI_5v5_x']*4)
-            ratings_D['metricSum_D_comp'] = 0.
-            ratings_D.loc[~ratings_D['SameTeam'], 'metricSum_D_comp'] = ratings_D.loc[~ratings_D['SameTeam'], 'metric_O_y']*ratings_D.loc[~ratings_D['SameTeam'], 'Overlap']/\
-                (ratings_D.loc[~ratings_D['SameTeam'], 'TOI_5v5_x']*5)
-            ratings_D = ratings_D.groupby(['Player','PlayerID','Position_x'], as_index=False).agg({
-                'TOI_5v5_x' : 'max',
-                'OZoneStartRate_5v5_x' : 'max',
-                'DZoneStartRate_5v5_x' : 'max',
-                'metric_O_x' : 'max',
-                'metricSum_O_team' : 'sum',
-                'metricSum_O_comp' : 'sum',
-                'metric_D_x' : 'max',
-                'metricSum_D_team' : 'sum',
-                'metricSum_D_comp' : 'sum',
-                'xG_5v5_onice_x' : 'max',
-                'Goals_5v5_x' : 'max',
-                'Shots_5v5_x' : 'max',
-                'ShotAttempts_5v5_x' : 'max',
-                'UnblockedShotAttempts_5v5_x' : 'max',
-                'xG_5v5_x' : 'max',
-                'xG_flurry_5v5_x' : 'max',
-                'PrimaryAssists_5v5_x' : 'max',
-                'SecondaryAssists_5v5_x' : 'max',
-                'TOI_x' : 'max'
-            })
-
-            features = ['OZoneStartRate_5v5_x','metricSum_O_team','metricSum_O_comp']
-            X = ratings_D.dropna(subset=features)[features].values
-            Y = ratings_D.dropna(subset=features)['metric_O_x'].values
-            model = LinearRegression()
-            model.fit(X, Y)
-            ratings_D['pred_metric_O_x'] = model.predict(ratings_D[features].fillna(0.4).values)
-            ratings_D['metric_O_aboveExp'] = ratings_D['metric_O_x']-ratings_D['pred_metric_O_x']
-            ratings_D['metric_O_aboveAvg'] = ratings_D['metric_O_x']-metric_mean_D_O
-            ratings_D['indiv_contrib_5v5'] = (.070*ratings_D['Goals_5v5_x']+.050*ratings_D['PrimaryAssists_5v5_x']+.021*ratings_D['SecondaryAssists_5v5_x']+\
-                .502*.049399*ratings_D['ShotAttempts_5v5_x']+\
-                .386*ratings_D['xG_flurry_5v5_x'])*3600/(ratings_D['TOI_5v5_x']*(.070+.050+.021+.502+.386))
-            indiv_contrib_mean = (ratings_D['indiv_contrib_5v5']*ratings_D['TOI_5v5_x']).sum()/ratings_D['TOI_5v5_x'].sum()
-            ratings_D['indiv_contrib_5v5_aboveAvg'] = ratings_D['indiv_contrib_5v5']-indiv_contrib_mean
-            ratings_D['GC60_5v5'] = (ratings_D['metric_O_aboveExp']+ratings_D['metric_O_aboveAvg']+ratings_D['indiv_contrib_5v5_aboveAvg'])/3
-            ratings_D = ratings_D.rename(columns = {'Position_x':'Position', 'TOI_5v5_x':'TOI_5v5'})
-            inseason_ratings_season_D = ratings_D[['Player','PlayerID','Position','TOI_5v5','GC60_5v5']]
-
-            features = ['DZoneStartRate_5v5_x','metricSum_D_team','metricSum_D_comp']
-            X = ratings_D.dropna(subset=features)[features].values
-            Y = ratings_D.dropna(subset=features)['metric_D_x'].values
-            model = LinearRegression()
-            model.fit(X, Y)
-            ratings_D['pred_metric_D_x'] = model.predict(ratings_D[features].fillna(0.4).values)
-            ratings_D['metric_D_aboveExp'] = ratings_D['metric_D_x']-ratings_D['pred_metric_D_x']
-            ratings_D['metric_D_aboveAvg'] = ratings_D['metric_D_x']-metric_mean_D_D
-            ratings_D['GP60_5v5'] = (ratings_D['metric_D_aboveExp']+ratings_D['metric_D_aboveAvg'])/-2
-            ratings_D = ratings_D.rename(columns = {'Position_x':'Position', 'TOI_5v5_x':'TOI_5v5'})
-            inseason_ratings_season_D = inseason_ratings_season_D.merge(ratings_D[['Player','PlayerID','Position','GP60_5v5']], \
-                on=['Player','PlayerID','Position'])
-
-            # D, PP
-            ratings_PP_D = ratings_PP.loc[ratings_PP['Position_x']=='D']
-            ratings_PP_D = ratings_PP_D.loc[ratings_PP_D['Position_y']!='G']
-            ratings_PP_D = ratings_PP_D.loc[ratings_PP_D['Overlap']>0]
-            ratings_PP_D = ratings_PP_D.loc[ratings_PP_D['TOI_PP_x']>0]
-            ratings_PP_D = ratings_PP_D.loc[((ratings_PP_D['TOI_PK_y']>0)&(~ratings_PP_D['SameTeam']))|((ratings_PP_D['TOI_PP_y']>0)&(ratings_PP_D['SameTeam']))]
-            ratings_PP_D['metricSum_PP_team'] = 0.
-            ratings_PP_D.loc[ratings_PP_D['SameTeam'], 'metricSum_PP_team'] = ratings_PP_D.loc[ratings_PP_D['SameTeam'], 'metric_PP_y']*ratings_PP_D.loc[ratings_PP_D['SameTeam'], \
-                'Overlap']/(ratings_PP_D.loc[ratings_PP_D['SameTeam'], 'TOI_PP_x']*4)
-            ratings_PP_D['metricSum_PP_comp'] = 0.
-            ratings_PP_D.loc[~ratings_PP_D['SameTeam'], 'metricSum_PP_comp'] = ratings_PP_D.loc[~ratings_PP_D['SameTeam'], 'metric_PK_y'].fillna(0)\
-                *ratings_PP_D.loc[~ratings_PP_D['SameTeam'], 'Overlap']/(ratings_PP_D.loc[~ratings_PP_D['SameTeam'], 'TOI_PP_x']*4)
-            ratings_PP_D = ratings_PP_D.groupby(['Player','PlayerID','Position_x'], as_index=False).agg({
-                'TOI_PP_x' : 'max',
-                'metric_PP_x' : 'max',
-                'metricSum_PP_team' : 'sum',
-                'metricSum_PP_comp' : 'sum',
-                'xG_PP_onice_x' : 'max',
-                'Goals_PP_x' : 'max',
-                'Shots_PP_x' : 'max',
-                'ShotAttempts_PP_x' : 'max',
-                'UnblockedShotAttempts_PP_x' : 'max',
-                'xG_PP_x' : 'max',
-                'xG_flurry_PP_x' : 'max',
-                'PrimaryAssists_PP_x' : 'max',
-                'SecondaryAssists_PP_x' : 'max',
-                'GoalsAdjusted_PP_x' : 'max',
-                'PrimaryAssistsAdjusted_PP_x' : 'max',
-                'ShotAttemptsAdjusted_PP_x' : 'max'
-            })
-            ratings_PP_D.columns = ['Player','PlayerID','Position_x','TOI_PP','metric_O_PP','metricSum_team_PP','metricSum_comp_PP','xG_PP_onice','Goals_PP',
-                'Shots_PP','ShotAttempts_PP','UnblockedShotAttempts_PP','xG_PP','xG_flurry_PP','PrimaryAssists_PP','SecondaryAssists_PP',
-                'GoalsAdjusted_PP','PrimaryAssistsAdjusted_PP','ShotAttemptsAdjusted_PP']
-
-            features = ['metricSum_team_PP','metricSum_comp_PP']
-            X = ratings_PP_D[features].values
-            Y = ratings_PP_D['metric_O_PP'].values
-            model = LinearRegression()
-            model.fit(X, Y)
-            ratings_PP_D['pred_metric_O_PP'] = model.predict(X)
-            ratings_PP_D['metric_PP_aboveExp'] = ratings_PP_D['metric_O_PP']-ratings_PP_D['pred_metric_O_PP']
-            ratings_PP_D['metric_PP_aboveAvg'] = ratings_PP_D['metric_O_PP']-metric_mean_D_PP
-            ratings_PP_D['indiv_contrib_PP'] = (.021*ratings_PP_D['GoalsAdjusted_PP']+.091*ratings_PP_D['PrimaryAssistsAdjusted_PP']+.033*ratings_PP_D['SecondaryAssists_PP']+\
-                .354*.049399*ratings_PP_D['ShotAttempts_PP']+\
-                .289*ratings_PP_D['xG_PP'])*3600/(ratings_PP_D['TOI_PP']*(.021+.091+.033+.354+.289))
-            indiv_contrib_mean = (ratings_PP_D['indiv_contrib_PP']*ratings_PP_D['TOI_PP']).sum()/ratings_PP_D['TOI_PP'].sum()
-            ratings_PP_D['indiv_contrib_PP_aboveAvg'] = ratings_PP_D['indiv_contrib_PP']-indiv_contrib_mean
-            ratings_PP_D['GC60_PP'] = (ratings_PP_D['metric_PP_aboveExp']+ratings_PP_D['metric_PP_aboveAvg']+ratings_PP_D['indiv_contrib_PP_aboveAvg'])/3
-            ratings_PP_D = ratings_PP_D.rename(columns = {'Position_x':'Position', 'TOI_PP_x':'TOI_PP'})
-            inseason_ratings_season_D = inseason_ratings_season_D.merge(ratings_PP_D[['Player','PlayerID','Position','TOI_PP','GC60_PP']], \
-                on=['Player','PlayerID','Position'], how='left')
-
-            # D, PK
-            ratings_PK_D = ratings_PK.loc[ratings_PK['Position_x']=='D']
-            ratings_PK_D = ratings_PK_D.loc[ratings_PK_D['Position_y']!='G']
-            ratings_PK_D = ratings_PK_D.loc[ratings_PK_D['Overlap']>0]
-            ratings_PK_D = ratings_PK_D.loc[ratings_PK_D['TOI_PK_x']>0]
-            ratings_PK_D = ratings_PK_D.loc[((ratings_PK_D['TOI_PP_y']>0)&(~ratings_PK_D['SameTeam']))|((ratings_PK_D['TOI_PK_y']>0)&(ratings_PK_D['SameTeam']))]
-            ratings_PK_D['metricSum_PK_team'] = 0.
-            ratings_PK_D.loc[ratings_PK_D['SameTeam'], 'metricSum_PK_team'] = ratings_PK_D.loc[ratings_PK_D['SameTeam'], 'metric_PK_y'].fillna(0)\
-                *ratings_PK_D.loc[ratings_PK_D['SameTeam'], 'Overlap']/(ratings_PK_D.loc[ratings_PK_D['SameTeam'], 'TOI_PK_x']*3)
-            ratings_PK_D['metricSum_PK_comp'] = 0.
-            ratings_PK_D.loc[~ratings_PK_D['SameTeam'], 'metricSum_PK_comp'] = ratings_PK_D.loc[~ratings_PK_D['SameTeam'], 'metric_PP_y'].fillna(0)\
-                *ratings_PK_D.loc[~ratings_PK_D['SameTeam'], 'Overlap']/(ratings_PK_D.loc[~ratings_PK_D['SameTeam'], 'TOI_PK_x']*5)
-            ratings_PK_D = ratings_PK_D.groupby(['Player','PlayerID','Position_x'], as_index=False).agg({
-                'TOI_PK_x' : 'max',
-                'metric_PK_x' : 'max',
-                'metricSum_PK_team' : 'sum',
-                'metricSum_PK_comp' : 'sum'
-            })
-            ratings_PK_D.columns = ['Player','PlayerID','Position_x','TOI_PK','metric_D_PK','metricSum_team_PK','metricSum_comp_PK']
-
-            features = ['metricSum_team_PK','metricSum_comp_PK']
-            X = ratings_PK_D[features].values
-            Y = ratings_PK_D['metric_D_PK'].values
-            model = LinearRegression()
-            model.fit(X, Y)
-            ratings_PK_D['pred_metric_D_PK'] = model.predict(X)
-            ratings_PK_D['metric_D_aboveExp'] = ratings_PK_D['metric_D_PK']-ratings_PK_D['pred_metric_D_PK']
-            ratings_PK_D['metric_D_aboveAvg'] = ratings_PK_D['metric_D_PK']-metric_mean_D_PK
-            ratings_PK_D['GP60_PK'] = (ratings_PK_D['metric_D_aboveExp']+ratings_PK_D['metric_D_aboveAvg'])/-2
-            ratings_PK_D = ratings_PK_D.rename(columns = {'Position_x':'Position', 'TOI_PP_x':'TOI_PP'})
-            inseason_ratings_season_D = inseason_ratings_season_D.merge(ratings_PK_D[['Player','PlayerID','Position','TOI_PK','GP60_PK']], \
-                on=['Player','PlayerID','Position'], how='left')
-
-            # D, Pens
-            ratings_pen_D = xGs_temp.loc[xGs_temp['Position']=='D', ['Player','PlayerID','Position','Penalties','PenaltiesDrawn','TOI']]
-            ratings_pen_D = ratings_pen_D.groupby(['Player','PlayerID','Position'], as_index=False).sum()
-            pen_val = ((3600*xGs_temp['Goals_PP_onice'].sum()/xGs_temp['TOI_PP'].sum()) - (3600*xGs_temp['Goals_PK_onice'].sum()/xGs_temp['TOI_PK'].sum()))*(2/60)
-            ratings_pen_D['GI60_Pens'] = pen_val*3600*(.733*ratings_pen_D['PenaltiesDrawn'].fillna(0) - 1.267*ratings_pen_D['Penalties'].fillna(0))/ratings_pen_D['TOI']
-            inseason_ratings_season_D = inseason_ratings_season_D.merge(ratings_pen_D[['Player','PlayerID','Position','TOI','GI60_Pens']], \
-                on=['Player','PlayerID','Position'], how='left')
-            inseason_ratings_season = pd.concat([inseason_ratings_season, inseason_ratings_season_D], ignore_index=True)
-
-            # G
-            inseason_ratings_season_G = xGs_temp.loc[xGs_temp['Position']=='G', ['Player','PlayerID','Position','TOI','xGAdjustedAgainst_onice',
-                'GoalsAdjustedAgainst_onice','GoalsAgainst_onice','ShotsAgainst_onice']]
-            inseason_ratings_season_G = inseason_ratings_season_G.groupby(['Player','PlayerID','Position'], as_index=False).sum()
-            inseason_ratings_season_G['GSAXAdjusted'] = inseason_ratings_season_G['xGAdjustedAgainst_onice'] - inseason_ratings_season_G['GoalsAdjustedAgainst_onice']
-            inseason_ratings_season_G['SvPct'] = 1 - (inseason_ratings_season_G['GoalsAgainst_onice']/inseason_ratings_season_G['ShotsAgainst_onice'])
-            inseason_ratings_season_G['SvPctAboveAvg'] = inseason_ratings_season_G['SvPct'] - \
-                ((inseason_ratings_season_G['SvPct']*inseason_ratings_season_G['TOI']).sum()/inseason_ratings_season_G['TOI'].sum())
-            inseason_ratings_season_G['GoalsSavedAboveAvg'] = inseason_ratings_season_G['SvPctAboveAvg']*inseason_ratings_season_G['ShotsAgainst_onice']
-            inseason_ratings_season_G['GI60'] = (.020*inseason_ratings_season_G['GoalsSavedAboveAvg']+.018*inseason_ratings_season_G['GSAXAdjusted'])*3600/\
-                (inseason_ratings_season_G['TOI']*(.020+.018))
-            inseason_ratings_season_G = inseason_ratings_season_G[['Player','PlayerID','Position','TOI','GI60']]
-            inseason_ratings_season = inseason_ratings_season.merge(inseason_ratings_season_G, on=['Player','PlayerID','Position','TOI'], how='outer')
-
-            # combine
-            inseason_ratings_season['Date'] = i
-            inseason_ratings_season['Season'] = season
-            inseason_ratings_season.columns = ['Player','PlayerID','Position','prevGames_TOI_5v5','prevGames_GC60_5v5','prevGames_GP60_5v5',
-                'prevGames_TOI_PP','prevGames_GC60_PP','prevGames_TOI_PK','prevGames_GP60_PK','prevGames_TOI','prevGames_GI60_Pens','prevGames_GI60',
-                'Date','Season']
-            if len(inseason_ratings.index)==0:
-                inseason_ratings = inseason_ratings_season.copy(deep=True)
-            else:
-                inseason_ratings = pd.concat([inseason_ratings, inseason_ratings_season], ignore_index=True)
+        # add games from prev_date up to (not including) this date to the totals
+        player_first, player_last = np.searchsorted(player_dates, [prev_date, i.strftime('%Y-%m-%d')])
+        np.add.at(player_totals, player_codes[player_first:player_last], player_stats[player_first:player_last])
+        player_seen[player_codes[player_first:player_last]] = True
+        pair_first, pair_last = np.searchsorted(pair_dates, [prev_date, i.strftime('%Y-%m-%d')])
+        np.add.at(pair_totals, (pair_strengths[pair_first:pair_last], pair_codes[pair_first:pair_last]), pair_overlaps[pair_first:pair_last])
+        pair_seen[pair_strengths[pair_first:pair_last], pair_codes[pair_first:pair_last]] = True
+        prev_date = i.strftime('%Y-%m-%d')
+        if not player_seen.any():
+            continue
+
+        # no games since the last date computed, so its ratings carry over
+        if inseason_ratings_season is not None and player_first==player_last and pair_first==pair_last:
+            inseason_ratings.append(inseason_ratings_season.assign(Date=i))
+            continue
+
+        xGs_temp = pd.concat([players.loc[player_seen].reset_index(drop=True),
+            pd.DataFrame(player_totals[player_seen], columns=stats)], axis=1)
+        ratings_temp = pairs.loc[pair_seen[0]].assign(Overlap=pair_totals[0, pair_seen[0]])
+        ratings_PP = pairs.loc[pair_seen[1]].assign(Overlap=pair_totals[1, pair_seen[1]])
+        ratings_PK = pairs.loc[pair_seen[2]].assign(Overlap=pair_totals[2, pair_seen[2]])
+        inseason_ratings_season = _player_ratings_on_date(xGs_temp, ratings_temp, ratings_PP, ratings_PK, i, season)
+        inseason_ratings.append(inseason_ratings_season)
+
+    if len(inseason_ratings)==0:
+        return pd.DataFrame(columns=PLAYER_RATINGS_COLUMNS)
+    inseason_ratings = pd.concat(inseason_ratings, ignore_index=True)
+    inseason_ratings['Date'] = inseason_ratings['Date'].astype(str)
+    return inseason_ratings
+
+def get_player_inseason_ratings(playerGame, toiOverlap, start_date, end_date, data_dir=None):
+    # ratings going into each date from start_date to end_date, for every player who has played so far in the season
+    # if data_dir is given, dates already in the snapshot store are read from it and only the dates after them are computed
+    if data_dir is None:
+        return _player_inseason_ratings(playerGame, toiOverlap, start_date, end_date)
+
+    played = playerGame.loc[(playerGame['Playoffs']==0)&(playerGame['TOI_5v5'].notnull())]
+    return _snapshot_ratings('playerRatings', lambda s, e: _player_inseason_ratings(playerGame, toiOverlap, s, e), PLAYER_RATINGS_COLUMNS,
+        playerGame['Season'].unique()[0], start_date, end_date, played['Date'].max(), data_dir)
+
+def add_player_inseason_ratings(playerGame, toiOverlap, start_date, end_date, data_dir=None):
+    # add impact from previous games so far in the season to playerGame
+    inseason_ratings = get_player_inseason_ratings(playerGame, toiOverlap, start_date, end_date, data_dir)
 
     # merge with original data
     playerGame['Date'] = playerGame['Date'].astype(str)
@@ -529,7 +669,29 @@ def add_player_inseason_ratings(playerGame, toiOverlap, start_date, end_date):
     return playerGame
 
 
-def add_team_inseason_ratings(teamGame, start_date, end_date):
+def _team_inseason_ratings_cumulative(teamGame, metrics, start_date, end_date):
+    # mean of each team's previous games in the season for every date at once, from cumulative sums and counts by team-season
+    daily = teamGame[['Team','Season','Date']+metrics].groupby(['Team','Season','Date'])
+    daily_sums = daily.sum()
+    daily_counts = daily.count()
+    prev_sums = daily_sums.groupby(level=['Team','Season']).cumsum() - daily_sums
+    prev_counts = daily_counts.groupby(level=['Team','Season']).cumsum() - daily_counts
+    inseason_ratings = prev_sums / prev_counts.where(prev_counts>0)
+    inseason_ratings.columns = ['prevGames_'+m for m in metrics]
+    inseason_ratings = inseason_ratings.reset_index()
+
+    # only dates in the range, and only the latest season playing on each date
+    inseason_ratings = inseason_ratings.loc[(inseason_ratings['Date']>=pd.Timestamp(start_date).strftime('%Y-%m-%d'))&\
+        (inseason_ratings['Date']<=pd.Timestamp(end_date).strftime('%Y-%m-%d'))]
+    inseason_ratings = inseason_ratings.loc[inseason_ratings['Season']==inseason_ratings.groupby('Date')['Season'].transform('max')]
+    inseason_ratings = inseason_ratings[['Team','Season']+['prevGames_'+m for m in metrics]+['Date']]
+
+    return inseason_ratings
+
+def add_team_inseason_ratings(teamGame, start_date, end_date, data_dir=None):
+    # add the mean of each team's previous games in the season to teamGame
+    # if data_dir is given, dates already in the snapshot store are read from it and only the dates after them are computed
+
     # add opponent metrics
     teamGame_Opp = teamGame[['Game_Id','Date','Team','Season',
         'Goals', 'Shots', 'ShotAttempts',
@@ -562,48 +724,19 @@ def add_team_inseason_ratings(teamGame, start_date, end_date):
         'GoalsAdjustedAgainst','ShotsAdjustedAgainst','ShotAttemptsAdjustedAgainst','UnblockedShotAttemptsAdjustedAgainst','xGAdjustedAgainst','xG_flurryAdjustedAgainst',
         'GoalsAdjusted_5v5Against','ShotsAdjusted_5v5Against','ShotAttemptsAdjusted_5v5Against','UnblockedShotAttemptsAdjusted_5v5Against',
         'xGAdjusted_5v5Against','xG_flurryAdjusted_5v5Against']
-    inseason_ratings = pd.DataFrame(columns = ['Team','Season',
-        'prevGames_Goals','prevGames_Shots','prevGames_ShotAttempts','prevGames_UnblockedShotAttempts','prevGames_xG','prevGames_xG_flurry',
-        'prevGames_Goals_5v5','prevGames_Shots_5v5','prevGames_ShotAttempts_5v5','prevGames_UnblockedShotAttempts_5v5','prevGames_xG_5v5','prevGames_xG_flurry_5v5',
-        'prevGames_GoalsAdjusted','prevGames_ShotsAdjusted','prevGames_ShotAttemptsAdjusted',
-            'prevGames_UnblockedShotAttemptsAdjusted','prevGames_xGAdjusted','prevGames_xG_flurryAdjusted',
-        'prevGames_GoalsAdjusted_5v5','prevGames_ShotsAdjusted_5v5','prevGames_ShotAttemptsAdjusted_5v5',
-            'prevGames_UnblockedShotAttemptsAdjusted_5v5','prevGames_xGAdjusted_5v5','prevGames_xG_flurryAdjusted_5v5',
-        'prevGames_GoalsAgainst','prevGames_ShotsAgainst','prevGames_ShotAttemptsAgainst',
-            'prevGames_UnblockedShotAttemptsAgainst','prevGames_xGAgainst','prevGames_xG_flurryAgainst',
-        'prevGames_Goals_5v5Against','prevGames_Shots_5v5Against','prevGames_ShotAttempts_5v5Against',
-            'prevGames_UnblockedShotAttempts_5v5Against','prevGames_xG_5v5Against','prevGames_xG_flurry_5v5Against',
-        'prevGames_GoalsAdjustedAgainst','prevGames_ShotsAdjustedAgainst','prevGames_ShotAttemptsAdjustedAgainst',
-            'prevGames_UnblockedShotAttemptsAdjustedAgainst','prevGames_xGAdjustedAgainst','prevGames_xG_flurryAdjustedAgainst',
-        'prevGames_GoalsAdjusted_5v5Against','prevGames_ShotsAdjusted_5v5Against','prevGames_ShotAttemptsAdjusted_5v5Against',
-            'prevGames_UnblockedShotAttemptsAdjusted_5v5Against','prevGames_xGAdjusted_5v5Against','prevGames_xG_flurryAdjusted_5v5Against','Date'])
-    for i in pd.date_range(start_date, end_date):
-        curSeason = teamGame.loc[teamGame['Date']==i.strftime('%Y-%m-%d'), 'Season'].max()
-        df_temp = teamGame.loc[(teamGame['Date']<i.strftime('%Y-%m-%d'))&(teamGame['Season']==curSeason)]
-        df_temp = df_temp.loc[df_temp['Team'].isin(teamGame.loc[teamGame['Date']==i.strftime('%Y-%m-%d'), 'Team'])]
-        if len(df_temp.index)>0:
-            df_temp = df_temp[['Team','Season']+metrics].groupby(['Team','Season'], as_index=False).mean()
-            df_temp.columns = ['Team','Season',
-                'prevGames_Goals','prevGames_Shots','prevGames_ShotAttempts','prevGames_UnblockedShotAttempts','prevGames_xG','prevGames_xG_flurry',
-                'prevGames_Goals_5v5','prevGames_Shots_5v5','prevGames_ShotAttempts_5v5','prevGames_UnblockedShotAttempts_5v5','prevGames_xG_5v5','prevGames_xG_flurry_5v5',
-                'prevGames_GoalsAdjusted','prevGames_ShotsAdjusted','prevGames_ShotAttemptsAdjusted',
-                    'prevGames_UnblockedShotAttemptsAdjusted','prevGames_xGAdjusted','prevGames_xG_flurryAdjusted',
-                'prevGames_GoalsAdjusted_5v5','prevGames_ShotsAdjusted_5v5','prevGames_ShotAttemptsAdjusted_5v5',
-                    'prevGames_UnblockedShotAttemptsAdjusted_5v5','prevGames_xGAdjusted_5v5','prevGames_xG_flurryAdjusted_5v5',
-                'prevGames_GoalsAgainst','prevGames_ShotsAgainst','prevGames_ShotAttemptsAgainst',
-                    'prevGames_UnblockedShotAttemptsAgainst','prevGames_xGAgainst','prevGames_xG_flurryAgainst',
-                'prevGames_Goals_5v5Against','prevGames_Shots_5v5Against','prevGames_ShotAttempts_5v5Against',
-                    'prevGames_UnblockedShotAttempts_5v5Against','prevGames_xG_5v5Against','prevGames_xG_flurry_5v5Against',
-                'prevGames_GoalsAdjustedAgainst','prevGames_ShotsAdjustedAgainst','prevGames_ShotAttemptsAdjustedAgainst',
-                    'prevGames_UnblockedShotAttemptsAdjustedAgainst','prevGames_xGAdjustedAgainst','prevGames_xG_flurryAdjustedAgainst',
-                'prevGames_GoalsAdjusted_5v5Against','prevGames_ShotsAdjusted_5v5Against','prevGames_ShotAttemptsAdjusted_5v5Against',
-                    'prevGames_UnblockedShotAttemptsAdjusted_5v5Against','prevGames_xGAdjusted_5v5Against','prevGames_xG_flurryAdjusted_5v5Against']
-            df_temp['Date'] = i.strftime('%Y-%m-%d')
-            if len(inseason_ratings.index)==0:
-                inseason_ratings = df_temp.copy(deep=True)
-            else:
-                inseason_ratings = pd.concat([inseason_ratings, df_temp], ignore_index=True)
-
+    compute = lambda s, e: _team_inseason_ratings_cumulative(teamGame, metrics, s, e)
+    in_range = teamGame.loc[(teamGame['Date']>=pd.Timestamp(start_date).strftime('%Y-%m-%d'))&(teamGame['Date']<=pd.Timestamp(end_date).strftime('%Y-%m-%d'))]
+    if data_dir is None or len(in_range.index)==0:
+        inseason_ratings = compute(start_date, end_date)
+    else:
+        # one snapshot per season in the range, each over the dates from the season's first game in the range (or start_date
+        # for the first season) up to the day before the next season's first game (or end_date for the last season)
+        firsts = in_range.groupby('Season')['Date'].min().sort_values()
+        starts = [pd.Timestamp(start_date).strftime('%Y-%m-%d')] + firsts.iloc[1:].tolist()
+        ends = [(pd.Timestamp(d) - pd.Timedelta(days=1)).strftime('%Y-%m-%d') for d in firsts.iloc[1:]] + [pd.Timestamp(end_date).strftime('%Y-%m-%d')]
+        final_date = teamGame.loc[teamGame['Goals'].notnull(), 'Date'].max()
+        inseason_ratings = pd.concat([_snapshot_ratings('teamRatings', compute, ['Team','Season']+['prevGames_'+m for m in metrics]+['Date'],
+            season, s, e, final_date, data_dir) for season, s, e in zip(firsts.index, starts, ends) if s<=e], ignore_index=True)
 
     teamGame = teamGame.merge(inseason_ratings, on=['Team','Season','Date'], how='left')
     return teamGame
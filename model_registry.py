@@ -0,0 +1,56 @@
+import os
+import pickle
+import threading
+
+# process-wide cache of pickled model artifacts (mean encodings, scalers, models), so each file is only unpickled once
+# entries are keyed by path and checked against the file's mtime and size, so a retrained model is picked up on its next use
+
+_artifacts = {}
+_compiled = {}
+_lock = threading.RLock()
+
+def _file_version(path):
+    stat = os.stat(path)
+    return (stat.st_mtime_ns, stat.st_size)
+
+def load(path):
+    # unpickled contents of path, loading it only if it isn't cached or the file has changed since it was cached
+    path = os.path.abspath(path)
+    version = _file_version(path)
+    with _lock:
+        cached = _artifacts.get(path)
+        if cached is not None and cached[0]==version:
+            return cached[1]
+        artifact = pickle.load(open(path, 'rb'))
+        _artifacts[path] = (version, artifact)
+    return artifact
+
+def load_compiled(paths, compile):
+    # compile(*artifacts) for the artifacts at paths, built once and cached until any of the files change
+    paths = tuple(os.path.abspath(p) for p in paths)
+    versions = tuple(_file_version(p) for p in paths)
+    with _lock:
+        cached = _compiled.get((compile, paths))
+        if cached is not None and cached[0]==versions:
+            return cached[1]
+        compiled = compile(*[load(p) for p in paths])
+        _compiled[(compile, paths)] = (versions, compiled)
+    return compiled
+
+def clear():
+    # drop all cached artifacts
+    with _lock:
+        _artifacts.clear()
+        _compiled.clear()
+
+def warm_up(models=None):
+    # load the artifacts for the given models (xG_model and games_model instances, by default the ones from the configs) up front,
+    # so a long-running process pays the loading cost at startup instead of on its first prediction
+    if models is None:
+        import xG_model
+        import games_model
+        models = [xG_model.xG_model(), games_model.games_model()]
+    for model in models:
+        model.load()
+        if hasattr(model, 'compile'):
+            model.compile()
@@ -1,16 +1,16 @@
 # TODONOW: team roster configs
 
 # ORDER TO RUN:
+#0. data_storage.py once, to convert any old .pkl data files to the partitioned parquet datasets
 #1. update_data.py for each season (includes data scraping)
 #2. use python in command line to do update_preseason_ratings.py. only necessary for a new season
-#3. predict_today.py
+#3. predict_today.py, or prediction_server.py to keep the data and model loaded between predictions
 
-# TODO: only run elo updates for new games
-# TODO: predictions only work for one day at a time
 # TODO: scraper may have included some preseason games in the data
 
 import data_scraper
 import data_processing
+import data_storage
 import inseason_ratings
 import games_model
 import argparse
@@ -21,8 +21,58 @@ import datetime
 from datetime import date
 from update_preseason_ratings import PreseasonRatingsUpdater
 
+def get_projected_lineups(schedule, ids, season=2022, roster_dir='configs/rosters'):
+    # projected lineup (from the team's roster config) for every team in every scheduled game, as playerGame rows
+    # ids has the PlayerID for each Player. returns the lineups and the teams that don't have a roster config
+    games = pd.concat([schedule[['game_id','date','home_team']].rename(columns={'home_team':'Team'}),
+        schedule[['game_id','date','away_team']].rename(columns={'away_team':'Team'})], ignore_index=True)
+    games = games.rename(columns={'game_id':'Game_Id', 'date':'Date'})
+    games['Team'] = games['Team'].replace({'PHX':'ARI', 'S.J':'SJS', 'L.A':'LAK', 'T.B':'TBL', 'N.J':'NJD'})
+
+    rosters = []
+    missing_teams = []
+    for t in games['Team'].unique().tolist():
+        try:
+            roster = pd.read_json(os.path.join(roster_dir, '{}.json'.format(t)))
+        except FileNotFoundError:
+            print ('No roster found for {}, ignoring this team'.format(t))
+            missing_teams.append(t)
+            continue
+        roster = roster.merge(ids, on='Player', how='left')
+        if len(roster.loc[roster['PlayerID'].isnull()].index)>0:
+            print ('Missing PlayerIDs:')
+            print (roster.loc[roster['PlayerID'].isnull()])
+        roster['Team'] = t
+        rosters.append(roster)
+    if len(rosters)==0:
+        return pd.DataFrame(columns=['Player','PlayerID','Position','Season','Date','DateInt','Playoffs','Game_Id','Team']), missing_teams
+
+    # the same lineup for each of the team's games
+    rosters = pd.concat(rosters, ignore_index=True).merge(games.groupby(['Team','Date'], as_index=False)['Game_Id'].max(), on='Team')
+    rosters['Season'] = int(season)
+    rosters['DateInt'] = rosters['Date'].str.replace('-','').astype(np.int64)
+    rosters['Playoffs'] = 0
+    return rosters, missing_teams
+
+def read_preseason_ratings(preseason_players_file='data/ratings_preseason_players.csv', preseason_teams_file='data/ratings_preseason_teams.csv'):
+    # preseason player and team ratings, with the columns named as add_game_features expects them
+    player_ratings = pd.read_csv(preseason_players_file)
+    player_ratings.columns = ['Player','PlayerID','Position','preseason_xGI60','preseason_xGC60_5v5','preseason_xGP60_5v5',
+        'preseason_xGC60_PP','preseason_xGP60_PK','preseason_xGI60_Pens','Season']
+
+    team_ratings = pd.read_csv(preseason_teams_file)
+    colnames = []
+    for c in team_ratings.columns.tolist():
+        if c[0]=='x':
+            colnames.append('preseason_'+c)
+        else:
+            colnames.append(c)
+    team_ratings.columns = colnames
+
+    return player_ratings, team_ratings
+
 def main(tofile, start_date=None, end_date=None, season=2022,
-        teamGame_file='data/teamGame.pkl', playerGame_file=None, toiOverlap_file=None,
+        data_dir='data',
         preseason_teams_file='data/ratings_preseason_teams.csv',
         preseason_players_file='data/ratings_preseason_players.csv',
         out_file=None, savetrain=False, train_file=None):
@@ -33,87 +83,57 @@ def main(tofile, start_date=None, end_date=None, season=2022,
         end_date = date.today().strftime('%Y-%m-%d')
 
     # determine data filenames if not given
-    if playerGame_file is None:
-        playerGame_file = 'data/playerGame_{}.pkl'.format(str(season))
-    if toiOverlap_file is None:
-        toiOverlap_file = 'data/toiOverlap_{}.pkl'.format(str(season))
     if tofile and out_file is None:
         out_file = 'data/gamePredictions_{}.csv'.format(str(season))
     if savetrain and train_file is None:
-        out_file = 'data/gameTrain_{}.csv'.format(str(season))
+        train_file = 'data/gameTrain_{}.csv'.format(str(season))
 
     # get schedule of games to predict
     schedule = data_scraper.scrape_schedule(start_date, end_date)
     print ('done scraping!')
 
     # read teamGame and playerGame data
-    teamGame = pd.read_pickle(teamGame_file)
-    try:
-        playerGame = pd.read_pickle(playerGame_file)
+    teamGame = data_storage.read_data('teamGame', data_dir=data_dir)
+    if data_storage.has_data('playerGame', season, data_dir):
+        playerGame = data_storage.read_data('playerGame', season, data_dir=data_dir)
         seasonFirstDay = False
-    except FileNotFoundError:
+    else:
         # there have not been any games yet this season, so playerGame doesn't exist yet
         playerGame = pd.DataFrame(columns=['Player','PlayerID','TOI_5v5'])
         seasonFirstDay = True
-        pass
 
-    # combine with scheduled games
-    teamGame = data_processing.add_scheduled_games(teamGame, schedule, season)
+    # combine with scheduled games, starting from the saved team state if it's up to date with teamGame
+    team_state = data_storage.read_team_state(data_dir)
+    if team_state is not None and (len(teamGame.index)==0 or team_state['Date'].max()!=teamGame['Date'].max()):
+        team_state = None
+    teamGame = data_processing.add_scheduled_games(teamGame, schedule, season, team_state)
     ### TODONOW: add projected lineup to playerGame, need ['Player','PlayerID','Position','Season','Date','Playoffs']
-    rosters = pd.DataFrame()
-    ids = pd.read_pickle('data/playerGame_{}.pkl'.format(str(int(season)-1)))[['Player','PlayerID']]
+    ids = data_storage.read_data('playerGame', int(season)-1, ['Player','PlayerID'], data_dir=data_dir)
     ids = pd.concat([playerGame[['Player','PlayerID']], ids], ignore_index=True)
     ids = ids.groupby('Player', as_index=False).max()
-    allTeams = pd.concat([schedule[['home_team']].rename(columns={'home_team':'Team'}),\
-        schedule[['away_team']].rename(columns={'away_team':'Team'})])
-    allTeams['Team'] = allTeams['Team'].replace({'PHX':'ARI', 'S.J':'SJS', 'L.A':'LAK', 'T.B':'TBL', 'N.J':'NJD'})
-    for t in allTeams['Team'].unique().tolist():
-        try:
-            roster = pd.read_json('configs/rosters/{}.json'.format(t))
-            roster = roster.merge(ids, on='Player', how='left')
-            if len(roster.loc[roster['PlayerID'].isnull()].index)>0:
-                print ('Missing PlayerIDs:')
-                print (roster.loc[roster['PlayerID'].isnull()])
-            roster['Season'] = int(season)
-            roster['Date'] = start_date
-            roster['DateInt'] = roster['Date'].str.replace('-','').astype(np.int64)
-            roster['Playoffs'] = 0
-            roster['Game_Id'] = schedule.loc[((schedule['home_team']==t)|(schedule['away_team']==t))&(schedule['date']==start_date),'game_id'].max()
-            roster['Team'] = t
-            playerGame = pd.concat([playerGame, roster], ignore_index=True)
-            teamGame.loc[(teamGame['Team']==t)&(teamGame['Date']==start_date), 'StartingGoalie_Id'] = roster.loc[roster['Position']=='G', 'PlayerID'].max()
-        except FileNotFoundError:
-            print ('No roster found for {}, ignoring this team'.format(t))
-            teamGame = teamGame.loc[~((teamGame['Team']==t)&(teamGame['Date'].isin(schedule['date'].unique())))]
-            pass
-
+    rosters, missing_teams = get_projected_lineups(schedule, ids, season)
+    playerGame = pd.concat([playerGame, rosters], ignore_index=True)
+    goalies = rosters.loc[rosters['Position']=='G'].groupby(['Team','Date'], as_index=False)['PlayerID'].max()
+    goalies = teamGame[['Team','Date']].merge(goalies, how='left', on=['Team','Date'])
+    teamGame.loc[goalies['PlayerID'].notnull().values, 'StartingGoalie_Id'] = goalies.loc[goalies['PlayerID'].notnull(), 'PlayerID'].values
+    teamGame = teamGame.loc[~((teamGame['Team'].isin(missing_teams))&(teamGame['Date'].isin(schedule['date'].unique())))]
 
     # only include regular season games
     teamGame = teamGame.loc[teamGame['Playoffs']==0]
     playerGame = playerGame.loc[playerGame['Playoffs']==0]
 
     # add preseason ratings
-    ratings = pd.read_csv(preseason_players_file)
-    ratings.columns = ['Player','PlayerID','Position','preseason_xGI60','preseason_xGC60_5v5','preseason_xGP60_5v5',
-        'preseason_xGC60_PP','preseason_xGP60_PK','preseason_xGI60_Pens','Season']
-    playerGame = playerGame.merge(ratings, on=['Player','PlayerID','Season','Position'], how='left')
-
-    ratings = pd.read_csv(preseason_teams_file)
-    colnames = []
-    for c in ratings.columns.tolist():
-        if c[0]=='x':
-            colnames.append('preseason_'+c)
-        else:
-            colnames.append(c)
-    ratings.columns = colnames
-    teamGame = teamGame.merge(ratings, on=['Team','Season'], how='left')
+    player_ratings, team_ratings = read_preseason_ratings(preseason_players_file, preseason_teams_file)
+    playerGame = playerGame.merge(player_ratings, on=['Player','PlayerID','Season','Position'], how='left')
+    teamGame = teamGame.merge(team_ratings, on=['Team','Season'], how='left')
 
     # add inseason ratings
     if seasonFirstDay:
         playerGame = inseason_ratings.add_player_inseason_ratings(playerGame, pd.DataFrame(columns=['Player_x','Player_Id_x','Strength','Game_Id']), start_date, end_date)
     else:
-        playerGame = inseason_ratings.add_player_inseason_ratings(playerGame, pd.read_pickle(toiOverlap_file), start_date, end_date)
-    teamGame = inseason_ratings.add_team_inseason_ratings(teamGame, start_date, end_date)
+        playerGame = inseason_ratings.add_player_inseason_ratings(playerGame, data_storage.read_data('toiOverlap', season, data_dir=data_dir), start_date, end_date,
+            data_dir=data_dir)
+    teamGame = inseason_ratings.add_team_inseason_ratings(teamGame, start_date, end_date, data_dir=data_dir)
     print ('preseason ratings added!')
 
     # calculate features for games model
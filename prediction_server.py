@@ -0,0 +1,426 @@
+import data_processing
+import data_storage
+import inseason_ratings
+import games_model
+import model_registry
+import predict_today
+import argparse
+import json
+import os
+import threading
+import time
+import pandas as pd
+import numpy as np
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# long-running prediction server, so predictions don't pay for starting python, reading the datasets and loading the model
+# every time. teamGame, the season's playerGame and toiOverlap, the preseason ratings and the games model are kept in memory,
+# and the datasets are refreshed from their manifests whenever update_data.py writes new days, reading only the changed dates
+#
+# POST /predict with a game, or {"games": [...]} for several, where each game is
+#   {"date": "YYYY-MM-DD", "home_team": "TOR", "away_team": "BOS",
+#    "home_lineup": [{"Player": ..., "Position": "F"}, ...], "away_lineup": [...]}
+# lineups are optional, a team's roster config (configs/rosters/<team>.json) is used if its lineup isn't given
+# GET /status returns the dates loaded, and POST /refresh re-reads any new data right away
+#
+# every game's features are made of the two teams' sides, and a team's side for its next game is the same for any date after
+# the last game played, apart from its rest days. so whenever the data changes, each team's side for its next game is built
+# with its roster config lineup (see _precompute), and a request for teams' next games only looks up the two teams' rows,
+# redoes the lineup features for any lineup it gives, and runs the model
+# other requests (past dates, or a team playing more than once) build the features from the history of the teams playing
+# (both teams' rows of every game they played, for the opponent stats), which gives the same features as building them from
+# all of teamGame. player in-season ratings depend on every player's ice time, so they're built from the whole season once
+# per date and cached, or read from the snapshot store for past dates
+
+TEAM_NAMES = {'PHX':'ARI', 'S.J':'SJS', 'L.A':'LAK', 'T.B':'TBL', 'N.J':'NJD'}
+
+# columns of the precomputed rows that depend on the game rather than the team, and are redone for each request
+MATCHUP_COLUMNS = ['Game_Id','Opp','Win','RestDays','BackToBack','EloDiff','EloDiff_538adj',
+    'GI_5v5_Off_Diff','GI_5v5_Def_Diff','GI_5v5_Diff','GI_PP_Diff','GI_PK_Diff']
+
+class prediction_state(object):
+    def __init__(self, season=2022, data_dir='data',
+            preseason_teams_file='data/ratings_preseason_teams.csv',
+            preseason_players_file='data/ratings_preseason_players.csv',
+            roster_dir='configs/rosters', model=None):
+        self.season = int(season)
+        self.data_dir = data_dir
+        self.roster_dir = roster_dir
+        self.model = model or games_model.games_model()
+        self.lock = threading.RLock()
+
+        self.player_ratings, self.team_ratings = predict_today.read_preseason_ratings(preseason_players_file, preseason_teams_file)
+        model_registry.warm_up([self.model])
+
+        self.manifests = {name:None for name in ['teamGame','playerGame','toiOverlap']}
+        self.manifest_versions = {name:None for name in self.manifests}
+        self.teamGame = pd.DataFrame()
+        self.playerGame = pd.DataFrame()
+        self.toiOverlap = pd.DataFrame()
+        self.player_inseason = {}
+        self.team_state = None
+        self.ids = None
+        self.next_features = pd.DataFrame()
+        self.next_date = None
+        self.next_game_nums = pd.Series(dtype='int64')
+
+        # player ids from last season too, for players in lineups who haven't played yet this season
+        ids = data_storage.read_data('playerGame', self.season-1, ['Player','PlayerID'], data_dir=data_dir)
+        self.prev_ids = ids.groupby('Player', as_index=False).max() if len(ids.index)>0 else pd.DataFrame(columns=['Player','PlayerID'])
+        self.refresh()
+
+    def _manifest_version(self, name):
+        path = data_storage._manifest_file(name, self.data_dir)
+        if not os.path.isfile(path):
+            return None
+        stat = os.stat(path)
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def _changed_dates(self, name, manifest):
+        # dates whose games differ between the loaded manifest and the one on disk
+        if self.manifests[name] is None:
+            return sorted(manifest['Date'].unique().tolist())
+        old = self.manifests[name]
+        if name!='teamGame':
+            old = old.loc[old['Season']==self.season]
+        diff = old.merge(manifest, how='outer', indicator=True)
+        return sorted(diff.loc[diff['_merge']!='both', 'Date'].unique().tolist())
+
+    def _refresh_dataset(self, name, df):
+        # df with the changed dates of a dataset re-read from disk, or None if nothing changed
+        version = self._manifest_version(name)
+        if version is None or version==self.manifest_versions[name]:
+            return None
+        manifest = data_storage.read_manifest(name, self.data_dir)
+        if name!='teamGame':
+            manifest = manifest.loc[manifest['Season']==self.season]
+        dates = self._changed_dates(name, manifest)
+        if len(dates)>0:
+            season = None if name=='teamGame' else self.season
+            new_rows = data_storage.read_data(name, season, start_date=dates[0], end_date=dates[-1], data_dir=self.data_dir)
+            if name=='toiOverlap':
+                # toiOverlap has no Date column, so its rows are matched to dates through the games in the manifests
+                games = pd.concat([manifest, self.manifests[name]], ignore_index=True) if self.manifests[name] is not None else manifest
+                changed = games.loc[games['Date'].isin(dates), 'Game_Id'].unique()
+                kept = manifest.loc[manifest['Date'].isin(dates), 'Game_Id'].unique()
+                if len(df.index)>0:
+                    df = df.loc[~df['Game_Id'].isin(changed)]
+                new_rows = new_rows.loc[new_rows['Game_Id'].isin(kept)]
+            else:
+                if len(df.index)>0:
+                    df = df.loc[~df['Date'].isin(dates)]
+                new_rows = new_rows.loc[new_rows['Date'].isin(dates)]
+            df = pd.concat([df, new_rows], ignore_index=True) if len(df.index)>0 else new_rows.reset_index(drop=True)
+        self.manifests[name] = manifest
+        self.manifest_versions[name] = version
+        return df
+
+    def refresh(self):
+        # re-read any dates that update_data.py has written since the last refresh. returns whether anything changed
+        with self.lock:
+            changed = False
+            for name in ['teamGame','playerGame','toiOverlap']:
+                df = self._refresh_dataset(name, getattr(self, name))
+                if df is not None:
+                    setattr(self, name, df)
+                    changed = True
+            if changed:
+                if len(self.teamGame.index)>0:
+                    self.teamGame = self.teamGame.sort_values(by=['DateInt','Game_Id'], kind='stable').reset_index(drop=True)
+                self.team_state = data_processing.get_team_state(self.teamGame)
+                if len(self.playerGame.index)>0:
+                    self.playerGame = self.playerGame.sort_values(by=['DateInt','Game_Id'], kind='stable').reset_index(drop=True)
+                self.player_inseason = {}
+                self.ids = self._ids()
+                self._precompute()
+            return changed
+
+    def _precompute(self):
+        # each team's side of the features for its next game, with its roster config lineup, for next_game_features to look up
+        # the rows come from features() on schedules the day after the last game played, where every team with a roster config
+        # is home once and away once
+        self.next_features = pd.DataFrame()
+        self.next_date = None
+        teams = sorted(os.path.splitext(f)[0] for f in os.listdir(self.roster_dir) if f.endswith('.json')) if os.path.isdir(self.roster_dir) else []
+        if len(self.teamGame.index)==0 or len(teams)<2:
+            return
+        next_date = (pd.Timestamp(self.teamGame['Date'].max())+pd.Timedelta(days=1)).strftime('%Y-%m-%d')
+
+        # the team's game number in the season going into its next game, for the players' projections
+        if len(self.playerGame.index)>0:
+            self.next_game_nums = self.playerGame.loc[self.playerGame['Playoffs']==0].groupby('Team')['DateInt'].nunique()+1
+        else:
+            self.next_game_nums = pd.Series(dtype='int64')
+
+        # each team home against the next one, split into schedules where no team plays twice
+        schedules = []
+        for home, away in zip(teams, teams[1:]+teams[:1]):
+            for pairs in schedules:
+                if all(home not in pair and away not in pair for pair in pairs):
+                    pairs.append((home, away))
+                    break
+            else:
+                schedules.append([(home, away)])
+
+        # a team's own columns come from its home row, and the ones only joined as Opp_ columns before they were dropped
+        # (its raw preseason and in-season ratings) from the row of the team it played away
+        homes = []
+        aways = []
+        for pairs in schedules:
+            df = self.features([{'date':next_date, 'home_team':home, 'away_team':away} for home, away in pairs])
+            homes.append(df[[c for c in df.columns if c not in MATCHUP_COLUMNS and not c.startswith('Opp_')]].set_index('Team'))
+            away = df[[c for c in df.columns if c.startswith('Opp_')]].set_axis(df['Opp'].values)
+            aways.append(away.rename(columns=lambda c: c[4:]))
+        homes = pd.concat(homes)
+        aways = pd.concat(aways)
+        self.next_features = homes.join(aways[[c for c in aways.columns if c not in homes.columns and c not in MATCHUP_COLUMNS]], how='inner').rename_axis('Team')
+        self.next_date = next_date
+
+    def status(self):
+        with self.lock:
+            return {
+                'season': self.season,
+                'teamGame_rows': len(self.teamGame.index),
+                'playerGame_rows': len(self.playerGame.index),
+                'toiOverlap_rows': len(self.toiOverlap.index),
+                'last_date': self.teamGame['Date'].max() if len(self.teamGame.index)>0 else None,
+                'cached_dates': sorted(self.player_inseason.keys()),
+                'next_date': self.next_date,
+                'next_teams': sorted(self.next_features.index.tolist()),
+            }
+
+    def _ids(self):
+        ids = self.prev_ids
+        if len(self.playerGame.index)>0:
+            ids = pd.concat([self.playerGame[['Player','PlayerID']], ids], ignore_index=True)
+        return ids.groupby('Player', as_index=False).max()
+
+    def player_inseason_ratings(self, d):
+        # every player's in-season ratings going into date d, from all of the season's games before it, cached by date
+        # past dates are read from the snapshot store (see inseason_ratings.py)
+        with self.lock:
+            if d in self.player_inseason:
+                return self.player_inseason[d]
+            if len(self.playerGame.index)==0:
+                ratings = pd.DataFrame(columns=inseason_ratings.PLAYER_RATINGS_COLUMNS)
+            else:
+                toiOverlap = self.toiOverlap if len(self.toiOverlap.index)>0 else pd.DataFrame(columns=['Player_x','Player_Id_x','Strength','Game_Id'])
+                ratings = inseason_ratings.get_player_inseason_ratings(self.playerGame, toiOverlap, d, d, data_dir=self.data_dir)
+            ratings = ratings.drop(columns=['Date','Season'])
+            self.player_inseason[d] = ratings
+            return ratings
+
+    def _schedule(self, games):
+        # schedule dataframe (as from data_scraper.scrape_schedule) for the requested games
+        schedule = pd.DataFrame({
+            'game_id':[g.get('game_id') for g in games],
+            'date':[pd.Timestamp(g['date']).strftime('%Y-%m-%d') for g in games],
+            'home_team':[TEAM_NAMES.get(g['home_team'], g['home_team']) for g in games],
+            'away_team':[TEAM_NAMES.get(g['away_team'], g['away_team']) for g in games],
+        })
+
+        # games without an id get one past any game this season, so they can't be mixed up with a game that was played
+        season_games = self.teamGame.loc[self.teamGame['Season']==self.season, 'Game_Id'] if len(self.teamGame.index)>0 else pd.Series(dtype='int64')
+        next_id = int(season_games.max())+1 if len(season_games.index)>0 else 1
+        missing = schedule['game_id'].isnull()
+        schedule.loc[missing, 'game_id'] = np.arange(next_id, next_id+missing.sum())
+        schedule['game_id'] = schedule['game_id'].astype(np.int64)
+        return schedule
+
+    def _request_lineup(self, players, team, game, ids):
+        # playerGame rows for a lineup given in a request
+        lineup = pd.DataFrame(players)[['Player','Position']].merge(ids, on='Player', how='left')
+        if lineup['PlayerID'].isnull().any():
+            print ('Missing PlayerIDs:')
+            print (lineup.loc[lineup['PlayerID'].isnull()])
+        lineup['Team'] = team
+        lineup['Date'] = game['date']
+        lineup['Game_Id'] = game['game_id']
+        lineup['Season'] = self.season
+        lineup['DateInt'] = int(game['date'].replace('-',''))
+        lineup['Playoffs'] = 0
+        return lineup
+
+    def _lineups(self, games, schedule, ids):
+        # playerGame rows for each team's lineup, from the request if it's given, or otherwise the team's roster config
+        lineups = []
+        missing_teams = []
+        for g, (_, game) in zip(games, schedule.iterrows()):
+            for side in ['home','away']:
+                team = game[side+'_team']
+                if g.get(side+'_lineup'):
+                    lineup = self._request_lineup(g[side+'_lineup'], team, game, ids)
+                else:
+                    # a one-team schedule, so only this team's roster is read
+                    single = pd.DataFrame({'game_id':[game['game_id']], 'date':[game['date']], 'home_team':[team], 'away_team':[team]})
+                    lineup, missing = predict_today.get_projected_lineups(single, ids, self.season, self.roster_dir)
+                    missing_teams = missing_teams + missing
+                lineups.append(lineup)
+        return pd.concat(lineups, ignore_index=True), missing_teams
+
+    def features(self, games):
+        # game features for the requested games, built from only the games the teams in them have played
+        with self.lock:
+            teamGame_all = self.teamGame
+            playerGame_all = self.playerGame
+            team_state = self.team_state
+            ids = self.ids
+        schedule = self._schedule(games)
+        start_date = schedule['date'].min()
+        end_date = schedule['date'].max()
+        teams = pd.concat([schedule['home_team'], schedule['away_team']]).unique()
+
+        # every game the teams played, with both teams' rows, over the seasons add_game_features uses
+        teamGame = teamGame_all
+        if len(teamGame.index)>0:
+            played = teamGame.loc[teamGame['Team'].isin(teams)&(teamGame['Season']>=self.season-2), ['Season','Game_Id']].drop_duplicates()
+            teamGame = teamGame.merge(played, on=['Season','Game_Id'])
+        teamGame = data_processing.add_scheduled_games(teamGame, schedule, self.season, team_state)
+
+        # lineups and their starting goalies
+        lineups, missing_teams = self._lineups(games, schedule, ids)
+        goalies = lineups.loc[lineups['Position']=='G'].groupby(['Team','Date'], as_index=False)['PlayerID'].max()
+        goalies = teamGame[['Team','Date']].merge(goalies, how='left', on=['Team','Date'])
+        teamGame.loc[goalies['PlayerID'].notnull().values, 'StartingGoalie_Id'] = goalies.loc[goalies['PlayerID'].notnull(), 'PlayerID'].values
+        teamGame = teamGame.loc[~((teamGame['Team'].isin(missing_teams))&(teamGame['Date'].isin(schedule['date'].unique())))]
+
+        # the teams' players from the games so far this season, and the lineups with their in-season ratings going into each date
+        if len(playerGame_all.index)>0:
+            playerGame = playerGame_all.loc[playerGame_all['Team'].isin(teams)&(playerGame_all['Date']<start_date)]
+        else:
+            playerGame = pd.DataFrame(columns=['Player','PlayerID','Position','TOI_5v5'])
+        lineups = pd.concat([lineups.loc[lineups['Date']==d].merge(self.player_inseason_ratings(d), on=['Player','PlayerID','Position'], how='left')
+            for d in lineups['Date'].unique()], ignore_index=True)
+        playerGame = pd.concat([playerGame, lineups], ignore_index=True)
+
+        # only include regular season games
+        teamGame = teamGame.loc[teamGame['Playoffs']==0]
+        playerGame = playerGame.loc[playerGame['Playoffs']==0]
+
+        # add preseason and team in-season ratings
+        playerGame = playerGame.merge(self.player_ratings, on=['Player','PlayerID','Season','Position'], how='left')
+        teamGame = teamGame.merge(self.team_ratings, on=['Team','Season'], how='left')
+        teamGame = inseason_ratings.add_team_inseason_ratings(teamGame, start_date, end_date)
+
+        df = data_processing.add_game_features(teamGame, playerGame)
+        df = df.loc[df['Date']>=start_date]
+        df = df.loc[df['Date']<=end_date]
+        return df
+
+    def _lineup_features(self, lineup, team, next_date):
+        # the roster features and starting goalie projection of a lineup for the team's next game, as features() gives them
+        lineup = lineup.merge(self.player_inseason_ratings(next_date), on=['Player','PlayerID','Position'], how='left')
+        lineup = lineup.merge(self.player_ratings, on=['Player','PlayerID','Season','Position'], how='left')
+        lineup['PlayerGameNum'] = self.next_game_nums.get(team, 1)
+        lineup = data_processing.project_players(lineup)
+        goalie = lineup.loc[lineup['Position']=='G', 'PlayerID'].max()
+        games = pd.DataFrame({'Date':[lineup['Date'].iloc[0]], 'Team':[team], 'StartingGoalie_Id':[goalie]})
+        return data_processing.add_roster_features(games, lineup).drop(columns=['Date','Team']).iloc[0]
+
+    def next_game_features(self, games):
+        # features for games that are each team's next game, from the two teams' precomputed rows (see _precompute), with the
+        # lineup features redone for any lineup given and the rest days counted to the game's date
+        # None if any game is on or before the last date played, a team plays more than once, or a team has no precomputed
+        # row (no roster config), and features() has to build them
+        with self.lock:
+            next_features = self.next_features
+            next_date = self.next_date
+            ids = self.ids
+        if next_date is None:
+            return None
+        schedule = self._schedule(games)
+        teams = pd.concat([schedule['home_team'], schedule['away_team']])
+        if schedule['date'].min()<next_date or not teams.is_unique or not teams.isin(next_features.index).all():
+            return None
+
+        home = next_features.loc[schedule['home_team']].reset_index()
+        away = next_features.loc[schedule['away_team']].reset_index()
+        for (_, game), g in zip(schedule.iterrows(), games):
+            for side, df in [('home', home), ('away', away)]:
+                if g.get(side+'_lineup'):
+                    team = game[side+'_team']
+                    lineup = self._lineup_features(self._request_lineup(g[side+'_lineup'], team, game, ids), team, next_date)
+                    df.loc[game.name, lineup.index] = lineup.values
+        for df in [home, away]:
+            df['Date'] = schedule['date'].values
+            df['RestDays'] = (pd.to_datetime(df['Date']) - pd.to_datetime(df['LastGame']))/np.timedelta64(1,'D')
+            df['BackToBack'] = (df['RestDays']==1).astype(np.int16)
+
+        df = pd.concat([home, away.add_prefix('Opp_')], axis=1)
+        df['Opp'] = schedule['away_team'].values
+        df['Game_Id'] = schedule['game_id'].values
+        df['Win'] = np.nan
+        return data_processing.add_roster_diffs(df)
+
+    def predict(self, games):
+        # win probabilities for the requested games
+        self.refresh()
+        df = self.next_game_features(games)
+        if df is None:
+            df = self.features(games)
+        # games missing any feature (e.g. a lineup without any defencemen) can't be predicted, and are left out
+        if df[games_model.games_config['features']].notnull().all(axis=1).sum()==0:
+            return pd.DataFrame(columns=['Date','Team','Opp','Win','winProba'])
+        scaler, model = self.model.load()
+        return games_model.predict_games(df, scaler, model)
+
+def make_handler(state):
+    class handler(BaseHTTPRequestHandler):
+        def _send(self, code, body):
+            body = json.dumps(body, default=str).encode()
+            self.send_response(code)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path=='/status':
+                self._send(200, state.status())
+            else:
+                self._send(404, {'error':'not found'})
+
+        def do_POST(self):
+            try:
+                length = int(self.headers.get('Content-Length', 0))
+                request = json.loads(self.rfile.read(length) or b'{}')
+                if self.path=='/refresh':
+                    self._send(200, {'changed':state.refresh()})
+                elif self.path=='/predict':
+                    games = request['games'] if 'games' in request else [request]
+                    start = time.time()
+                    preds = state.predict(games)
+                    preds = preds.astype(object).where(preds.notnull(), None)
+                    self._send(200, {'predictions':preds.to_dict(orient='records'), 'seconds':time.time()-start})
+                else:
+                    self._send(404, {'error':'not found'})
+            except (KeyError, ValueError) as e:
+                self._send(400, {'error':repr(e)})
+            except Exception as e:
+                self._send(500, {'error':repr(e)})
+
+    return handler
+
+def main(season=2022, host='127.0.0.1', port=8050, data_dir='data',
+        preseason_teams_file='data/ratings_preseason_teams.csv',
+        preseason_players_file='data/ratings_preseason_players.csv',
+        roster_dir='configs/rosters'):
+    state = prediction_state(season, data_dir, preseason_teams_file, preseason_players_file, roster_dir)
+    server = ThreadingHTTPServer((host, port), make_handler(state))
+    print ('serving predictions on {}:{}'.format(host, port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-season', required=False, default=2022, help='NHL season to predict games for')
+    parser.add_argument('-host', required=False, default='127.0.0.1', help='Address to listen on')
+    parser.add_argument('-port', required=False, default=8050, type=int, help='Port to listen on')
+    parser.add_argument('-data_dir', required=False, default='data', help='Directory with the datasets written by update_data.py')
+    parser.add_argument('-roster_dir', required=False, default='configs/rosters', help='Directory with the team roster configs, for games without lineups')
+    args = parser.parse_args()
+
+    main(season=args.season, host=args.host, port=args.port, data_dir=args.data_dir, roster_dir=args.roster_dir)
@@ -0,0 +1,89 @@
+import pandas as pd
+import numpy as np
+
+# compact dtypes for the columns of the stored datasets. the raw pbp and shifts from hockey_scraper come as int64/float64,
+# so the schema is applied whenever a dataset is written or read (see data_storage.py) and every stage sees the same dtypes
+# player ids that can be missing (no second player on an event, an empty net) are filled with -1, as add_xG_to_pbp always did
+#
+# the low-cardinality string columns (events, strengths, shot types, teams) of pbp and shifts are categoricals. categoricals
+# only compare to each other if they have the same categories, so data_processing converts them to plain strings where it
+# compares two of these columns (Ev_Team==Away_Team), adds categories before it reverses a strength in place, and groups on them
+# with observed=True (otherwise groupby includes every category, not just the ones in the data). they're stored as plain strings
+# (see data_storage._to_table) and the other datasets (playerGame, teamGame) keep their teams as plain strings
+
+PLAYER_SLOT_IDS = ['{}Player{}_id'.format(side, i) for side in ['away','home'] for i in range(1, 7)]
+
+SCHEMAS = {
+    'pbp': dict([
+        ('Period', np.int8),
+        ('Seconds_Elapsed', np.int16),
+        ('p1_ID', np.int32),
+        ('p2_ID', np.int32),
+        ('p3_ID', np.int32),
+    ] + [(c, np.int32) for c in PLAYER_SLOT_IDS] + [
+        ('Away_Players', np.int8),
+        ('Home_Players', np.int8),
+        ('Away_Score', np.int8),
+        ('Home_Score', np.int8),
+        ('Away_Goalie_Id', np.int32),
+        ('Home_Goalie_Id', np.int32),
+        ('Season', np.int32),
+    ]),
+    'shifts': {
+        'Period': np.int8,
+    },
+    'playerGame': {
+        'Game_Id': np.int32,
+        'PlayerID': np.int32,
+        'Season': np.int16,
+        'DateInt': np.int32,
+        'Playoffs': np.int8,
+    },
+    'teamGame': {
+        'Season': np.int16,
+        'DateInt': np.int32,
+        'Playoffs': np.int8,
+    },
+}
+
+CATEGORY_COLUMNS = {
+    'pbp': ['Event','Strength','Type','Ev_Team','Home_Team','Away_Team'],
+    'shifts': ['Team'],
+}
+
+# columns where a missing value is stored as -1
+FILL_COLUMNS = {
+    'pbp': ['p1_ID','p2_ID','p3_ID'] + PLAYER_SLOT_IDS + ['Away_Goalie_Id','Home_Goalie_Id'],
+}
+
+def apply(df, name):
+    # cast the columns of df that are in the dataset's schema to their compact dtypes, in place
+    schema = SCHEMAS.get(name, {})
+    fill = FILL_COLUMNS.get(name, [])
+    for c, dtype in schema.items():
+        if c not in df.columns or df[c].dtype==dtype:
+            continue
+        if c in fill:
+            df[c] = df[c].fillna(-1).astype(dtype)
+        else:
+            df[c] = df[c].astype(dtype)
+    for c in CATEGORY_COLUMNS.get(name, []):
+        if c in df.columns and df[c].dtype.name!='category':
+            df[c] = df[c].astype('category')
+    return df
+
+def check(df, name):
+    # raise if any column of df in the dataset's schema doesn't have its compact dtype
+    wrong = ['{} ({}, expected {})'.format(c, df[c].dtype, np.dtype(dtype)) for c, dtype in SCHEMAS.get(name, {}).items()
+        if c in df.columns and df[c].dtype!=dtype]
+    wrong += ['{} ({}, expected category)'.format(c, df[c].dtype) for c in CATEGORY_COLUMNS.get(name, [])
+        if c in df.columns and df[c].dtype.name!='category']
+    if len(wrong)>0:
+        raise ValueError('{} columns with the wrong dtype: {}'.format(name, ', '.join(wrong)))
+
+def memory_report(df, name):
+    # memory use of df before and after applying the schema, in MB
+    before = df.memory_usage(deep=True).sum()/1e6
+    after = apply(df.copy(deep=False), name).memory_usage(deep=True).sum()/1e6
+    print ('{}: {:.1f}MB before, {:.1f}MB after'.format(name, before, after))
+    return before, after
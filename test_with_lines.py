@@ -11,20 +11,10 @@ from update_preseason_ratings import PreseasonRatingsUpdater
 # predict for all games in given season
 # compare to lines
 
-def main(season=2021, lines_file='data/lines.csv', scaler_file=None, model_file=None):
-    # predict games
-    if model_file is None or scaler_file is None:
-        model = games_model.games_model(scaler_file='models/test_scaler.pkl', model_file='models/test_lr.pkl')
-        model.train(max_season=season-1)
-        df = model.predict(pd.read_csv('data/gameTrain_{}.csv'.format(str(season))))
-        os.remove('models/test_scaler.pkl')
-        os.remove('models/test_lr.pkl')
-    else:
-        model = games_model.games_model(scaler_file=scaler_file, model_file=model_file)
-        df = model.predict(pd.read_csv('data/gameTrain_{}.csv'.format(str(season))))
+def net_win(df, lines):
+    # net win from Kelly bets on every team whose predicted win probability (df, from games_model) beats the closing line
 
-    # get betting lines data
-    lines = pd.read_csv(lines_file)
+    # get implied win probabilities from the betting lines
     lines = lines.merge(df[['Date','Team','Win']], how='left', on=['Date','Team'])
     lines['ImpliedPct'] = 0.
     lines.loc[lines['Close']<0, 'ImpliedPct'] = lines.loc[lines['Close']<0, 'Close']/(lines.loc[lines['Close']<0, 'Close']-100)
@@ -57,8 +47,21 @@ def main(season=2021, lines_file='data/lines.csv', scaler_file=None, model_file=
     tmp_df.loc[tmp_df['Win']==1, 'NetWin'] = tmp_df.loc[tmp_df['Win']==1, 'NormBet']*tmp_df.loc[tmp_df['Win']==1, 'GainRatio']
     tmp_df.loc[tmp_df['Win']==0, 'NetWin'] = -tmp_df.loc[tmp_df['Win']==0, 'NormBet']
 
-    #aggregate
-    print ('Net Win: ' + str(tmp_df['NetWin'].sum()))
+    return tmp_df['NetWin'].sum()
+
+def main(season=2021, lines_file='data/lines.csv', scaler_file=None, model_file=None):
+    # predict games
+    if model_file is None or scaler_file is None:
+        model = games_model.games_model(scaler_file='models/test_scaler.pkl', model_file='models/test_lr.pkl')
+        model.train(max_season=season-1)
+        df = model.predict(pd.read_csv('data/gameTrain_{}.csv'.format(str(season))))
+        os.remove('models/test_scaler.pkl')
+        os.remove('models/test_lr.pkl')
+    else:
+        model = games_model.games_model(scaler_file=scaler_file, model_file=model_file)
+        df = model.predict(pd.read_csv('data/gameTrain_{}.csv'.format(str(season))))
+
+    print ('Net Win: ' + str(net_win(df, pd.read_csv(lines_file))))
 
 
 if __name__ == '__main__':
@@ -0,0 +1,670 @@
+import numpy as np
+import pandas as pd
+import data_processing
+import inseason_ratings
+import xG_model
+
+# original versions of code that has been rewritten for speed, kept here to check the rewrites against
+
+def player_inseason_ratings(playerGame, toiOverlap, start_date, end_date):
+    # inseason_ratings._player_inseason_ratings as it was: re-sums the season so far and recomputes every rating for each date
+    season = playerGame['Season'].unique()[0]
+
+    xGs = playerGame.loc[playerGame['Playoffs']==0]
+    xGs['PlayerGameNum'] = xGs.groupby(['Player','PlayerID'])['DateInt'].rank('dense')
+    ratings = toiOverlap.rename(columns={'Player_x':'Player', 'Player_Id_x':'PlayerID'})
+    ratings = ratings.loc[ratings['Game_Id'].isin(xGs['Game_Id'].unique())]
+    xGs = xGs.loc[xGs['TOI_5v5']>0]
+
+    inseason_ratings_all = pd.DataFrame(columns=inseason_ratings.PLAYER_RATINGS_COLUMNS)
+    for i in pd.date_range(start_date, end_date):
+        xGs_temp = xGs.loc[xGs['Date']<i.strftime('%Y-%m-%d')]
+        if len(xGs_temp.index)==0:
+            continue
+        ratings_temp = ratings.loc[ratings['Game_Id'].isin(xGs_temp['Game_Id'].unique())]
+        ratings_temp, ratings_PP, ratings_PK = inseason_ratings._sum_overlap(ratings_temp)
+        xGs_temp = inseason_ratings._sum_player_games(xGs_temp)
+        inseason_ratings_season = inseason_ratings._player_ratings_on_date(xGs_temp, ratings_temp, ratings_PP, ratings_PK, i, season)
+        if len(inseason_ratings_all.index)==0:
+            inseason_ratings_all = inseason_ratings_season.copy(deep=True)
+        else:
+            inseason_ratings_all = pd.concat([inseason_ratings_all, inseason_ratings_season], ignore_index=True)
+
+    inseason_ratings_all['Date'] = inseason_ratings_all['Date'].astype(str)
+    return inseason_ratings_all
+
+def pair_metric_sums(ratings, players, position, toi, sums, by, agg, special_teams=None):
+    # inseason_ratings.pair_metric_sums as it was: merges every pair with both players' columns, masks and groups back by player
+    ratings = ratings.merge(players, on=['Player','PlayerID'])
+    ratings = ratings.merge(players.rename(columns={'Player':'Player_y', 'PlayerID':'Player_Id_y'}), on=['Player_y','Player_Id_y'])
+    ratings = ratings.loc[ratings['Position_x']==position]
+    ratings = ratings.loc[ratings['Position_y']!='G']
+    if special_teams is not None:
+        ratings = ratings.loc[ratings['Overlap']>0]
+        ratings = ratings.loc[ratings[toi+'_x']>0]
+        ratings = ratings.loc[((ratings[special_teams[1]+'_y']>0)&(~ratings['SameTeam']))|((ratings[special_teams[0]+'_y']>0)&(ratings['SameTeam']))]
+    for c, (metric, same_team, n) in sums.items():
+        side = ratings['SameTeam'] if same_team else ~ratings['SameTeam']
+        ratings[c] = 0.
+        ratings.loc[side, c] = ratings.loc[side, metric+'_y'].fillna(0)*ratings.loc[side, 'Overlap']/(ratings.loc[side, toi+'_x']*n)
+    return ratings.groupby(by, as_index=False).agg(agg)
+
+def team_inseason_ratings(teamGame, metrics, start_date, end_date):
+    # inseason_ratings._team_inseason_ratings_cumulative as it was: the mean of each team's previous games in the season, one date at a time
+    inseason_ratings_all = pd.DataFrame(columns=['Team','Season']+['prevGames_'+m for m in metrics]+['Date'])
+    for i in pd.date_range(start_date, end_date):
+        curSeason = teamGame.loc[teamGame['Date']==i.strftime('%Y-%m-%d'), 'Season'].max()
+        df_temp = teamGame.loc[(teamGame['Date']<i.strftime('%Y-%m-%d'))&(teamGame['Season']==curSeason)]
+        df_temp = df_temp.loc[df_temp['Team'].isin(teamGame.loc[teamGame['Date']==i.strftime('%Y-%m-%d'), 'Team'])]
+        if len(df_temp.index)>0:
+            df_temp = df_temp[['Team','Season']+metrics].groupby(['Team','Season'], as_index=False).mean()
+            df_temp.columns = ['Team','Season']+['prevGames_'+m for m in metrics]
+            df_temp['Date'] = i.strftime('%Y-%m-%d')
+            if len(inseason_ratings_all.index)==0:
+                inseason_ratings_all = df_temp.copy(deep=True)
+            else:
+                inseason_ratings_all = pd.concat([inseason_ratings_all, df_temp], ignore_index=True)
+
+    return inseason_ratings_all
+
+def add_elo(teamGame):
+    # data_processing.add_elo as it was: runs through teamGame one game at a time, updating the rows for each team's next game
+    teamGame['Game_Id_Unique'] = (teamGame['Season'].astype(str) + teamGame['Game_Id'].astype(str)).astype(int)
+    teamGame = teamGame.sort_values(by=['DateInt','Game_Id'])
+    teamGame['teamGameRankOverall'] = teamGame.groupby('Team')['DateInt'].rank("dense")
+    gids = teamGame['Game_Id_Unique'].unique().tolist() #gids = teamGame.loc[teamGame['Elo'].isnull(), 'Game_Id'].unique().tolist()
+    teamGame['Elo'] = 1500 #teamGame.loc[teamGame['Elo'].isnull(), 'Elo'] = 1500
+    for gid in gids:
+        game_df = teamGame.loc[teamGame['Game_Id_Unique']==gid].copy()
+        elo_1 = game_df['Elo'].iloc[0]
+        elo_2 = game_df['Elo'].iloc[1]
+        if game_df['teamGameRank'].iloc[0]==1 and game_df['teamGameRankOverall'].iloc[0]>1:
+            elo_1 = (elo_1*0.7) + (1505*0.3)
+            teamGame.loc[(teamGame['Team']==game_df['Team'].iloc[0]) & (teamGame['teamGameRankOverall']==game_df['teamGameRankOverall'].iloc[0]), 'Elo'] = elo_1
+        if game_df['teamGameRank'].iloc[1]==1 and game_df['teamGameRankOverall'].iloc[1]>1:
+            elo_2 = (elo_2*0.7) + (1505*0.3)
+            teamGame.loc[(teamGame['Team']==game_df['Team'].iloc[1]) & (teamGame['teamGameRankOverall']==game_df['teamGameRankOverall'].iloc[1]), 'Elo'] = elo_2
+        p_1 = 1/(10**((elo_2-elo_1)/400)+1)
+        p_2 = 1/(10**((elo_1-elo_2)/400)+1)
+        win_1 = game_df['Win'].iloc[0]
+        win_2 = game_df['Win'].iloc[1]
+        victoryMarginMultiplier_1 = 0.6686 * np.log(np.max([np.abs(game_df['Goals'].iloc[0]-game_df['Goals'].iloc[1]),1])) + 0.8048
+        victoryMarginMultiplier_2 = 0.6686 * np.log(np.max([np.abs(game_df['Goals'].iloc[1]-game_df['Goals'].iloc[0]),1])) + 0.8048
+        if elo_1>elo_2 and win_1==1:
+            autoAdjust_1 = 2.05/((elo_1-elo_2) * 0.001 + 2.05)
+            autoAdjust_2 = 1
+        elif elo_2>elo_1 and win_2==1:
+            autoAdjust_2 = 2.05/((elo_1-elo_2) * 0.001 + 2.05)
+            autoAdjust_1 = 1
+        else:
+            autoAdjust_1 = 1
+            autoAdjust_2 = 1
+        favMultiplier_1 = win_1 - p_1
+        favMultiplier_2 = win_2 - p_2
+        new_elo_1 = elo_1 + (6*victoryMarginMultiplier_1*autoAdjust_1*favMultiplier_1)
+        new_elo_2 = elo_2 + (6*victoryMarginMultiplier_2*autoAdjust_2*favMultiplier_2)
+        teamGame.loc[(teamGame['Team']==game_df['Team'].iloc[0]) & (teamGame['teamGameRankOverall']==game_df['teamGameRankOverall'].iloc[0]+1), 'Elo'] = new_elo_1
+        teamGame.loc[(teamGame['Team']==game_df['Team'].iloc[1]) & (teamGame['teamGameRankOverall']==game_df['teamGameRankOverall'].iloc[1]+1), 'Elo'] = new_elo_2
+
+    return teamGame.drop(columns='Game_Id_Unique')
+
+def add_scheduled_games(teamGame, schedule, season=2022):
+    # data_processing.add_scheduled_games as it was: reranks all of teamGame and runs add_elo through the scheduled games
+    # a team's scheduled games after its first one get a NaN elo rating here
+    # do some processing in schedule dataframe first
+    home = schedule[['game_id','date','home_team']].copy()
+    home.columns = ['Game_Id','Date','Team']
+    home['Home'] = 1
+    away = schedule[['game_id','date','away_team']].copy()
+    away.columns = ['Game_Id','Date','Team']
+    away['Home'] = 0
+    schedule = pd.concat([home, away], ignore_index=True)
+    schedule['Team'] = schedule['Team'].replace({'PHX':'ARI', 'S.J':'SJS', 'L.A':'LAK', 'T.B':'TBL', 'N.J':'NJD'})
+    schedule['Season'] = int(season)
+    schedule['DateInt'] = schedule['Date'].str.replace('-','').astype(np.int32)
+
+    # combine dataframes
+    starting_goalies = teamGame[['Date','Team','StartingGoalie_Id']]
+    schedule = schedule.merge(starting_goalies, how='left', on=['Date','Team'])
+    teamGame = teamGame.loc[teamGame['Date']<(schedule['Date'].min())]
+    elo_ratings = data_processing.get_elo_ratings(teamGame)
+    teamGame = pd.concat([teamGame, schedule], ignore_index=True)
+
+    # add playoffs column
+    teamGame['teamGameRank'] = teamGame.groupby(['Team','Season'])['DateInt'].rank("dense")
+    teamGame['Playoffs'] = (teamGame['teamGameRank']>82).astype(np.int8)
+    teamGame.loc[(teamGame['Season']==2012)&(teamGame['teamGameRank']>48),'Playoffs'] = 1 #fix for the lockout-shortened season
+    teamGame.loc[(teamGame['Season']==2019)&(teamGame['Date']>'2020-03-12'),'Playoffs'] = 1 #fix for the first covid-shortened season
+    teamGame.loc[(teamGame['Season']==2020)&(teamGame['teamGameRank']>56),'Playoffs'] = 1 #fix for the second covid-shortened season
+
+    # add elo ratings, only running the scheduled games
+    teamGame = data_processing.add_elo(teamGame, elo_ratings)
+
+    return teamGame
+
+def add_lag(df, cols, lag, groupCol):
+    # rolling averages of the last lag games before each game. scheduled games (no stats for any of cols yet) are skipped,
+    # so when several days of games are predicted, every scheduled game gets the averages as of the last game played
+    # data_processing._add_lags as it was, one groupby-transform for each lag
+    new_cols = [col+'_last'+str(lag) for col in cols]
+    played = df[cols].notnull().any(axis=1)
+    rolling = df.loc[played].groupby(groupCol)[cols].transform(lambda x: x.rolling(window=lag).mean()).reindex(df.index)
+    rolling.columns = new_cols
+    if not played.all():
+        last_played = pd.Series(np.arange(len(df.index)), index=df.index).where(played).groupby(df[groupCol]).ffill()
+        rolling.loc[~played] = np.vstack([rolling.values, np.full(len(new_cols), np.nan)])[last_played.loc[~played].fillna(-1).astype(np.int64).values]
+    df[new_cols] = rolling.groupby(df[groupCol]).shift(1)
+
+    return df
+
+def roster_features(teamGame, playerGame):
+    # data_processing._roster_features as it was, merged to teamGame: team sums, medians, maxes and standard deviations of the
+    # player projections, one groupby and merge per set of players
+    playerTeamGame = playerGame.loc[playerGame['Position'].isin(['F','D'])].groupby(['Date','Team']).agg({
+        'xGC60_5v5' : ['sum','median','max','std'],
+        'xGP60_5v5' : ['sum','median','max','std'],
+        'xGI60_Pens' : ['sum','median','max','std']
+    }).reset_index()
+    playerTeamGame.columns = ['Date','Team','xGC60_5v5_sum','xGC60_5v5_median','xGC60_5v5_max','xGC60_5v5_std',
+                              'xGP60_5v5_sum','xGP60_5v5_median','xGP60_5v5_max','xGP60_5v5_std',
+                              'xGI60_Pens_sum','xGI60_Pens_median','xGI60_Pens_max','xGI60_Pens_std'
+                              ]
+    games_df = teamGame.merge(playerTeamGame, on=['Date','Team'], how='left')
+
+    playerGame = playerGame.copy()
+    playerGame['PP_Rank'] = playerGame.groupby(['Date','Team','Position'])['xGC60_PP'].rank("dense", ascending=False)
+    playerGame['PK_Rank'] = playerGame.groupby(['Date','Team','Position'])['xGP60_PK'].rank("dense", ascending=False)
+
+    playerTeamGame = playerGame.loc[((playerGame['Position']=='F')&(playerGame['PP_Rank']<=6))|\
+        ((playerGame['Position']=='D')&(playerGame['PP_Rank']<=2))].groupby(['Date','Team']).agg({
+        'xGC60_PP' : ['sum','median','max','std']
+    }).reset_index()
+    playerTeamGame.columns = ['Date','Team','xGC60_PP_sum','xGC60_PP_median','xGC60_PP_max','xGC60_PP_std']
+    games_df = games_df.merge(playerTeamGame, on=['Date','Team'], how='left')
+
+    playerTeamGame = playerGame.loc[((playerGame['Position']=='F')&(playerGame['PK_Rank']<=4))|\
+        ((playerGame['Position']=='D')&(playerGame['PP_Rank']<=4))].groupby(['Date','Team']).agg({
+        'xGP60_PK' : ['sum','median','max','std']
+    }).reset_index()
+    playerTeamGame.columns = ['Date','Team','xGP60_PK_sum','xGP60_PK_median','xGP60_PK_max','xGP60_PK_std']
+    games_df = games_df.merge(playerTeamGame, on=['Date','Team'], how='left')
+
+    playerTeamGame = playerGame.loc[playerGame['Position']=='F'].groupby(['Date','Team']).agg({
+        'xGC60_5v5' : ['sum','median','max','std'],
+        'xGP60_5v5' : ['sum','median','max','std'],
+        'xGI60_Pens' : ['sum','median','max','std']
+    }).reset_index()
+    playerTeamGame.columns = ['Date','Team','xGC60_5v5_F_sum','xGC60_5v5_F_median','xGC60_5v5_F_max','xGC60_5v5_F_std',
+                              'xGP60_5v5_F_sum','xGP60_5v5_F_median','xGP60_5v5_F_max','xGP60_5v5_F_std',
+                              'xGI60_Pens_F_sum','xGI60_Pens_F_median','xGI60_Pens_F_max','xGI60_Pens_F_std'
+                              ]
+    games_df = games_df.merge(playerTeamGame, on=['Date','Team'], how='left')
+
+    playerTeamGame = playerGame.loc[playerGame['Position']=='D'].groupby(['Date','Team']).agg({
+        'xGC60_5v5' : ['sum','median','max','std'],
+        'xGP60_5v5' : ['sum','median','max','std'],
+        'xGI60_Pens' : ['sum','median','max','std']
+    }).reset_index()
+    playerTeamGame.columns = ['Date','Team','xGC60_5v5_D_sum','xGC60_5v5_D_median','xGC60_5v5_D_max','xGC60_5v5_D_std',
+                              'xGP60_5v5_D_sum','xGP60_5v5_D_median','xGP60_5v5_D_max','xGP60_5v5_D_std',
+                              'xGI60_Pens_D_sum','xGI60_Pens_D_median','xGI60_Pens_D_max','xGI60_Pens_D_std'
+                              ]
+    games_df = games_df.merge(playerTeamGame, on=['Date','Team'], how='left')
+
+    return games_df
+
+def add_opponent_columns(games_df, cols):
+    # data_processing._add_opponent_columns as it was: a self-join on the game, with the opponent's cols renamed to Opp_ columns
+    games_df_opp = games_df[['Game_Id','Date','Season','Team']+cols]
+    games_df_opp = games_df_opp.rename(columns = {c : 'Opp_'+c for c in cols})
+    games_df_opp = games_df_opp.rename(columns = {'Team' : 'Opp'})
+    return games_df.merge(games_df_opp, on=['Game_Id','Date','Season','Opp'])
+
+def xG_predict(mean_encodings, scaler, model, df):
+    # xG_model.predict as it was: the mean encodings, scaler and LGBMClassifier run as they were trained
+    for i, colname in xG_model.xG_config['mean_encodings'].items():
+        df[colname+'_meanEnc'] = df[colname].map(mean_encodings[i])
+    X = df[xG_model.xG_config['features']].values
+    X = scaler.transform(X)
+    return model.predict_proba(X)[:,1]
+
+def add_onice_stats(playerGame, shots):
+    # data_processing._add_onice_stats as it was: a wide copy of shots and a groupby and merge for each of the 12 player slots
+    # on-ice stats home players
+    for i in range(1,7):
+        shots['Player'] = shots['homePlayer{}'.format(str(i))].copy()
+        shots['PlayerID'] = shots['homePlayer{}_id'.format(str(i))].copy()
+
+        shots['Goals_onice_home{}'.format(str(i))] = shots['Goals'] * shots['HomeTeamEvent']
+        shots['Shots_onice_home{}'.format(str(i))] = shots['Shots'] * shots['HomeTeamEvent']
+        shots['ShotAttempts_onice_home{}'.format(str(i))] = shots['ShotAttempts'] * shots['HomeTeamEvent']
+        shots['UnblockedShotAttempts_onice_home{}'.format(str(i))] = shots['UnblockedShotAttempts'] * shots['HomeTeamEvent']
+        shots['xG_onice_home{}'.format(str(i))] = shots['xG'] * shots['HomeTeamEvent']
+        shots['xG_flurry_onice_home{}'.format(str(i))] = shots['xG_flurry'] * shots['HomeTeamEvent']
+        shots['Goals_5v5_onice_home{}'.format(str(i))] = shots['Goals_5v5'] * shots['HomeTeamEvent']
+        shots['Shots_5v5_onice_home{}'.format(str(i))] = shots['Shots_5v5'] * shots['HomeTeamEvent']
+        shots['ShotAttempts_5v5_onice_home{}'.format(str(i))] = shots['ShotAttempts_5v5'] * shots['HomeTeamEvent']
+        shots['UnblockedShotAttempts_5v5_onice_home{}'.format(str(i))] = shots['UnblockedShotAttempts_5v5'] * shots['HomeTeamEvent']
+        shots['xG_5v5_onice_home{}'.format(str(i))] = shots['xG_5v5'] * shots['HomeTeamEvent']
+        shots['xG_flurry_5v5_onice_home{}'.format(str(i))] = shots['xG_flurry_5v5'] * shots['HomeTeamEvent']
+        shots['Goals_PP_onice_home{}'.format(str(i))] = shots['Goals_PP'] * shots['HomeTeamEvent']
+        shots['Shots_PP_onice_home{}'.format(str(i))] = shots['Shots_PP'] * shots['HomeTeamEvent']
+        shots['ShotAttempts_PP_onice_home{}'.format(str(i))] = shots['ShotAttempts_PP'] * shots['HomeTeamEvent']
+        shots['UnblockedShotAttempts_PP_onice_home{}'.format(str(i))] = shots['UnblockedShotAttempts_PP'] * shots['HomeTeamEvent']
+        shots['xG_PP_onice_home{}'.format(str(i))] = shots['xG_PP'] * shots['HomeTeamEvent']
+        shots['xG_flurry_PP_onice_home{}'.format(str(i))] = shots['xG_flurry_PP'] * shots['HomeTeamEvent']
+        shots['Goals_PK_onice_home{}'.format(str(i))] = shots['Goals_PK'] * shots['HomeTeamEvent']
+        shots['Shots_PK_onice_home{}'.format(str(i))] = shots['Shots_PK'] * shots['HomeTeamEvent']
+        shots['ShotAttempts_PK_onice_home{}'.format(str(i))] = shots['ShotAttempts_PK'] * shots['HomeTeamEvent']
+        shots['UnblockedShotAttempts_PK_onice_home{}'.format(str(i))] = shots['UnblockedShotAttempts_PK'] * shots['HomeTeamEvent']
+        shots['xG_PK_onice_home{}'.format(str(i))] = shots['xG_PK'] * shots['HomeTeamEvent']
+        shots['xG_flurry_PK_onice_home{}'.format(str(i))] = shots['xG_flurry_PK'] * shots['HomeTeamEvent']
+
+        shots['GoalsAdjusted_onice_home{}'.format(str(i))] = shots['GoalsAdjusted'] * shots['HomeTeamEvent']
+        shots['ShotsAdjusted_onice_home{}'.format(str(i))] = shots['ShotsAdjusted'] * shots['HomeTeamEvent']
+        shots['ShotAttemptsAdjusted_onice_home{}'.format(str(i))] = shots['ShotAttemptsAdjusted'] * shots['HomeTeamEvent']
+        shots['UnblockedShotAttemptsAdjusted_onice_home{}'.format(str(i))] = shots['UnblockedShotAttemptsAdjusted'] * shots['HomeTeamEvent']
+        shots['xGAdjusted_onice_home{}'.format(str(i))] = shots['xGAdjusted'] * shots['HomeTeamEvent']
+        shots['xG_flurryAdjusted_onice_home{}'.format(str(i))] = shots['xG_flurryAdjusted'] * shots['HomeTeamEvent']
+        shots['GoalsAdjusted_5v5_onice_home{}'.format(str(i))] = shots['GoalsAdjusted_5v5'] * shots['HomeTeamEvent']
+        shots['ShotsAdjusted_5v5_onice_home{}'.format(str(i))] = shots['ShotsAdjusted_5v5'] * shots['HomeTeamEvent']
+        shots['ShotAttemptsAdjusted_5v5_onice_home{}'.format(str(i))] = shots['ShotAttemptsAdjusted_5v5'] * shots['HomeTeamEvent']
+        shots['UnblockedShotAttemptsAdjusted_5v5_onice_home{}'.format(str(i))] = shots['UnblockedShotAttemptsAdjusted_5v5'] * shots['HomeTeamEvent']
+        shots['xGAdjusted_5v5_onice_home{}'.format(str(i))] = shots['xGAdjusted_5v5'] * shots['HomeTeamEvent']
+        shots['xG_flurryAdjusted_5v5_onice_home{}'.format(str(i))] = shots['xG_flurryAdjusted_5v5'] * shots['HomeTeamEvent']
+        shots['GoalsAdjusted_PP_onice_home{}'.format(str(i))] = shots['GoalsAdjusted_PP'] * shots['HomeTeamEvent']
+        shots['ShotsAdjusted_PP_onice_home{}'.format(str(i))] = shots['ShotsAdjusted_PP'] * shots['HomeTeamEvent']
+        shots['ShotAttemptsAdjusted_PP_onice_home{}'.format(str(i))] = shots['ShotAttemptsAdjusted_PP'] * shots['HomeTeamEvent']
+        shots['UnblockedShotAttemptsAdjusted_PP_onice_home{}'.format(str(i))] = shots['UnblockedShotAttemptsAdjusted_PP'] * shots['HomeTeamEvent']
+        shots['xGAdjusted_PP_onice_home{}'.format(str(i))] = shots['xGAdjusted_PP'] * shots['HomeTeamEvent']
+        shots['xG_flurryAdjusted_PP_onice_home{}'.format(str(i))] = shots['xG_flurryAdjusted_PP'] * shots['HomeTeamEvent']
+
+        shots['GoalsAgainst_onice_home{}'.format(str(i))] = shots['Goals'] * shots['AwayTeamEvent']
+        shots['ShotsAgainst_onice_home{}'.format(str(i))] = shots['Shots'] * shots['AwayTeamEvent']
+        shots['ShotAttemptsAgainst_onice_home{}'.format(str(i))] = shots['ShotAttempts'] * shots['AwayTeamEvent']
+        shots['UnblockedShotAttemptsAgainst_onice_home{}'.format(str(i))] = shots['UnblockedShotAttempts'] * shots['AwayTeamEvent']
+        shots['xGAgainst_onice_home{}'.format(str(i))] = shots['xG'] * shots['AwayTeamEvent']
+        shots['xG_flurryAgainst_onice_home{}'.format(str(i))] = shots['xG_flurry'] * shots['AwayTeamEvent']
+        shots['GoalsAgainst_5v5_onice_home{}'.format(str(i))] = shots['Goals_5v5'] * shots['AwayTeamEvent']
+        shots['ShotsAgainst_5v5_onice_home{}'.format(str(i))] = shots['Shots_5v5'] * shots['AwayTeamEvent']
+        shots['ShotAttemptsAgainst_5v5_onice_home{}'.format(str(i))] = shots['ShotAttempts_5v5'] * shots['AwayTeamEvent']
+        shots['UnblockedShotAttemptsAgainst_5v5_onice_home{}'.format(str(i))] = shots['UnblockedShotAttempts_5v5'] * shots['AwayTeamEvent']
+        shots['xGAgainst_5v5_onice_home{}'.format(str(i))] = shots['xG_5v5'] * shots['AwayTeamEvent']
+        shots['xG_flurryAgainst_5v5_onice_home{}'.format(str(i))] = shots['xG_flurry_5v5'] * shots['AwayTeamEvent']
+        shots['GoalsAgainst_PP_onice_home{}'.format(str(i))] = shots['Goals_PK'] * shots['AwayTeamEvent']
+        shots['ShotsAgainst_PP_onice_home{}'.format(str(i))] = shots['Shots_PK'] * shots['AwayTeamEvent']
+        shots['ShotAttemptsAgainst_PP_onice_home{}'.format(str(i))] = shots['ShotAttempts_PK'] * shots['AwayTeamEvent']
+        shots['UnblockedShotAttemptsAgainst_PP_onice_home{}'.format(str(i))] = shots['UnblockedShotAttempts_PK'] * shots['AwayTeamEvent']
+        shots['xGAgainst_PP_onice_home{}'.format(str(i))] = shots['xG_PK'] * shots['AwayTeamEvent']
+        shots['xG_flurryAgainst_PP_onice_home{}'.format(str(i))] = shots['xG_flurry_PK'] * shots['AwayTeamEvent']
+        shots['GoalsAgainst_PK_onice_home{}'.format(str(i))] = shots['Goals_PP'] * shots['AwayTeamEvent']
+        shots['ShotsAgainst_PK_onice_home{}'.format(str(i))] = shots['Shots_PP'] * shots['AwayTeamEvent']
+        shots['ShotAttemptsAgainst_PK_onice_home{}'.format(str(i))] = shots['ShotAttempts_PP'] * shots['AwayTeamEvent']
+        shots['UnblockedShotAttemptsAgainst_PK_onice_home{}'.format(str(i))] = shots['UnblockedShotAttempts_PP'] * shots['AwayTeamEvent']
+        shots['xGAgainst_PK_onice_home{}'.format(str(i))] = shots['xG_PP'] * shots['AwayTeamEvent']
+        shots['xG_flurryAgainst_PK_onice_home{}'.format(str(i))] = shots['xG_flurry_PP'] * shots['AwayTeamEvent']
+        shots['ReboundShotsAgainst_onice_home{}'.format(str(i))] = (shots['ShotCategory']=='Rebound').astype(np.int16) * shots['AwayTeamEvent']
+
+        shots['GoalsAdjustedAgainst_onice_home{}'.format(str(i))] = shots['GoalsAdjusted'] * shots['AwayTeamEvent']
+        shots['ShotsAdjustedAgainst_onice_home{}'.format(str(i))] = shots['ShotsAdjusted'] * shots['AwayTeamEvent']
+        shots['ShotAttemptsAdjustedAgainst_onice_home{}'.format(str(i))] = shots['ShotAttemptsAdjusted'] * shots['AwayTeamEvent']
+        shots['UnblockedShotAttemptsAdjustedAgainst_onice_home{}'.format(str(i))] = shots['UnblockedShotAttemptsAdjusted'] * shots['AwayTeamEvent']
+        shots['xGAdjustedAgainst_onice_home{}'.format(str(i))] = shots['xGAdjusted'] * shots['AwayTeamEvent']
+        shots['xG_flurryAdjustedAgainst_onice_home{}'.format(str(i))] = shots['xG_flurryAdjusted'] * shots['AwayTeamEvent']
+        shots['GoalsAdjustedAgainst_5v5_onice_home{}'.format(str(i))] = shots['GoalsAdjusted_5v5'] * shots['AwayTeamEvent']
+        shots['ShotsAdjustedAgainst_5v5_onice_home{}'.format(str(i))] = shots['ShotsAdjusted_5v5'] * shots['AwayTeamEvent']
+        shots['ShotAttemptsAdjustedAgainst_5v5_onice_home{}'.format(str(i))] = shots['ShotAttemptsAdjusted_5v5'] * shots['AwayTeamEvent']
+        shots['UnblockedShotAttemptsAdjustedAgainst_5v5_onice_home{}'.format(str(i))] = shots['UnblockedShotAttemptsAdjusted_5v5'] * shots['AwayTeamEvent']
+        shots['xGAdjustedAgainst_5v5_onice_home{}'.format(str(i))] = shots['xGAdjusted_5v5'] * shots['AwayTeamEvent']
+        shots['xG_flurryAdjustedAgainst_5v5_onice_home{}'.format(str(i))] = shots['xG_flurryAdjusted_5v5'] * shots['AwayTeamEvent']
+        shots['GoalsAdjustedAgainst_PK_onice_home{}'.format(str(i))] = shots['GoalsAdjusted_PP'] * shots['AwayTeamEvent']
+        shots['ShotsAdjustedAgainst_PK_onice_home{}'.format(str(i))] = shots['ShotsAdjusted_PP'] * shots['AwayTeamEvent']
+        shots['ShotAttemptsAdjustedAgainst_PK_onice_home{}'.format(str(i))] = shots['ShotAttemptsAdjusted_PP'] * shots['AwayTeamEvent']
+        shots['UnblockedShotAttemptsAdjustedAgainst_PK_onice_home{}'.format(str(i))] = shots['UnblockedShotAttemptsAdjusted_PP'] * shots['AwayTeamEvent']
+        shots['xGAdjustedAgainst_PK_onice_home{}'.format(str(i))] = shots['xGAdjusted_PP'] * shots['AwayTeamEvent']
+        shots['xG_flurryAdjustedAgainst_PK_onice_home{}'.format(str(i))] = shots['xG_flurryAdjusted_PP'] * shots['AwayTeamEvent']
+
+        shots['team_home{}'.format(str(i))] = shots['Home_Team'].copy()
+
+        # add column for tracking player positions
+        shots['position_home{}'.format(str(i))] = 1
+
+        playerGame_home = shots.groupby([
+                'Game_Id','Date','Player','PlayerID','Season'
+            ]).agg({
+                'Goals_onice_home{}'.format(str(i)) : sum,
+                'Shots_onice_home{}'.format(str(i)) : sum,
+                'ShotAttempts_onice_home{}'.format(str(i)) : sum,
+                'UnblockedShotAttempts_onice_home{}'.format(str(i)) : sum,
+                'xG_onice_home{}'.format(str(i)) : sum,
+                'xG_flurry_onice_home{}'.format(str(i)) : sum,
+                'Goals_5v5_onice_home{}'.format(str(i)) : sum,
+                'Shots_5v5_onice_home{}'.format(str(i)) : sum,
+                'ShotAttempts_5v5_onice_home{}'.format(str(i)) : sum,
+                'UnblockedShotAttempts_5v5_onice_home{}'.format(str(i)) : sum,
+                'xG_5v5_onice_home{}'.format(str(i)) : sum,
+                'xG_flurry_5v5_onice_home{}'.format(str(i)) : sum,
+                'Goals_PP_onice_home{}'.format(str(i)) : sum,
+                'Shots_PP_onice_home{}'.format(str(i)) : sum,
+                'ShotAttempts_PP_onice_home{}'.format(str(i)) : sum,
+                'UnblockedShotAttempts_PP_onice_home{}'.format(str(i)) : sum,
+                'xG_PP_onice_home{}'.format(str(i)) : sum,
+                'xG_flurry_PP_onice_home{}'.format(str(i)) : sum,
+                'Goals_PK_onice_home{}'.format(str(i)) : sum,
+                'Shots_PK_onice_home{}'.format(str(i)) : sum,
+                'ShotAttempts_PK_onice_home{}'.format(str(i)) : sum,
+                'UnblockedShotAttempts_PK_onice_home{}'.format(str(i)) : sum,
+                'xG_PK_onice_home{}'.format(str(i)) : sum,
+                'xG_flurry_PK_onice_home{}'.format(str(i)) : sum,
+                'GoalsAgainst_onice_home{}'.format(str(i)) : sum,
+                'ShotsAgainst_onice_home{}'.format(str(i)) : sum,
+                'ShotAttemptsAgainst_onice_home{}'.format(str(i)) : sum,
+                'UnblockedShotAttemptsAgainst_onice_home{}'.format(str(i)) : sum,
+                'xGAgainst_onice_home{}'.format(str(i)) : sum,
+                'xG_flurryAgainst_onice_home{}'.format(str(i)) : sum,
+                'GoalsAgainst_5v5_onice_home{}'.format(str(i)) : sum,
+                'ShotsAgainst_5v5_onice_home{}'.format(str(i)) : sum,
+                'ShotAttemptsAgainst_5v5_onice_home{}'.format(str(i)) : sum,
+                'UnblockedShotAttemptsAgainst_5v5_onice_home{}'.format(str(i)) : sum,
+                'xGAgainst_5v5_onice_home{}'.format(str(i)) : sum,
+                'xG_flurryAgainst_5v5_onice_home{}'.format(str(i)) : sum,
+                'GoalsAgainst_PP_onice_home{}'.format(str(i)) : sum,
+                'ShotsAgainst_PP_onice_home{}'.format(str(i)) : sum,
+                'ShotAttemptsAgainst_PP_onice_home{}'.format(str(i)) : sum,
+                'UnblockedShotAttemptsAgainst_PP_onice_home{}'.format(str(i)) : sum,
+                'xGAgainst_PP_onice_home{}'.format(str(i)) : sum,
+                'xG_flurryAgainst_PP_onice_home{}'.format(str(i)) : sum,
+                'GoalsAgainst_PK_onice_home{}'.format(str(i)) : sum,
+                'ShotsAgainst_PK_onice_home{}'.format(str(i)) : sum,
+                'ShotAttemptsAgainst_PK_onice_home{}'.format(str(i)) : sum,
+                'UnblockedShotAttemptsAgainst_PK_onice_home{}'.format(str(i)) : sum,
+                'xGAgainst_PK_onice_home{}'.format(str(i)) : sum,
+                'xG_flurryAgainst_PK_onice_home{}'.format(str(i)) : sum,
+                'GoalsAdjusted_onice_home{}'.format(str(i)) : sum,
+                'ShotsAdjusted_onice_home{}'.format(str(i)) : sum,
+                'ShotAttemptsAdjusted_onice_home{}'.format(str(i)) : sum,
+                'UnblockedShotAttemptsAdjusted_onice_home{}'.format(str(i)) : sum,
+                'xGAdjusted_onice_home{}'.format(str(i)) : sum,
+                'xG_flurryAdjusted_onice_home{}'.format(str(i)) : sum,
+                'GoalsAdjusted_5v5_onice_home{}'.format(str(i)) : sum,
+                'ShotsAdjusted_5v5_onice_home{}'.format(str(i)) : sum,
+                'ShotAttemptsAdjusted_5v5_onice_home{}'.format(str(i)) : sum,
+                'UnblockedShotAttemptsAdjusted_5v5_onice_home{}'.format(str(i)) : sum,
+                'xGAdjusted_5v5_onice_home{}'.format(str(i)) : sum,
+                'xG_flurryAdjusted_5v5_onice_home{}'.format(str(i)) : sum,
+                'GoalsAdjusted_PP_onice_home{}'.format(str(i)) : sum,
+                'ShotsAdjusted_PP_onice_home{}'.format(str(i)) : sum,
+                'ShotAttemptsAdjusted_PP_onice_home{}'.format(str(i)) : sum,
+                'UnblockedShotAttemptsAdjusted_PP_onice_home{}'.format(str(i)) : sum,
+                'xGAdjusted_PP_onice_home{}'.format(str(i)) : sum,
+                'xG_flurryAdjusted_PP_onice_home{}'.format(str(i)) : sum,
+                'GoalsAdjustedAgainst_onice_home{}'.format(str(i)) : sum,
+                'ShotsAdjustedAgainst_onice_home{}'.format(str(i)) : sum,
+                'ShotAttemptsAdjustedAgainst_onice_home{}'.format(str(i)) : sum,
+                'UnblockedShotAttemptsAdjustedAgainst_onice_home{}'.format(str(i)) : sum,
+                'xGAdjustedAgainst_onice_home{}'.format(str(i)) : sum,
+                'xG_flurryAdjustedAgainst_onice_home{}'.format(str(i)) : sum,
+                'GoalsAdjustedAgainst_5v5_onice_home{}'.format(str(i)) : sum,
+                'ShotsAdjustedAgainst_5v5_onice_home{}'.format(str(i)) : sum,
+                'ShotAttemptsAdjustedAgainst_5v5_onice_home{}'.format(str(i)) : sum,
+                'UnblockedShotAttemptsAdjustedAgainst_5v5_onice_home{}'.format(str(i)) : sum,
+                'xGAdjustedAgainst_5v5_onice_home{}'.format(str(i)) : sum,
+                'xG_flurryAdjustedAgainst_5v5_onice_home{}'.format(str(i)) : sum,
+                'GoalsAdjustedAgainst_PK_onice_home{}'.format(str(i)) : sum,
+                'ShotsAdjustedAgainst_PK_onice_home{}'.format(str(i)) : sum,
+                'ShotAttemptsAdjustedAgainst_PK_onice_home{}'.format(str(i)) : sum,
+                'UnblockedShotAttemptsAdjustedAgainst_PK_onice_home{}'.format(str(i)) : sum,
+                'xGAdjustedAgainst_PK_onice_home{}'.format(str(i)) : sum,
+                'xG_flurryAdjustedAgainst_PK_onice_home{}'.format(str(i)) : sum,
+                'ReboundShotsAgainst_onice_home{}'.format(str(i)) : sum,
+                'position_home{}'.format(str(i)) : sum,
+                'team_home{}'.format(str(i)) : lambda x: x.value_counts().index[0]
+        }).reset_index().fillna(0)
+        playerGame_home['team_home{}'.format(str(i))] = playerGame_home['team_home{}'.format(str(i))].replace(0, '')
+
+        playerGame = playerGame.merge(playerGame_home, how='outer', on=['Game_Id','Date','Player','PlayerID','Season'])
+        del playerGame_home
+
+    # on-ice stats away players
+    for i in range(1,7):
+        shots['Player'] = shots['awayPlayer{}'.format(str(i))].copy()
+        shots['PlayerID'] = shots['awayPlayer{}_id'.format(str(i))].copy()
+
+        shots['Goals_onice_away{}'.format(str(i))] = shots['Goals'] * shots['AwayTeamEvent']
+        shots['Shots_onice_away{}'.format(str(i))] = shots['Shots'] * shots['AwayTeamEvent']
+        shots['ShotAttempts_onice_away{}'.format(str(i))] = shots['ShotAttempts'] * shots['AwayTeamEvent']
+        shots['UnblockedShotAttempts_onice_away{}'.format(str(i))] = shots['UnblockedShotAttempts'] * shots['AwayTeamEvent']
+        shots['xG_onice_away{}'.format(str(i))] = shots['xG'] * shots['AwayTeamEvent']
+        shots['xG_flurry_onice_away{}'.format(str(i))] = shots['xG_flurry'] * shots['AwayTeamEvent']
+        shots['Goals_5v5_onice_away{}'.format(str(i))] = shots['Goals_5v5'] * shots['AwayTeamEvent']
+        shots['Shots_5v5_onice_away{}'.format(str(i))] = shots['Shots_5v5'] * shots['AwayTeamEvent']
+        shots['ShotAttempts_5v5_onice_away{}'.format(str(i))] = shots['ShotAttempts_5v5'] * shots['AwayTeamEvent']
+        shots['UnblockedShotAttempts_5v5_onice_away{}'.format(str(i))] = shots['UnblockedShotAttempts_5v5'] * shots['AwayTeamEvent']
+        shots['xG_5v5_onice_away{}'.format(str(i))] = shots['xG_5v5'] * shots['AwayTeamEvent']
+        shots['xG_flurry_5v5_onice_away{}'.format(str(i))] = shots['xG_flurry_5v5'] * shots['AwayTeamEvent']
+        shots['Goals_PP_onice_away{}'.format(str(i))] = shots['Goals_PP'] * shots['AwayTeamEvent']
+        shots['Shots_PP_onice_away{}'.format(str(i))] = shots['Shots_PP'] * shots['AwayTeamEvent']
+        shots['ShotAttempts_PP_onice_away{}'.format(str(i))] = shots['ShotAttempts_PP'] * shots['AwayTeamEvent']
+        shots['UnblockedShotAttempts_PP_onice_away{}'.format(str(i))] = shots['UnblockedShotAttempts_PP'] * shots['AwayTeamEvent']
+        shots['xG_PP_onice_away{}'.format(str(i))] = shots['xG_PP'] * shots['AwayTeamEvent']
+        shots['xG_flurry_PP_onice_away{}'.format(str(i))] = shots['xG_flurry_PP'] * shots['AwayTeamEvent']
+        shots['Goals_PK_onice_away{}'.format(str(i))] = shots['Goals_PK'] * shots['AwayTeamEvent']
+        shots['Shots_PK_onice_away{}'.format(str(i))] = shots['Shots_PK'] * shots['AwayTeamEvent']
+        shots['ShotAttempts_PK_onice_away{}'.format(str(i))] = shots['ShotAttempts_PK'] * shots['AwayTeamEvent']
+        shots['UnblockedShotAttempts_PK_onice_away{}'.format(str(i))] = shots['UnblockedShotAttempts_PK'] * shots['AwayTeamEvent']
+        shots['xG_PK_onice_away{}'.format(str(i))] = shots['xG_PK'] * shots['AwayTeamEvent']
+        shots['xG_flurry_PK_onice_away{}'.format(str(i))] = shots['xG_flurry_PK'] * shots['AwayTeamEvent']
+
+        shots['GoalsAdjusted_onice_away{}'.format(str(i))] = shots['GoalsAdjusted'] * shots['AwayTeamEvent']
+        shots['ShotsAdjusted_onice_away{}'.format(str(i))] = shots['ShotsAdjusted'] * shots['AwayTeamEvent']
+        shots['ShotAttemptsAdjusted_onice_away{}'.format(str(i))] = shots['ShotAttemptsAdjusted'] * shots['AwayTeamEvent']
+        shots['UnblockedShotAttemptsAdjusted_onice_away{}'.format(str(i))] = shots['UnblockedShotAttemptsAdjusted'] * shots['AwayTeamEvent']
+        shots['xGAdjusted_onice_away{}'.format(str(i))] = shots['xGAdjusted'] * shots['AwayTeamEvent']
+        shots['xG_flurryAdjusted_onice_away{}'.format(str(i))] = shots['xG_flurryAdjusted'] * shots['AwayTeamEvent']
+        shots['GoalsAdjusted_5v5_onice_away{}'.format(str(i))] = shots['GoalsAdjusted_5v5'] * shots['AwayTeamEvent']
+        shots['ShotsAdjusted_5v5_onice_away{}'.format(str(i))] = shots['ShotsAdjusted_5v5'] * shots['AwayTeamEvent']
+        shots['ShotAttemptsAdjusted_5v5_onice_away{}'.format(str(i))] = shots['ShotAttemptsAdjusted_5v5'] * shots['AwayTeamEvent']
+        shots['UnblockedShotAttemptsAdjusted_5v5_onice_away{}'.format(str(i))] = shots['UnblockedShotAttemptsAdjusted_5v5'] * shots['AwayTeamEvent']
+        shots['xGAdjusted_5v5_onice_away{}'.format(str(i))] = shots['xGAdjusted_5v5'] * shots['AwayTeamEvent']
+        shots['xG_flurryAdjusted_5v5_onice_away{}'.format(str(i))] = shots['xG_flurryAdjusted_5v5'] * shots['AwayTeamEvent']
+        shots['GoalsAdjusted_PP_onice_away{}'.format(str(i))] = shots['GoalsAdjusted_PP'] * shots['AwayTeamEvent']
+        shots['ShotsAdjusted_PP_onice_away{}'.format(str(i))] = shots['ShotsAdjusted_PP'] * shots['AwayTeamEvent']
+        shots['ShotAttemptsAdjusted_PP_onice_away{}'.format(str(i))] = shots['ShotAttemptsAdjusted_PP'] * shots['AwayTeamEvent']
+        shots['UnblockedShotAttemptsAdjusted_PP_onice_away{}'.format(str(i))] = shots['UnblockedShotAttemptsAdjusted_PP'] * shots['AwayTeamEvent']
+        shots['xGAdjusted_PP_onice_away{}'.format(str(i))] = shots['xGAdjusted_PP'] * shots['AwayTeamEvent']
+        shots['xG_flurryAdjusted_PP_onice_away{}'.format(str(i))] = shots['xG_flurryAdjusted_PP'] * shots['AwayTeamEvent']
+
+        shots['GoalsAgainst_onice_away{}'.format(str(i))] = shots['Goals'] * shots['HomeTeamEvent']
+        shots['ShotsAgainst_onice_away{}'.format(str(i))] = shots['Shots'] * shots['HomeTeamEvent']
+        shots['ShotAttemptsAgainst_onice_away{}'.format(str(i))] = shots['ShotAttempts'] * shots['HomeTeamEvent']
+        shots['UnblockedShotAttemptsAgainst_onice_away{}'.format(str(i))] = shots['UnblockedShotAttempts'] * shots['HomeTeamEvent']
+        shots['xGAgainst_onice_away{}'.format(str(i))] = shots['xG'] * shots['HomeTeamEvent']
+        shots['xG_flurryAgainst_onice_away{}'.format(str(i))] = shots['xG_flurry'] * shots['HomeTeamEvent']
+        shots['GoalsAgainst_5v5_onice_away{}'.format(str(i))] = shots['Goals_5v5'] * shots['HomeTeamEvent']
+        shots['ShotsAgainst_5v5_onice_away{}'.format(str(i))] = shots['Shots_5v5'] * shots['HomeTeamEvent']
+        shots['ShotAttemptsAgainst_5v5_onice_away{}'.format(str(i))] = shots['ShotAttempts_5v5'] * shots['HomeTeamEvent']
+        shots['UnblockedShotAttemptsAgainst_5v5_onice_away{}'.format(str(i))] = shots['UnblockedShotAttempts_5v5'] * shots['HomeTeamEvent']
+        shots['xGAgainst_5v5_onice_away{}'.format(str(i))] = shots['xG_5v5'] * shots['HomeTeamEvent']
+        shots['xG_flurryAgainst_5v5_onice_away{}'.format(str(i))] = shots['xG_flurry_5v5'] * shots['HomeTeamEvent']
+        shots['GoalsAgainst_PP_onice_away{}'.format(str(i))] = shots['Goals_PK'] * shots['HomeTeamEvent']
+        shots['ShotsAgainst_PP_onice_away{}'.format(str(i))] = shots['Shots_PK'] * shots['HomeTeamEvent']
+        shots['ShotAttemptsAgainst_PP_onice_away{}'.format(str(i))] = shots['ShotAttempts_PK'] * shots['HomeTeamEvent']
+        shots['UnblockedShotAttemptsAgainst_PP_onice_away{}'.format(str(i))] = shots['UnblockedShotAttempts_PK'] * shots['HomeTeamEvent']
+        shots['xGAgainst_PP_onice_away{}'.format(str(i))] = shots['xG_PK'] * shots['HomeTeamEvent']
+        shots['xG_flurryAgainst_PP_onice_away{}'.format(str(i))] = shots['xG_flurry_PK'] * shots['HomeTeamEvent']
+        shots['GoalsAgainst_PK_onice_away{}'.format(str(i))] = shots['Goals_PP'] * shots['HomeTeamEvent']
+        shots['ShotsAgainst_PK_onice_away{}'.format(str(i))] = shots['Shots_PP'] * shots['HomeTeamEvent']
+        shots['ShotAttemptsAgainst_PK_onice_away{}'.format(str(i))] = shots['ShotAttempts_PP'] * shots['HomeTeamEvent']
+        shots['UnblockedShotAttemptsAgainst_PK_onice_away{}'.format(str(i))] = shots['UnblockedShotAttempts_PP'] * shots['HomeTeamEvent']
+        shots['xGAgainst_PK_onice_away{}'.format(str(i))] = shots['xG_PP'] * shots['HomeTeamEvent']
+        shots['xG_flurryAgainst_PK_onice_away{}'.format(str(i))] = shots['xG_flurry_PP'] * shots['HomeTeamEvent']
+        shots['ReboundShotsAgainst_onice_away{}'.format(str(i))] = (shots['ShotCategory']=='Rebound').astype(np.int16) * shots['HomeTeamEvent']
+
+        shots['GoalsAdjustedAgainst_onice_away{}'.format(str(i))] = shots['GoalsAdjusted'] * shots['HomeTeamEvent']
+        shots['ShotsAdjustedAgainst_onice_away{}'.format(str(i))] = shots['ShotsAdjusted'] * shots['HomeTeamEvent']
+        shots['ShotAttemptsAdjustedAgainst_onice_away{}'.format(str(i))] = shots['ShotAttemptsAdjusted'] * shots['HomeTeamEvent']
+        shots['UnblockedShotAttemptsAdjustedAgainst_onice_away{}'.format(str(i))] = shots['UnblockedShotAttemptsAdjusted'] * shots['HomeTeamEvent']
+        shots['xGAdjustedAgainst_onice_away{}'.format(str(i))] = shots['xGAdjusted'] * shots['HomeTeamEvent']
+        shots['xG_flurryAdjustedAgainst_onice_away{}'.format(str(i))] = shots['xG_flurryAdjusted'] * shots['HomeTeamEvent']
+        shots['GoalsAdjustedAgainst_5v5_onice_away{}'.format(str(i))] = shots['GoalsAdjusted_5v5'] * shots['HomeTeamEvent']
+        shots['ShotsAdjustedAgainst_5v5_onice_away{}'.format(str(i))] = shots['ShotsAdjusted_5v5'] * shots['HomeTeamEvent']
+        shots['ShotAttemptsAdjustedAgainst_5v5_onice_away{}'.format(str(i))] = shots['ShotAttemptsAdjusted_5v5'] * shots['HomeTeamEvent']
+        shots['UnblockedShotAttemptsAdjustedAgainst_5v5_onice_away{}'.format(str(i))] = shots['UnblockedShotAttemptsAdjusted_5v5'] * shots['HomeTeamEvent']
+        shots['xGAdjustedAgainst_5v5_onice_away{}'.format(str(i))] = shots['xGAdjusted_5v5'] * shots['HomeTeamEvent']
+        shots['xG_flurryAdjustedAgainst_5v5_onice_away{}'.format(str(i))] = shots['xG_flurryAdjusted_5v5'] * shots['HomeTeamEvent']
+        shots['GoalsAdjustedAgainst_PK_onice_away{}'.format(str(i))] = shots['GoalsAdjusted_PP'] * shots['HomeTeamEvent']
+        shots['ShotsAdjustedAgainst_PK_onice_away{}'.format(str(i))] = shots['ShotsAdjusted_PP'] * shots['HomeTeamEvent']
+        shots['ShotAttemptsAdjustedAgainst_PK_onice_away{}'.format(str(i))] = shots['ShotAttemptsAdjusted_PP'] * shots['HomeTeamEvent']
+        shots['UnblockedShotAttemptsAdjustedAgainst_PK_onice_away{}'.format(str(i))] = shots['UnblockedShotAttemptsAdjusted_PP'] * shots['HomeTeamEvent']
+        shots['xGAdjustedAgainst_PK_onice_away{}'.format(str(i))] = shots['xGAdjusted_PP'] * shots['HomeTeamEvent']
+        shots['xG_flurryAdjustedAgainst_PK_onice_away{}'.format(str(i))] = shots['xG_flurryAdjusted_PP'] * shots['HomeTeamEvent']
+
+        shots['team_away{}'.format(str(i))] = shots['Away_Team'].copy()
+
+        # add column for tracking player positions
+        shots['position_away{}'.format(str(i))] = 1
+
+        playerGame_away = shots.groupby([
+                'Game_Id','Date','Player','PlayerID','Season'
+            ]).agg({
+                'Goals_onice_away{}'.format(str(i)) : sum,
+                'Shots_onice_away{}'.format(str(i)) : sum,
+                'ShotAttempts_onice_away{}'.format(str(i)) : sum,
+                'UnblockedShotAttempts_onice_away{}'.format(str(i)) : sum,
+                'xG_onice_away{}'.format(str(i)) : sum,
+                'xG_flurry_onice_away{}'.format(str(i)) : sum,
+                'Goals_5v5_onice_away{}'.format(str(i)) : sum,
+                'Shots_5v5_onice_away{}'.format(str(i)) : sum,
+                'ShotAttempts_5v5_onice_away{}'.format(str(i)) : sum,
+                'UnblockedShotAttempts_5v5_onice_away{}'.format(str(i)) : sum,
+                'xG_5v5_onice_away{}'.format(str(i)) : sum,
+                'xG_flurry_5v5_onice_away{}'.format(str(i)) : sum,
+                'Goals_PP_onice_away{}'.format(str(i)) : sum,
+                'Shots_PP_onice_away{}'.format(str(i)) : sum,
+                'ShotAttempts_PP_onice_away{}'.format(str(i)) : sum,
+                'UnblockedShotAttempts_PP_onice_away{}'.format(str(i)) : sum,
+                'xG_PP_onice_away{}'.format(str(i)) : sum,
+                'xG_flurry_PP_onice_away{}'.format(str(i)) : sum,
+                'Goals_PK_onice_away{}'.format(str(i)) : sum,
+                'Shots_PK_onice_away{}'.format(str(i)) : sum,
+                'ShotAttempts_PK_onice_away{}'.format(str(i)) : sum,
+                'UnblockedShotAttempts_PK_onice_away{}'.format(str(i)) : sum,
+                'xG_PK_onice_away{}'.format(str(i)) : sum,
+                'xG_flurry_PK_onice_away{}'.format(str(i)) : sum,
+                'GoalsAgainst_onice_away{}'.format(str(i)) : sum,
+                'ShotsAgainst_onice_away{}'.format(str(i)) : sum,
+                'ShotAttemptsAgainst_onice_away{}'.format(str(i)) : sum,
+                'UnblockedShotAttemptsAgainst_onice_away{}'.format(str(i)) : sum,
+                'xGAgainst_onice_away{}'.format(str(i)) : sum,
+                'xG_flurryAgainst_onice_away{}'.format(str(i)) : sum,
+                'GoalsAgainst_5v5_onice_away{}'.format(str(i)) : sum,
+                'ShotsAgainst_5v5_onice_away{}'.format(str(i)) : sum,
+                'ShotAttemptsAgainst_5v5_onice_away{}'.format(str(i)) : sum,
+                'UnblockedShotAttemptsAgainst_5v5_onice_away{}'.format(str(i)) : sum,
+                'xGAgainst_5v5_onice_away{}'.format(str(i)) : sum,
+                'xG_flurryAgainst_5v5_onice_away{}'.format(str(i)) : sum,
+                'GoalsAgainst_PP_onice_away{}'.format(str(i)) : sum,
+                'ShotsAgainst_PP_onice_away{}'.format(str(i)) : sum,
+                'ShotAttemptsAgainst_PP_onice_away{}'.format(str(i)) : sum,
+                'UnblockedShotAttemptsAgainst_PP_onice_away{}'.format(str(i)) : sum,
+                'xGAgainst_PP_onice_away{}'.format(str(i)) : sum,
+                'xG_flurryAgainst_PP_onice_away{}'.format(str(i)) : sum,
+                'GoalsAgainst_PK_onice_away{}'.format(str(i)) : sum,
+                'ShotsAgainst_PK_onice_away{}'.format(str(i)) : sum,
+                'ShotAttemptsAgainst_PK_onice_away{}'.format(str(i)) : sum,
+                'UnblockedShotAttemptsAgainst_PK_onice_away{}'.format(str(i)) : sum,
+                'xGAgainst_PK_onice_away{}'.format(str(i)) : sum,
+                'xG_flurryAgainst_PK_onice_away{}'.format(str(i)) : sum,
+                'GoalsAdjusted_onice_away{}'.format(str(i)) : sum,
+                'ShotsAdjusted_onice_away{}'.format(str(i)) : sum,
+                'ShotAttemptsAdjusted_onice_away{}'.format(str(i)) : sum,
+                'UnblockedShotAttemptsAdjusted_onice_away{}'.format(str(i)) : sum,
+                'xGAdjusted_onice_away{}'.format(str(i)) : sum,
+                'xG_flurryAdjusted_onice_away{}'.format(str(i)) : sum,
+                'GoalsAdjusted_5v5_onice_away{}'.format(str(i)) : sum,
+                'ShotsAdjusted_5v5_onice_away{}'.format(str(i)) : sum,
+                'ShotAttemptsAdjusted_5v5_onice_away{}'.format(str(i)) : sum,
+                'UnblockedShotAttemptsAdjusted_5v5_onice_away{}'.format(str(i)) : sum,
+                'xGAdjusted_5v5_onice_away{}'.format(str(i)) : sum,
+                'xG_flurryAdjusted_5v5_onice_away{}'.format(str(i)) : sum,
+                'GoalsAdjusted_PP_onice_away{}'.format(str(i)) : sum,
+                'ShotsAdjusted_PP_onice_away{}'.format(str(i)) : sum,
+                'ShotAttemptsAdjusted_PP_onice_away{}'.format(str(i)) : sum,
+                'UnblockedShotAttemptsAdjusted_PP_onice_away{}'.format(str(i)) : sum,
+                'xGAdjusted_PP_onice_away{}'.format(str(i)) : sum,
+                'xG_flurryAdjusted_PP_onice_away{}'.format(str(i)) : sum,
+                'GoalsAdjustedAgainst_onice_away{}'.format(str(i)) : sum,
+                'ShotsAdjustedAgainst_onice_away{}'.format(str(i)) : sum,
+                'ShotAttemptsAdjustedAgainst_onice_away{}'.format(str(i)) : sum,
+                'UnblockedShotAttemptsAdjustedAgainst_onice_away{}'.format(str(i)) : sum,
+                'xGAdjustedAgainst_onice_away{}'.format(str(i)) : sum,
+                'xG_flurryAdjustedAgainst_onice_away{}'.format(str(i)) : sum,
+                'GoalsAdjustedAgainst_5v5_onice_away{}'.format(str(i)) : sum,
+                'ShotsAdjustedAgainst_5v5_onice_away{}'.format(str(i)) : sum,
+                'ShotAttemptsAdjustedAgainst_5v5_onice_away{}'.format(str(i)) : sum,
+                'UnblockedShotAttemptsAdjustedAgainst_5v5_onice_away{}'.format(str(i)) : sum,
+                'xGAdjustedAgainst_5v5_onice_away{}'.format(str(i)) : sum,
+                'xG_flurryAdjustedAgainst_5v5_onice_away{}'.format(str(i)) : sum,
+                'GoalsAdjustedAgainst_PK_onice_away{}'.format(str(i)) : sum,
+                'ShotsAdjustedAgainst_PK_onice_away{}'.format(str(i)) : sum,
+                'ShotAttemptsAdjustedAgainst_PK_onice_away{}'.format(str(i)) : sum,
+                'UnblockedShotAttemptsAdjustedAgainst_PK_onice_away{}'.format(str(i)) : sum,
+                'xGAdjustedAgainst_PK_onice_away{}'.format(str(i)) : sum,
+                'xG_flurryAdjustedAgainst_PK_onice_away{}'.format(str(i)) : sum,
+                'ReboundShotsAgainst_onice_away{}'.format(str(i)) : sum,
+                'position_away{}'.format(str(i)) : sum,
+                'team_away{}'.format(str(i)) : lambda x: x.value_counts().index[0]
+        }).reset_index()
+        playerGame_away['team_away{}'.format(str(i))] = playerGame_away['team_away{}'.format(str(i))].replace(0, '')
+
+        playerGame = playerGame.merge(playerGame_away, how='outer', on=['Game_Id','Date','Player','PlayerID','Season'])
+        del playerGame_away
+
+        # add up home and away player position numbers
+        playerGame['position_{}'.format(str(i))] = playerGame['position_home{}'.format(str(i))].fillna(0) + playerGame['position_away{}'.format(str(i))].fillna(0)
+        playerGame = playerGame.drop(columns=['position_home{}'.format(str(i)),'position_away{}'.format(str(i))])
+
+    # fill nulls, and add up on-ice columns so there is only one per stat
+    playerGame = playerGame.fillna(0)
+    for col in ['Goals_onice','Shots_onice','ShotAttempts_onice','UnblockedShotAttempts_onice','xG_onice',
+                'xG_flurry_onice','Goals_5v5_onice','Shots_5v5_onice',
+                'ShotAttempts_5v5_onice','UnblockedShotAttempts_5v5_onice','xG_5v5_onice',
+                'xG_flurry_5v5_onice','Goals_PP_onice','Shots_PP_onice',
+                'ShotAttempts_PP_onice','UnblockedShotAttempts_PP_onice','xG_PP_onice',
+                'xG_flurry_PP_onice','Goals_PK_onice','Shots_PK_onice',
+                'ShotAttempts_PK_onice','UnblockedShotAttempts_PK_onice','xG_PK_onice',
+                'xG_flurry_PK_onice','GoalsAgainst_onice','ShotsAgainst_onice',
+                'ShotAttemptsAgainst_onice','UnblockedShotAttemptsAgainst_onice',
+                'xGAgainst_onice','xG_flurryAgainst_onice','GoalsAgainst_5v5_onice',
+                'ShotsAgainst_5v5_onice','ShotAttemptsAgainst_5v5_onice','UnblockedShotAttemptsAgainst_5v5_onice',
+                'xGAgainst_5v5_onice','xG_flurryAgainst_5v5_onice','GoalsAgainst_PP_onice',
+                'ShotsAgainst_PP_onice','ShotAttemptsAgainst_PP_onice','UnblockedShotAttemptsAgainst_PP_onice',
+                'xGAgainst_PP_onice','xG_flurryAgainst_PP_onice','GoalsAgainst_PK_onice',
+                'ShotsAgainst_PK_onice','ShotAttemptsAgainst_PK_onice','UnblockedShotAttemptsAgainst_PK_onice',
+                'xGAgainst_PK_onice','xG_flurryAgainst_PK_onice','GoalsAdjusted_onice',
+                'ShotsAdjusted_onice','ShotAttemptsAdjusted_onice','UnblockedShotAttemptsAdjusted_onice',
+                'xGAdjusted_onice','xG_flurryAdjusted_onice','GoalsAdjusted_5v5_onice',
+                'ShotsAdjusted_5v5_onice','ShotAttemptsAdjusted_5v5_onice','UnblockedShotAttemptsAdjusted_5v5_onice',
+                'xGAdjusted_5v5_onice','xG_flurryAdjusted_5v5_onice','GoalsAdjusted_PP_onice','ShotsAdjusted_PP_onice',
+                'ShotAttemptsAdjusted_PP_onice','UnblockedShotAttemptsAdjusted_PP_onice',
+                'xGAdjusted_PP_onice','xG_flurryAdjusted_PP_onice','GoalsAdjustedAgainst_onice','ShotsAdjustedAgainst_onice',
+                'ShotAttemptsAdjustedAgainst_onice','UnblockedShotAttemptsAdjustedAgainst_onice',
+                'xGAdjustedAgainst_onice','xG_flurryAdjustedAgainst_onice','GoalsAdjustedAgainst_5v5_onice','ShotsAdjustedAgainst_5v5_onice',
+                'ShotAttemptsAdjustedAgainst_5v5_onice','UnblockedShotAttemptsAdjustedAgainst_5v5_onice',
+                'xGAdjustedAgainst_5v5_onice','xG_flurryAdjustedAgainst_5v5_onice','GoalsAdjustedAgainst_PK_onice','ShotsAdjustedAgainst_PK_onice',
+                'ShotAttemptsAdjustedAgainst_PK_onice','UnblockedShotAttemptsAdjustedAgainst_PK_onice',
+                'xGAdjustedAgainst_PK_onice','xG_flurryAdjustedAgainst_PK_onice','ReboundShotsAgainst_onice']:
+        playerGame[col] = playerGame['{}_home1'.format(col)] + playerGame['{}_home2'.format(col)] + playerGame['{}_home3'.format(col)] + playerGame['{}_home4'.format(col)] \
+            + playerGame['{}_home5'.format(col)] + playerGame['{}_home6'.format(col)] + playerGame['{}_away1'.format(col)] + playerGame['{}_away2'.format(col)] \
+            + playerGame['{}_away3'.format(col)] + playerGame['{}_away4'.format(col)] + playerGame['{}_away5'.format(col)] + playerGame['{}_away6'.format(col)]
+        playerGame = playerGame.drop(columns=['{}_home1'.format(col),'{}_home2'.format(col),'{}_home3'.format(col),'{}_home4'.format(col),'{}_home5'.format(col),
+                                      '{}_home6'.format(col),'{}_away1'.format(col),'{}_away2'.format(col),'{}_away3'.format(col),'{}_away4'.format(col),
+                                      '{}_away5'.format(col),'{}_away6'.format(col)])
+
+    # combine the team columns into one
+    playerGame['Team'] = playerGame[['team_away1','team_away2','team_away3','team_away4','team_away5','team_away6',
+                                     'team_home1','team_home2','team_home3','team_home4','team_home5','team_home6']].replace(0,'').max(1)
+    playerGame = playerGame.drop(columns=['team_away1','team_away2','team_away3','team_away4','team_away5','team_away6',
+                                  'team_home1','team_home2','team_home3','team_home4','team_home5','team_home6'])
+
+    return playerGame
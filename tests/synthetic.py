@@ -0,0 +1,271 @@
+import numpy as np
+import pandas as pd
+
+# small random frames with the columns the rating and feature code reads, for checking rewritten code against the originals
+
+PLAYER_STATS = ['DZoneStartCount_5v5','GoalsAdjustedAgainst_PK_onice','GoalsAdjustedAgainst_onice','GoalsAdjusted_5v5_onice','GoalsAdjusted_PP',
+    'GoalsAdjusted_PP_onice','GoalsAgainst_5v5_onice','GoalsAgainst_PK_onice','GoalsAgainst_onice','Goals_5v5','Goals_5v5_onice','Goals_PK_onice',
+    'Goals_PP','Goals_PP_onice','NZoneStartCount_5v5','OZoneStartCount_5v5','Penalties','PenaltiesDrawn','PrimaryAssistsAdjusted_PP',
+    'PrimaryAssists_5v5','PrimaryAssists_PP','SecondaryAssists_5v5','SecondaryAssists_PP','ShotAttemptsAdjusted_5v5_onice','ShotAttemptsAdjusted_PP',
+    'ShotAttemptsAgainst_PK_onice','ShotAttempts_5v5','ShotAttempts_PP','ShotsAdjusted_5v5_onice','ShotsAgainst_onice','Shots_5v5','Shots_PP',
+    'UnblockedShotAttemptsAdjustedAgainst_5v5_onice','UnblockedShotAttempts_5v5','UnblockedShotAttempts_PP','UnblockedShotAttempts_PP_onice',
+    'xGAdjustedAgainst_5v5_onice','xGAdjustedAgainst_onice','xGAgainst_onice','xG_5v5','xG_5v5_onice','xG_PP','xG_PP_onice',
+    'xG_flurryAdjustedAgainst_5v5_onice','xG_flurryAdjustedAgainst_PK_onice','xG_flurryAgainst_PK_onice','xG_flurry_5v5','xG_flurry_5v5_onice',
+    'xG_flurry_PP','xG_flurry_PP_onice']
+
+def player_games(n_games=24, seed=0, season=2022):
+    # playerGame and toiOverlap for 4 teams of 8 forwards, 4 defence and 2 goalies, about 3 games every other day
+    rng = np.random.default_rng(seed)
+    teams = ['T{}'.format(k) for k in range(4)]
+    rosters = {t:[('{}_F{}'.format(t, j), 1000*k+j, 'F') for j in range(8)]+[('{}_D{}'.format(t, j), 1000*k+50+j, 'D') for j in range(4)]+\
+        [('{}_G{}'.format(t, j), 1000*k+90+j, 'G') for j in range(2)] for k, t in enumerate(teams)}
+    dates = pd.date_range('{}-10-07'.format(season), periods=2*n_games).strftime('%Y-%m-%d')
+    rows = []
+    overlaps = []
+    for g in range(n_games):
+        date = dates[2*(g//3)]
+        home, away = rng.choice(teams, 2, replace=False)
+        gid = season*1000000 + 20001 + g
+        dressed = []
+        for team in (home, away):
+            for player, player_id, position in rosters[team]:
+                if (position=='G' and player.endswith('1') and rng.random()<.7) or rng.random()<.1:
+                    continue
+                row = {c:float(rng.gamma(2, 1)) for c in PLAYER_STATS}
+                row.update({'Player':player, 'PlayerID':player_id, 'Position':position, 'Team':team, 'Game_Id':gid, 'Date':date, 'Season':season,
+                    'DateInt':int(date.replace('-','')), 'Playoffs':0, 'PlayerGameID':date+'_'+str(player_id)})
+                row['TOI_5v5'] = 0. if rng.random()<.05 else float(rng.uniform(300, 1200))
+                row['TOI'] = row['TOI_5v5'] + 300
+                row['TOI_PP'] = float(rng.uniform(0, 200))
+                row['TOI_PK'] = float(rng.uniform(0, 200))
+                rows.append(row)
+                dressed.append((player, player_id, team))
+        for player_x, player_id_x, team_x in dressed:
+            for player_y, player_id_y, team_y in dressed:
+                if player_x==player_y:
+                    continue
+                for strength in ['5x5','5x4','4x5','4x4']:
+                    if rng.random()<.5:
+                        overlaps.append({'Game_Id':gid, 'Player_x':player_x, 'Player_Id_x':player_id_x, 'Player_y':player_y, 'Player_Id_y':player_id_y,
+                            'Strength':strength, 'SameTeam':team_x==team_y, 'Overlap':float(rng.choice([0., rng.uniform(0, 300)], p=[.1, .9]))})
+    return pd.DataFrame(rows), pd.DataFrame(overlaps)
+
+TEAM_METRICS = ['Goals','Shots','xG','GoalsAgainst','ShotsAgainst','xGAgainst']
+
+def team_games(seasons=(2021, 2022), n_dates=40, seed=0):
+    # teamGame rows (one per team per game) for 6 teams from October 7th each season, with every team playing on 3 dates out
+    # of 4. goals are always there, the other metrics are sometimes missing
+    rng = np.random.default_rng(seed)
+    teams = np.array(['T{}'.format(k) for k in range(6)])
+    rows = []
+    for season in seasons:
+        gid = season*1000000 + 20001
+        for date in pd.date_range('{}-10-07'.format(season), periods=n_dates).strftime('%Y-%m-%d'):
+            if rng.random()<.25:
+                continue
+            order = rng.permutation(teams)
+            for home, away in zip(order[0::2], order[1::2]):
+                goals = rng.integers(0, 6, 2).astype(float)
+                home_win = goals[0]>goals[1] or (goals[0]==goals[1] and rng.random()<.5)
+                for team, opp, home_flag, team_goals, win in [(home, away, 1, goals[0], home_win), (away, home, 0, goals[1], not home_win)]:
+                    row = {m:float(rng.gamma(2, 1)) if rng.random()>.05 else np.nan for m in TEAM_METRICS}
+                    row.update({'Game_Id':gid, 'Date':date, 'DateInt':int(date.replace('-','')), 'Team':team, 'Opp':opp, 'Home':home_flag,
+                        'Season':season, 'Goals':team_goals, 'Win':int(win), 'StartingGoalie_Id':float(rng.integers(1, 4))})
+                    rows.append(row)
+                gid += 1
+    return pd.DataFrame(rows)
+
+XG_CATEGORIES = {'Strength':['5x5','5x4','4x5','4x4','3x3'], 'Type':['WRIST','SLAP','SNAP','BACKHAND','TIP-IN'],
+    'Ev_Zone':['Off','Def','Neu'], 'ShotCategory':['Rebound','Rush','Other']}
+
+def shots(features, n_shots=5000, seed=0):
+    # shots with every numeric xG feature (some missing), the mean encoded categories and a goal flag that depends on them
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({c:rng.choice(values, n_shots) for c, values in XG_CATEGORIES.items()})
+    for f in features:
+        if not f.endswith('_meanEnc'):
+            df[f] = rng.normal(rng.uniform(-50, 50), rng.uniform(1, 30), n_shots)
+            df.loc[rng.random(n_shots)<.05, f] = np.nan
+    logit = -2.5 + .03*df['yC'].fillna(0) - .02*df['x_adj'].fillna(0) + (df['ShotCategory']=='Rebound')*1.
+    df['goal'] = (rng.random(n_shots) < 1/(1+np.exp(-logit))).astype(int)
+    return df
+
+def onice_shots(onice_sources, n_shots=3000, seed=0):
+    # shots with the six home and away player slots (some empty, the sixth often), the stats in onice_sources (some missing),
+    # and a playerGame with one row per player in the first home slot, plus a player who was never on the ice
+    rng = np.random.default_rng(seed)
+    teams = np.array(['BOS','TOR','MTL','NYR','DET','CHI'])
+    games = rng.integers(20001, 20001+max(n_shots//300, 2), n_shots)
+    home, away = games%6, (games+1)%6
+    shots = pd.DataFrame({'Game_Id':games, 'Date':['2022-10-{:02d}'.format(g%28+1) for g in games], 'Season':2022,
+        'Home_Team':teams[home], 'Away_Team':teams[away]})
+    shots['Ev_Team'] = np.where(rng.random(n_shots)<.5, shots['Home_Team'], shots['Away_Team'])
+    shots['Event'] = rng.choice(['SHOT','MISS','GOAL','BLOCK','FAC'], n_shots)
+    shots['ShotCategory'] = rng.choice(['Rebound','Other',None], n_shots)
+    for source in sorted(onice_sources):
+        values = rng.random(n_shots)
+        values[rng.random(n_shots)<.05] = np.nan
+        shots[source] = values
+    for side, team in [('home', home), ('away', away)]:
+        for i in range(1, 7):
+            number = rng.integers(0, 20, n_shots)
+            names = pd.Series(['P{}_{}'.format(t, p) for t, p in zip(team, number)], dtype=object)
+            ids = pd.Series((team*100+number).astype(float))
+            missing = rng.random(n_shots)<(.3 if i==6 else .01)
+            names[missing] = None
+            ids[missing] = np.nan
+            shots['{}Player{}'.format(side, i)] = names.values
+            shots['{}Player{}_id'.format(side, i)] = ids.values
+    shots['HomeTeamEvent'] = ((shots['Ev_Team']==shots['Home_Team'])|((shots['Ev_Team']==shots['Away_Team'])&(shots['Event']=='BLOCK'))).astype(int)
+    shots['AwayTeamEvent'] = ((shots['Ev_Team']==shots['Away_Team'])|((shots['Ev_Team']==shots['Home_Team'])&(shots['Event']=='BLOCK'))).astype(int)
+
+    playerGame = shots[['Game_Id','Date','homePlayer1','homePlayer1_id','Season']].dropna().drop_duplicates()
+    playerGame = playerGame.rename(columns={'homePlayer1':'Player', 'homePlayer1_id':'PlayerID'})
+    playerGame['Goals'] = 1.
+    playerGame = pd.concat([playerGame, pd.DataFrame({'Game_Id':[1], 'Date':['2022-10-01'], 'Player':['X'], 'PlayerID':[9.], 'Season':[2022],
+        'Goals':[2.]})], ignore_index=True)
+    return playerGame, shots
+
+GAME_METRICS = [m+s for s in ['','_5v5'] for m in [m+a for a in ['','Adjusted'] for m in ['Goals','Shots','ShotAttempts','UnblockedShotAttempts','xG','xG_flurry']]]
+
+def server_data(data_dir, roster_dir, seed=0):
+    # the datasets prediction_server reads, written to data_dir: teamGame for two seasons of random games and the games of a
+    # player_games season, that season's playerGame and toiOverlap, and the players in last season's playerGame. plus a
+    # roster config for each team in roster_dir, and the preseason player and team ratings, whose files are returned
+    import json
+    import os
+    import data_processing
+    import data_storage
+    rng = np.random.default_rng(seed)
+    playerGame, toiOverlap = player_games(n_games=36, seed=seed)
+    teams = sorted(playerGame['Team'].unique())
+
+    # home team first, as player_games writes the rows
+    games = [(gid, df['Date'].iloc[0], *df['Team'].unique()) for gid, df in playerGame.groupby('Game_Id', sort=True)]
+    for season in [2020, 2021]:
+        dates = pd.date_range('{}-10-07'.format(season), periods=60).strftime('%Y-%m-%d')
+        games += [(season*1000000+20001+k, dates[k//2], *rng.choice(teams, 2, replace=False)) for k in range(120)]
+    rows = []
+    for gid, date, home, away in games:
+        goals = rng.integers(0, 6, 2)
+        goals[0] += goals[0]==goals[1]
+        for team, home_flag, team_goals, opp_goals in [(home, 1, goals[0], goals[1]), (away, 0, goals[1], goals[0])]:
+            row = {m:float(rng.gamma(2, 1)) for m in GAME_METRICS}
+            row.update({'Goals':float(team_goals), 'Season':int(str(gid)[:4]), 'Game_Id':gid, 'Date':date, 'DateInt':int(date.replace('-','')),
+                'Team':team, 'Home':home_flag, 'Win':int(team_goals>opp_goals), 'StartingGoalie':'G', 'Playoffs':0,
+                'StartingGoalie_Id':playerGame.loc[(playerGame['Team']==team)&(playerGame['Position']=='G'), 'PlayerID'].min()})
+            rows.append(row)
+    teamGame = pd.DataFrame(rows).sort_values(by=['DateInt','Game_Id'], ignore_index=True)
+    teamGame['teamGameRank'] = teamGame.groupby(['Team','Season'])['DateInt'].rank('dense')
+    teamGame = data_processing.add_elo(teamGame)
+
+    data_storage.write_data(teamGame, 'teamGame', data_dir=data_dir)
+    data_storage.write_data(playerGame, 'playerGame', 2022, data_dir=data_dir)
+    data_storage.write_data(toiOverlap, 'toiOverlap', 2022, game_dates=playerGame, data_dir=data_dir)
+    previous = playerGame.drop_duplicates(subset=['Player']).assign(Season=2021, Date='2021-11-01', DateInt=20211101, Game_Id=2021020001)
+    data_storage.write_data(previous, 'playerGame', 2021, data_dir=data_dir)
+
+    # a roster config with the team's skaters and one goalie
+    for team in teams:
+        roster = playerGame.loc[playerGame['Team']==team].drop_duplicates(subset=['Player'])[['Player','Position']]
+        roster = pd.concat([roster.loc[roster['Position']!='G'], roster.loc[roster['Position']=='G'].iloc[:1]], ignore_index=True)
+        roster.to_json(os.path.join(roster_dir, '{}.json'.format(team)))
+
+    # preseason ratings for every other player, and for all but one team
+    players_file = os.path.join(data_dir, 'ratings_preseason_players.csv')
+    players = playerGame.drop_duplicates(subset=['Player'])[['Player','PlayerID','Position']].iloc[::2].reset_index(drop=True)
+    for c in ['xGI60','xGC60_5v5','xGP60_5v5','xGC60_PP','xGP60_PK','xGI60_Pens']:
+        players[c] = rng.normal(0, .05, len(players.index))
+    players.assign(Season=2022).to_csv(players_file, index=False)
+    teams_file = os.path.join(data_dir, 'ratings_preseason_teams.csv')
+    with open('configs/preseason_config_team.json') as f:
+        metrics = list(json.load(f).keys())
+    ratings = pd.DataFrame({'Team':teams[:-1], 'Season':2022})
+    for m in metrics:
+        ratings['x'+m] = rng.gamma(2, 1, len(ratings.index))
+    ratings.to_csv(teams_file, index=False)
+    return players_file, teams_file
+
+PBP_EVENTS = ['FAC','SHOT','MISS','BLOCK','GOAL','HIT','GIVE','TAKE','PENL','STOP']
+
+def pbp_games(n_games=6, seed=0, season=2022, n_teams=4):
+    # pbp and shifts with the columns hockey_scraper returns that data_processing reads, for up to 4 teams of 12 forwards, 6 defence
+    # and a goalie, one game a day from October 10th. the pbp uses hockey_scraper's old team codes for one team (L.A), the shifts
+    # the fixed ones (LAK). goals late in a period are sometimes scored into an empty net
+    rng = np.random.default_rng(seed)
+    teams = [('BOS','BOS'), ('TOR','TOR'), ('L.A','LAK'), ('CHI','CHI')][:n_teams]
+    rosters = {t:[('{}_F{}'.format(t, j), 1000*k+j) for j in range(12)]+[('{}_D{}'.format(t, j), 1000*k+50+j) for j in range(6)]
+        for k, (_, t) in enumerate(teams)}
+    goalies = {t:('{}_G'.format(t), 1000*k+90) for k, (_, t) in enumerate(teams)}
+    strengths = ['5x5','5x4','4x5','4x4','5x3','3x5']
+    plays = []
+    shifts = []
+    for g in range(n_games):
+        gid = 20001+g
+        date = (pd.Timestamp('{}-10-10'.format(season)) + pd.Timedelta(days=g)).strftime('%Y-%m-%d')
+        (home, home_fixed), (away, away_fixed) = [teams[i] for i in rng.choice(len(teams), 2, replace=False)]
+        score = {home:0, away:0}
+        for period in [1, 2, 3]:
+            times = np.sort(rng.integers(1, 1200, 70))
+            times[0] = 0
+            for i, t in enumerate(times):
+                event = 'FAC' if i==0 else rng.choice(PBP_EVENTS, p=[.15,.2,.12,.1,.05,.12,.05,.05,.06,.1])
+                strength = '5x5' if i==0 or rng.random()<.75 else rng.choice(strengths)
+                ev_team = None if event=='STOP' else (home if rng.random()<.5 else away)
+                empty_net = event=='GOAL' and period==3 and t>1100 and rng.random()<.5
+                row = {'Game_Id':gid, 'Date':date, 'Period':period, 'Event':event, 'Seconds_Elapsed':int(t), 'Strength':strength,
+                    'Ev_Team':ev_team, 'Home_Team':home, 'Away_Team':away, 'Home_Zone':None if event=='STOP' else rng.choice(['Off','Def','Neu']),
+                    'Ev_Zone':rng.choice(['Off','Def','Neu']), 'Type':None, 'xC':np.nan, 'yC':np.nan,
+                    'Home_Score':score[home], 'Away_Score':score[away], 'Home_Players':6, 'Away_Players':6,
+                    'Home_Goalie':goalies[home_fixed][0], 'Home_Goalie_Id':goalies[home_fixed][1],
+                    'Away_Goalie':goalies[away_fixed][0], 'Away_Goalie_Id':goalies[away_fixed][1]}
+                if empty_net:
+                    side = 'Away' if ev_team==home else 'Home'
+                    row.update({side+'_Goalie':None, side+'_Goalie_Id':np.nan, side+'_Players':5})
+                on_ice = {}
+                for side, team in [('home', home_fixed), ('away', away_fixed)]:
+                    skaters = [rosters[team][j] for j in rng.choice(12, 3, replace=False)]+[rosters[team][12+j] for j in rng.choice(6, 2, replace=False)]
+                    on_ice[side] = skaters
+                    slots = skaters+([] if row[side.capitalize()+'_Goalie'] is None else [goalies[team]])
+                    for j in range(6):
+                        row['{}Player{}'.format(side, j+1)] = slots[j][0] if j<len(slots) else None
+                        row['{}Player{}_id'.format(side, j+1)] = slots[j][1] if j<len(slots) else np.nan
+                players = on_ice['home' if ev_team==home else 'away'] if ev_team is not None else []
+                for j in range(3):
+                    player = players[j] if j<len(players) and (j==0 or event=='GOAL' or (j==1 and event in ['BLOCK','PENL'])) else (None, np.nan)
+                    row['p{}_name'.format(j+1)], row['p{}_ID'.format(j+1)] = player
+                if event in ['SHOT','MISS','GOAL','BLOCK']:
+                    row['Type'] = rng.choice(['WRIST','SLAP','SNAP','BACKHAND','TIP-IN'])
+                if event=='PENL':
+                    row['Type'] = rng.choice(['Tripping(2 min)','Hooking(2 min)','Fighting (maj)'])
+                if event in ['FAC','SHOT','MISS','GOAL','BLOCK','HIT','GIVE','TAKE'] and rng.random()<.95:
+                    row['xC'], row['yC'] = float(rng.integers(-99, 100)), float(rng.integers(-42, 43))
+                if event=='GOAL':
+                    score[ev_team] += 1
+                plays.append(row)
+
+            # shifts for every skater, and the goalies for the whole period
+            for team in [home_fixed, away_fixed]:
+                for player, player_id in rosters[team]:
+                    t = int(rng.integers(0, 60))
+                    while t<1200:
+                        end = min(t+int(rng.integers(30, 70)), 1200)
+                        shifts.append({'Game_Id':gid, 'Period':period, 'Team':team, 'Player':player, 'Player_Id':player_id,
+                            'Start':float(t), 'End':float(end), 'Date':date})
+                        t = end+int(rng.integers(60, 200))
+                player, player_id = goalies[team]
+                shifts.append({'Game_Id':gid, 'Period':period, 'Team':team, 'Player':player, 'Player_Id':player_id, 'Start':0., 'End':1200., 'Date':date})
+    return pd.DataFrame(plays), pd.DataFrame(shifts)
+
+def homeaway_adjustments():
+    # score and home/away adjustments with the columns of data/score_homeaway_adjustments.csv, for every strength, score and period
+    rows = []
+    rng = np.random.default_rng(0)
+    for strength in ['5x5','PP','4x5','3x5','4x4','3x3','EN','5x3','3x4']:
+        for home_away in ['home','away']:
+            for score_diff in range(-3, 4):
+                for period in [1, 3, 4]:
+                    rows.append({'strength':strength, 'homeAway':home_away, 'scoreDiff':score_diff, 'period':period,
+                        **{c:float(rng.uniform(.9, 1.1)) for c in ['goalsAdjustment','shotsAdjustment','shotAttemptsAdjustment',
+                        'unblockedShotAttemptsAdjustment','xGAdjustment']}})
+    return pd.DataFrame(rows)
@@ -0,0 +1,41 @@
+import os
+import pandas as pd
+import backtest
+
+def _write_season(data_dir, season, n, mtime=None):
+    path = os.path.join(data_dir, 'gameTrain_{}.csv'.format(season))
+    pd.DataFrame({'Win': [1, 0] * n, 'Elo': range(2 * n)}).to_csv(path, index=False)
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+    return path
+
+def _seasons(data_dir):
+    return backtest.load_game_train(data_dir=str(data_dir)).groupby('Season').size().to_dict()
+
+def test_cache_rebuilt_when_files_change(tmp_path):
+    _write_season(tmp_path, 2021, 2)
+    _write_season(tmp_path, 2022, 3)
+    assert _seasons(tmp_path) == {2021: 4, 2022: 6}
+
+    # a season added with an mtime older than the cache
+    _write_season(tmp_path, 2020, 1, mtime=1_000_000)
+    assert _seasons(tmp_path) == {2020: 2, 2021: 4, 2022: 6}
+
+    # a season deleted
+    os.remove(os.path.join(tmp_path, 'gameTrain_2021.csv'))
+    assert _seasons(tmp_path) == {2020: 2, 2022: 6}
+
+    # a season rewritten with its old mtime kept
+    mtime = os.path.getmtime(os.path.join(tmp_path, 'gameTrain_2022.csv'))
+    _write_season(tmp_path, 2022, 5, mtime=mtime)
+    assert _seasons(tmp_path) == {2020: 2, 2022: 10}
+
+def test_cache_reused_when_files_unchanged(tmp_path):
+    _write_season(tmp_path, 2021, 2)
+    backtest.load_game_train(data_dir=str(tmp_path))
+    cache_file = os.path.join(tmp_path, 'gameTrain.parquet')
+    built = os.path.getmtime(cache_file)
+    os.utime(cache_file, (built - 100, built - 100))
+    df = backtest.load_game_train(['Elo'], data_dir=str(tmp_path))
+    assert list(df.columns) == ['Elo']
+    assert os.path.getmtime(cache_file) == built - 100
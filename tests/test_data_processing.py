@@ -0,0 +1,155 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+import data_processing
+import reference
+import schema
+import synthetic
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+def _read_fixture(name):
+    return pd.read_csv(os.path.join(FIXTURES, name), keep_default_na=False, na_values=[''])
+
+@pytest.mark.parametrize('chunk_size', [100, 5])
+def test_get_toi_overlap_matches_original(chunk_size):
+    # expected output comes from the original chunked merge loop in aggregate_player_data, run on the same 12 games
+    plays = _read_fixture('toi_pbp.csv')
+    shifts = _read_fixture('toi_shifts.csv')
+    toi_overlap, toi = data_processing.get_toi_overlap(plays, shifts, chunk_size=chunk_size)
+
+    keys = ['Game_Id','Player_x','Player_Id_x','Player_y','Player_Id_y','Strength','SameTeam']
+    expected = _read_fixture('toi_overlap_expected.csv')
+    pd.testing.assert_frame_equal(toi_overlap.sort_values(by=keys, ignore_index=True), expected.sort_values(by=keys, ignore_index=True),
+        check_dtype=False)
+    keys = ['Game_Id','Player','Player_Id','Date']
+    expected = _read_fixture('toi_expected.csv')
+    pd.testing.assert_frame_equal(toi.sort_values(by=keys, ignore_index=True), expected.sort_values(by=keys, ignore_index=True),
+        check_dtype=False)
+
+def _ranked_team_games():
+    teamGame = synthetic.team_games()
+    teamGame['teamGameRank'] = teamGame.groupby(['Team','Season'])['DateInt'].rank('dense')
+    return teamGame
+
+def test_add_elo_matches_loop():
+    # the array elo engine against running through the games one at a time, including the regression to the mean in a new season
+    teamGame = _ranked_team_games()
+    expected = reference.add_elo(teamGame.copy())
+    elo = data_processing.add_elo(teamGame.copy())
+    pd.testing.assert_frame_equal(elo.reset_index(drop=True), expected.reset_index(drop=True)[elo.columns], check_dtype=False, rtol=1e-9)
+
+def test_add_elo_resumed():
+    # resuming from the ratings after the first season's games gives the same ratings as running through every game
+    teamGame = _ranked_team_games()
+    elo = data_processing.add_elo(teamGame.copy())
+    prefix = elo.loc[elo['Season']==2021].drop(columns=['teamGameRankOverall'])
+    resumed = data_processing.add_elo(pd.concat([prefix, teamGame.loc[teamGame['Season']==2022]], ignore_index=True), data_processing.get_elo_ratings(prefix))
+    pd.testing.assert_frame_equal(elo.reset_index(drop=True), resumed.reset_index(drop=True)[elo.columns], check_dtype=False, rtol=1e-9)
+
+def test_add_lags_matches_transform():
+    # cumulative sum lag features against a groupby-transform rolling mean for each lag, with the last two dates scheduled
+    # (no stats yet), and carrying on from the lag_history of earlier games against computing them all at once
+    teamGame = synthetic.team_games()
+    metrics = synthetic.TEAM_METRICS
+    lags = [2, 4, 8]
+    teamGame.loc[teamGame['Date']>=sorted(teamGame['Date'].unique())[-2], metrics] = np.nan
+    expected = teamGame.copy()
+    for lag in lags:
+        expected = reference.add_lag(expected, metrics, lag, 'Team')
+    lagged = data_processing._add_lags(teamGame.copy(), metrics, lags, 'Team')
+    assert lagged['Goals_last8'].notnull().sum()>0
+    pd.testing.assert_frame_equal(lagged, expected, rtol=1e-12)
+
+    later = teamGame['Date']>='2022-10-25'
+    appended = data_processing._add_lags(teamGame.loc[later].copy(), metrics, lags, 'Team',
+        history=data_processing.lag_history(teamGame.loc[~later], metrics, lags, 'Team'))
+    pd.testing.assert_frame_equal(lagged.loc[later], appended)
+
+def test_add_onice_stats_matches_slots():
+    # long-format on-ice attribution against a groupby and merge for each of the 12 player slots
+    sources = set(data_processing._onice_source(c)[0] for c in data_processing.ONICE_COLUMNS) - {'ReboundShots'}
+    playerGame, shots = synthetic.onice_shots(sources)
+    expected = reference.add_onice_stats(playerGame.copy(), shots.copy())
+    onice = data_processing._add_onice_stats(playerGame.copy(), shots.copy())
+
+    keys = ['Game_Id','Date','Player','PlayerID','Season']
+    assert set(onice.columns)==set(expected.columns)
+    pd.testing.assert_frame_equal(onice.sort_values(by=keys, ignore_index=True), expected.sort_values(by=keys, ignore_index=True)[onice.columns],
+        check_dtype=False, rtol=1e-9)
+
+def test_categorical_pbp_matches_plain(tmp_path, monkeypatch):
+    # shot features, xG and the player and team aggregates from pbp and shifts with the schema's categoricals, against the same
+    # with every string column left as plain strings
+    pbp, shifts = synthetic.pbp_games()
+    adjustments = os.path.join(tmp_path, 'score_homeaway_adjustments.csv')
+    synthetic.homeaway_adjustments().to_csv(adjustments, index=False)
+
+    def run():
+        plays, shots = data_processing.get_shots_data(schema.apply(pbp.copy(), 'pbp'), 2022)
+        plays = data_processing.add_xG_to_pbp(plays, shots)
+        teamGame = data_processing.aggregate_team_data(plays.copy(), None, adjustments)
+        playerGame, toi_overlap = data_processing.aggregate_player_data(plays, schema.apply(shifts.copy(), 'shifts'), teamGame, adjustments)
+        return [shots, plays, playerGame, toi_overlap, teamGame]
+
+    categorical = run()
+    assert categorical[1]['Strength'].dtype.name=='category'
+    monkeypatch.setattr(schema, 'CATEGORY_COLUMNS', {})
+    plain = run()
+    for df, expected in zip(categorical, plain):
+        df = df.astype({c:object for c in df.columns if df[c].dtype.name=='category'})
+        pd.testing.assert_frame_equal(df, expected)
+
+def test_shot_features_version_covers_helpers(monkeypatch):
+    # the cache version changes when a helper _shot_features calls changes, not just _shot_features itself
+    version = data_processing.shot_features_version()
+    def reverse_strength(df, rows):
+        df.loc[rows, 'Strength'] = df.loc[rows, 'Strength'].astype(object).str[::-1]
+    reverse_strength.__module__ = data_processing.__name__
+    monkeypatch.setattr(data_processing, '_reverse_strength', reverse_strength)
+    assert data_processing.shot_features_version()!=version
+
+def test_roster_features_matches_merges():
+    # the single-sort roster features against one groupby and merge per set of players, with tied and missing projections
+    playerGame = synthetic.player_games()[0]
+    rng = np.random.default_rng(0)
+    for c in ['xGC60_5v5','xGP60_5v5','xGI60_Pens','xGC60_PP','xGP60_PK']:
+        playerGame[c] = np.round(rng.normal(0, .1, len(playerGame.index)), 2)
+        playerGame.loc[rng.random(len(playerGame.index))<.05, c] = np.nan
+    teamGame = playerGame[['Game_Id','Date','Team']].drop_duplicates(ignore_index=True)
+
+    expected = reference.roster_features(teamGame, playerGame)
+    features = teamGame.merge(data_processing._roster_features(playerGame), on=['Date','Team'], how='left')
+    pd.testing.assert_frame_equal(features, expected, rtol=1e-9)
+
+@pytest.mark.parametrize('duplicated', [False, True])
+def test_add_opponent_columns_matches_self_join(duplicated):
+    # gathered opponent columns against a self-join on the game, with some rows missing their opponent and, when a team has
+    # two rows in a game, with the rows repeated the way the join repeats them
+    teamGame = synthetic.team_games()
+    teamGame = teamGame.drop(index=teamGame.index[5::37]).reset_index(drop=True)
+    if duplicated:
+        teamGame = pd.concat([teamGame, teamGame.iloc[10:12].assign(Goals=9.)], ignore_index=True)
+    cols = synthetic.TEAM_METRICS+['Win','StartingGoalie_Id']
+
+    expected = reference.add_opponent_columns(teamGame, cols)
+    gathered = data_processing._add_opponent_columns(teamGame, cols)
+    pd.testing.assert_frame_equal(gathered, expected, check_index_type=False)
+
+@pytest.mark.parametrize('first_date', [False, True])
+def test_add_scheduled_games_matches_rerank(first_date):
+    # a day of games added as scheduled games from the team state, against reranking and running add_elo through all of
+    # teamGame. on the first date of a season, the elo ratings are regressed to the mean
+    teamGame = data_processing.add_elo(_ranked_team_games())
+    teamGame['Playoffs'] = np.int8(0)
+    dates = teamGame.loc[teamGame['Season']==2022, 'Date']
+    date = dates.min() if first_date else dates.max()
+    games = teamGame.loc[(teamGame['Date']==date)&(teamGame['Home']==1)]
+    opps = teamGame.loc[(teamGame['Date']==date)&(teamGame['Home']==0), ['Game_Id','Team']].rename(columns={'Team':'away_team'})
+    schedule = games[['Game_Id','Date','Team']].merge(opps, on='Game_Id').set_axis(['game_id','date','home_team','away_team'], axis=1)
+    team_state = data_processing.get_team_state(teamGame.loc[teamGame['Date']<date])
+
+    expected = reference.add_scheduled_games(teamGame.copy(), schedule, 2022)
+    scheduled = data_processing.add_scheduled_games(teamGame.copy(), schedule, 2022, team_state)
+    pd.testing.assert_frame_equal(scheduled[expected.columns], expected)
@@ -0,0 +1,75 @@
+import os
+import pandas as pd
+from datetime import date
+import data_scraper
+import data_storage
+
+def _save_day(fixtures_dir, day, game_ids, status='OFF'):
+    # a day's schedule and its games in the scrape_dates cache layout, for ReplayScraper
+    pd.DataFrame({'game_id':game_ids, 'date':day, 'status':status}).to_pickle(os.path.join(fixtures_dir, 'schedule_{}.pkl'.format(day)))
+    for g in game_ids:
+        pd.to_pickle({
+            'pbp':pd.DataFrame({'Game_Id':int(str(g)[5:]), 'Date':day, 'Period':1, 'Event':['FAC','SHOT','GOAL'], 'Seconds_Elapsed':[0., 10., 20.]}),
+            'shifts':pd.DataFrame({'Game_Id':int(str(g)[5:]), 'Date':day, 'Period':1, 'Player':['A','B'], 'Start':[0., 5.], 'End':[40., 45.]}),
+        }, os.path.join(fixtures_dir, 'game_{}.pkl'.format(g)))
+
+def _dirs(tmp_path):
+    fixtures_dir = tmp_path / 'fixtures'
+    fixtures_dir.mkdir()
+    return str(fixtures_dir), str(tmp_path / 'data'), str(tmp_path / 'cache')
+
+def test_scrape_dates_replays_cached_day(tmp_path):
+    fixtures_dir, data_dir, cache_dir = _dirs(tmp_path)
+    _save_day(fixtures_dir, '2019-10-02', [2019020001, 2019020002])
+    data_scraper.scrape_dates('2019-10-02', '2019-10-02', 2019, data_dir, scraper=data_scraper.ReplayScraper(fixtures_dir), cache_dir=cache_dir)
+
+    pbp = data_storage.read_data('pbp', 2019, data_dir=data_dir)
+    shifts = data_storage.read_data('shifts', 2019, data_dir=data_dir)
+    assert sorted(pbp['Game_Id'].unique().tolist())==[20001, 20002]
+    assert len(pbp.index)==6 and len(shifts.index)==4
+    assert sorted(os.listdir(cache_dir))==['game_2019020001.pkl','game_2019020002.pkl','schedule_2019-10-02.pkl']
+
+    # scraping the day again from the cache alone adds nothing
+    data_scraper.scrape_dates('2019-10-02', '2019-10-02', 2019, data_dir, scraper=data_scraper.ReplayScraper(str(tmp_path / 'none')), cache_dir=cache_dir)
+    assert len(data_storage.read_data('pbp', 2019, data_dir=data_dir).index)==6
+
+def test_scrape_dates_stops_at_failed_day(tmp_path):
+    # the second day's schedule is missing, so only the first day is stored and the next run starts from the second day
+    fixtures_dir, data_dir, cache_dir = _dirs(tmp_path)
+    _save_day(fixtures_dir, '2019-10-02', [2019020001])
+    _save_day(fixtures_dir, '2019-10-04', [2019020003])
+    scraper = data_scraper.ReplayScraper(fixtures_dir)
+    data_scraper.scrape_dates('2019-10-02', '2019-10-04', 2019, data_dir, scraper=scraper, cache_dir=cache_dir)
+    assert data_storage.read_manifest('pbp', data_dir)['Game_Id'].tolist()==[20001]
+
+    _save_day(fixtures_dir, '2019-10-03', [2019020002])
+    data_scraper.scrape_dates(None, '2019-10-04', 2019, data_dir, scraper=scraper, cache_dir=cache_dir)
+    assert sorted(data_storage.read_manifest('pbp', data_dir)['Game_Id'].tolist())==[20001, 20002, 20003]
+    assert sorted(data_storage.read_manifest('shifts', data_dir)['Game_Id'].tolist())==[20001, 20002, 20003]
+
+def test_scrape_dates_rescrapes_game_missing_shifts(tmp_path):
+    # a game with pbp stored but no shifts isn't skipped
+    fixtures_dir, data_dir, cache_dir = _dirs(tmp_path)
+    _save_day(fixtures_dir, '2019-10-02', [2019020001])
+    data_storage.append_data(pd.read_pickle(os.path.join(fixtures_dir, 'game_2019020001.pkl'))['pbp'], 'pbp', 2019, data_dir=data_dir)
+    data_scraper.scrape_dates('2019-10-02', '2019-10-02', 2019, data_dir, scraper=data_scraper.ReplayScraper(fixtures_dir), cache_dir=cache_dir)
+    assert data_storage.read_manifest('shifts', data_dir)['Game_Id'].tolist()==[20001]
+    assert len(data_storage.read_data('pbp', 2019, data_dir=data_dir).index)==3
+
+def test_scrape_games_parallel_doesnt_cache_today(tmp_path):
+    fixtures_dir, data_dir, cache_dir = _dirs(tmp_path)
+    today = date.today().strftime('%Y-%m-%d')
+    _save_day(fixtures_dir, today, [2099020001])
+    scraped = data_scraper.scrape_games_parallel(today, today, scraper=data_scraper.ReplayScraper(fixtures_dir), cache_dir=cache_dir)
+    assert len(scraped['pbp'].index)==3 and scraped['failed']==[]
+    assert os.listdir(cache_dir)==[]
+
+def test_scrape_games_parallel_skips_preseason_and_unfinished(tmp_path):
+    # the schedule lists a preseason game and a postponed one, which have no games saved, along with a finished game.
+    # only the finished game is scraped and the day doesn't fail
+    fixtures_dir, data_dir, cache_dir = _dirs(tmp_path)
+    _save_day(fixtures_dir, '2019-10-02', [2019020001])
+    pd.DataFrame({'game_id':[2019010001, 2019020001, 2019020002], 'date':'2019-10-02', 'status':['OFF','OFF','PPD']}).to_pickle(
+        os.path.join(fixtures_dir, 'schedule_2019-10-02.pkl'))
+    scraped = data_scraper.scrape_games_parallel('2019-10-02', '2019-10-02', scraper=data_scraper.ReplayScraper(fixtures_dir), cache_dir=cache_dir)
+    assert scraped['pbp']['Game_Id'].unique().tolist()==[20001] and scraped['failed']==[]
@@ -0,0 +1,19 @@
+import pandas as pd
+import data_storage
+import schema
+import synthetic
+
+def test_categoricals_read_back_with_plain_files(tmp_path):
+    # partitions written with plain strings (before the schema had categoricals) and with categoricals read back as one
+    # frame with the schema's dtypes
+    pbp = synthetic.pbp_games(n_games=4)[0].assign(Season=2022)
+    old = pbp['Game_Id']<20003
+    data_storage.write_data(pbp.loc[old], 'pbp', 2022, data_dir=str(tmp_path))
+    data_storage.write_data(schema.apply(pbp.loc[~old].copy(), 'pbp'), 'pbp', 2022, data_dir=str(tmp_path))
+
+    df = data_storage.read_data('pbp', 2022, data_dir=str(tmp_path))
+    schema.check(df, 'pbp')
+    keys = ['Game_Id','Period','Seconds_Elapsed','Event']
+    df = df.astype({c:object for c in schema.CATEGORY_COLUMNS['pbp']}).sort_values(by=keys, kind='stable', ignore_index=True)
+    expected = schema.apply(pbp.copy(), 'pbp').astype({c:object for c in schema.CATEGORY_COLUMNS['pbp']})
+    pd.testing.assert_frame_equal(df[expected.columns], expected.sort_values(by=keys, kind='stable', ignore_index=True))
@@ -0,0 +1,90 @@
+import warnings
+import numpy as np
+import pandas as pd
+import pytest
+import data_storage
+import inseason_ratings
+import reference
+import synthetic
+
+def test_player_inseason_ratings_matches_recompute():
+    # running totals, with ratings carried over on dates without games, against re-summing the season for every date
+    # the range starts before the first game and runs past the last one
+    playerGame, toiOverlap = synthetic.player_games(n_games=12)
+    start_date, end_date = '2022-10-05', '2022-10-25'
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        expected = reference.player_inseason_ratings(playerGame.copy(), toiOverlap, start_date, end_date)
+        ratings = inseason_ratings._player_inseason_ratings(playerGame.copy(), toiOverlap, start_date, end_date)
+
+    keys = ['Player','PlayerID','Position','Date']
+    assert ratings['Date'].nunique()==pd.date_range('2022-10-08', end_date).size
+    pd.testing.assert_frame_equal(ratings.sort_values(by=keys, ignore_index=True), expected.sort_values(by=keys, ignore_index=True)[ratings.columns],
+        check_dtype=False, rtol=1e-9)
+
+@pytest.mark.parametrize('two_positions', [False, True])
+def test_pair_metric_sums_matches_merge(two_positions):
+    # teammate and competition sums from the sparse overlap matrices against merging the pairs with the player totals, for each
+    # position and strength. some players are left out of the totals, and with two_positions a few are listed as F and D
+    playerGame, toiOverlap = synthetic.player_games()
+    players = inseason_ratings._sum_player_games(playerGame.loc[playerGame['TOI_5v5']>0])
+    players = players.loc[~players['Player'].isin(['T0_F3','T1_D2','T2_G0'])]
+    if two_positions:
+        extra = players.loc[players['Player'].isin(['T0_F1','T2_F5','T3_F0'])].assign(Position='D')
+        extra[synthetic.PLAYER_STATS] = extra[synthetic.PLAYER_STATS]*.5
+        players = pd.concat([players, extra], ignore_index=True)
+    pairs = inseason_ratings._sum_overlap(toiOverlap.rename(columns={'Player_x':'Player', 'Player_Id_x':'PlayerID'}))
+    strengths = [
+        ('TOI_5v5', None, {'team':('xG_5v5_onice', True, 4), 'comp':('Goals_5v5_onice', False, 5)}),
+        ('TOI_PP', ('TOI_PP','TOI_PK'), {'team':('GoalsAdjusted_PP_onice', True, 4), 'comp':('GoalsAgainst_PK_onice', False, 4)}),
+        ('TOI_PK', ('TOI_PK','TOI_PP'), {'team':('GoalsAgainst_PK_onice', True, 3), 'comp':('GoalsAdjusted_PP_onice', False, 5)}),
+    ]
+    for ratings, (toi, special_teams, sums) in zip(pairs, strengths):
+        overlaps = inseason_ratings.overlap_matrices(ratings, players)
+        for position in ['F','D']:
+            args = (position, toi, sums, ['Player','PlayerID','Position_x'], {toi+'_x':'max', 'team':'sum', 'comp':'sum'}, special_teams)
+            expected = reference.pair_metric_sums(ratings, players, *args)
+            summed = inseason_ratings.pair_metric_sums(ratings, overlaps, players, *args)
+            assert len(summed.index)>0
+            pd.testing.assert_frame_equal(summed, expected, rtol=1e-9)
+
+def test_team_inseason_ratings_matches_loop():
+    # cumulative sums by team-season against taking the mean of each team's previous games one date at a time, as merged onto teamGame
+    # (the cumulative version also has rows of NaN for each team's first game, which the loop leaves to the merge)
+    teamGame = synthetic.team_games()
+    start_date, end_date = '2021-10-01', '2022-11-30'
+    expected = reference.team_inseason_ratings(teamGame, synthetic.TEAM_METRICS, start_date, end_date)
+    ratings = inseason_ratings._team_inseason_ratings_cumulative(teamGame, synthetic.TEAM_METRICS, start_date, end_date)
+
+    keys = ['Team','Season','Date']
+    expected = teamGame[keys].merge(expected, on=keys, how='left')
+    ratings = teamGame[keys].merge(ratings, on=keys, how='left')
+    assert ratings['prevGames_Goals'].notnull().sum()>0
+    pd.testing.assert_frame_equal(ratings, expected, check_dtype=False, rtol=1e-9)
+
+def test_team_inseason_ratings_snapshots_by_season(tmp_path):
+    # a range over two seasons saves each season's dates under that season, and reading them back gives the same ratings
+    teamGame = synthetic.team_games().drop(columns=['Opp','GoalsAgainst','ShotsAgainst','xGAgainst'])
+    rng = np.random.default_rng(1)
+    for m in synthetic.GAME_METRICS:
+        if m not in teamGame.columns:
+            teamGame[m] = rng.gamma(2, 1, len(teamGame.index))
+    start_date, end_date = '2021-10-20', '2022-11-10'
+    data_dir = str(tmp_path)
+    expected = inseason_ratings.add_team_inseason_ratings(teamGame, start_date, end_date)
+    computed = inseason_ratings.add_team_inseason_ratings(teamGame, start_date, end_date, data_dir=data_dir)
+    stored = inseason_ratings.add_team_inseason_ratings(teamGame, start_date, end_date, data_dir=data_dir)
+
+    first_2022 = teamGame.loc[teamGame['Season']==2022, 'Date'].min()
+    dates_2021 = inseason_ratings.read_snapshot_dates('teamRatings', 2021, data_dir)
+    dates_2022 = inseason_ratings.read_snapshot_dates('teamRatings', 2022, data_dir)
+    assert dates_2021[0]==start_date and dates_2021[-1]<first_2022
+    assert dates_2022[0]==first_2022 and dates_2022[-1]==end_date
+    assert set(data_storage.read_data('teamRatings', 2021, data_dir=data_dir)['Season'])=={2021}
+    assert set(data_storage.read_data('teamRatings', 2022, data_dir=data_dir)['Season'])=={2022}
+
+    keys = ['Team','Season','Date']
+    assert expected['prevGames_Goals'].notnull().sum()>0
+    for ratings in [computed, stored]:
+        pd.testing.assert_frame_equal(ratings.sort_values(by=keys, ignore_index=True), expected.sort_values(by=keys, ignore_index=True),
+            check_dtype=False, rtol=1e-9)
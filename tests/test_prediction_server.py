@@ -0,0 +1,76 @@
+import json
+import threading
+import urllib.error
+import urllib.request
+import pandas as pd
+import pytest
+import games_model
+import prediction_server
+import synthetic
+
+@pytest.fixture(scope='module')
+def state(tmp_path_factory):
+    data_dir = tmp_path_factory.mktemp('data')
+    roster_dir = tmp_path_factory.mktemp('rosters')
+    players_file, teams_file = synthetic.server_data(str(data_dir), str(roster_dir))
+    return prediction_server.prediction_state(2022, str(data_dir), teams_file, players_file, str(roster_dir))
+
+def _lineup(team):
+    return [{'Player':'{}_F{}'.format(team, j), 'Position':'F'} for j in range(7)] + \
+        [{'Player':'{}_D{}'.format(team, j), 'Position':'D'} for j in range(4)] + [{'Player':'{}_G1'.format(team), 'Position':'G'}]
+
+@pytest.mark.parametrize('games', [
+    [{'date':'2022-12-01', 'home_team':'T0', 'away_team':'T1'}],
+    [{'date':'2022-12-03', 'home_team':'T3', 'away_team':'T0'}, {'date':'2022-12-01', 'home_team':'T1', 'away_team':'T2'}],
+    [{'date':'2022-12-01', 'home_team':'T2', 'away_team':'T3', 'home_lineup':_lineup('T2'), 'away_lineup':_lineup('T1')}],
+])
+def test_next_game_features_match_features(state, games):
+    looked_up = state.next_game_features(games)
+    assert looked_up is not None
+    built = state.features(games)
+    columns = ['Date','Team','Opp'] + games_model.games_config['features']
+    pd.testing.assert_frame_equal(looked_up.sort_values(by='Team')[columns].reset_index(drop=True),
+        built.sort_values(by='Team')[columns].reset_index(drop=True), check_dtype=False)
+
+def test_predict_from_next_game_features(state):
+    games = [{'date':'2022-12-01', 'home_team':'T1', 'away_team':'T2'}]
+    preds = state.predict(games)
+    scaler, model = state.model.load()
+    expected = games_model.predict_games(state.features(games), scaler, model)
+    assert len(preds.index)==1
+    pd.testing.assert_frame_equal(preds.reset_index(drop=True), expected.reset_index(drop=True), check_dtype=False)
+
+def test_next_game_features_fall_back(state):
+    # a team playing twice, and a game before the last date played, are built by features()
+    assert state.next_game_features([{'date':'2022-12-01', 'home_team':'T0', 'away_team':'T1'},
+        {'date':'2022-12-02', 'home_team':'T2', 'away_team':'T0'}]) is None
+    assert state.next_game_features([{'date':state.teamGame['Date'].max(), 'home_team':'T0', 'away_team':'T1'}]) is None
+
+class _failing_state(object):
+    def refresh(self):
+        return False
+
+    def predict(self, games):
+        if 'date' not in games[0]:
+            raise KeyError('date')
+        raise RuntimeError('model failed')
+
+def _post(port, body):
+    request = urllib.request.Request('http://127.0.0.1:{}/predict'.format(port), data=json.dumps(body).encode(), method='POST')
+    try:
+        with urllib.request.urlopen(request) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+def test_errors_return_json():
+    server = prediction_server.ThreadingHTTPServer(('127.0.0.1', 0), prediction_server.make_handler(_failing_state()))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        port = server.server_address[1]
+        assert _post(port, {'home_team':'T0'}) == (400, {'error':"KeyError('date')"})
+        assert _post(port, {'date':'2022-12-01'}) == (500, {'error':"RuntimeError('model failed')"})
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,35 @@
+import os
+import pandas as pd
+import data_storage
+import update_data
+import synthetic
+
+def test_process_batches_playoffs_match_one_batch(tmp_path, monkeypatch):
+    # a season of 84 games between two teams, so each team's last two are playoff games. processed about 20 games at a time,
+    # the playoffs flag in playerGame and teamGame matches processing the whole season at once
+    monkeypatch.chdir(tmp_path)
+    os.mkdir('data')
+    synthetic.homeaway_adjustments().to_csv(os.path.join('data', 'score_homeaway_adjustments.csv'), index=False)
+    pbp, shifts = synthetic.pbp_games(n_games=84, n_teams=2)
+    data_storage.write_data(pbp.assign(Season=2022), 'pbp', 2022)
+    data_storage.write_data(shifts.assign(Season=2022), 'shifts', 2022)
+    start_date, end_date = pbp['Date'].min(), pbp['Date'].max()
+
+    def run(batch_size):
+        batches = list(update_data.process_batches(start_date, end_date, 2022, batch_size=batch_size))
+        playerGame = pd.concat([b[0] for b in batches], ignore_index=True)
+        teamGame = pd.concat([b[2] for b in batches], ignore_index=True)
+        return len(batches), playerGame, teamGame
+
+    n_batches, playerGame, teamGame = run(20)
+    assert n_batches>1
+    _, expected_playerGame, expected_teamGame = run(1000)
+    assert set(teamGame.loc[teamGame['Playoffs']==1, 'Game_Id'])=={20083, 20084}
+
+    keys = ['Game_Id','Team']
+    pd.testing.assert_frame_equal(teamGame[keys+['Playoffs']].sort_values(by=keys, ignore_index=True),
+        expected_teamGame[keys+['Playoffs']].sort_values(by=keys, ignore_index=True))
+    keys = ['Game_Id','PlayerID']
+    pd.testing.assert_frame_equal(playerGame[keys+['Playoffs']].sort_values(by=keys, ignore_index=True),
+        expected_playerGame[keys+['Playoffs']].sort_values(by=keys, ignore_index=True))
+    assert playerGame['Playoffs'].sum()>0
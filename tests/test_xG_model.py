@@ -0,0 +1,48 @@
+import os
+import tempfile
+import lightgbm as lgb
+import numpy as np
+from sklearn.preprocessing import StandardScaler
+import xG_model
+import reference
+import synthetic
+
+def test_compiled_xG_model_matches_sklearn():
+    # a small model trained the same way as xG_model.train, predicted through the compiled model and through the scaler and
+    # LGBMClassifier, on new shots that include a category the mean encodings haven't seen
+    features = xG_model.xG_config['features']
+    train = synthetic.shots(features)
+    mean_encodings = {i: train.groupby(colname)['goal'].mean().to_dict() for i, colname in xG_model.xG_config['mean_encodings'].items()}
+    for i, colname in xG_model.xG_config['mean_encodings'].items():
+        train[colname+'_meanEnc'] = train[colname].map(mean_encodings[i])
+    scaler = StandardScaler()
+    X = scaler.fit_transform(train[features].values)
+    model = lgb.LGBMClassifier(max_depth=4, min_child_samples=50, random_state=26, n_estimators=20, verbose=-1)
+    model.fit(X, train['goal'].values)
+
+    shots = synthetic.shots(features, n_shots=2000, seed=1)
+    shots.loc[:10, 'Type'] = 'WRAP-AROUND'
+    expected = reference.xG_predict(mean_encodings, scaler, model, shots.copy())
+    preds = xG_model.compiled_xG_model(mean_encodings, scaler, model).predict(shots)
+    assert np.abs(preds - expected).max()<1e-6
+
+def test_compiled_xG_model_matches_booster():
+    # a Booster trained from a saved binary dataset with the train parameters, as xG_model.train saves it
+    features = xG_model.xG_config['features']
+    train = synthetic.shots(features)
+    mean_encodings = {i: train.groupby(colname)['goal'].mean().to_dict() for i, colname in xG_model.xG_config['mean_encodings'].items()}
+    for i, colname in xG_model.xG_config['mean_encodings'].items():
+        train[colname+'_meanEnc'] = train[colname].map(mean_encodings[i])
+    scaler = StandardScaler()
+    X = scaler.fit_transform(train[features].values).astype(np.float32)
+    with tempfile.TemporaryDirectory() as work_dir:
+        binary_file = os.path.join(work_dir, 'train.bin')
+        lgb.Dataset(X, label=train['goal'].values, params=xG_model.TRAIN_PARAMS).save_binary(binary_file)
+        model = lgb.train(xG_model.TRAIN_PARAMS, lgb.Dataset(binary_file, params=xG_model.TRAIN_PARAMS), num_boost_round=20)
+
+    shots = synthetic.shots(features, n_shots=2000, seed=1)
+    for i, colname in xG_model.xG_config['mean_encodings'].items():
+        shots[colname+'_meanEnc'] = shots[colname].map(mean_encodings[i])
+    expected = model.predict(scaler.transform(shots[features].values))
+    preds = xG_model.compiled_xG_model(mean_encodings, scaler, model).predict(shots)
+    assert np.abs(preds - expected).max()<1e-6
@@ -1,63 +1,99 @@
 import data_scraper
 import data_processing
+import data_storage
+import inseason_ratings
 import argparse
 import os
+import shutil
 import pandas as pd
 import datetime
 from datetime import date, timedelta
 
-def main(start_date=None, end_date=None, season=2022, pbp_data_file=None, shifts_data_file=None, preseason_ratings_file='data/ratings_preseason.csv',
-    output_playerGame=None, output_toiOverlap=None, output_teamGame='data/teamGame.pkl', replace=False, teamGameReplace=False):
+def _batch_dates(games, batch_size):
+    # group consecutive dates into batches of about batch_size games. days aren't split, so a batch is at least one day
+    batches = []
+    batch = []
+    n_games = 0
+    for d, n in games.groupby('Date').size().items():
+        if len(batch)>0 and n_games+n>batch_size:
+            batches.append(batch)
+            batch = []
+            n_games = 0
+        batch.append(d)
+        n_games += n
+    if len(batch)>0:
+        batches.append(batch)
+    return batches
+
+def process_batches(start_date, end_date, season=2022, team_state=None, data_dir='data', batch_size=20):
+    # generator that runs the stored pbp and shifts between start_date and end_date (inclusive) through get_shots_data,
+    # add_xG_to_pbp, aggregate_player_data and aggregate_team_data a batch of games at a time, so memory use depends on the
+    # batch size and not the date range. yields the playerGame, toi_overlap and teamGame rows for each batch, and the team state after it
+    # team_state is each team's state after its last game before start_date (see data_processing.get_team_state), if there are any
+    games = data_storage.read_manifest('pbp', data_dir)
+    games = games.loc[(games['Season']==int(season))&(games['Date']>=start_date)&(games['Date']<=end_date)]
+    if team_state is None:
+        team_state = data_processing.get_team_state(pd.DataFrame())
+    for batch in _batch_dates(games, batch_size):
+        pbp = data_storage.read_data('pbp', season, start_date=batch[0], end_date=batch[-1], data_dir=data_dir)
+        shifts = data_storage.read_data('shifts', season, start_date=batch[0], end_date=batch[-1], data_dir=data_dir)
+
+        pbp, shots = data_processing.get_shots_data(pbp, season, os.path.join(data_dir, 'shotFeatures'))
+        pbp = data_processing.add_xG_to_pbp(pbp, shots)
+        del shots
+
+        # only the team state is carried between batches, for the game ranks and elo ratings, so earlier teamGame rows aren't touched
+        # (playerGame's playoffs flag comes from these rows too)
+        teamGame = data_processing.aggregate_team_data(pbp.copy(), None, team_state=team_state)
+        team_state = data_processing.update_team_state(team_state, teamGame)
+        playerGame, toi_overlap = data_processing.aggregate_player_data(pbp, shifts, teamGame)
+        del pbp, shifts
+
+        yield playerGame, toi_overlap, teamGame, team_state
+
+def main(start_date=None, end_date=None, season=2022, data_dir='data', preseason_ratings_file='data/ratings_preseason.csv',
+    replace=False, teamGameReplace=False, batch_size=20):
     # use yesterday if dates are not given
     if start_date is None:
         start_date = (date.today() - timedelta(days=1)).strftime('%Y-%m-%d')
     if end_date is None:
         end_date = (date.today() - timedelta(days=1)).strftime('%Y-%m-%d')
 
-    # determine data filenames if not given
-    if pbp_data_file is None:
-        pbp_data_file = 'data/pbp_{}.pkl'.format(str(season))
-    if shifts_data_file is None:
-        shifts_data_file = 'data/shifts_{}.pkl'.format(str(season))
-    if output_playerGame is None:
-        output_playerGame = 'data/playerGame_{}.pkl'.format(str(season))
-    if output_toiOverlap is None:
-        output_toiOverlap = 'data/toiOverlap_{}.pkl'.format(str(season))
-
     # scrape data
-    data_scraper.scrape_dates(start_date, end_date, pbp_data_file=pbp_data_file, shifts_data_file=shifts_data_file)
+    data_scraper.scrape_dates(start_date, end_date, season=season, data_dir=data_dir)
 
-    # get pbp data
-    pbp = pd.read_pickle(pbp_data_file)
-    shifts = pd.read_pickle(shifts_data_file)
+    # clear out old data if replacing
+    if replace:
+        data_storage.delete_data('playerGame', season, data_dir)
+        data_storage.delete_data('toiOverlap', season, data_dir)
+    if teamGameReplace:
+        shutil.rmtree(os.path.join(data_dir, 'teamGame'), ignore_errors=True)
 
-    # filter for only dates between start_date and end_date (inclusive)
-    shifts = shifts.loc[shifts['Date']>=start_date]
-    pbp = pbp.loc[pbp['Date']>=start_date]
-    shifts = shifts.loc[shifts['Date']<=end_date]
-    pbp = pbp.loc[pbp['Date']<=end_date]
+    # saved in-season ratings for dates after start_date were computed from the games being rewritten
+    if teamGameReplace:
+        inseason_ratings.clear_snapshots(data_dir=data_dir)
+    else:
+        inseason_ratings.clear_snapshots(season, None if replace else start_date, data_dir)
 
-    # process data and output
-    pbp, shots = data_processing.get_shots_data(pbp, season)
-    pbp = data_processing.add_xG_to_pbp(pbp, shots)
-    del shots
-    playerGame, toi_overlap = data_processing.aggregate_player_data(pbp, shifts)
-    del shifts
-    if os.path.isfile(output_playerGame) and not replace:
-        playerGame = pd.concat([pd.read_pickle(output_playerGame), playerGame], ignore_index=True)
-    playerGame.to_pickle(output_playerGame)
-    del playerGame
-    if os.path.isfile(output_toiOverlap) and not replace:
-        toi_overlap = pd.concat([pd.read_pickle(output_toiOverlap), toi_overlap], ignore_index=True)
-    toi_overlap.to_pickle(output_toiOverlap)
-    del toi_overlap
+    # teamGame rows before start_date don't change, so only each team's state after its last game before start_date is
+    # needed to carry on from. the saved state is used if it's for exactly the stored games before start_date, otherwise
+    # it's computed from them
+    games = data_storage.read_manifest('teamGame', data_dir)
+    last_date = games.loc[games['Date']<start_date, 'Date'].max() if len(games.index)>0 else None
+    team_state = data_storage.read_team_state(data_dir)
+    if team_state is not None and (pd.isnull(last_date) or team_state['Date'].max()!=last_date):
+        team_state = None
+    if team_state is None and not pd.isnull(last_date):
+        prev_teamGame = data_storage.read_data('teamGame', end_date=(datetime.datetime.strptime(start_date, '%Y-%m-%d') - timedelta(days=1)), data_dir=data_dir)
+        team_state = data_processing.get_team_state(prev_teamGame)
+        del prev_teamGame
 
-    if os.path.isfile(output_teamGame) and not teamGameReplace:
-        prev_teamGame = pd.read_pickle(output_teamGame)
-    else:
-        prev_teamGame = None
-    teamGame = data_processing.aggregate_team_data(pbp, prev_teamGame)
-    teamGame.to_pickle(output_teamGame)
+    # process the games in batches, writing each batch's partitions and the team state after it as it's finished
+    for playerGame, toi_overlap, teamGame, team_state in process_batches(start_date, end_date, season, team_state, data_dir, batch_size):
+        data_storage.write_data(playerGame, 'playerGame', season, data_dir=data_dir)
+        data_storage.write_data(toi_overlap, 'toiOverlap', season, game_dates=playerGame, data_dir=data_dir)
+        data_storage.write_data(teamGame, 'teamGame', data_dir=data_dir)
+        data_storage.write_team_state(team_state, data_dir)
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
@@ -65,9 +101,11 @@ if __name__ == '__main__':
     parser.add_argument('-season', required=False, help='NHL season to run for. Must pick dates for only one season at a time.')
     parser.add_argument('--replace', help='Replaces any existing data if flag is included', action='store_true')
     parser.add_argument('--teamGameReplace', help='Replaces any existing data for teamGame only if flag is included', action='store_true')
+    parser.add_argument('-batch_size', required=False, type=int, default=20, help='Approximate number of games to process at a time')
     args = parser.parse_args()
 
     if args.dates is None:
-        main(replace=args.replace)
+        main(replace=args.replace, batch_size=args.batch_size)
     else:
-        main(start_date = args.dates[0], end_date = args.dates[1], season = args.season, replace=args.replace, teamGameReplace=args.teamGameReplace)
+        main(start_date = args.dates[0], end_date = args.dates[1], season = args.season, replace=args.replace, teamGameReplace=args.teamGameReplace,
+            batch_size=args.batch_size)
@@ -1,4 +1,6 @@
 import json
+import data_storage
+import inseason_ratings
 import pandas as pd
 import numpy as np
 from sklearn.linear_model import LinearRegression
@@ -73,8 +75,8 @@ class PreseasonRatingsUpdater(object):
         ratings_all = pd.DataFrame()
         for season in range(start_season-3, end_season):
             # read data
-            playerGame = pd.read_pickle('data/playerGame_{}.pkl'.format(str(season)))
-            toi_overlap = pd.read_pickle('data/toiOverlap_{}.pkl'.format(str(season)))
+            playerGame = data_storage.read_data('playerGame', season)
+            toi_overlap = data_storage.read_data('toiOverlap', season)
 
             xGs = playerGame.loc[playerGame['Playoffs']==0]
             xGs = xGs.drop(columns=['Playoffs','DateInt','Season','Date','Game_Id','Playoffs','DateInt','PlayerGameID','Team'])
@@ -178,44 +180,26 @@ class PreseasonRatingsUpdater(object):
             ratings = ratings.loc[ratings['Strength']=='5x5']
             ratings = ratings[['Player','PlayerID','Player_y','Player_Id_y','SameTeam','Overlap']]
             ratings = ratings.groupby(['Player','PlayerID','Player_y','Player_Id_y','SameTeam'], as_index=False).sum()
-            ratings = ratings.merge(xGs, on=['Player','PlayerID'])
-            xG_others = xGs.rename(columns={'Player':'Player_y', 'PlayerID':'Player_Id_y'})
-            ratings = ratings.merge(xG_others, on=['Player_y','Player_Id_y'])
-            del xG_others
+            overlaps_5v5 = inseason_ratings.overlap_matrices(ratings, xGs)
 
             ratings_PP = toi_overlap.rename(columns={'Player_x':'Player', 'Player_Id_x':'PlayerID'})
             ratings_PP = ratings_PP.loc[ratings_PP['Strength'].isin(['5x4','5x3','4x3'])]
             ratings_PP = ratings_PP[['Player','PlayerID','Player_y','Player_Id_y','SameTeam','Overlap']]
             ratings_PP = ratings_PP.groupby(['Player','PlayerID','Player_y','Player_Id_y','SameTeam'], as_index=False).sum()
-            ratings_PP = ratings_PP.merge(xGs, on=['Player','PlayerID'])
-            xG_others = xGs.rename(columns={'Player':'Player_y', 'PlayerID':'Player_Id_y'})
-            ratings_PP = ratings_PP.merge(xG_others, on=['Player_y','Player_Id_y'])
-            del xG_others
+            overlaps_PP = inseason_ratings.overlap_matrices(ratings_PP, xGs)
 
             ratings_PK = toi_overlap.rename(columns={'Player_x':'Player', 'Player_Id_x':'PlayerID'})
             ratings_PK = ratings_PK.loc[ratings_PK['Strength'].isin(['4x5','3x5','3x4'])]
             ratings_PK = ratings_PK[['Player','PlayerID','Player_y','Player_Id_y','SameTeam','Overlap']]
             ratings_PK = ratings_PK.groupby(['Player','PlayerID','Player_y','Player_Id_y','SameTeam'], as_index=False).sum()
-            ratings_PK = ratings_PK.merge(xGs, on=['Player','PlayerID'])
-            xG_others = xGs.rename(columns={'Player':'Player_y', 'PlayerID':'Player_Id_y'})
-            ratings_PK = ratings_PK.merge(xG_others, on=['Player_y','Player_Id_y'])
-            del xG_others
-
-            ratings_F = ratings.loc[ratings['Position_x']=='F']
-            ratings_F = ratings_F.loc[ratings_F['Position_y']!='G']
-            ratings_F['metricSum_O_team'] = 0.
-            ratings_F.loc[ratings_F['SameTeam'], 'metricSum_O_team'] = ratings_F.loc[ratings_F['SameTeam'], 'metric_O_y']*ratings_F.loc[ratings_F['SameTeam'], 'Overlap']/\
-                (ratings_F.loc[ratings_F['SameTeam'], 'TOI_5v5_x']*4)
-            ratings_F['metricSum_O_comp'] = 0.
-            ratings_F.loc[~ratings_F['SameTeam'], 'metricSum_O_comp'] = ratings_F.loc[~ratings_F['SameTeam'], 'metric_D_y']*ratings_F.loc[~ratings_F['SameTeam'], 'Overlap']/\
-                (ratings_F.loc[~ratings_F['SameTeam'], 'TOI_5v5_x']*5)
-            ratings_F['metricSum_D_team'] = 0.
-            ratings_F.loc[ratings_F['SameTeam'], 'metricSum_D_team'] = ratings_F.loc[ratings_F['SameTeam'], 'metric_D_y']*ratings_F.loc[ratings_F['SameTeam'], 'Overlap']/\
-                (ratings_F.loc[ratings_F['SameTeam'], 'TOI_5v5_x']*4)
-            ratings_F['metricSum_D_comp'] = 0.
-            ratings_F.loc[~ratings_F['SameTeam'], 'metricSum_D_comp'] = ratings_F.loc[~ratings_F['SameTeam'], 'metric_O_y']*ratings_F.loc[~ratings_F['SameTeam'], 'Overlap']/\
-                (ratings_F.loc[~ratings_F['SameTeam'], 'TOI_5v5_x']*5)
-            ratings_F = ratings_F.groupby(['Player','PlayerID','Position_x'], as_index=False).agg({
+            overlaps_PK = inseason_ratings.overlap_matrices(ratings_PK, xGs)
+
+            ratings_F = inseason_ratings.pair_metric_sums(ratings, overlaps_5v5, xGs, 'F', 'TOI_5v5', {
+                'metricSum_O_team' : ('metric_O', True, 4),
+                'metricSum_O_comp' : ('metric_D', False, 5),
+                'metricSum_D_team' : ('metric_D', True, 4),
+                'metricSum_D_comp' : ('metric_O', False, 5)
+            }, ['Player','PlayerID','Position_x'], {
                 'TOI_5v5_x' : 'max',
                 'OZoneStartRate_5v5_x' : 'max',
                 'DZoneStartRate_5v5_x' : 'max',
@@ -274,18 +258,10 @@ class PreseasonRatingsUpdater(object):
             ratings_F['GP60_5v5_Adj'] = ratings_F['GP60_5v5']*ratings_F['nonneg_adjustment']
             ratings_F['GP_5v5'] = ratings_F['GP60_5v5']*ratings_F['TOI_5v5_x']/3600
 
-            ratings_PP_F = ratings_PP.loc[ratings_PP['Position_x']=='F']
-            ratings_PP_F = ratings_PP_F.loc[ratings_PP_F['Position_y']!='G']
-            ratings_PP_F = ratings_PP_F.loc[ratings_PP_F['Overlap']>0]
-            ratings_PP_F = ratings_PP_F.loc[ratings_PP_F['TOI_PP_x']>0]
-            ratings_PP_F = ratings_PP_F.loc[((ratings_PP_F['TOI_PK_y']>0)&(~ratings_PP_F['SameTeam']))|((ratings_PP_F['TOI_PP_y']>0)&(ratings_PP_F['SameTeam']))]
-            ratings_PP_F['metricSum_PP_team'] = 0.
-            ratings_PP_F.loc[ratings_PP_F['SameTeam'], 'metricSum_PP_team'] = ratings_PP_F.loc[ratings_PP_F['SameTeam'], 'metric_PP_y']*ratings_PP_F.loc[ratings_PP_F['SameTeam'], \
-                'Overlap']/(ratings_PP_F.loc[ratings_PP_F['SameTeam'], 'TOI_PP_x']*4)
-            ratings_PP_F['metricSum_PP_comp'] = 0.
-            ratings_PP_F.loc[~ratings_PP_F['SameTeam'], 'metricSum_PP_comp'] = ratings_PP_F.loc[~ratings_PP_F['SameTeam'], 'metric_PK_y'].fillna(0)\
-                *ratings_PP_F.loc[~ratings_PP_F['SameTeam'], 'Overlap']/(ratings_PP_F.loc[~ratings_PP_F['SameTeam'], 'TOI_PP_x']*4)
-            ratings_PP_F = ratings_PP_F.groupby(['Player','PlayerID'], as_index=False).agg({
+            ratings_PP_F = inseason_ratings.pair_metric_sums(ratings_PP, overlaps_PP, xGs, 'F', 'TOI_PP', {
+                'metricSum_PP_team' : ('metric_PP', True, 4),
+                'metricSum_PP_comp' : ('metric_PK', False, 4)
+            }, ['Player','PlayerID'], {
                 'TOI_PP_x' : 'max',
                 'metric_PP_x' : 'max',
                 'metricSum_PP_team' : 'sum',
@@ -299,7 +275,7 @@ class PreseasonRatingsUpdater(object):
                 'xG_flurry_PP_x' : 'max',
                 'PrimaryAssists_PP_x' : 'max',
                 'SecondaryAssists_PP_x' : 'max'
-            })
+            }, special_teams=('TOI_PP','TOI_PK'))
             ratings_PP_F.columns = ['Player','PlayerID','TOI_PP','metric_O_PP','metricSum_team_PP','metricSum_comp_PP','xG_PP_onice','Goals_PP',
                 'Shots_PP','ShotAttempts_PP','UnblockedShotAttempts_PP','xG_PP','xG_flurry_PP','PrimaryAssists_PP','SecondaryAssists_PP']
 
@@ -324,23 +300,15 @@ class PreseasonRatingsUpdater(object):
             ratings_PP_F['GC60_PP_Adj'] = ratings_PP_F['GC60_PP']*ratings_PP_F['nonneg_adjustment']
             ratings_PP_F['GC_PP'] = ratings_PP_F['GC60_PP']*ratings_PP_F['TOI_PP']/3600
 
-            ratings_PK_F = ratings_PK.loc[ratings_PK['Position_x']=='F']
-            ratings_PK_F = ratings_PK_F.loc[ratings_PK_F['Position_y']!='G']
-            ratings_PK_F = ratings_PK_F.loc[ratings_PK_F['Overlap']>0]
-            ratings_PK_F = ratings_PK_F.loc[ratings_PK_F['TOI_PK_x']>0]
-            ratings_PK_F = ratings_PK_F.loc[((ratings_PK_F['TOI_PP_y']>0)&(~ratings_PK_F['SameTeam']))|((ratings_PK_F['TOI_PK_y']>0)&(ratings_PK_F['SameTeam']))]
-            ratings_PK_F['metricSum_PK_team'] = 0.
-            ratings_PK_F.loc[ratings_PK_F['SameTeam'], 'metricSum_PK_team'] = ratings_PK_F.loc[ratings_PK_F['SameTeam'], 'metric_PK_y'].fillna(0)\
-                *ratings_PK_F.loc[ratings_PK_F['SameTeam'], 'Overlap']/(ratings_PK_F.loc[ratings_PK_F['SameTeam'], 'TOI_PK_x']*3)
-            ratings_PK_F['metricSum_PK_comp'] = 0.
-            ratings_PK_F.loc[~ratings_PK_F['SameTeam'], 'metricSum_PK_comp'] = ratings_PK_F.loc[~ratings_PK_F['SameTeam'], 'metric_PP_y'].fillna(0)\
-                *ratings_PK_F.loc[~ratings_PK_F['SameTeam'], 'Overlap']/(ratings_PK_F.loc[~ratings_PK_F['SameTeam'], 'TOI_PK_x']*5)
-            ratings_PK_F = ratings_PK_F.groupby(['Player','PlayerID'], as_index=False).agg({
+            ratings_PK_F = inseason_ratings.pair_metric_sums(ratings_PK, overlaps_PK, xGs, 'F', 'TOI_PK', {
+                'metricSum_PK_team' : ('metric_PK', True, 3),
+                'metricSum_PK_comp' : ('metric_PP', False, 5)
+            }, ['Player','PlayerID'], {
                 'TOI_PK_x' : 'max',
                 'metric_PK_x' : 'max',
                 'metricSum_PK_team' : 'sum',
                 'metricSum_PK_comp' : 'sum'
-            })
+            }, special_teams=('TOI_PK','TOI_PP'))
             ratings_PK_F.columns = ['Player','PlayerID','TOI_PK','metric_D_PK','metricSum_team_PK','metricSum_comp_PK']
 
             features = ['metricSum_team_PK','metricSum_comp_PK']
@@ -384,21 +352,12 @@ class PreseasonRatingsUpdater(object):
                 + ratings_F['TOI_PK']*ratings_F['GP60_PK']) / (ratings_F['TOI_5v5_x']+ratings_F['TOI_PP']+ratings_F['TOI_PK']))
             ratings_F['GI'] = ratings_F['GI60']*ratings_F['TOI_x']/3600
 
-            ratings_D = ratings.loc[ratings['Position_x']=='D']
-            ratings_D = ratings_D.loc[ratings_D['Position_y']!='G']
-            ratings_D['metricSum_O_team'] = 0.
-            ratings_D.loc[ratings_D['SameTeam'], 'metricSum_O_team'] = ratings_D.loc[ratings_D['SameTeam'], 'metric_O_y']*ratings_D.loc[ratings_D['SameTeam'], 'Overlap']/\
-                (ratings_D.loc[ratings_D['SameTeam'], 'TOI_5v5_x']*4)
-            ratings_D['metricSum_O_comp'] = 0.
-            ratings_D.loc[~ratings_D['SameTeam'], 'metricSum_O_comp'] = ratings_D.loc[~ratings_D['SameTeam'], 'metric_D_y']*ratings_D.loc[~ratings_D['SameTeam'], 'Overlap']/\
-                (ratings_D.loc[~ratings_D['SameTeam'], 'TOI_5v5_x']*5)
-            ratings_D['metricSum_D_team'] = 0.
-            ratings_D.loc[ratings_D['SameTeam'], 'metricSum_D_team'] = ratings_D.loc[ratings_D['SameTeam'], 'metric_D_y']*ratings_D.loc[ratings_D['SameTeam'], 'Overlap']/\
-                (ratings_D.loc[ratings_D['SameTeam'], 'TOI_5v5_x']*4)
-            ratings_D['metricSum_D_comp'] = 0.
-            ratings_D.loc[~ratings_D['SameTeam'], 'metricSum_D_comp'] = ratings_D.loc[~ratings_D['SameTeam'], 'metric_O_y']*ratings_D.loc[~ratings_D['SameTeam'], 'Overlap']/\
-                (ratings_D.loc[~ratings_D['SameTeam'], 'TOI_5v5_x']*5)
-            ratings_D = ratings_D.groupby(['Player','PlayerID','Position_x'], as_index=False).agg({
+            ratings_D = inseason_ratings.pair_metric_sums(ratings, overlaps_5v5, xGs, 'D', 'TOI_5v5', {
+                'metricSum_O_team' : ('metric_O', True, 4),
+                'metricSum_O_comp' : ('metric_D', False, 5),
+                'metricSum_D_team' : ('metric_D', True, 4),
+                'metricSum_D_comp' : ('metric_O', False, 5)
+            }, ['Player','PlayerID','Position_x'], {
                 'TOI_5v5_x' : 'max',
                 'OZoneStartRate_5v5_x' : 'max',
                 'DZoneStartRate_5v5_x' : 'max',
@@ -457,18 +416,10 @@ class PreseasonRatingsUpdater(object):
             ratings_D['GP60_5v5_Adj'] = ratings_D['GP60_5v5']*ratings_D['nonneg_adjustment']
             ratings_D['GP_5v5'] = ratings_D['GP60_5v5']*ratings_D['TOI_5v5_x']/3600
 
-            ratings_PP_D = ratings_PP.loc[ratings_PP['Position_x']=='D']
-            ratings_PP_D = ratings_PP_D.loc[ratings_PP_D['Position_y']!='G']
-            ratings_PP_D = ratings_PP_D.loc[ratings_PP_D['Overlap']>0]
-            ratings_PP_D = ratings_PP_D.loc[ratings_PP_D['TOI_PP_x']>0]
-            ratings_PP_D = ratings_PP_D.loc[((ratings_PP_D['TOI_PK_y']>0)&(~ratings_PP_D['SameTeam']))|((ratings_PP_D['TOI_PP_y']>0)&(ratings_PP_D['SameTeam']))]
-            ratings_PP_D['metricSum_PP_team'] = 0.
-            ratings_PP_D.loc[ratings_PP_D['SameTeam'], 'metricSum_PP_team'] = ratings_PP_D.loc[ratings_PP_D['SameTeam'], 'metric_PP_y']*ratings_PP_D.loc[ratings_PP_D['SameTeam'], \
-                'Overlap']/(ratings_PP_D.loc[ratings_PP_D['SameTeam'], 'TOI_PP_x']*4)
-            ratings_PP_D['metricSum_PP_comp'] = 0.
-            ratings_PP_D.loc[~ratings_PP_D['SameTeam'], 'metricSum_PP_comp'] = ratings_PP_D.loc[~ratings_PP_D['SameTeam'], 'metric_PK_y'].fillna(0)\
-                *ratings_PP_D.loc[~ratings_PP_D['SameTeam'], 'Overlap']/(ratings_PP_D.loc[~ratings_PP_D['SameTeam'], 'TOI_PP_x']*4)
-            ratings_PP_D = ratings_PP_D.groupby(['Player','PlayerID'], as_index=False).agg({
+            ratings_PP_D = inseason_ratings.pair_metric_sums(ratings_PP, overlaps_PP, xGs, 'D', 'TOI_PP', {
+                'metricSum_PP_team' : ('metric_PP', True, 4),
+                'metricSum_PP_comp' : ('metric_PK', False, 4)
+            }, ['Player','PlayerID'], {
                 'TOI_PP_x' : 'max',
                 'metric_PP_x' : 'max',
                 'metricSum_PP_team' : 'sum',
@@ -485,7 +436,7 @@ class PreseasonRatingsUpdater(object):
                 'PrimaryAssists_PP_x' : 'max',
                 'PrimaryAssistsAdjusted_PP_x' : 'max',
                 'SecondaryAssists_PP_x' : 'max'
-            })
+            }, special_teams=('TOI_PP','TOI_PK'))
             ratings_PP_D.columns = ['Player','PlayerID','TOI_PP','metric_O_PP','metricSum_team_PP','metricSum_comp_PP','xG_PP_onice','Goals_PP','GoalsAdjusted_PP',
                 'Shots_PP','ShotAttempts_PP','ShotAttemptsAdjusted_PP','UnblockedShotAttempts_PP','xG_PP','xG_flurry_PP','PrimaryAssists_PP','SecondaryAssists_PP',
                 'PrimaryAssistsAdjusted_PP']
@@ -511,23 +462,15 @@ class PreseasonRatingsUpdater(object):
             ratings_PP_D['GC60_PP_Adj'] = ratings_PP_D['GC60_PP']*ratings_PP_D['nonneg_adjustment']
             ratings_PP_D['GC_PP'] = ratings_PP_D['GC60_PP']*ratings_PP_D['TOI_PP']/3600
 
-            ratings_PK_D = ratings_PK.loc[ratings_PK['Position_x']=='D']
-            ratings_PK_D = ratings_PK_D.loc[ratings_PK_D['Position_y']!='G']
-            ratings_PK_D = ratings_PK_D.loc[ratings_PK_D['Overlap']>0]
-            ratings_PK_D = ratings_PK_D.loc[ratings_PK_D['TOI_PK_x']>0]
-            ratings_PK_D = ratings_PK_D.loc[((ratings_PK_D['TOI_PP_y']>0)&(~ratings_PK_D['SameTeam']))|((ratings_PK_D['TOI_PK_y']>0)&(ratings_PK_D['SameTeam']))]
-            ratings_PK_D['metricSum_PK_team'] = 0.
-            ratings_PK_D.loc[ratings_PK_D['SameTeam'], 'metricSum_PK_team'] = ratings_PK_D.loc[ratings_PK_D['SameTeam'], 'metric_PK_y'].fillna(0)\
-                *ratings_PK_D.loc[ratings_PK_D['SameTeam'], 'Overlap']/(ratings_PK_D.loc[ratings_PK_D['SameTeam'], 'TOI_PK_x']*3)
-            ratings_PK_D['metricSum_PK_comp'] = 0.
-            ratings_PK_D.loc[~ratings_PK_D['SameTeam'], 'metricSum_PK_comp'] = ratings_PK_D.loc[~ratings_PK_D['SameTeam'], 'metric_PP_y'].fillna(0)\
-                *ratings_PK_D.loc[~ratings_PK_D['SameTeam'], 'Overlap']/(ratings_PK_D.loc[~ratings_PK_D['SameTeam'], 'TOI_PK_x']*5)
-            ratings_PK_D = ratings_PK_D.groupby(['Player','PlayerID'], as_index=False).agg({
+            ratings_PK_D = inseason_ratings.pair_metric_sums(ratings_PK, overlaps_PK, xGs, 'D', 'TOI_PK', {
+                'metricSum_PK_team' : ('metric_PK', True, 3),
+                'metricSum_PK_comp' : ('metric_PP', False, 5)
+            }, ['Player','PlayerID'], {
                 'TOI_PK_x' : 'max',
                 'metric_PK_x' : 'max',
                 'metricSum_PK_team' : 'sum',
                 'metricSum_PK_comp' : 'sum'
-            })
+            }, special_teams=('TOI_PK','TOI_PP'))
             ratings_PK_D.columns = ['Player','PlayerID','TOI_PK','metric_D_PK','metricSum_team_PK','metricSum_comp_PK']
 
             features = ['metricSum_team_PK','metricSum_comp_PK']
@@ -626,13 +569,13 @@ class PreseasonRatingsUpdater(object):
         return df
 
     def update_team_preseason_ratings(self, start_season=2015, end_season=2022, out_file='data/ratings_preseason_teams.csv'):
-        teamGame = pd.read_pickle('data/teamGame.pkl')
-        teamSeason = teamGame.loc[teamGame['Playoffs']==0, ['Game_Id','Date','Team','Season',
+        teamGame = data_storage.read_data('teamGame', columns=['Game_Id','Date','Team','Season','Playoffs',
             'Goals','Shots','ShotAttempts','UnblockedShotAttempts','xG','xG_flurry','Goals_5v5','Shots_5v5','ShotAttempts_5v5',
             'UnblockedShotAttempts_5v5','xG_5v5','xG_flurry_5v5',
             'GoalsAdjusted','ShotsAdjusted','ShotAttemptsAdjusted','UnblockedShotAttemptsAdjusted','xGAdjusted','xG_flurryAdjusted',
             'GoalsAdjusted_5v5','ShotsAdjusted_5v5','ShotAttemptsAdjusted_5v5','UnblockedShotAttemptsAdjusted_5v5',
-            'xGAdjusted_5v5','xG_flurryAdjusted_5v5']]
+            'xGAdjusted_5v5','xG_flurryAdjusted_5v5'])
+        teamSeason = teamGame.loc[teamGame['Playoffs']==0].drop(columns=['Playoffs'])
         del teamGame
         teamSeason_Opp = teamSeason.copy(deep=True)
         teamSeason_Opp.columns = ['Game_Id','Date','Opp','Season',
@@ -3,9 +3,13 @@
 import pickle
 import os
 import json
+import shutil
 import lightgbm as lgb
 import data_processing
+import model_registry
+import data_storage
 import pandas as pd
+import numpy as np
 from sklearn.preprocessing import StandardScaler
 from sklearn.metrics import log_loss, roc_auc_score
 
@@ -14,73 +18,150 @@ config_file = os.path.join(scriptdir, 'configs/xG_config.json')
 with open(config_file, 'r') as f:
     xG_config = json.load(f)
 
+class compiled_xG_model(object):
+    # xG predictions without going through sklearn. trees only compare a feature to a threshold, and
+    # (x - mean)/scale <= t is the same split as x - mean <= t*scale, so the scaler's scale is folded into the tree thresholds.
+    # the mean is still subtracted when building the input matrix so missing values, which LightGBM treats as 0, go down the
+    # same side of each split as after the scaler. mean encodings are looked up from dense arrays, and the booster is called
+    # directly on a contiguous float32 matrix using all cores
+    def __init__(self, mean_encodings, scaler, model, num_threads=0):
+        # model is a LightGBM Booster, as train saves it, or the LGBMClassifier in model files saved before that
+        model = getattr(model, 'booster_', model)
+        self.features = xG_config['features']
+        self.num_threads = num_threads
+        self.mean = scaler.mean_ if scaler.with_mean else np.zeros(len(self.features))
+        self.scale = scaler.scale_ if scaler.with_std else np.ones(len(self.features))
+
+        # lookup arrays for mean encoded columns, already centred. unknown categories get NaN, like Series.map
+        self.lookups = {}
+        for i, colname in xG_config['mean_encodings'].items():
+            j = self.features.index(colname+'_meanEnc')
+            self.lookups[j] = (colname, pd.Index(list(mean_encodings[i].keys())),
+                np.append(np.array(list(mean_encodings[i].values()), dtype=np.float64) - self.mean[j], np.nan).astype(np.float32))
+
+        # rewrite the tree thresholds in centred (unscaled) units
+        lines = []
+        split_feature = []
+        for line in model.model_to_string().split('\n'):
+            if line.startswith('tree_sizes='):
+                # sizes of the tree blocks change with the new thresholds, and LightGBM can find the trees without them
+                continue
+            if line.startswith('split_feature='):
+                split_feature = [int(f) for f in line[len('split_feature='):].split()]
+            elif line.startswith('decision_type=') and any(int(d) & 1 for d in line[len('decision_type='):].split()):
+                raise ValueError('cannot fold the scaler into categorical splits')
+            elif line.startswith('threshold='):
+                thresholds = [float(t)*self.scale[f] for t, f in zip(line[len('threshold='):].split(), split_feature)]
+                line = 'threshold=' + ' '.join(repr(float(t)) for t in thresholds)
+            lines.append(line)
+        self.booster = lgb.Booster(model_str='\n'.join(lines))
+
+    def predict(self, df):
+        # makes xG predictions for shots in the provided dataframe
+        X = np.empty((len(df.index), len(self.features)), dtype=np.float32)
+        for j, feature in enumerate(self.features):
+            if j in self.lookups:
+                colname, keys, values = self.lookups[j]
+                X[:,j] = values[keys.get_indexer(df[colname])]
+            else:
+                X[:,j] = df[feature].values - self.mean[j]
+
+        return self.booster.predict(X, num_threads=self.num_threads)
+
+# columns that mean encodings are made for. prevEvent isn't a feature, but is saved with the others
+MEAN_ENCODING_COLUMNS = {'shotCategory':'ShotCategory', 'strength':'Strength', 'zone':'Ev_Zone', 'type':'Type', 'prevEvent':'prev_Event'}
+TRAIN_CHUNK_SIZE = 1000000
+# the LGBMClassifier settings the model has always been trained with, as LightGBM parameters
+TRAIN_PARAMS = {'objective':'binary', 'max_depth':10, 'min_child_samples':200, 'seed':26, 'verbose':-1}
+TRAIN_ROUNDS = 130
+
+def build_train_data(min_season=2012, max_season=2020, work_dir='data/xG_train', cache_dir='data/shotFeatures', data_dir='data'):
+    # xG training data for the given seasons of pbp in data_dir, built a season at a time so memory use is about the size of the
+    # final feature matrix instead of every season's shots at once. returns the mean encodings, the feature matrix (unscaled, as a
+    # float32 memory-mapped file in work_dir) and the target (int8, memory-mapped the same way)
+    features = xG_config['features']
+    columns = list(dict.fromkeys([f for f in features if not f.endswith('_meanEnc')] + list(MEAN_ENCODING_COLUMNS.values()) + ['goal']))
+    os.makedirs(work_dir, exist_ok=True)
+
+    # first pass: save each season's shots with only the columns that are needed, and add up the goals and shots in each
+    # category for the mean encodings
+    sums = {}
+    season_files = []
+    n_shots = 0
+    for season in range(min_season, max_season+1):
+        shots = data_processing.get_shots_data(data_storage.read_data('pbp', season, data_dir=data_dir), season, cache_dir)[1][columns]
+        for i, colname in MEAN_ENCODING_COLUMNS.items():
+            season_sums = shots.groupby(colname, observed=True)['goal'].agg(['sum','count'])
+            sums[i] = season_sums if i not in sums else sums[i].add(season_sums, fill_value=0)
+        season_files.append(os.path.join(work_dir, 'shots_{}.parquet'.format(season)))
+        shots.to_parquet(season_files[-1], index=False)
+        n_shots += len(shots.index)
+        del shots
+    mean_codes = {i: (s['sum']/s['count']).to_dict() for i, s in sums.items()}
+
+    # second pass: fill in the feature matrix and target a season at a time
+    X = np.lib.format.open_memmap(os.path.join(work_dir, 'X.npy'), mode='w+', dtype=np.float32, shape=(n_shots, len(features)))
+    y = np.lib.format.open_memmap(os.path.join(work_dir, 'y.npy'), mode='w+', dtype=np.int8, shape=(n_shots,))
+    row = 0
+    for f in season_files:
+        shots = pd.read_parquet(f)
+        for i, colname in xG_config['mean_encodings'].items():
+            shots[colname+'_meanEnc'] = shots[colname].map(mean_codes[i])
+        X[row:row+len(shots.index)] = shots[features].values
+        y[row:row+len(shots.index)] = shots['goal'].values
+        row += len(shots.index)
+        os.remove(f)
+        del shots
+    X.flush()
+    y.flush()
+
+    return mean_codes, X, y
+
 class xG_model(object):
     def __init__(self):
         self.mean_encodings_file = os.path.join(scriptdir, 'models/', xG_config['mean_encodings_file'])
         self.scaler_file = os.path.join(scriptdir, 'models/', xG_config['scaler_file'])
         self.model_file = os.path.join(scriptdir, 'models/', xG_config['model_file'])
 
-    def predict(self, df):
-        # makes xG predictions for shots in the provided dataframe
+    def load(self):
+        # mean encodings, scaler and model, each only unpickled once per process (see model_registry.py)
+        return model_registry.load(self.mean_encodings_file), model_registry.load(self.scaler_file), model_registry.load(self.model_file)
 
-        # create mean encoded columns for categorical variables
-        mean_encodings = pickle.load(open(self.mean_encodings_file, 'rb'))
-        for i, colname in xG_config['mean_encodings'].items():
-            df[colname+'_meanEnc'] = df[colname].map(mean_encodings[i])
-
-        # create input feature array
-        X = df[xG_config['features']].values
-        scaler = pickle.load(open(self.scaler_file, 'rb'))
-        X = scaler.transform(X)
+    def compile(self):
+        # compiled_xG_model for the current model files, built once per process
+        return model_registry.load_compiled([self.mean_encodings_file, self.scaler_file, self.model_file], compiled_xG_model)
 
-        # make predictions
-        model = pickle.load(open(self.model_file, 'rb'))
-        preds = model.predict_proba(X)[:,1]
-
-        return preds
+    def predict(self, df):
+        # makes xG predictions for shots in the provided dataframe
+        return self.compile().predict(df)
 
-    def train(self, max_season=2020):
+    def train(self, max_season=2020, cache_dir='data/shotFeatures', work_dir='data/xG_train', data_dir='data'):
         # retrains xG model
+        # the training data is built a season at a time into memory-mapped files in work_dir (see build_train_data), so the
+        # scaler is fit and applied in chunks and LightGBM trains from a binary dataset built from those files
 
-        # read data and process into just shots for xG model
-        df = data_processing.get_shots_data(pd.read_pickle('data/pbp_2012.pkl'), 2012)[1]
-        for season in range(2013, max_season+1):
-            df = pd.concat([df, data_processing.get_shots_data(pd.read_pickle('data/pbp_{}.pkl'.format(str(season))), season)[1]], ignore_index=True)
-
-        # get mean encodings
-        mean_codes_strength = df.groupby(['Strength'])['goal'].mean().to_dict()
-        mean_codes_zone = df.groupby(['Ev_Zone'])['goal'].mean().to_dict()
-        mean_codes_type = df.groupby(['Type'])['goal'].mean().to_dict()
-        mean_codes_prevEvent = df.groupby(['prev_Event'])['goal'].mean().to_dict()
-        mean_codes_shotCategory = df.groupby(['ShotCategory'])['goal'].mean().to_dict()
-        mean_codes = {
-            'shotCategory' : mean_codes_shotCategory,
-            'strength' : mean_codes_strength,
-            'zone' : mean_codes_zone,
-            'type' : mean_codes_type,
-            'prevEvent' : mean_codes_prevEvent
-        }
+        # read data and process into just shots for xG model, with the mean encodings
+        mean_codes, X, y = build_train_data(2012, max_season, work_dir, cache_dir, data_dir)
         pickle.dump(mean_codes, open(self.mean_encodings_file, 'wb'))
 
-        df['Strength_meanEnc'] = df['Strength'].map(mean_codes_strength)
-        df['Ev_Zone_meanEnc'] = df['Ev_Zone'].map(mean_codes_zone)
-        df['Type_meanEnc'] = df['Type'].map(mean_codes_type)
-        df['prev_Event_meanEnc'] = df['prev_Event'].map(mean_codes_prevEvent)
-        df['ShotCategory_meanEnc'] = df['ShotCategory'].map(mean_codes_shotCategory)
-
-        X = df[xG_config['features']].values
-        y = df['goal'].values
-        del df
-
-        # apply scaler
+        # apply scaler, in place
         scaler = StandardScaler()
-        X = scaler.fit_transform(X)
+        for start in range(0, len(y), TRAIN_CHUNK_SIZE):
+            scaler.partial_fit(X[start:start+TRAIN_CHUNK_SIZE])
+        for start in range(0, len(y), TRAIN_CHUNK_SIZE):
+            X[start:start+TRAIN_CHUNK_SIZE] = scaler.transform(X[start:start+TRAIN_CHUNK_SIZE])
         pickle.dump(scaler, open(self.scaler_file, 'wb'))
 
-        model = lgb.LGBMClassifier(max_depth=10, min_child_samples=200, random_state=26, n_estimators=130)
-        model.fit(X, y)
+        # bin the memory-mapped matrix into a LightGBM binary file and train from that, so the raw matrix isn't held in
+        # memory while the trees are built
+        binary_file = os.path.join(work_dir, 'train.bin')
+        lgb.Dataset(X, label=y, params=TRAIN_PARAMS).save_binary(binary_file)
+        model = lgb.train(TRAIN_PARAMS, lgb.Dataset(binary_file, params=TRAIN_PARAMS), num_boost_round=TRAIN_ROUNDS)
         pickle.dump(model, open(self.model_file, 'wb'))
 
-        preds = model.predict_proba(X)[:,1]
+        preds = model.predict(X)
         print ('LogLoss score on train set: {}'.format(str(log_loss(y, preds))))
         print ('AUC score on train set: {}'.format(str(roc_auc_score(y, preds))))
+
+        del X, y
+        shutil.rmtree(work_dir, ignore_errors=True)